@@ -0,0 +1,315 @@
+"""
+Hourly and daily message rollups backing /api/analytics/performance.
+
+Rollups are keyed by the bucket a message was *sent* in, so late replies and
+conversions dirty old buckets. Each refresh finds the dirty days from three
+watermarks (new message ids, message updates such as a recorded reply,
+prospect updates) and recomputes just those days from the raw rows. Replies
+are found by when they were recorded (messages.updated_at), not by their
+Instagram timestamp, which can be older than one recorded before it. Days
+before the archive horizon (see app.archive) are final: their messages have
+left the hot table.
+"""
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+GRANULARITIES = ('hour', 'day')
+WATERMARK_NAME = 'message_rollups'
+STREAM_CHUNK_SIZE = 10000
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+def _day_ranges(days: Set[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Merge a set of day starts into contiguous [start, end) ranges"""
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1] = (ranges[-1][0], day + timedelta(days=1))
+        else:
+            ranges.append((day, day + timedelta(days=1)))
+    return ranges
+
+def archive_horizon(db: Session) -> Optional[datetime]:
+    """Start of the first day whose messages are all still hot, None if nothing was archived"""
+    return db.query(func.max(models.MessageArchive.archived_before)).scalar()
+
+def get_watermark(db: Session) -> models.RollupWatermark:
+    watermark = db.query(models.RollupWatermark).get(WATERMARK_NAME)
+    if not watermark:
+        watermark = models.RollupWatermark(name=WATERMARK_NAME, last_message_id=0)
+        db.add(watermark)
+        db.flush()
+    return watermark
+
+def find_dirty_days(db: Session, watermark: models.RollupWatermark) -> Tuple[Set[datetime], Dict]:
+    """Return the days needing recomputation and the watermark values to store afterwards"""
+    dirty_days = set()
+
+    # Snapshot before scanning; anything updated after this is rescanned next run
+    latest_prospect_update = db.query(func.max(models.Prospect.updated_at)).scalar()
+    latest_message_update = db.query(func.max(models.Message.updated_at)).scalar()
+
+    min_sent, max_sent, max_id = db.query(
+        func.min(models.Message.sent_at),
+        func.max(models.Message.sent_at),
+        func.max(models.Message.id)
+    ).filter(models.Message.id > (watermark.last_message_id or 0)).one()
+
+    if min_sent and max_sent:
+        day = truncate(min_sent, 'day')
+        while day <= max_sent:
+            dirty_days.add(day)
+            day += timedelta(days=1)
+
+    # Replies (and any other change) recorded on messages that were already rolled up
+    changed = db.query(models.Message.sent_at).filter(
+        models.Message.id <= (watermark.last_message_id or 0),
+        models.Message.updated_at.isnot(None)
+    )
+    if watermark.last_message_update:
+        changed = changed.filter(models.Message.updated_at > watermark.last_message_update)
+
+    for sent_at, in changed.yield_per(STREAM_CHUNK_SIZE):
+        if sent_at:
+            dirty_days.add(truncate(sent_at, 'day'))
+
+    # Status changes (conversions, niche corrections) on prospects dirty every day they were messaged
+    updated = db.query(models.Message.sent_at).join(
+        models.Prospect, models.Message.prospect_id == models.Prospect.id
+    ).filter(models.Message.id <= (watermark.last_message_id or 0))
+    if watermark.last_prospect_update:
+        updated = updated.filter(models.Prospect.updated_at > watermark.last_prospect_update)
+
+    for sent_at, in updated.yield_per(STREAM_CHUNK_SIZE):
+        if sent_at:
+            dirty_days.add(truncate(sent_at, 'day'))
+
+    horizon = archive_horizon(db)
+    if horizon:
+        dirty_days = {day for day in dirty_days if day >= horizon}
+
+    new_marks = {
+        'last_message_id': max(max_id or 0, watermark.last_message_id or 0),
+        'last_message_update': latest_message_update or watermark.last_message_update,
+        'last_prospect_update': latest_prospect_update or watermark.last_prospect_update
+    }
+    return dirty_days, new_marks
+
+def _aggregate(rows: Iterable) -> List[Dict]:
+    """Aggregate (sent_at, response_at, campaign, account, niche, variant, status) rows into rollup dicts"""
+    buckets = defaultdict(lambda: {'sent': 0, 'responded': 0, 'converted': 0, 'response_seconds': []})
+
+    for sent_at, response_at, campaign_id, account_id, niche, variant, prospect_status in rows:
+        if not sent_at:
+            continue
+        dimensions = (campaign_id, account_id, niche, variant)
+        for granularity in GRANULARITIES:
+            bucket = buckets[(granularity, truncate(sent_at, granularity)) + dimensions]
+            bucket['sent'] += 1
+            if response_at:
+                bucket['responded'] += 1
+                bucket['response_seconds'].append(max(0.0, (response_at - sent_at).total_seconds()))
+            if prospect_status == models.ProspectStatus.CONVERTED:
+                bucket['converted'] += 1
+
+    rollups = []
+    for (granularity, bucket_start, campaign_id, account_id, niche, variant), counts in buckets.items():
+        response_seconds = counts['response_seconds']
+        rollups.append({
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'campaign_id': campaign_id,
+            'instagram_account_id': account_id,
+            'niche': niche,
+            'template_variant': variant,
+            'sent': counts['sent'],
+            'responded': counts['responded'],
+            'converted': counts['converted'],
+            'median_response_seconds': statistics.median(response_seconds) if response_seconds else None,
+            'updated_at': datetime.utcnow()
+        })
+    return rollups
+
+def recompute_range(db: Session, start: datetime, end: datetime) -> int:
+    """Rebuild every hourly and daily rollup in [start, end) from the messages table"""
+    db.query(models.MessageRollup).filter(
+        models.MessageRollup.bucket_start >= start,
+        models.MessageRollup.bucket_start < end
+    ).delete(synchronize_session=False)
+
+    rows = db.query(
+        models.Message.sent_at,
+        models.Message.response_at,
+        models.Message.campaign_id,
+        models.Message.instagram_account_id,
+        models.Prospect.niche,
+        models.Message.template_variant,
+        models.Prospect.status
+    ).join(
+        models.Prospect, models.Message.prospect_id == models.Prospect.id
+    ).filter(
+        models.Message.sent_at >= start,
+        models.Message.sent_at < end
+    ).yield_per(STREAM_CHUNK_SIZE)
+
+    rollups = _aggregate(rows)
+    if rollups:
+        db.bulk_insert_mappings(models.MessageRollup, rollups)
+    return len(rollups)
+
+def refresh_rollups(db: Session) -> Dict:
+    """Incrementally bring the rollup tables up to date and advance the watermark"""
+    watermark = get_watermark(db)
+    dirty_days, new_marks = find_dirty_days(db, watermark)
+
+    rollups_written = 0
+    ranges = _day_ranges(dirty_days)
+    for start, end in ranges:
+        rollups_written += recompute_range(db, start, end)
+
+    for key, value in new_marks.items():
+        setattr(watermark, key, value)
+    db.commit()
+
+    return {
+        'days_recomputed': len(dirty_days),
+        'ranges': len(ranges),
+        'rollups_written': rollups_written,
+        'last_message_id': watermark.last_message_id
+    }
+
+def rebuild_rollups(db: Session) -> Dict:
+    """Drop the rollups after the archive horizon and the watermark, then rebuild them from scratch"""
+    rollups = db.query(models.MessageRollup)
+    horizon = archive_horizon(db)
+    if horizon:
+        rollups = rollups.filter(models.MessageRollup.bucket_start >= horizon)
+    rollups.delete(synchronize_session=False)
+    db.query(models.RollupWatermark).filter(models.RollupWatermark.name == WATERMARK_NAME).delete(synchronize_session=False)
+    db.commit()
+    return refresh_rollups(db)
+
+def get_rollups(db: Session, granularity: str, start: datetime, end: datetime,
+                campaign_id: Optional[int] = None, instagram_account_id: Optional[int] = None,
+                niche: Optional[str] = None, template_variant: Optional[str] = None) -> List[models.MessageRollup]:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    query = db.query(models.MessageRollup).filter(
+        models.MessageRollup.granularity == granularity,
+        models.MessageRollup.bucket_start >= truncate(start, granularity),
+        models.MessageRollup.bucket_start < end
+    )
+    if campaign_id is not None:
+        query = query.filter(models.MessageRollup.campaign_id == campaign_id)
+    if instagram_account_id is not None:
+        query = query.filter(models.MessageRollup.instagram_account_id == instagram_account_id)
+    if niche is not None:
+        query = query.filter(models.MessageRollup.niche == niche)
+    if template_variant is not None:
+        query = query.filter(models.MessageRollup.template_variant == template_variant)
+    return query.order_by(models.MessageRollup.bucket_start).all()
+
+def summarize_rollups(rollups: List[models.MessageRollup]) -> Dict:
+    """
+    Collapse rollup rows across dimensions into one series per bucket.
+
+    Medians can't be merged exactly, so the combined median_response_seconds is the
+    response-weighted mean of the per-row medians.
+    """
+    buckets = {}
+    niches = defaultdict(int)
+
+    for rollup in rollups:
+        bucket = buckets.setdefault(rollup.bucket_start, {
+            'bucket_start': rollup.bucket_start, 'sent': 0, 'responded': 0, 'converted': 0, '_weighted': 0.0
+        })
+        bucket['sent'] += rollup.sent
+        bucket['responded'] += rollup.responded
+        bucket['converted'] += rollup.converted
+        if rollup.median_response_seconds is not None:
+            bucket['_weighted'] += rollup.median_response_seconds * rollup.responded
+        niches[rollup.niche or 'general'] += rollup.sent
+
+    series = []
+    for bucket in buckets.values():
+        weighted = bucket.pop('_weighted')
+        bucket['response_rate'] = bucket['responded'] / bucket['sent'] if bucket['sent'] else 0.0
+        bucket['conversion_rate'] = bucket['converted'] / bucket['sent'] if bucket['sent'] else 0.0
+        bucket['median_response_seconds'] = weighted / bucket['responded'] if bucket['responded'] else None
+        series.append(bucket)
+
+    return {
+        'buckets': series,
+        'niche_distribution': [{'niche': niche, 'count': count} for niche, count in sorted(niches.items())]
+    }
+
+def source_performance(db: Session, campaign_id: Optional[int] = None) -> List[Dict]:
+    """
+    Prospects produced per scrape source and how far they got, in one GROUP BY over
+    prospect_sources. With campaign_id, only the hashtags and accounts that campaign targets.
+    """
+    status = models.Prospect.status
+    def count_status(*statuses):
+        return func.sum(case((status.in_(statuses), 1), else_=0))
+
+    query = db.query(
+        models.ProspectSource.source_type,
+        models.ProspectSource.source,
+        func.count(models.ProspectSource.prospect_id),
+        count_status(models.ProspectStatus.QUALIFIED, models.ProspectStatus.MESSAGED,
+                     models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED),
+        func.sum(case((models.Prospect.dm_sent == True, 1), else_=0)),
+        count_status(models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED),
+        count_status(models.ProspectStatus.CONVERTED)
+    ).join(
+        models.Prospect, models.Prospect.id == models.ProspectSource.prospect_id
+    )
+
+    if campaign_id is not None:
+        hashtags = select(models.CampaignHashtag.hashtag).where(models.CampaignHashtag.campaign_id == campaign_id)
+        accounts = select(models.CampaignTargetAccount.username).where(
+            models.CampaignTargetAccount.campaign_id == campaign_id
+        )
+        query = query.filter(or_(
+            and_(models.ProspectSource.source_type == 'hashtag', models.ProspectSource.source.in_(hashtags)),
+            and_(models.ProspectSource.source_type == 'followers', models.ProspectSource.source.in_(accounts))
+        ))
+
+    results = []
+    for source_type, source, prospects, qualified, messaged, responded, converted in query.group_by(
+        models.ProspectSource.source_type, models.ProspectSource.source
+    ).order_by(func.count(models.ProspectSource.prospect_id).desc()):
+        results.append({
+            'source_type': source_type,
+            'source': source,
+            'prospects': prospects,
+            'qualified': qualified or 0,
+            'messaged': messaged or 0,
+            'responded': responded or 0,
+            'converted': converted or 0,
+            'response_rate': round((responded or 0) / messaged, 4) if messaged else 0.0,
+            'conversion_rate': round((converted or 0) / prospects, 4) if prospects else 0.0
+        })
+    return results
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(refresh_rollups(db))
+    finally:
+        db.close()
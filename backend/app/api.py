@@ -1,65 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, UploadFile, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.exc import DataError
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+import io
+import tempfile
 
-from app import schemas, models, crud
+from app import schemas, models, crud, analytics, archive, inbox, prioritization, prospect_csv, scraper, search, session_health, thumbnails
+from app.auth import get_current_user
 from app.database import get_db
-from app.crud import pwd_context
-
-router = APIRouter()
-
-SECRET_KEY = "your-secret-key"  # Change this in a real app
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-@router.post("/auth/login", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not pwd_context.verify(form_data.password, user.password_hash):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+from app.response_cache import cached_json
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+CAMPAIGN_TABLES = ('campaigns', 'campaign_hashtags', 'campaign_target_accounts')
+_campaigns_adapter = TypeAdapter(list[schemas.Campaign])
+_instagram_accounts_adapter = TypeAdapter(list[schemas.InstagramAccount])
+_coolify_configs_adapter = TypeAdapter(list[schemas.CoolifyConfig])
+_deployments_adapter = TypeAdapter(list[schemas.Deployment])
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024  # Larger exports spill to a temp file
 
 @router.get("/prospects/", response_model=list[schemas.Prospect])
-def read_prospects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    prospects = crud.get_prospects(db, skip=skip, limit=limit)
+def read_prospects(skip: int = 0, limit: int = 100, status: Optional[schemas.ProspectStatus] = None, niche: Optional[str] = None,
+                   q: Optional[str] = None, db: Session = Depends(get_db)):
+    try:
+        prospects = crud.get_prospects(db, skip=skip, limit=limit, status=status.value if status else None, niche=niche, q=q)
+    except search.SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
     return prospects
 
 @router.post("/prospects/", response_model=schemas.Prospect)
 def create_prospect(prospect: schemas.ProspectCreate, db: Session = Depends(get_db)):
     return crud.create_prospect(db=db, prospect=prospect)
 
+@router.post("/prospects/import", response_model=schemas.ProspectImportResult)
+def import_prospects(file: UploadFile, db: Session = Depends(get_db)):
+    """CSV upload keyed on username (see app.prospect_csv); COPY on Postgres"""
+    try:
+        result = prospect_csv.import_csv(db, io.TextIOWrapper(file.file, encoding='utf-8-sig', newline=''))
+    except (ValueError, DataError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid prospect CSV: {getattr(e, 'orig', None) or e}")
+    db.commit()
+    return result
+
+@router.get("/prospects/export")
+def export_prospects(status: Optional[schemas.ProspectStatus] = None, niche: Optional[str] = None, db: Session = Depends(get_db)):
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode='w+', newline='')
+    prospect_csv.export_csv(db, out, status=status.value if status else None, niche=niche)
+    out.seek(0)
+
+    def chunks():
+        with out:
+            while chunk := out.read(64 * 1024):
+                yield chunk
+    return StreamingResponse(chunks(), media_type='text/csv',
+                             headers={'Content-Disposition': 'attachment; filename="prospects.csv"'})
+
 @router.get("/campaigns/", response_model=list[schemas.Campaign])
-def read_campaigns(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    campaigns = crud.get_campaigns(db, skip=skip, limit=limit)
-    return campaigns
+def read_campaigns(request: Request, skip: int = 0, limit: int = 100, hashtag: Optional[str] = None,
+                   target_account: Optional[str] = None, db: Session = Depends(get_db)):
+    return cached_json(request, 'campaigns', CAMPAIGN_TABLES, lambda: crud.get_campaigns(
+        db, skip=skip, limit=limit, hashtag=hashtag, target_account=target_account
+    ), _campaigns_adapter)
 
 @router.post("/campaigns/", response_model=schemas.Campaign)
 def create_campaign(campaign: schemas.CampaignCreate, db: Session = Depends(get_db)):
     return crud.create_campaign(db=db, campaign=campaign)
 
+@router.get("/campaigns/{campaign_id}/queue", response_model=list[schemas.Prospect])
+def read_campaign_queue(campaign_id: int, limit: int = 20, db: Session = Depends(get_db)):
+    """The queue as last refreshed (by a dispatch run or POST .../queue/refresh)"""
+    if not db.query(models.Campaign.id).filter(models.Campaign.id == campaign_id).first():
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return [prospect for prospect, _ in prioritization.top_candidates(db, campaign_id, limit)]
+
+@router.post("/campaigns/{campaign_id}/queue/refresh")
+def refresh_campaign_queue(campaign_id: int, db: Session = Depends(get_db)):
+    campaign = db.query(models.Campaign).get(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    result = prioritization.refresh_campaign_queue(db, campaign)
+    db.commit()
+    return result
+
+def _queue_scrape(source_type: str, request: schemas.ScrapeRequest, background_tasks: BackgroundTasks):
+    try:
+        scraper.apify_client_from_env()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    source = scraper.normalize_source(source_type, request.source)
+    if not source:
+        raise HTTPException(status_code=400, detail="Source is required")
+    background_tasks.add_task(scraper.run_scrape, source_type, source, request.limit or scraper.DEFAULT_LIMIT)
+    return {"source_type": source_type, "source": source, "last_status": "queued"}
+
+@router.post("/scrape/hashtag", response_model=schemas.ScrapeCursor, status_code=status.HTTP_202_ACCEPTED)
+def scrape_hashtag(request: schemas.ScrapeRequest, background_tasks: BackgroundTasks):
+    return _queue_scrape('hashtag', request, background_tasks)
+
+@router.post("/scrape/followers", response_model=schemas.ScrapeCursor, status_code=status.HTTP_202_ACCEPTED)
+def scrape_followers(request: schemas.ScrapeRequest, background_tasks: BackgroundTasks):
+    return _queue_scrape('followers', request, background_tasks)
+
+@router.post("/prospects/thumbnails/refresh", status_code=status.HTTP_202_ACCEPTED)
+def refresh_thumbnails(background_tasks: BackgroundTasks):
+    background_tasks.add_task(thumbnails.run_fetcher)
+    return {"status": "queued"}
+
+@router.get("/scrape/cursors", response_model=list[schemas.ScrapeCursor])
+def read_scrape_cursors(db: Session = Depends(get_db)):
+    return db.query(models.ScrapeCursor).order_by(models.ScrapeCursor.last_run_at.desc()).all()
+
+@router.post("/inbox/sync", status_code=status.HTTP_202_ACCEPTED)
+def sync_inbox(background_tasks: BackgroundTasks, account_id: Optional[int] = None):
+    try:
+        scraper.apify_client_from_env()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    background_tasks.add_task(inbox.run_sync, account_id)
+    return {"status": "queued", "instagram_account_id": account_id}
+
+@router.get("/inbox/cursors", response_model=list[schemas.InboxCursor])
+def read_inbox_cursors(db: Session = Depends(get_db)):
+    return db.query(models.InboxCursor).order_by(models.InboxCursor.last_synced_at.desc()).all()
+
 @router.get("/messages/", response_model=list[schemas.Message])
 def read_messages(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     messages = crud.get_messages(db, skip=skip, limit=limit)
@@ -70,28 +137,155 @@ def create_message(message: schemas.MessageCreate, db: Session = Depends(get_db)
     return crud.create_message(db=db, message=message)
 
 @router.get("/instagram-accounts/", response_model=list[schemas.InstagramAccount])
-def read_instagram_accounts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    accounts = crud.get_instagram_accounts(db, skip=skip, limit=limit)
-    return accounts
+def read_instagram_accounts(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return cached_json(request, 'instagram_accounts', ('instagram_accounts',),
+                       lambda: crud.get_instagram_accounts(db, skip=skip, limit=limit), _instagram_accounts_adapter)
 
 @router.post("/instagram-accounts/", response_model=schemas.InstagramAccount)
 def create_instagram_account(account: schemas.InstagramAccountCreate, db: Session = Depends(get_db)):
     return crud.create_instagram_account(db=db, account=account)
 
+@router.post("/instagram-accounts/health-check", status_code=status.HTTP_202_ACCEPTED)
+def check_instagram_sessions(background_tasks: BackgroundTasks):
+    try:
+        scraper.apify_client_from_env()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    background_tasks.add_task(session_health.run_checks)
+    return {"status": "queued"}
+
 @router.get("/coolify-configs/", response_model=list[schemas.CoolifyConfig])
-def read_coolify_configs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    configs = crud.get_coolify_configs(db, skip=skip, limit=limit)
-    return configs
+def read_coolify_configs(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return cached_json(request, 'coolify_configs', ('coolify_configs',),
+                       lambda: crud.get_coolify_configs(db, skip=skip, limit=limit), _coolify_configs_adapter)
 
 @router.post("/coolify-configs/", response_model=schemas.CoolifyConfig)
 def create_coolify_config(config: schemas.CoolifyConfigCreate, db: Session = Depends(get_db)):
     return crud.create_coolify_config(db=db, config=config)
 
 @router.get("/deployments/", response_model=list[schemas.Deployment])
-def read_deployments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    deployments = crud.get_deployments(db, skip=skip, limit=limit)
-    return deployments
+def read_deployments(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return cached_json(request, 'deployments', ('deployments',),
+                       lambda: crud.get_deployments(db, skip=skip, limit=limit), _deployments_adapter)
 
 @router.post("/deployments/", response_model=schemas.Deployment)
 def create_deployment(deployment: schemas.DeploymentCreate, db: Session = Depends(get_db)):
     return crud.create_deployment(db=db, deployment=deployment)
+
+@router.post("/deployments/bulk", response_model=schemas.DeploymentBatch, status_code=status.HTTP_202_ACCEPTED)
+def bulk_deploy(request: schemas.BulkDeploymentRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    if not request.deployment_ids and not request.deployments:
+        raise HTTPException(status_code=400, detail="No deployments given")
+    if request.parallelism is not None and request.parallelism < 1:
+        raise HTTPException(status_code=400, detail="parallelism must be at least 1")
+    batch = crud.create_deployment_batch(db, request)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    import coolify_service  # requests and the Coolify client load on first use, not at startup
+    background_tasks.add_task(coolify_service.run_batch, batch.id)
+    return batch
+
+@router.get("/deployments/bulk/{batch_id}", response_model=schemas.DeploymentBatch)
+def read_deployment_batch(batch_id: int, db: Session = Depends(get_db)):
+    batch = crud.get_deployment_batch(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Deployment batch not found")
+    return batch
+
+def _fan_out_summary(results, variable_set_id: Optional[int] = None):
+    counts = {status: sum(1 for result in results if result['status'] == status) for status in ('updated', 'unchanged', 'failed')}
+    return {'variable_set_id': variable_set_id, **counts, 'results': results}
+
+@router.get("/env-sets/", response_model=list[schemas.EnvironmentVariableSet])
+def read_variable_sets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return crud.get_variable_sets(db, skip=skip, limit=limit)
+
+@router.post("/env-sets/", response_model=schemas.EnvironmentVariableSet)
+def create_variable_set(variable_set: schemas.EnvironmentVariableSetCreate, db: Session = Depends(get_db)):
+    if db.query(models.EnvironmentVariableSet.id).filter(models.EnvironmentVariableSet.name == variable_set.name).first():
+        raise HTTPException(status_code=400, detail="Variable set name already exists")
+    return crud.create_variable_set(db=db, variable_set=variable_set)
+
+@router.patch("/env-sets/{variable_set_id}", response_model=schemas.EnvironmentFanOut)
+def update_variable_set(variable_set_id: int, update: schemas.EnvironmentVariableSetUpdate, db: Session = Depends(get_db)):
+    """Change a shared set and push the changed keys to every deployment using it"""
+    variable_set = crud.get_variable_set(db, variable_set_id)
+    if not variable_set:
+        raise HTTPException(status_code=404, detail="Variable set not found")
+    import coolify_service
+    results = coolify_service.EnvironmentFanOut(db).update_set(variable_set, update.values, update.unset)
+    return _fan_out_summary(results, variable_set_id)
+
+@router.post("/env-sets/{variable_set_id}/push", response_model=schemas.EnvironmentFanOut)
+def push_variable_set(variable_set_id: int, db: Session = Depends(get_db)):
+    """Retry: send every deployment using the set whatever it is still missing"""
+    if not crud.get_variable_set(db, variable_set_id):
+        raise HTTPException(status_code=404, detail="Variable set not found")
+    deployment_ids = [deployment_id for deployment_id, in db.query(models.DeploymentVariableSet.deployment_id).filter(
+        models.DeploymentVariableSet.variable_set_id == variable_set_id
+    )]
+    import coolify_service
+    return _fan_out_summary(coolify_service.EnvironmentFanOut(db).push(deployment_ids), variable_set_id)
+
+@router.put("/deployments/{deployment_id}/env-sets", response_model=schemas.EnvironmentFanOut)
+def set_deployment_variable_sets(deployment_id: int, request: schemas.DeploymentVariableSets, db: Session = Depends(get_db)):
+    if not db.query(models.Deployment).get(deployment_id):
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    if not crud.set_deployment_variable_sets(db, deployment_id, request.variable_set_ids):
+        raise HTTPException(status_code=404, detail="Variable set not found")
+    import coolify_service
+    return _fan_out_summary(coolify_service.EnvironmentFanOut(db).push([deployment_id]))
+
+@router.get("/analytics/performance", response_model=schemas.PerformanceAnalytics)
+def read_performance_analytics(
+    granularity: str = 'day',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    campaign_id: Optional[int] = None,
+    instagram_account_id: Optional[int] = None,
+    niche: Optional[str] = None,
+    template_variant: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if granularity not in analytics.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(analytics.GRANULARITIES)}")
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+
+    rollups = analytics.get_rollups(
+        db, granularity, start, end,
+        campaign_id=campaign_id,
+        instagram_account_id=instagram_account_id,
+        niche=niche,
+        template_variant=template_variant
+    )
+    summary = analytics.summarize_rollups(rollups)
+
+    daily = {}
+    for bucket in summary['buckets']:
+        day = bucket['bucket_start'].date().isoformat()
+        daily[day] = daily.get(day, 0) + bucket['sent']
+
+    return {
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'buckets': summary['buckets'],
+        'daily_messages': [{'date': day, 'messages': count} for day, count in daily.items()],
+        'niche_distribution': summary['niche_distribution']
+    }
+
+@router.get("/archive/partitions", response_model=list[schemas.MessageArchive])
+def read_archive_partitions(db: Session = Depends(get_db)):
+    return archive.get_partitions(db)
+
+@router.get("/archive/messages", response_model=list[schemas.ArchivedMessage])
+def read_archived_messages(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                           prospect_id: Optional[int] = None, campaign_id: Optional[int] = None,
+                           skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return archive.query_archived_messages(db, start=start, end=end, prospect_id=prospect_id,
+                                           campaign_id=campaign_id, skip=skip, limit=limit)
+
+@router.get("/analytics/sources", response_model=list[schemas.SourcePerformance])
+def read_source_analytics(campaign_id: Optional[int] = None, db: Session = Depends(get_db)):
+    return analytics.source_performance(db, campaign_id=campaign_id)
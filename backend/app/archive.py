@@ -0,0 +1,252 @@
+"""
+Message archival into monthly SQLite partitions.
+
+Messages sent before the cutoff (MESSAGE_ARCHIVE_AFTER_DAYS, 180 by default)
+move out of the hot `messages` table into one SQLite file per month under
+MESSAGE_ARCHIVE_DIR (messages-2025-01.sqlite, ...), listed in message_archives.
+Like the hot table (see app.message_content), a partition doesn't repeat the
+rendered text: each row points into the partition's own `templates` table and
+keeps its substitution values as JSON ({"name":"Sam","niche":"life"}), so a
+partition file stands alone. Text that isn't a rendering of a known template
+is stored once as a template of its own, with no values.
+
+Rollups are brought up to date before anything moves, and days before the
+archive horizon (the latest cutoff) are frozen: analytics leaves them alone,
+so a late reply or conversion can't rebuild a day from rows that are no longer
+in the hot table. Messages whose follow-up is still pending or sending stay hot
+until it goes out. Each chunk is committed to its partitions before it is
+deleted from the hot table, so an interrupted run is simply run again.
+
+Archived messages are read with query_archived_messages (GET /api/archive/messages).
+
+    python -m app.archive                       archive messages older than 180 days
+    python -m app.archive --older-than-days 90 --vacuum
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import analytics, message_content, models
+
+ARCHIVE_DIR = os.getenv('MESSAGE_ARCHIVE_DIR', './message_archive')
+ARCHIVE_AFTER_DAYS = int(os.getenv('MESSAGE_ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_CHUNK_SIZE = 10000
+OPEN_FOLLOW_UP_STATUSES = ('pending', 'sending')
+
+partition_metadata = MetaData()
+
+archived_templates = Table(
+    'templates', partition_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('variant', String(50)),
+    Column('body', Text, nullable=False, unique=True)
+)
+
+archived_messages = Table(
+    'messages', partition_metadata,
+    Column('id', Integer, primary_key=True),  # messages.id from the hot table
+    Column('prospect_id', Integer, nullable=False, index=True),
+    Column('campaign_id', Integer, nullable=False, index=True),
+    Column('instagram_account_id', Integer),
+    Column('template_id', Integer, nullable=False),
+    Column('template_values', Text),  # JSON object; NULL when the template is the verbatim text
+    Column('template_variant', String(50)),
+    Column('message_type', String(50)),
+    Column('sent_at', DateTime, nullable=False, index=True),
+    Column('response_at', DateTime),
+    Column('response_content', Text),
+    Column('created_at', DateTime)
+)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def partition_path(directory: str, month: str) -> str:
+    return os.path.join(directory, f'messages-{month}.sqlite')
+
+def _partition_engine(path: str):
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            engine = create_engine(f'sqlite:///{path}', connect_args={"check_same_thread": False})
+            partition_metadata.create_all(bind=engine)
+            _engines[path] = engine
+        return engine
+
+def compact_content(db: Session, row) -> Tuple[str, Optional[str], Optional[str]]:
+    """(template body, variant, JSON values or None) for a hot messages row"""
+    if row['template_id'] is not None:
+        return message_content.template_body(db, row['template_id']), row['template_variant'], row['template_values']
+    match = message_content.match_template(row['content'], row['template_variant'])
+    if match:
+        body, variant, values = match
+        return body, variant, json.dumps(values, separators=(',', ':'))
+    return row['content'], None, None
+
+def _write_partition(db: Session, path: str, rows: List[Dict]) -> int:
+    """Insert rows into a partition file, skipping ids already there; returns its message count"""
+    with _partition_engine(path).begin() as conn:
+        template_ids = {body: template_id for template_id, body in conn.execute(
+            select(archived_templates.c.id, archived_templates.c.body)
+        )}
+        archived = []
+        for row in rows:
+            body, variant, values = compact_content(db, row)
+            if body not in template_ids:
+                template_ids[body] = conn.execute(
+                    archived_templates.insert().values(variant=variant, body=body)
+                ).inserted_primary_key[0]
+            archived.append({
+                'id': row['id'],
+                'prospect_id': row['prospect_id'],
+                'campaign_id': row['campaign_id'],
+                'instagram_account_id': row['instagram_account_id'],
+                'template_id': template_ids[body],
+                'template_values': values,
+                'template_variant': row['template_variant'],
+                'message_type': row['message_type'],
+                'sent_at': row['sent_at'],
+                'response_at': row['response_at'],
+                'response_content': row['response_content'],
+                'created_at': row['created_at']
+            })
+        conn.execute(sqlite_insert(archived_messages).on_conflict_do_nothing(index_elements=['id']), archived)
+        return conn.execute(select(func.count()).select_from(archived_messages)).scalar()
+
+def _record_partition(db: Session, month: str, path: str, rows: List[Dict], count: int, cutoff: datetime):
+    partition = db.query(models.MessageArchive).get(month)
+    if not partition:
+        partition = models.MessageArchive(month=month, path=path)
+        db.add(partition)
+    first_sent, last_sent = min(row['sent_at'] for row in rows), max(row['sent_at'] for row in rows)
+    partition.messages = count
+    partition.first_sent_at = min(first_sent, partition.first_sent_at or first_sent)
+    partition.last_sent_at = max(last_sent, partition.last_sent_at or last_sent)
+    partition.archived_before = max(cutoff, partition.archived_before or cutoff)
+
+def archive_messages(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS, now: datetime = None,
+                     directory: str = ARCHIVE_DIR, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> Dict:
+    """Move messages sent before the cutoff day into their monthly partitions"""
+    analytics.refresh_rollups(db)
+    cutoff = analytics.truncate((now or datetime.utcnow()) - timedelta(days=older_than_days), 'day')
+    os.makedirs(directory, exist_ok=True)
+
+    messages = models.Message.__table__
+    open_follow_ups = select(models.FollowUp.message_id).where(models.FollowUp.status.in_(OPEN_FOLLOW_UP_STATUSES))
+    archived, months, last_id = 0, set(), 0
+    while True:
+        rows = db.execute(select(messages).where(
+            messages.c.sent_at < cutoff,
+            messages.c.id > last_id,
+            messages.c.id.notin_(open_follow_ups)
+        ).order_by(messages.c.id).limit(chunk_size)).mappings().all()
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['sent_at'].strftime('%Y-%m'), []).append(row)
+        for month, month_rows in by_month.items():
+            path = partition_path(directory, month)
+            count = _write_partition(db, path, month_rows)
+            _record_partition(db, month, path, month_rows, count, cutoff)
+            months.add(month)
+
+        # Same predicate as the select, bounded by this chunk's ids
+        chunk = select(messages.c.id).where(
+            messages.c.sent_at < cutoff,
+            messages.c.id > last_id,
+            messages.c.id <= rows[-1]['id'],
+            messages.c.id.notin_(open_follow_ups)
+        )
+        db.query(models.FollowUp).filter(or_(
+            models.FollowUp.message_id.in_(chunk), models.FollowUp.follow_up_message_id.in_(chunk)
+        )).delete(synchronize_session=False)
+        db.query(models.Message).filter(models.Message.id.in_(chunk)).delete(synchronize_session=False)
+        db.commit()
+
+        archived += len(rows)
+        last_id = rows[-1]['id']
+
+    return {'archived': archived, 'months': sorted(months), 'cutoff': cutoff}
+
+def get_partitions(db: Session) -> List[models.MessageArchive]:
+    return db.query(models.MessageArchive).order_by(models.MessageArchive.month).all()
+
+def _render(body: str, values: Optional[str]) -> str:
+    return body.format(**json.loads(values)) if values else body
+
+def query_archived_messages(db: Session, start: datetime = None, end: datetime = None, prospect_id: int = None,
+                            campaign_id: int = None, skip: int = 0, limit: int = 100) -> List[Dict]:
+    """Archived messages sent in [start, end), oldest first, with content rendered from their template"""
+    partitions = db.query(models.MessageArchive).order_by(models.MessageArchive.month)
+    if start:
+        partitions = partitions.filter(models.MessageArchive.last_sent_at >= start)
+    if end:
+        partitions = partitions.filter(models.MessageArchive.first_sent_at < end)
+
+    wanted = skip + limit
+    results = []
+    for partition in partitions:
+        if len(results) >= wanted:
+            break
+        if not os.path.exists(partition.path):
+            print(f"Archive partition {partition.month} is missing: {partition.path}")
+            continue
+        query = select(archived_messages, archived_templates.c.body).join(
+            archived_templates, archived_templates.c.id == archived_messages.c.template_id
+        )
+        if start:
+            query = query.where(archived_messages.c.sent_at >= start)
+        if end:
+            query = query.where(archived_messages.c.sent_at < end)
+        if prospect_id is not None:
+            query = query.where(archived_messages.c.prospect_id == prospect_id)
+        if campaign_id is not None:
+            query = query.where(archived_messages.c.campaign_id == campaign_id)
+        query = query.order_by(archived_messages.c.sent_at, archived_messages.c.id).limit(wanted - len(results))
+        with _partition_engine(partition.path).connect() as conn:
+            results.extend(conn.execute(query).mappings().all())
+
+    return [{
+        'id': row['id'],
+        'prospect_id': row['prospect_id'],
+        'campaign_id': row['campaign_id'],
+        'instagram_account_id': row['instagram_account_id'],
+        'content': _render(row['body'], row['template_values']),
+        'template_variant': row['template_variant'],
+        'message_type': row['message_type'],
+        'sent_at': row['sent_at'],
+        'response_at': row['response_at'],
+        'response_content': row['response_content']
+    } for row in results[skip:wanted]]
+
+def vacuum(db: Session):
+    """Give the space freed in the hot database back to the filesystem (SQLite only)"""
+    with db.get_bind().connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM')
+
+if __name__ == '__main__':
+    import argparse
+
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Move old messages into monthly archive partitions')
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--directory', default=ARCHIVE_DIR)
+    parser.add_argument('--vacuum', action='store_true', help='compact the hot database afterwards')
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(archive_messages(db, args.older_than_days, directory=args.directory))
+        if args.vacuum:
+            vacuum(db)
+    finally:
+        db.close()
@@ -0,0 +1,188 @@
+"""
+JWT authentication for the API.
+
+Every /api route except login depends on get_current_user. Verifying a bearer
+token on each request is made cheap by two in-process caches:
+
+    - an LRU of tokens whose signature has been verified, keyed on the token and
+      holding its expiry, so a token is decoded once and rejected as soon as it
+      expires
+    - a TTL cache of the users those tokens belong to, so most requests don't
+      touch the users table; a deactivated user is locked out within USER_CACHE_TTL
+
+bcrypt hashing and verification take ~200 ms of CPU each, so they run on a
+small bounded thread pool instead of the event loop: a burst of logins queues
+for the pool while other requests keep being served.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.database import get_db
+
+SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key')  # Set in production
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024))
+USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', 60))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+
+router = APIRouter()
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
+CREDENTIALS_EXCEPTION = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+class TokenCache:
+    """LRU of verified tokens -> (username, expiry timestamp)"""
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE):
+        self.size = size
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str, now: float = None) -> Optional[str]:
+        now = now or time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry:
+                return None
+            if entry[1] <= now:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[0]
+
+    def put(self, token: str, username: str, expires_at: float):
+        with self._lock:
+            self._entries[token] = (username, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class UserCache:
+    """username -> schemas.User, each entry kept for `ttl` seconds"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, username: str, now: float = None) -> Optional[schemas.User]:
+        now = now or time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry and entry[1] > now:
+                return entry[0]
+            self._entries.pop(username, None)
+            return None
+
+    def put(self, user: schemas.User, now: float = None):
+        with self._lock:
+            self._entries[user.username] = (user, (now or time.monotonic()) + self.ttl)
+
+    def forget(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache()
+user_cache = UserCache()
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    from jose import jwt  # loaded with the first token rather than at startup
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+async def verify_password(plain_password: str, password_hash: Optional[str]) -> bool:
+    if not password_hash:
+        return False
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.verify, plain_password, password_hash)
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.hash, password)
+
+def token_username(token: str) -> str:
+    """Username a bearer token was issued to; raises CREDENTIALS_EXCEPTION if it is invalid or expired"""
+    username = token_cache.get(token)
+    if username:
+        return username
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise CREDENTIALS_EXCEPTION
+    username = payload.get("sub")
+    if not username or not payload.get("exp"):
+        raise CREDENTIALS_EXCEPTION
+    token_cache.put(token, username, float(payload["exp"]))
+    return username
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> schemas.User:
+    username = token_username(token)
+    user = user_cache.get(username)
+    if not user:
+        db_user = crud.get_user_by_username(db, username=username)
+        if not db_user:
+            raise CREDENTIALS_EXCEPTION
+        user = schemas.User.model_validate(db_user)
+        user_cache.put(user)
+    if not user.is_active:
+        raise CREDENTIALS_EXCEPTION
+    return user
+
+@router.post("/auth/login", response_model=schemas.Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = crud.get_user_by_username(db, username=form_data.username)
+    if not user or not user.is_active or not await verify_password(form_data.password, user.password_hash):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_cache.put(schemas.User.model_validate(user))
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/auth/me", response_model=schemas.User)
+def read_current_user(current_user: schemas.User = Depends(get_current_user)):
+    return current_user
+
+@router.post("/auth/users", response_model=schemas.User)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db),
+                      current_user: schemas.User = Depends(get_current_user)):
+    if crud.get_user_by_username(db, username=user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    return crud.create_user(db, user, await hash_password(user.password))
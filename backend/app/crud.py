@@ -1,5 +1,8 @@
-from sqlalchemy.orm import Session
-from app import models, schemas
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy.orm import Session, selectinload
+from app import message_content, models, schemas, search
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -7,36 +10,117 @@ def get_user(db: Session, user_id: int):
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
-    db_user = models.User(username=user.username, email=user.email, password_hash=hashed_password)
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str):
+    """`password_hash` comes from auth.hash_password, which keeps bcrypt off the request thread"""
+    db_user = models.User(username=user.username, email=user.email, password_hash=password_hash)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def get_prospects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Prospect).offset(skip).limit(limit).all()
+def get_prospects(db: Session, skip: int = 0, limit: int = 100, status: Optional[str] = None, niche: Optional[str] = None,
+                  q: Optional[str] = None):
+    query = db.query(models.Prospect)
+    if status:
+        query = query.filter(models.Prospect.status == models.ProspectStatus(status))
+    if niche:
+        query = query.filter(models.Prospect.niche == niche)
+    if q:
+        query = search.apply_bio_search(query, q)
+    return search.run_search(query.offset(skip).limit(limit))
+
+def _to_model_enum(data: dict, field: str, enum_class):
+    """Pydantic gives us the schema's str enum; SQLAlchemy's Enum column needs the model enum"""
+    if data.get(field) is not None:
+        data[field] = enum_class(getattr(data[field], 'value', data[field]))
+    return data
 
 def create_prospect(db: Session, prospect: schemas.ProspectCreate):
-    db_prospect = models.Prospect(**prospect.dict())
+    db_prospect = models.Prospect(**_to_model_enum(prospect.dict(), 'status', models.ProspectStatus))
     db.add(db_prospect)
+    db.flush()
+    from app import dedup  # numpy; loaded on the first write rather than at startup
+    dedup.index_prospects(db, [db_prospect])
     db.commit()
     db.refresh(db_prospect)
     return db_prospect
 
-def get_campaigns(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Campaign).offset(skip).limit(limit).all()
+SCRAPED_STAT_FIELDS = ('full_name', 'followers', 'following', 'posts_count', 'profile_pic_url')
+
+def _insert_for(db: Session):
+    if db.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def upsert_prospects(db: Session, rows: List[dict], refresh: Iterable[str] = SCRAPED_STAT_FIELDS) -> List[models.Prospect]:
+    """
+    Bulk insert scraped profiles keyed on username; profiles that already exist get
+    the `refresh` fields (their follower stats) updated and keep everything else. New
+    prospects are indexed for near-duplicates. Returns the newly created prospects;
+    does not commit.
+    """
+    if not rows:
+        return []
+    now = datetime.utcnow()
+    usernames = [row['username'] for row in rows]
+    existing = set()
+    for offset in range(0, len(usernames), 900):
+        existing.update(username for username, in db.query(models.Prospect.username).filter(
+            models.Prospect.username.in_(usernames[offset:offset + 900])
+        ))
+
+    insert = _insert_for(db)(models.Prospect.__table__)
+    db.execute(insert.on_conflict_do_update(
+        index_elements=['username'],
+        set_={**{field: getattr(insert.excluded, field) for field in refresh}, 'updated_at': now}
+    ), [{
+        'status': models.ProspectStatus.DISCOVERED,
+        'dm_sent': False,
+        'response_received': False,
+        'coach_score': 0.0,
+        'value_score': 0.0,
+        'created_at': now,
+        'updated_at': now,
+        **row
+    } for row in rows])
+
+    new_usernames = [username for username in usernames if username not in existing]
+    created = []
+    for offset in range(0, len(new_usernames), 900):
+        created.extend(db.query(models.Prospect).filter(
+            models.Prospect.username.in_(new_usernames[offset:offset + 900])
+        ))
+    from app import dedup
+    dedup.index_prospects(db, created)
+    return created
+
+def get_campaigns(db: Session, skip: int = 0, limit: int = 100, hashtag: Optional[str] = None,
+                  target_account: Optional[str] = None):
+    query = db.query(models.Campaign).options(
+        selectinload(models.Campaign.hashtag_links),
+        selectinload(models.Campaign.target_account_links)
+    )
+    if hashtag:
+        query = query.filter(models.Campaign.hashtag_links.any(
+            models.CampaignHashtag.hashtag == models.normalize_hashtag(hashtag)
+        ))
+    if target_account:
+        query = query.filter(models.Campaign.target_account_links.any(
+            models.CampaignTargetAccount.username == models.normalize_username(target_account)
+        ))
+    return query.offset(skip).limit(limit).all()
 
 def create_campaign(db: Session, campaign: schemas.CampaignCreate):
-    db_campaign = models.Campaign(**campaign.dict())
+    data = _to_model_enum(campaign.dict(), 'status', models.CampaignStatus)
+    if data.get('priority_weights') is not None:
+        data['priority_weights'] = json.dumps(data['priority_weights'])
+    # hashtags and target_accounts lists go straight to the join tables via the model setters
+    db_campaign = models.Campaign(**data)
     db.add(db_campaign)
     db.commit()
     db.refresh(db_campaign)
@@ -46,7 +130,10 @@ def get_messages(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Message).offset(skip).limit(limit).all()
 
 def create_message(db: Session, message: schemas.MessageCreate):
-    db_message = models.Message(**message.dict())
+    data = message.dict()
+    content = data.pop('content')
+    data.update(message_content.reference(db, content))
+    db_message = models.Message(**data)
     db.add(db_message)
     db.commit()
     db.refresh(db_message)
@@ -81,3 +168,55 @@ def create_deployment(db: Session, deployment: schemas.DeploymentCreate):
     db.commit()
     db.refresh(db_deployment)
     return db_deployment
+
+def create_deployment_batch(db: Session, request: schemas.BulkDeploymentRequest):
+    """Queue existing deployments and new ones as one batch; None if any deployment_ids don't exist"""
+    deployment_ids = list(dict.fromkeys(request.deployment_ids))
+    if db.query(models.Deployment.id).filter(models.Deployment.id.in_(deployment_ids)).count() != len(deployment_ids):
+        return None
+    new_deployments = [models.Deployment(**deployment.dict()) for deployment in request.deployments]
+    db.add_all(new_deployments)
+    db.flush()
+    deployment_ids += [deployment.id for deployment in new_deployments]
+
+    batch = models.DeploymentBatch(parallelism=request.parallelism, total=len(deployment_ids), succeeded=0, failed=0)
+    db.add(batch)
+    db.flush()
+    db.add_all([models.DeploymentBatchItem(batch_id=batch.id, deployment_id=deployment_id, step='create', attempts=0)
+                for deployment_id in deployment_ids])
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+def get_deployment_batch(db: Session, batch_id: int):
+    return db.query(models.DeploymentBatch).get(batch_id)
+
+def get_variable_sets(db: Session, skip: int = 0, limit: int = 100):
+    return db.query(models.EnvironmentVariableSet).order_by(models.EnvironmentVariableSet.name).offset(skip).limit(limit).all()
+
+def get_variable_set(db: Session, variable_set_id: int):
+    return db.query(models.EnvironmentVariableSet).get(variable_set_id)
+
+def create_variable_set(db: Session, variable_set: schemas.EnvironmentVariableSetCreate):
+    db_variable_set = models.EnvironmentVariableSet(name=variable_set.name,
+                                                    variables=json.dumps(variable_set.variables, sort_keys=True))
+    db.add(db_variable_set)
+    db.commit()
+    db.refresh(db_variable_set)
+    return db_variable_set
+
+def set_deployment_variable_sets(db: Session, deployment_id: int, variable_set_ids: List[int]) -> bool:
+    """Link a deployment to exactly these sets, in this order; False if any set doesn't exist"""
+    variable_set_ids = list(dict.fromkeys(variable_set_ids))
+    found = db.query(models.EnvironmentVariableSet.id).filter(
+        models.EnvironmentVariableSet.id.in_(variable_set_ids)
+    ).count() if variable_set_ids else 0
+    if found != len(variable_set_ids):
+        return False
+    db.query(models.DeploymentVariableSet).filter(
+        models.DeploymentVariableSet.deployment_id == deployment_id
+    ).delete(synchronize_session=False)
+    db.add_all([models.DeploymentVariableSet(deployment_id=deployment_id, variable_set_id=variable_set_id, position=position)
+                for position, variable_set_id in enumerate(variable_set_ids)])
+    db.commit()
+    return True
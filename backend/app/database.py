@@ -1,13 +1,35 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./coach_outreach.db")
+# Every process (API, each worker) has its own pool; keep
+# processes * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server's max_connections
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def database_url(url: str) -> str:
+    # Coolify and most hosts hand out postgres://, which SQLAlchemy no longer accepts
+    return "postgresql://" + url[len("postgres://"):] if url.startswith("postgres://") else url
+
+def engine_options(url: str) -> dict:
+    """create_engine keyword arguments for the database `url` points at"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True
+    }
+
+SQLALCHEMY_DATABASE_URL = database_url(os.getenv("DATABASE_URL", "sqlite:///./coach_outreach.db"))
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,209 @@
+"""
+Near-duplicate bio detection for clone and spam accounts.
+
+Each bio is normalized, cut into character shingles and reduced to a MinHash
+signature of NUM_PERM values. The signature is split into BANDS bands of ROWS
+values; each band hashes to a bucket stored in bio_lsh_buckets, so finding
+candidates for a new profile is one query of BANDS primary-key lookups
+regardless of how many bios are indexed. Candidates are confirmed by comparing
+signatures, and a match at DUPLICATE_THRESHOLD or above points the new
+prospect's duplicate_of_id at the cluster representative (the first-indexed
+member). Duplicates are kept out of the DM queue, so one representative per
+cluster gets scored and messaged.
+
+Only representatives are bucketed, so a cluster is matched through its one
+signature and a new clone of a large spam farm is compared once, not against
+every clone so far. Duplicates still get a signature row, which marks them as
+indexed.
+
+Signatures are taken when a prospect is ingested; a later bio edit doesn't move
+it to another cluster.
+
+    python -m app.dedup            index prospects that have no signature yet
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MIN_BIO_LENGTH = 20  # Shorter bios ("life coach") are too generic to call clones
+DUPLICATE_THRESHOLD = 0.7
+CHUNK_SIZE = 500
+
+_PERM_RNG = np.random.RandomState(2024)
+_PERM_A = (_PERM_RNG.randint(0, 1 << 62, size=NUM_PERM).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+_PERM_B = _PERM_RNG.randint(0, 1 << 62, size=NUM_PERM).astype(np.uint64)
+_BAND_MULTIPLIERS = (_PERM_RNG.randint(0, 1 << 62, size=(BANDS, ROWS)).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+_BAND_SALTS = _PERM_RNG.randint(0, 1 << 62, size=BANDS).astype(np.uint64)
+
+_URL = re.compile(r'(https?://|www\.)\S+|\S+\.[a-z]{2,}(/\S*)?')
+_HANDLE = re.compile(r'@\w+')
+_COMBINING = re.compile('[\u0300-\u036f]')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+def normalize_bio(bio: Optional[str]) -> str:
+    """Lowercase, strip accents, links, @handles and punctuation/emoji, collapse whitespace"""
+    text = bio or ''
+    if not text.isascii():
+        text = _COMBINING.sub('', unicodedata.normalize('NFKD', text))
+    text = text.lower()
+    text = _HANDLE.sub(' ', _URL.sub(' ', text))
+    return _NON_ALNUM.sub(' ', text).strip()
+
+def minhash_many(bios: List[Optional[str]]) -> List[Optional[np.ndarray]]:
+    """MinHash signatures (uint32[NUM_PERM]) for a batch of bios; None where the bio is too short"""
+    signatures: List[Optional[np.ndarray]] = [None] * len(bios)
+    texts = [normalize_bio(bio) for bio in bios]
+    owners = [i for i, text in enumerate(texts) if len(text) >= MIN_BIO_LENGTH]
+    if not owners:
+        return signatures
+
+    # Hash every SHINGLE_SIZE-byte window of all bios at once, then keep the windows inside a single bio
+    encoded = [texts[i].encode('utf-8') for i in owners]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+    windows = len(data) - SHINGLE_SIZE + 1
+    hashes = np.zeros(windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(257) + data[offset:offset + windows]
+
+    counts = lengths - SHINGLE_SIZE + 1
+    firsts = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) + np.repeat(np.cumsum(lengths) - lengths - firsts, counts)
+    shingles = hashes[positions]
+
+    # Multiply-shift hashing stands in for NUM_PERM random permutations
+    with np.errstate(over='ignore'):
+        permuted = (np.outer(_PERM_A, shingles) + _PERM_B[:, None]) >> np.uint64(32)
+    minimums = np.minimum.reduceat(permuted, firsts, axis=1).astype(np.uint32).T
+
+    for owner, signature in zip(owners, minimums):
+        signatures[owner] = signature
+    return signatures
+
+def minhash(bio: Optional[str]) -> Optional[np.ndarray]:
+    return minhash_many([bio])[0]
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket key per band; the band number is mixed in so keys never clash across bands"""
+    rows = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    with np.errstate(over='ignore'):
+        keys = (rows * _BAND_MULTIPLIERS).sum(axis=1) ^ _BAND_SALTS
+    return [int(key) for key in keys.view(np.int64)]
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two bios' shingle sets"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+def _unpack(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.uint32)
+
+_buckets = models.BioLshBucket.__table__
+_signatures = models.BioSignature.__table__
+_CANDIDATES = select(_buckets.c.bucket, _buckets.c.prospect_id, _signatures.c.signature).join(
+    _signatures, _signatures.c.prospect_id == _buckets.c.prospect_id
+).where(_buckets.c.bucket.in_(bindparam('buckets', expanding=True)))
+
+def _existing_candidates(db: Session, buckets: Iterable[int]) -> Tuple[Dict[int, List[int]], Dict[int, np.ndarray]]:
+    """(bucket -> representative ids, representative id -> signature) for the given bucket keys"""
+    buckets = list(buckets)
+    found: Dict[int, List[int]] = {}
+    signatures: Dict[int, np.ndarray] = {}
+    for offset in range(0, len(buckets), 900):
+        for bucket, prospect_id, blob in db.execute(_CANDIDATES, {'buckets': buckets[offset:offset + 900]}):
+            found.setdefault(bucket, []).append(prospect_id)
+            if prospect_id not in signatures:
+                signatures[prospect_id] = _unpack(blob)
+    return found, signatures
+
+def index_prospects(db: Session, prospects: List[models.Prospect]) -> Dict:
+    """
+    Sign and index flushed prospects, setting duplicate_of_id on near-duplicates of
+    anything already indexed or earlier in the same batch. Does not commit.
+    """
+    prospects = sorted(prospects, key=lambda p: p.id)
+    signatures = minhash_many([p.bio for p in prospects])
+    buckets = {p.id: band_buckets(sig) for p, sig in zip(prospects, signatures) if sig is not None}
+
+    existing, representatives = _existing_candidates(db, {bucket for keys in buckets.values() for bucket in keys})
+
+    signature_rows, bucket_rows = [], []
+    duplicates = 0
+    for prospect, signature in zip(prospects, signatures):
+        if signature is None:
+            continue
+        keys = buckets[prospect.id]
+        candidates = {candidate for key in keys for candidate in existing.get(key, ())}
+        candidates.discard(prospect.id)
+
+        best, representative = 0.0, None
+        for candidate in candidates:
+            score = similarity(signature, representatives[candidate])
+            if score > best:
+                best, representative = score, candidate
+
+        signature_rows.append({'prospect_id': prospect.id, 'signature': signature.tobytes()})
+        if best >= DUPLICATE_THRESHOLD:
+            prospect.duplicate_of_id = representative
+            duplicates += 1
+            continue
+
+        # A new representative; later prospects in this batch can match it
+        representatives[prospect.id] = signature
+        for key in keys:
+            existing.setdefault(key, []).append(prospect.id)
+        bucket_rows.extend({'bucket': key, 'prospect_id': prospect.id} for key in set(keys))
+
+    if signature_rows:
+        db.execute(_signatures.insert(), signature_rows)
+    if bucket_rows:
+        db.execute(_buckets.insert(), bucket_rows)
+    db.flush()
+    return {'indexed': len(signature_rows), 'duplicates': duplicates}
+
+def index_unsigned(db: Session, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """Index every prospect that has no signature yet, oldest first, committing per chunk"""
+    totals = {'indexed': 0, 'duplicates': 0}
+    last_id = 0
+    while True:
+        chunk = db.query(models.Prospect).outerjoin(
+            models.BioSignature, models.BioSignature.prospect_id == models.Prospect.id
+        ).filter(
+            models.BioSignature.prospect_id.is_(None),
+            models.Prospect.id > last_id
+        ).order_by(models.Prospect.id).limit(chunk_size).all()
+        if not chunk:
+            return totals
+        result = index_prospects(db, chunk)
+        db.commit()
+        totals['indexed'] += result['indexed']
+        totals['duplicates'] += result['duplicates']
+        last_id = chunk[-1].id
+
+def cluster_members(db: Session, prospect_id: int) -> List[models.Prospect]:
+    """Every prospect in the same near-duplicate cluster, representative first"""
+    prospect = db.query(models.Prospect).get(prospect_id)
+    if not prospect:
+        return []
+    representative_id = prospect.duplicate_of_id or prospect.id
+    return db.query(models.Prospect).filter(
+        (models.Prospect.id == representative_id) | (models.Prospect.duplicate_of_id == representative_id)
+    ).order_by(models.Prospect.id).all()
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(index_unsigned(db))
+    finally:
+        db.close()
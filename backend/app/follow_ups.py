@@ -0,0 +1,147 @@
+"""
+Automated follow-ups for DMs that got no reply.
+
+Every initial DM gets one row in follow_ups, keyed by the message, holding the
+time it falls due (sent_at + the campaign's follow_up_delay_hours). The table
+works as a persistent timer wheel: dispatchers read the due slots for their
+campaign and account straight off the (campaign, account, status, due_at)
+index, so finding due work costs the same at a thousand messages or ten
+million, and keying on the message means a restart can never schedule a second
+follow-up for the same DM.
+
+Follow-ups go out from the account that sent the original DM, in the same
+batches and under the same daily limits as first messages. A follow-up is
+claimed (status 'sending') and committed with its send batch before the DM
+goes out, so a crash mid-send leaves it claimed instead of sending it twice
+until app.send_journal settles the batch. Prospects that replied in the
+meantime are cancelled when their follow-up comes due.
+
+    python -m app.follow_ups       schedule follow-ups for DMs sent before this existed
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(hours=6)
+CHUNK_SIZE = 5000
+ANSWERED_STATUSES = (models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED, models.ProspectStatus.REJECTED)
+
+Claimed = Tuple[models.FollowUp, models.Prospect]
+
+def _delay(campaign: models.Campaign) -> Optional[timedelta]:
+    return timedelta(hours=campaign.follow_up_delay_hours) if campaign.follow_up_delay_hours else None
+
+def _insert_ignoring_scheduled(db: Session, rows: List[Dict]) -> None:
+    if rows:
+        db.execute(crud._insert_for(db)(models.FollowUp.__table__).on_conflict_do_nothing(index_elements=['message_id']), rows)
+
+def schedule_follow_ups(db: Session, campaign: models.Campaign, messages: List[models.Message]) -> int:
+    """Schedule follow-ups for flushed initial messages; already-scheduled messages are skipped. Does not commit"""
+    delay = _delay(campaign)
+    if not delay:
+        return 0
+    rows = [{
+        'message_id': message.id,
+        'campaign_id': message.campaign_id,
+        'prospect_id': message.prospect_id,
+        'instagram_account_id': message.instagram_account_id,
+        'due_at': (message.sent_at or datetime.utcnow()) + delay,
+        'status': 'pending',
+        'attempts': 0,
+        'updated_at': datetime.utcnow()
+    } for message in messages if message.message_type in (None, 'initial')]
+    _insert_ignoring_scheduled(db, rows)
+    return len(rows)
+
+def _answered(prospect: models.Prospect, response_at) -> bool:
+    return bool(response_at or prospect.response_received or prospect.status in ANSWERED_STATUSES)
+
+def claim_due_follow_ups(db: Session, campaign: models.Campaign, account_id: Optional[int], limit: int,
+                         now: datetime = None) -> List[Claimed]:
+    """
+    Up to `limit` due follow-ups for this campaign and account, oldest first, marked
+    'sending'. Ones whose prospect has answered are cancelled on the way, and on
+    Postgres rows another dispatcher is claiming are skipped rather than waited on.
+    The caller commits before sending.
+    """
+    now = now or datetime.utcnow()
+    claimed: List[Claimed] = []
+    while len(claimed) < limit:
+        rows = db.query(models.FollowUp, models.Prospect, models.Message.response_at).join(
+            models.Prospect, models.Prospect.id == models.FollowUp.prospect_id
+        ).join(
+            models.Message, models.Message.id == models.FollowUp.message_id
+        ).filter(
+            models.FollowUp.campaign_id == campaign.id,
+            models.FollowUp.instagram_account_id == account_id,
+            models.FollowUp.status == 'pending',
+            models.FollowUp.due_at <= now
+        ).order_by(models.FollowUp.due_at).limit(limit - len(claimed)).with_for_update(
+            of=models.FollowUp, skip_locked=True  # Postgres only; SQLite serializes writers anyway
+        ).all()
+        if not rows:
+            break
+        for follow_up, prospect, response_at in rows:
+            if _answered(prospect, response_at):
+                follow_up.status = 'cancelled'
+            else:
+                follow_up.status = 'sending'
+                follow_up.attempts = (follow_up.attempts or 0) + 1
+                claimed.append((follow_up, prospect))
+        db.flush()
+    return claimed
+
+def finish_follow_ups(db: Session, claimed: List[Claimed], sent_message_ids: Dict[int, int],
+                      now: datetime = None) -> None:
+    """
+    Mark claimed follow-ups sent (sent_message_ids maps original message id to the
+    follow-up message id); failed ones are retried after RETRY_DELAY until
+    MAX_ATTEMPTS, then dropped. Does not commit.
+    """
+    now = now or datetime.utcnow()
+    for follow_up, _ in claimed:
+        if follow_up.message_id in sent_message_ids:
+            follow_up.status = 'sent'
+            follow_up.follow_up_message_id = sent_message_ids[follow_up.message_id]
+        elif follow_up.attempts >= MAX_ATTEMPTS:
+            follow_up.status = 'cancelled'
+        else:
+            follow_up.status = 'pending'
+            follow_up.due_at = now + RETRY_DELAY
+    db.flush()
+
+def backfill(db: Session, chunk_size: int = CHUNK_SIZE) -> Dict[int, int]:
+    """Schedule follow-ups for unanswered initial messages that have none yet, committing per chunk"""
+    scheduled = {}
+    for campaign in db.query(models.Campaign).filter(models.Campaign.follow_up_delay_hours > 0).all():
+        count = 0
+        last_id = 0
+        while True:
+            chunk = db.query(models.Message).outerjoin(
+                models.FollowUp, models.FollowUp.message_id == models.Message.id
+            ).filter(
+                models.Message.campaign_id == campaign.id,
+                models.Message.id > last_id,
+                models.Message.response_at.is_(None),
+                models.FollowUp.message_id.is_(None)
+            ).order_by(models.Message.id).limit(chunk_size).all()
+            if not chunk:
+                break
+            count += schedule_follow_ups(db, campaign, chunk)
+            db.commit()
+            last_id = chunk[-1].id
+        scheduled[campaign.id] = count
+    return scheduled
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(backfill(db))
+    finally:
+        db.close()
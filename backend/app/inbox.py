@@ -0,0 +1,252 @@
+"""
+Inbox sync: record replies to our DMs.
+
+For each Instagram account an Apify inbox actor lists the DM threads with
+activity newer than the account's InboxCursor. Each thread item looks like
+
+    {'threadId': ..., 'username': 'coach_x', 'lastActivityAt': ISO timestamp,
+     'messages': [{'isOutgoing': False, 'text': ..., 'timestamp': ISO timestamp}, ...]}
+
+Thread usernames are matched against an index of open messages (sent by this
+account, no response_at yet) built with one query per page of threads. Each
+open message is answered by the first inbound message in its thread sent after
+it, so an older inbound message in the same thread can't hide the reply. A
+prospect's response_received_at keeps its first reply. All updates for a sync - messages, prospects, campaign
+counters, pending follow-ups and the cursor - are applied as executemany
+statements and committed together, so a failed sync leaves nothing half-done
+and the next run picks up from the same cursor.
+
+    python -m app.inbox            sync every active account
+    python -m app.inbox 3          sync one account
+"""
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.metrics import track_outbound
+from app.scraper import apify_client_from_env
+
+PAGE_SIZE = 500
+DEFAULT_LIMIT = 1000
+CLOSED_STATUSES = (models.ProspectStatus.CONVERTED, models.ProspectStatus.REJECTED)
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """ISO timestamp from the actor as a naive UTC datetime, matching the stored columns"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def first_reply(thread: Dict, after: Optional[datetime]) -> Optional[Dict]:
+    """Earliest inbound message in the thread newer than `after`, with its parsed timestamp"""
+    replies = []
+    for message in thread.get('messages') or []:
+        if message.get('isOutgoing'):
+            continue
+        timestamp = parse_timestamp(message.get('timestamp'))
+        if timestamp and (not after or timestamp > after):
+            replies.append((timestamp, message.get('text') or ''))
+    if not replies:
+        return None
+    timestamp, text = min(replies, key=lambda reply: reply[0])
+    return {'timestamp': timestamp, 'text': text}
+
+def open_message_index(db: Session, account_id: int, usernames: List[str]) -> Dict[str, List]:
+    """username -> unanswered messages this account sent them, oldest first"""
+    index: Dict[str, List] = {}
+    for offset in range(0, len(usernames), 900):
+        rows = db.query(
+            models.Prospect.username, models.Message.id, models.Message.sent_at, models.Message.campaign_id,
+            models.Prospect.id, models.Prospect.status
+        ).join(
+            models.Message, models.Message.prospect_id == models.Prospect.id
+        ).filter(
+            models.Prospect.username.in_(usernames[offset:offset + 900]),
+            models.Message.instagram_account_id == account_id,
+            models.Message.response_at.is_(None)
+        ).order_by(models.Message.sent_at)
+        for username, *row in rows:
+            index.setdefault(username.lower(), []).append(row)
+    return index
+
+class InboxSync:
+
+    def __init__(self, db: Session, apify_client=None, page_size: int = PAGE_SIZE):
+        self.db = db
+        self.apify_client = apify_client or apify_client_from_env()
+        self.page_size = page_size
+        self.actor_id = os.getenv('APIFY_INBOX_ACTOR_ID', 'apify/instagram-inbox-scraper')
+
+    def _cursor(self, account_id: int) -> models.InboxCursor:
+        cursor = self.db.query(models.InboxCursor).get(account_id)
+        if not cursor:
+            cursor = models.InboxCursor(instagram_account_id=account_id, threads_seen=0, replies_recorded=0)
+            self.db.add(cursor)
+        return cursor
+
+    def _fetch_threads(self, account: models.InstagramAccount, cursor: models.InboxCursor, limit: int):
+        """Pages of thread items newer than the cursor, or None if the actor run failed"""
+        run_input = {'sessionid': account.session_id, 'resultsLimit': limit}
+        if cursor.newest_marker:
+            run_input['newerThan'] = cursor.newest_marker
+        with track_outbound('apify', 'inbox_sync'):
+            run = self.apify_client.actor(self.actor_id).call(run_input=run_input)
+        if not run or run.get('status') != 'SUCCEEDED':
+            print(f"Inbox sync for {account.username} failed: {run.get('status') if run else 'no run'}")
+            return None
+
+        dataset = self.apify_client.dataset(run['defaultDatasetId'])
+        pages = []
+        offset = 0
+        while True:
+            with track_outbound('apify', 'list_items'):
+                items = dataset.list_items(offset=offset, limit=self.page_size).items or []
+            pages.append(items)
+            offset += len(items)
+            if len(items) < self.page_size:
+                return pages
+
+    def _match(self, account_id: int, threads: List[Dict]) -> List[Dict]:
+        """Replies in these threads matched to the open message each one answers"""
+        usernames = list({(thread.get('username') or '').lower() for thread in threads} - {''})
+        index = open_message_index(self.db, account_id, usernames)
+
+        matches = []
+        for thread in threads:
+            for message_id, sent_at, campaign_id, prospect_id, prospect_status in index.get(
+                (thread.get('username') or '').lower(), ()
+            ):
+                reply = first_reply(thread, sent_at) if sent_at else None
+                if not reply:
+                    continue
+                matches.append({
+                    'message_id': message_id,
+                    'campaign_id': campaign_id,
+                    'prospect_id': prospect_id,
+                    'prospect_status': prospect_status,
+                    'reply_at': reply['timestamp'],
+                    'reply_text': reply['text']
+                })
+        return matches
+
+    def _apply(self, matches: List[Dict]) -> None:
+        """Write every matched reply with one executemany per table; the caller commits"""
+        if not matches:
+            return
+        now = datetime.utcnow()
+
+        messages = models.Message.__table__
+        self.db.execute(messages.update().where(messages.c.id == bindparam('message_id')).values(
+            response_at=bindparam('reply_at'), response_content=bindparam('reply_text'), updated_at=now
+        ), matches)
+
+        first_replies = {}
+        for match in matches:
+            current = first_replies.get(match['prospect_id'])
+            if not current or match['reply_at'] < current['first_reply_at']:
+                first_replies[match['prospect_id']] = {
+                    'prospect_id': match['prospect_id'],
+                    'first_reply_at': match['reply_at'],
+                    'new_status': match['prospect_status'] if match['prospect_status'] in CLOSED_STATUSES
+                    else models.ProspectStatus.RESPONDED,
+                    'now': now
+                }
+        prospects = models.Prospect.__table__
+        self.db.execute(prospects.update().where(prospects.c.id == bindparam('prospect_id')).values(
+            response_received=True,
+            response_received_at=func.coalesce(prospects.c.response_received_at, bindparam('first_reply_at')),
+            status=bindparam('new_status'), updated_at=bindparam('now')
+        ), list(first_replies.values()))
+
+        campaigns = models.Campaign.__table__
+        self.db.execute(campaigns.update().where(campaigns.c.id == bindparam('campaign_id')).values(
+            responses_received=func.coalesce(campaigns.c.responses_received, 0) + bindparam('replies')
+        ), [{'campaign_id': campaign_id, 'replies': replies}
+            for campaign_id, replies in Counter(campaign_id for campaign_id, _ in {
+                (match['campaign_id'], match['prospect_id']) for match in matches
+            }).items()])
+
+        follow_ups = models.FollowUp.__table__
+        self.db.execute(follow_ups.update().where(
+            (follow_ups.c.prospect_id == bindparam('replied_id')) & (follow_ups.c.status == 'pending')
+        ).values(status='cancelled', updated_at=now), [{'replied_id': prospect_id} for prospect_id in first_replies])
+
+    def sync_account(self, account: models.InstagramAccount, limit: int = DEFAULT_LIMIT) -> Dict:
+        cursor = self._cursor(account.id)
+        after = parse_timestamp(cursor.newest_marker)
+        pages = self._fetch_threads(account, cursor, limit)
+        if pages is None:
+            cursor.last_status = 'failed'
+            cursor.last_synced_at = datetime.utcnow()
+            self.db.commit()
+            return {'account': account.username, 'status': 'failed', 'threads': 0, 'replies': 0}
+
+        threads = matched = 0
+        newest = after
+        try:
+            for items in pages:
+                fresh = []
+                for item in items:
+                    activity = parse_timestamp(item.get('lastActivityAt'))
+                    if activity and after and activity <= after:
+                        continue
+                    if activity and (not newest or activity > newest):
+                        newest = activity
+                    fresh.append(item)
+                matches = self._match(account.id, fresh)
+                self._apply(matches)
+                threads += len(fresh)
+                matched += len(matches)
+
+            cursor.newest_marker = newest.isoformat() if newest else None
+            cursor.threads_seen = (cursor.threads_seen or 0) + threads
+            cursor.replies_recorded = (cursor.replies_recorded or 0) + matched
+            cursor.last_status = 'completed'
+            cursor.last_synced_at = datetime.utcnow()
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return {'account': account.username, 'status': 'completed', 'threads': threads, 'replies': matched}
+
+    def sync_all(self, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+        accounts = self.db.query(models.InstagramAccount).filter(models.InstagramAccount.is_active == True).all()
+        return [self.sync_account(account, limit) for account in accounts]
+
+def run_sync(account_id: Optional[int] = None, limit: int = DEFAULT_LIMIT):
+    """Background-task entry point: syncs with its own session"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        sync = InboxSync(db)
+        if account_id:
+            account = db.query(models.InstagramAccount).get(account_id)
+            print(sync.sync_account(account, limit) if account else f"Instagram account {account_id} not found")
+        else:
+            for result in sync.sync_all(limit):
+                print(result)
+    except Exception as e:
+        print(f"Inbox sync failed: {str(e)}")
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Record DM replies from Instagram inboxes')
+    parser.add_argument('account_id', type=int, nargs='?', help='sync only this account')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+    run_sync(args.account_id, args.limit)
@@ -0,0 +1,144 @@
+"""
+Account leases for sharding campaign dispatch across worker processes.
+
+Every worker heartbeats its row in workers and holds time-limited leases on a
+share of the active Instagram accounts in account_leases. Only the holder of
+an account's lease dispatches for that account. Each rebalance:
+
+    - renews the worker's own leases and drops leases on deactivated accounts
+    - works out the fair share, ceil(active accounts / live workers)
+    - releases leases above the share, so a new worker gets accounts
+    - takes free or expired leases up to the share, so accounts of a worker
+      that died (stopped heartbeating) are picked up once its leases expire
+
+Taking a lease is a single conditional UPDATE (free or expired, and still the
+row we saw), so two workers racing for one account can't both win. Every
+function here commits, keeping lock hold times short.
+"""
+import math
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.session_health import dispatchable
+
+LEASE_SECONDS = int(os.getenv('WORKER_LEASE_SECONDS', 60))
+_NEVER = datetime(1970, 1, 1)
+
+def new_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+def heartbeat(db: Session, worker_id: str, lease_seconds: int = LEASE_SECONDS, now: datetime = None) -> List[int]:
+    """Record that the worker is alive and extend its leases; returns the account ids it still holds"""
+    now = now or datetime.utcnow()
+    worker = db.query(models.WorkerProcess).get(worker_id)
+    if not worker:
+        hostname, pid = (worker_id.split(':') + ['', ''])[:2]
+        worker = models.WorkerProcess(id=worker_id, hostname=hostname, pid=int(pid) if pid.isdigit() else None,
+                                      started_at=now)
+        db.add(worker)
+    worker.heartbeat_at = now
+
+    db.query(models.AccountLease).filter(
+        models.AccountLease.worker_id == worker_id,
+        models.AccountLease.expires_at > now
+    ).update({'expires_at': now + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+    db.commit()
+    return held_accounts(db, worker_id, now)
+
+def held_accounts(db: Session, worker_id: str, now: datetime = None) -> List[int]:
+    now = now or datetime.utcnow()
+    return [account_id for account_id, in db.query(models.AccountLease.instagram_account_id).filter(
+        models.AccountLease.worker_id == worker_id,
+        models.AccountLease.expires_at > now
+    ).order_by(models.AccountLease.instagram_account_id)]
+
+def holds(db: Session, worker_id: str, account_id: int, now: datetime = None) -> bool:
+    now = now or datetime.utcnow()
+    return db.query(models.AccountLease.instagram_account_id).filter(
+        models.AccountLease.instagram_account_id == account_id,
+        models.AccountLease.worker_id == worker_id,
+        models.AccountLease.expires_at > now
+    ).first() is not None
+
+def live_workers(db: Session, lease_seconds: int = LEASE_SECONDS, now: datetime = None) -> List[str]:
+    now = now or datetime.utcnow()
+    return [worker_id for worker_id, in db.query(models.WorkerProcess.id).filter(
+        models.WorkerProcess.heartbeat_at > now - timedelta(seconds=lease_seconds)
+    ).order_by(models.WorkerProcess.id)]
+
+def active_accounts(db: Session) -> List[int]:
+    return [account_id for account_id, in db.query(models.InstagramAccount.id).filter(
+        models.InstagramAccount.is_active == True,
+        dispatchable()
+    ).order_by(models.InstagramAccount.id)]
+
+def release(db: Session, worker_id: str, account_ids: Optional[List[int]] = None, now: datetime = None):
+    """Give up some (or all) of a worker's leases"""
+    now = now or datetime.utcnow()
+    query = db.query(models.AccountLease).filter(models.AccountLease.worker_id == worker_id)
+    if account_ids is not None:
+        query = query.filter(models.AccountLease.instagram_account_id.in_(account_ids))
+    query.update({'worker_id': None, 'expires_at': now}, synchronize_session=False)
+    db.commit()
+
+def _try_acquire(db: Session, worker_id: str, account_id: int, lease_seconds: int, now: datetime) -> bool:
+    taken = db.query(models.AccountLease).filter(
+        models.AccountLease.instagram_account_id == account_id,
+        models.AccountLease.expires_at <= now
+    ).update({
+        'worker_id': worker_id,
+        'acquired_at': now,
+        'expires_at': now + timedelta(seconds=lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+    return bool(taken)
+
+def rebalance(db: Session, worker_id: str, lease_seconds: int = LEASE_SECONDS, now: datetime = None) -> List[int]:
+    """Heartbeat, then shed or take leases to this worker's fair share; returns the accounts it holds"""
+    now = now or datetime.utcnow()
+    held = heartbeat(db, worker_id, lease_seconds, now)
+
+    accounts = active_accounts(db)
+    gone = [account_id for account_id in held if account_id not in set(accounts)]
+    if gone:
+        release(db, worker_id, gone, now)
+        held = [account_id for account_id in held if account_id not in gone]
+
+    # Every active account gets a lease row, so taking one is always a conditional UPDATE
+    if accounts:
+        db.execute(crud._insert_for(db)(models.AccountLease.__table__).on_conflict_do_nothing(
+            index_elements=['instagram_account_id']
+        ), [{'instagram_account_id': account_id, 'expires_at': _NEVER} for account_id in accounts])
+        db.commit()
+
+    workers = max(1, len(live_workers(db, lease_seconds, now)))
+    share = math.ceil(len(accounts) / workers) if accounts else 0
+
+    if len(held) > share:
+        release(db, worker_id, held[share:], now)
+        held = held[:share]
+
+    if len(held) < share:
+        free = [account_id for account_id, in db.query(models.AccountLease.instagram_account_id).filter(
+            models.AccountLease.instagram_account_id.in_(accounts),
+            models.AccountLease.expires_at <= now
+        ).order_by(models.AccountLease.instagram_account_id)]
+        for account_id in free:
+            if len(held) >= share:
+                break
+            if _try_acquire(db, worker_id, account_id, lease_seconds, now):
+                held.append(account_id)
+
+    return sorted(held)
+
+def retire(db: Session, worker_id: str):
+    """Release every lease and drop the worker's heartbeat row, for a clean shutdown"""
+    release(db, worker_id)
+    db.query(models.WorkerProcess).filter(models.WorkerProcess.id == worker_id).delete(synchronize_session=False)
+    db.commit()
@@ -0,0 +1,219 @@
+"""
+Lookalike scoring: how much a prospect resembles the ones who responded or converted.
+
+Bios and niches are turned into hashed word unigram/bigram counts (NUM_FEATURES
+buckets) and stored per prospect in prospect_vectors, together with running
+document frequencies, so new prospects are vectorized once as they arrive.
+Scoring weights the counts by TF-IDF, L2-normalizes each row and takes the
+cosine with the unit centroid of the positive prospects - for a whole chunk at
+a time as sparse (row, feature, value) arrays and one weighted bincount.
+
+Refreshes are incremental: new prospects are vectorized and scored against the
+current centroid. The centroid is rebuilt and every un-messaged prospect
+rescored when the positive set has moved by RESCORE_POSITIVE_CHANGE or the
+corpus has grown by RESCORE_GROWTH since the last full pass; that bumps the
+model generation, which the campaign queues pick up as a config change.
+
+    python -m app.lookalike        refresh vectors and scores
+"""
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+
+from app import models
+from app.dedup import normalize_bio
+
+FEATURE_BITS = 18
+NUM_FEATURES = 1 << FEATURE_BITS
+POSITIVE_STATUSES = (models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED)
+RESCORE_POSITIVE_CHANGE = 0.05
+RESCORE_GROWTH = 0.1
+CHUNK_SIZE = 20000
+MODEL_ID = 1
+
+Features = Tuple[np.ndarray, np.ndarray]
+
+def extract_features(bio: Optional[str], niche: Optional[str]) -> Features:
+    """Sorted hashed feature indices and their counts for one prospect"""
+    tokens = normalize_bio(bio).split()
+    grams = tokens + [f'{first} {second}' for first, second in zip(tokens, tokens[1:])]
+    if niche:
+        grams.append(f'niche:{niche.lower()}')
+    hashed = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32, count=len(grams))
+    return np.unique(hashed & np.uint32(NUM_FEATURES - 1), return_counts=True)
+
+def pack_features(features: Features) -> bytes:
+    indices, counts = features
+    return np.concatenate([indices.astype(np.uint32), counts.astype(np.uint32)]).tobytes()
+
+def unpack_features(blob: bytes) -> Features:
+    values = np.frombuffer(blob, dtype=np.uint32)
+    half = len(values) // 2
+    return values[:half], values[half:]
+
+def idf_weights(doc_freq: np.ndarray, document_count: int) -> np.ndarray:
+    """Smoothed inverse document frequency per feature"""
+    return np.log((1.0 + document_count) / (1.0 + doc_freq)) + 1.0
+
+def tfidf_rows(rows: List[Features], idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unit-length TF-IDF rows as parallel (row, feature, value) arrays"""
+    lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+    if not lengths.sum():
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty
+    row_ids = np.repeat(np.arange(len(rows)), lengths)
+    indices = np.concatenate([indices for indices, _ in rows]).astype(np.int64)
+    counts = np.concatenate([counts for _, counts in rows]).astype(np.float64)
+
+    values = (1.0 + np.log(counts)) * idf[indices]
+    norms = np.sqrt(np.bincount(row_ids, weights=values ** 2, minlength=len(rows)))
+    return row_ids, indices, values / norms[row_ids]
+
+def cosine_scores(rows: List[Features], idf: np.ndarray, centroid: np.ndarray) -> np.ndarray:
+    row_ids, indices, values = tfidf_rows(rows, idf)
+    return np.bincount(row_ids, weights=values * centroid[indices], minlength=len(rows))
+
+def build_centroid(rows: List[Features], idf: np.ndarray) -> Optional[np.ndarray]:
+    """Unit-length mean of the rows' TF-IDF vectors, or None when there's nothing to average"""
+    _, indices, values = tfidf_rows(rows, idf)
+    centroid = np.bincount(indices, weights=values, minlength=NUM_FEATURES)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm else None
+
+def _load_model(db: Session) -> models.LookalikeModel:
+    # A no-op write takes the model row's lock first, so concurrent workers refresh one at a time
+    # instead of vectorizing the same prospects twice
+    db.query(models.LookalikeModel).filter(models.LookalikeModel.id == MODEL_ID).update(
+        {'id': MODEL_ID}, synchronize_session=False
+    )
+    model = db.query(models.LookalikeModel).populate_existing().get(MODEL_ID)
+    if not model:
+        model = models.LookalikeModel(id=MODEL_ID, document_count=0, last_prospect_id=0,
+                                      scored_document_count=0, generation=0)
+        db.add(model)
+    return model
+
+def _vectorize_new(db: Session, model: models.LookalikeModel, doc_freq: np.ndarray) -> int:
+    """Store feature vectors for prospects past the watermark, updating document frequencies"""
+    vectorized = 0
+    while True:
+        chunk = db.query(models.Prospect.id, models.Prospect.bio, models.Prospect.niche).filter(
+            models.Prospect.id > model.last_prospect_id
+        ).order_by(models.Prospect.id).limit(CHUNK_SIZE).all()
+        if not chunk:
+            return vectorized
+
+        rows = []
+        for prospect_id, bio, niche in chunk:
+            features = extract_features(bio, niche)
+            if len(features[0]):
+                rows.append({'prospect_id': prospect_id, 'features': pack_features(features)})
+                doc_freq[features[0]] += 1
+        if rows:
+            db.execute(models.ProspectVector.__table__.insert(), rows)
+        model.document_count = (model.document_count or 0) + len(rows)
+        model.last_prospect_id = chunk[-1][0]
+        vectorized += len(rows)
+
+def _positive_ids(db: Session) -> np.ndarray:
+    ids = db.query(models.Prospect.id).filter(models.Prospect.status.in_(POSITIVE_STATUSES))
+    return np.array(sorted(prospect_id for prospect_id, in ids), dtype=np.int32)
+
+def _load_vectors(db: Session, prospect_ids: Iterable[int]) -> List[Features]:
+    prospect_ids = list(prospect_ids)
+    rows = []
+    for offset in range(0, len(prospect_ids), 900):
+        rows.extend(unpack_features(blob) for blob, in db.query(models.ProspectVector.features).filter(
+            models.ProspectVector.prospect_id.in_(prospect_ids[offset:offset + 900])
+        ))
+    return rows
+
+def _score(db: Session, idf: np.ndarray, centroid: np.ndarray, after_id: int = 0, keep_updated_at: bool = False) -> int:
+    """
+    Score un-messaged prospects with id > after_id. A full rescore keeps updated_at so
+    it doesn't look like every prospect changed; the generation bump covers the queues.
+    """
+    table = models.Prospect.__table__
+    values = {'lookalike_score': bindparam('score')}
+    if keep_updated_at:
+        values['updated_at'] = table.c.updated_at
+    update = table.update().where(table.c.id == bindparam('prospect_id')).values(**values)
+
+    scored = 0
+    last_id = after_id
+    while True:
+        chunk = db.query(models.ProspectVector.prospect_id, models.ProspectVector.features).join(
+            models.Prospect, models.Prospect.id == models.ProspectVector.prospect_id
+        ).filter(
+            models.ProspectVector.prospect_id > last_id,
+            models.Prospect.dm_sent == False
+        ).order_by(models.ProspectVector.prospect_id).limit(CHUNK_SIZE).all()
+        if not chunk:
+            return scored
+
+        scores = cosine_scores([unpack_features(blob) for _, blob in chunk], idf, centroid)
+        db.execute(update, [
+            {'prospect_id': prospect_id, 'score': round(float(score), 6)}
+            for (prospect_id, _), score in zip(chunk, scores)
+        ])
+        scored += len(chunk)
+        last_id = chunk[-1][0]
+
+def refresh_scores(db: Session) -> Dict:
+    """Vectorize new prospects and bring lookalike scores up to date; does not commit"""
+    model = _load_model(db)
+    watermark = model.last_prospect_id or 0
+    doc_freq = np.frombuffer(model.doc_freq, dtype=np.int32).copy() if model.doc_freq else np.zeros(NUM_FEATURES, dtype=np.int32)
+
+    vectorized = _vectorize_new(db, model, doc_freq)
+    model.doc_freq = doc_freq.tobytes()
+    idf = idf_weights(doc_freq, model.document_count)
+
+    positives = _positive_ids(db)
+    previous = np.frombuffer(model.positive_ids, dtype=np.int32) if model.positive_ids else np.zeros(0, dtype=np.int32)
+    moved = len(np.setxor1d(positives, previous))
+    full = len(positives) > 0 and (
+        model.centroid is None
+        or moved > RESCORE_POSITIVE_CHANGE * max(1, len(previous))
+        or model.document_count >= (model.scored_document_count or 0) * (1 + RESCORE_GROWTH)
+    )
+
+    scored = 0
+    if full:
+        centroid = build_centroid(_load_vectors(db, positives.tolist()), idf)
+        if centroid is not None:
+            scored = _score(db, idf, centroid, keep_updated_at=True)
+            model.centroid = centroid.astype(np.float32).tobytes()
+            model.positive_ids = positives.tobytes()
+            model.scored_document_count = model.document_count
+            model.generation = (model.generation or 0) + 1
+        else:
+            full = False
+    elif model.centroid is not None and vectorized:
+        centroid = np.frombuffer(model.centroid, dtype=np.float32).astype(np.float64)
+        scored = _score(db, idf, centroid, after_id=watermark)
+
+    db.flush()
+    return {
+        'vectorized': vectorized,
+        'positives': len(positives),
+        'full_rescore': full,
+        'scored': scored,
+        'generation': model.generation
+    }
+
+def current_generation(db: Session) -> int:
+    return db.query(models.LookalikeModel.generation).filter(models.LookalikeModel.id == MODEL_ID).scalar() or 0
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(refresh_scores(db))
+        db.commit()
+    finally:
+        db.close()
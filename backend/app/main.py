@@ -1,12 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine
 from app.api import router as api_router
+from app.auth import router as auth_router
+from app import metrics, migrations, thumbnails
 
-Base.metadata.create_all(bind=engine)
-
+# No DDL here: the schema is migrated before the app starts (python -m app.migrations)
 app = FastAPI()
 
+@app.on_event("startup")
+def check_migrations():
+    todo = migrations.pending(engine)
+    if todo:
+        print(f"Warning: {len(todo)} pending migration(s) ({', '.join(name for _, name in todo)}); run python -m app.migrations")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,8 +22,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.include_router(auth_router, prefix="/api")
 app.include_router(api_router, prefix="/api")
+app.include_router(thumbnails.router, prefix="/api")
 
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,160 @@
+"""
+Template-reference storage for message text.
+
+Almost every DM is one of the ~25 MessageTemplates strings with a name and
+niche filled in, so a message row stores a reference into message_templates
+plus its substitution values as compact JSON ({"name":"Sam","niche":"life"})
+instead of the rendered text. Text that isn't a rendering of a known template
+(custom messages, API-created ones) is still stored verbatim in `content`.
+
+Each distinct template text gets its own message_templates row; when the text
+behind a variant key changes, the new text becomes the next version of that
+variant and older messages keep pointing at the text they were sent with.
+Template rows are never updated, so bodies are memoized per database and id
+for the life of the process, and Message.content renders on first read.
+
+Databases created before this change get the new columns from migration
+v0002 (python -m app.migrations); the existing rows are then converted with
+
+    python -m app.message_content
+"""
+import json
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from message_templates import TEMPLATE_GROUPS, MessageTemplates
+
+CONVERT_CHUNK_SIZE = 10000
+
+_caches: 'WeakKeyDictionary[Engine, Tuple[Dict[int, str], Dict[str, int]]]' = WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+def _cache(db: Session) -> Tuple[Dict[int, str], Dict[str, int]]:
+    """(id -> body, body -> id) for the session's database"""
+    engine = db.get_bind()
+    cache = _caches.get(engine)
+    if cache is None:
+        with _cache_lock:
+            cache = _caches.setdefault(engine, ({}, {}))
+    return cache
+
+def _remember(db: Session, template_id: int, body: str):
+    bodies, ids = _cache(db)
+    with _cache_lock:
+        bodies[template_id] = body
+        ids[body] = template_id
+
+def _known_templates():
+    for templates in TEMPLATE_GROUPS.values():
+        yield from templates
+
+def match_template(content: str, variant: Optional[str] = None) -> Optional[Tuple[str, str, Dict[str, str]]]:
+    """(template text, variant, values) that render `content`; tries the variant's template first"""
+    template = MessageTemplates.get_template_by_variant(variant)
+    if template:
+        values = MessageTemplates.extract_values(template, content)
+        if values is not None:
+            return template, variant, values
+    for template in _known_templates():
+        values = MessageTemplates.extract_values(template, content)
+        if values is not None:
+            return template, MessageTemplates.get_template_variant(template), values
+    return None
+
+def template_id_for(db: Session, body: str, variant: Optional[str]) -> int:
+    """id of the message_templates row holding `body`, adding it as the variant's next version if new"""
+    template_id = _cache(db)[1].get(body)
+    if template_id is not None:
+        return template_id
+
+    templates = models.MessageTemplate.__table__
+    template_id = db.execute(select(templates.c.id).where(templates.c.body == body)).scalar()
+    if template_id is not None:
+        _remember(db, template_id, body)
+        return template_id
+
+    # Not memoized until a later call finds it, in case this transaction is rolled back
+    version = (db.query(func.max(models.MessageTemplate.version)).filter(
+        models.MessageTemplate.variant == variant
+    ).scalar() or 0) + 1
+    db.execute(crud._insert_for(db)(templates).values(
+        variant=variant, version=version, body=body, created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['body']))
+    return db.execute(select(templates.c.id).where(templates.c.body == body)).scalar()
+
+def reference(db: Session, content: str, variant: Optional[str] = None) -> Dict:
+    """Message column values storing `content`: a template reference when it matches one, else the text"""
+    match = match_template(content, variant)
+    if not match:
+        return {'stored_content': content, 'template_id': None, 'template_values': None}
+    body, variant, values = match
+    return {
+        'stored_content': '',
+        'template_id': template_id_for(db, body, variant),
+        'template_values': json.dumps(values, separators=(',', ':'))
+    }
+
+def template_body(db: Session, template_id: int) -> str:
+    body = _cache(db)[0].get(template_id)
+    if body is None:
+        body = db.query(models.MessageTemplate.body).filter(models.MessageTemplate.id == template_id).scalar()
+        if body is None:
+            raise LookupError(f"Message template {template_id} does not exist")
+        _remember(db, template_id, body)
+    return body
+
+@lru_cache(maxsize=4096)
+def _format(body: str, values: Optional[str]) -> str:
+    # A batch's messages share their text, so consecutive reads mostly hit
+    return body.format(**json.loads(values)) if values else body
+
+def render(db: Session, template_id: int, values: Optional[str]) -> str:
+    return _format(template_body(db, template_id), values)
+
+def convert_messages(db: Session, chunk_size: int = CONVERT_CHUNK_SIZE) -> Dict[str, int]:
+    """Replace the rendered text of existing messages with template references, one committed chunk at a time"""
+    messages = models.Message.__table__
+    totals = {'scanned': 0, 'converted': 0}
+    last_id = 0
+    while True:
+        rows = db.execute(select(messages.c.id, messages.c.content, messages.c.template_variant).where(
+            messages.c.id > last_id,
+            messages.c.template_id.is_(None),
+            messages.c.content != ''
+        ).order_by(messages.c.id).limit(chunk_size)).fetchall()
+        if not rows:
+            return totals
+
+        updates = []
+        for message_id, content, variant in rows:
+            columns = reference(db, content, variant)
+            if columns['template_id'] is not None:
+                updates.append({'message_id': message_id, 'new_template_id': columns['template_id'],
+                                'new_values': columns['template_values']})
+        if updates:
+            db.execute(messages.update().where(messages.c.id == bindparam('message_id')).values(
+                content='', template_id=bindparam('new_template_id'), template_values=bindparam('new_values')
+            ), updates)
+        db.commit()
+        totals['scanned'] += len(rows)
+        totals['converted'] += len(updates)
+        last_id = rows[-1][0]
+
+if __name__ == '__main__':
+    from app import migrations
+    from app.database import SessionLocal, engine
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        print(convert_messages(db))
+    finally:
+        db.close()
@@ -0,0 +1,325 @@
+"""
+Prometheus metrics for the API, the database and outbound calls.
+
+A small self-contained registry that renders the Prometheus text format, so we
+don't need another dependency for a handful of counters and histograms.
+
+- MetricsMiddleware: request latency per route template, plus SQL query count
+  and time per request (collected by the engine event hooks below)
+- SQLAlchemy Engine events: per-statement duration and a slow-query log with the
+  statement shape (literals stripped)
+- track_outbound(): context manager timing calls to Apify, OpenAI, Coolify, GitHub
+- DMS_TOTAL: DMs sent/failed per Instagram account
+- RESPONSE_CACHE_*: hits, misses and size of app.response_cache
+- SESSION_HEALTH_CHECKS: app.session_health results
+- DEPLOYMENT_STEPS: bulk Coolify deployment steps by outcome
+- THUMBNAIL_FETCHES: app.thumbnails profile-picture downloads by result
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.metrics')
+slow_query_logger = logging.getLogger('app.db.slow')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_SECONDS', '0.25'))
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(value: bool):
+    """Switch collection on or off at runtime (used by the overhead benchmark)"""
+    global _enabled
+    _enabled = value
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.register(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        raise NotImplementedError
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, key, child):
+        return [f'{self.name}_total{_format_labels(self.labelnames, key)} {child.value}']
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _render_child(self, key, child):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {child.value}']
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = 'le="%s"' % ('+Inf' if bound == float('inf') else repr(bound))
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {child.sum}')
+        lines.append(f'{self.name}_count{labels} {child.count}')
+        return lines
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template', ('method', 'route', 'status'))
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time', ('operation',))
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'SQL statements executed per HTTP request', ('route',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds', 'Total SQL time per HTTP request', ('route',))
+SLOW_QUERIES = Counter(
+    'db_slow_queries', 'SQL statements slower than SLOW_QUERY_SECONDS', ('operation',))
+OUTBOUND_CALL_DURATION = Histogram(
+    'outbound_call_duration_seconds', 'Latency of calls to external services', ('service', 'operation', 'outcome'),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+DMS_TOTAL = Counter(
+    'instagram_dms', 'Instagram DMs attempted, by sending account and outcome', ('account', 'outcome'))
+RESPONSE_CACHE_REQUESTS = Counter(
+    'response_cache_requests', 'Cached list endpoint requests by result (hit, not_modified, miss)', ('endpoint', 'result'))
+RESPONSE_CACHE_EVICTIONS = Counter(
+    'response_cache_evictions', 'Response cache entries evicted to stay under RESPONSE_CACHE_MAX_BYTES')
+RESPONSE_CACHE_BYTES = Gauge(
+    'response_cache_bytes', 'Size of the cached response bodies')
+SESSION_HEALTH_CHECKS = Counter(
+    'session_health_checks', 'Instagram session checks by result (healthy, expired, unknown)', ('result',))
+DEPLOYMENT_STEPS = Counter(
+    'deployment_steps', 'Bulk deployment pipeline calls by step (create, deploy, poll) and outcome (ok, retry, failed)',
+    ('step', 'outcome'))
+THUMBNAIL_FETCHES = Counter(
+    'thumbnail_fetches', 'Profile-picture downloads by result (cached, reused, missing, failed)', ('result',))
+
+# [query count, query seconds] for the request being served, set by MetricsMiddleware
+_request_db_stats: contextvars.ContextVar[Optional[List]] = contextvars.ContextVar('request_db_stats', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement for logging: literals become ?, IN lists collapse, whitespace squashes"""
+    shape = _LITERALS.sub('?', statement)
+    shape = _IN_LISTS.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+
+@lru_cache(maxsize=1024)
+def _statement_metrics(statement: str) -> Tuple[str, _HistogramChild]:
+    """(operation, duration child) per statement text; the ORM repeats the same few hundred statements"""
+    operation = _operation(statement)
+    return operation, DB_QUERY_DURATION.labels(operation)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _enabled and context is not None:
+        context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if not _enabled or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    operation, duration = _statement_metrics(statement)
+    duration.observe(elapsed)
+
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+    if elapsed >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.labels(operation).inc()
+        slow_query_logger.warning("Slow query (%.3fs): %s", elapsed, statement_shape(statement))
+
+@contextmanager
+def track_outbound(service: str, operation: str):
+    """Time a call to an external service; exceptions are recorded as outcome=error and re-raised"""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        OUTBOUND_CALL_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+def record_dm_results(account: str, results: Dict[str, bool]):
+    sent = sum(1 for success in results.values() if success)
+    if sent:
+        DMS_TOTAL.labels(account, 'sent').inc(sent)
+    if len(results) - sent:
+        DMS_TOTAL.labels(account, 'failed').inc(len(results) - sent)
+
+# (method, route template, status) -> the request's three histogram children, so a request
+# doesn't build label tuples and look them up again; route templates keep this small
+_route_metrics: Dict[Tuple[str, str, int], Tuple[_HistogramChild, _HistogramChild, _HistogramChild]] = {}
+
+def _request_metrics(method: str, route: str, status: int) -> Tuple[_HistogramChild, _HistogramChild, _HistogramChild]:
+    key = (method, route, status)
+    children = _route_metrics.get(key)
+    if children is None:
+        children = _route_metrics[key] = (HTTP_REQUEST_DURATION.labels(method, route, status),
+                                          DB_QUERIES_PER_REQUEST.labels(route), DB_TIME_PER_REQUEST.labels(route))
+    return children
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; avoids BaseHTTPMiddleware's per-request task overhead"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = [0, 0.0]
+        token = _request_db_stats.set(stats)
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status_holder[0] = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db_stats.reset(token)
+            route = scope.get('route')
+            duration, queries, db_time = _request_metrics(
+                scope['method'], getattr(route, 'path', 'unmatched'), status_holder[0])
+            duration.observe(elapsed)
+            queries.observe(stats[0])
+            db_time.observe(stats[1])
@@ -0,0 +1,115 @@
+"""
+Versioned schema migrations.
+
+Every module in this package named vNNNN_description.py is one migration: an
+upgrade(conn) run inside a transaction, or with autocommit when the module sets
+`transactional = False` (Postgres can only build an index CONCURRENTLY outside
+one). schema_migrations records the versions applied, so each runs once per
+database. The API doesn't touch the schema on startup; migrations are a deploy
+step (the Docker image runs them before uvicorn) and app.main only warns when
+some are pending.
+
+An empty database gets the current models with create_all and every migration
+stamped as applied, since there is nothing to migrate. Databases created before
+versioning start from v0001, so migrations check what is already there before
+changing it. create_all only adds missing tables, never columns or indexes on
+tables that exist, so those need their own migration (v0005, v0006). Indexes on big tables are declared on the model and built with
+create_index_online(conn, model_index(table, name)), which doesn't block
+writes on Postgres.
+
+    python -m app.migrations            apply pending migrations
+    python -m app.migrations --status   list applied and pending migrations
+"""
+import contextlib
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from typing import List, Set, Tuple
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+_MODULE = re.compile(r'^v(\d{4})_\w+$')
+_LOCK_ID = 4187204  # pg_advisory_lock key serializing concurrent upgrades
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+def available() -> List[Tuple[int, str]]:
+    """(version, module name) of every migration, oldest first; nothing is imported"""
+    return sorted((int(match.group(1)), name) for name in (module.name for module in pkgutil.iter_modules(__path__))
+                  for match in [_MODULE.match(name)] if match)
+
+def applied(engine) -> Set[int]:
+    if not inspect(engine).has_table(schema_migrations.name):
+        return set()
+    with engine.connect() as conn:
+        return {version for version, in conn.execute(select(schema_migrations.c.version))}
+
+def pending(engine) -> List[Tuple[int, str]]:
+    done = applied(engine)
+    return [(version, name) for version, name in available() if version not in done]
+
+def model_index(table, name: str) -> Index:
+    return next(index for index in table.indexes if index.name == name)
+
+def create_index_online(conn, index: Index):
+    """Build an index without blocking writes: CONCURRENTLY on Postgres (in a non-transactional migration)"""
+    options = index.dialect_options['postgresql']
+    concurrently = options['concurrently']
+    options['concurrently'] = conn.dialect.name == 'postgresql'
+    try:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+    finally:
+        options['concurrently'] = concurrently  # The model's Index is shared with create_all
+
+def _record(conn, version: int, name: str):
+    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+
+@contextlib.contextmanager
+def _upgrade_lock(engine):
+    """Serialize upgrades from several processes (SQLite already serializes writers)"""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': _LOCK_ID})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _LOCK_ID})
+
+def upgrade(engine) -> List[str]:
+    """Apply pending migrations in order; returns the names applied"""
+    from app.database import Base
+    from app import models  # noqa: F401 - registers the tables on Base.metadata
+
+    with _upgrade_lock(engine):
+        with engine.begin() as conn:
+            schema_migrations.create(conn, checkfirst=True)
+        todo = pending(engine)
+        existing = set(inspect(engine).get_table_names()) & set(Base.metadata.tables)
+        if todo and not existing and len(todo) == len(available()):
+            with engine.begin() as conn:
+                Base.metadata.create_all(bind=conn)
+                for version, name in todo:
+                    _record(conn, version, name)
+            return [name for _, name in todo]
+
+        for version, name in todo:
+            migration = importlib.import_module(f'{__name__}.{name}')
+            if getattr(migration, 'transactional', True):
+                with engine.begin() as conn:
+                    migration.upgrade(conn)
+                    _record(conn, version, name)
+            else:
+                with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    migration.upgrade(conn)
+                    _record(conn, version, name)
+            print(f"Applied migration {name}")
+        return [name for _, name in todo]
@@ -0,0 +1,16 @@
+import argparse
+
+from app import migrations
+from app.database import engine
+
+parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+parser.add_argument('--status', action='store_true', help='list applied and pending migrations instead')
+args = parser.parse_args()
+
+if args.status:
+    done = migrations.applied(engine)
+    for version, name in migrations.available():
+        print(f"{'applied' if version in done else 'pending'}  {name}")
+else:
+    applied = migrations.upgrade(engine)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
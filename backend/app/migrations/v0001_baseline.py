@@ -0,0 +1,18 @@
+"""
+Baseline for databases created by create_all before migrations were versioned.
+
+Adds whichever tables the database is missing, and on SQLite the prospect bio
+FTS table and its triggers (backfilled from existing bios) when the database
+predates search.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(conn):
+    from app import models
+    from app.database import Base
+
+    Base.metadata.create_all(bind=conn)
+    if conn.dialect.name == 'sqlite' and not inspect(conn).has_table('prospects_fts'):
+        for statement in models.PROSPECT_FTS_DDL:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO prospects_fts(prospects_fts) VALUES('rebuild')"))
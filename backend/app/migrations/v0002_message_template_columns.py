@@ -0,0 +1,14 @@
+"""
+Template reference columns on messages (see app.message_content).
+
+Existing rows keep their rendered text; `python -m app.message_content`
+converts them afterwards, in committed chunks.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('messages')}
+    if 'template_id' not in columns:
+        conn.execute(text("ALTER TABLE messages ADD COLUMN template_id INTEGER REFERENCES message_templates (id)"))
+    if 'template_values' not in columns:
+        conn.execute(text("ALTER TABLE messages ADD COLUMN template_values TEXT"))
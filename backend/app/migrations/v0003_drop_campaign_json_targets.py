@@ -0,0 +1,34 @@
+"""
+Move campaigns.hashtags/target_accounts JSON into the join tables, then drop the columns.
+
+Campaigns whose JSON can't be read keep the links they already have, and the
+value is printed so it isn't lost silently.
+"""
+import json
+
+from sqlalchemy import inspect, text
+
+LEGACY = {
+    'hashtags': ('campaign_hashtags', 'hashtag', 'normalize_hashtag'),
+    'target_accounts': ('campaign_target_accounts', 'username', 'normalize_username')
+}
+
+def upgrade(conn):
+    from app import models
+
+    columns = {column['name'] for column in inspect(conn).get_columns('campaigns')}
+    for column, (link_table, key, normalize) in LEGACY.items():
+        if column not in columns:
+            continue
+        links = models.Base.metadata.tables[link_table]
+        for campaign_id, value in conn.execute(text(f"SELECT id, {column} FROM campaigns WHERE {column} IS NOT NULL")):
+            try:
+                items = dict.fromkeys(filter(None, map(getattr(models, normalize), models._json_list(value))))
+            except (TypeError, ValueError, json.JSONDecodeError):
+                print(f"Skipping unreadable {column} on campaign {campaign_id}: {value!r}")
+                continue
+            conn.execute(links.delete().where(links.c.campaign_id == campaign_id))
+            if items:
+                conn.execute(links.insert(), [{'campaign_id': campaign_id, key: item, 'position': position}
+                                              for position, item in enumerate(items)])
+        conn.execute(text(f"ALTER TABLE campaigns DROP COLUMN {column}"))
@@ -0,0 +1,15 @@
+"""
+Index follow_ups.follow_up_message_id.
+
+app.archive deletes follow-ups by the id of the message that was sent for
+them, which scanned the whole table once per archived chunk. Built online:
+outside a transaction so Postgres can build it CONCURRENTLY.
+"""
+from app.migrations import create_index_online, model_index
+
+transactional = False
+
+def upgrade(conn):
+    from app import models
+
+    create_index_online(conn, model_index(models.FollowUp.__table__, 'ix_follow_ups_follow_up_message_id'))
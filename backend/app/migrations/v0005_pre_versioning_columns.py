@@ -0,0 +1,49 @@
+"""
+Columns added to existing tables before migrations were versioned.
+
+v0001's create_all only creates missing tables, so a database from before
+versioning (like the one shipped in backend/instance) kept its old prospects,
+campaigns, messages and instagram_accounts tables without these columns. Each
+is added only if it's missing. Columns the code reads as numbers get their
+model default for existing rows; the rest start NULL.
+"""
+from sqlalchemy import inspect, text
+
+# (table, column, default for existing rows)
+COLUMNS = [
+    ('instagram_accounts', 'session_id', "''"),
+    ('instagram_accounts', 'daily_limit', '40'),
+    ('instagram_accounts', 'last_reset_date', None),
+    ('instagram_accounts', 'current_batch_size', None),
+    ('instagram_accounts', 'current_delay_seconds', None),
+    ('instagram_accounts', 'failure_rate', '0.0'),
+    ('instagram_accounts', 'cooldown_until', None),
+    ('instagram_accounts', 'active_hours_start', '9'),
+    ('instagram_accounts', 'active_hours_end', '21'),
+    ('campaigns', 'instagram_account_id', None),
+    ('campaigns', 'priority_weights', None),
+    ('campaigns', 'follow_up_delay_hours', '72'),
+    ('messages', 'instagram_account_id', None),
+    ('messages', 'template_variant', None),
+    ('prospects', 'duplicate_of_id', None),
+    ('prospects', 'lookalike_score', None)
+]
+
+def upgrade(conn):
+    from app.database import Base
+
+    inspector = inspect(conn)
+    existing = {table: {column['name'] for column in inspector.get_columns(table)}
+                for table in {table for table, _, _ in COLUMNS}}
+    for table, name, default in COLUMNS:
+        if name in existing[table]:
+            continue
+        column = Base.metadata.tables[table].c[name]
+        ddl = f"ALTER TABLE {table} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+        if default is not None:
+            ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        for foreign_key in column.foreign_keys:
+            ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+        conn.execute(text(ddl))
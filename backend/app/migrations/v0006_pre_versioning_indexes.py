@@ -0,0 +1,21 @@
+"""
+Indexes on the pre-versioning tables (prospects, messages) that v0001 couldn't add.
+
+Same databases as v0005: their tables already existed, so create_all skipped
+the indexes declared on them since. Built online, like v0004.
+"""
+from app.migrations import create_index_online, model_index
+
+transactional = False
+
+INDEXES = {
+    'prospects': ('ix_prospects_niche', 'ix_prospects_status', 'ix_prospects_duplicate_of_id', 'ix_prospects_updated_at'),
+    'messages': ('ix_messages_prospect_id', 'ix_messages_sent_at', 'ix_messages_response_at')
+}
+
+def upgrade(conn):
+    from app.database import Base
+
+    for table, names in INDEXES.items():
+        for name in names:
+            create_index_online(conn, model_index(Base.metadata.tables[table], name))
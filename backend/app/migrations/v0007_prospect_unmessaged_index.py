@@ -0,0 +1,15 @@
+"""
+Partial index on prospects still waiting for a first DM (see models.Prospect).
+
+Covers status for rows with dm_sent false and no duplicate_of_id, so the
+dispatch queue's eligibility filter skips everyone already messaged. Built
+online, like v0004 and v0006.
+"""
+from app.migrations import create_index_online, model_index
+
+transactional = False
+
+def upgrade(conn):
+    from app import models
+
+    create_index_online(conn, model_index(models.Prospect.__table__, 'ix_prospects_unmessaged_status'))
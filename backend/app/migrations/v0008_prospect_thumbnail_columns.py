@@ -0,0 +1,14 @@
+"""
+Cached profile-picture columns on prospects (see app.thumbnails).
+
+Existing prospects start without a thumbnail; `python -m app.thumbnails`
+fetches them afterwards.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('prospects')}
+    if 'thumbnail_digest' not in columns:
+        conn.execute(text("ALTER TABLE prospects ADD COLUMN thumbnail_digest VARCHAR(64)"))
+    if 'thumbnail_source' not in columns:
+        conn.execute(text("ALTER TABLE prospects ADD COLUMN thumbnail_source VARCHAR(500)"))
@@ -0,0 +1,12 @@
+"""
+Account that dispatches an unpinned campaign (see worker.account_campaigns).
+
+Existing unpinned campaigns start without one; the first worker pass assigns
+them, so they keep whichever account they had been going to.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('campaigns')}
+    if 'dispatch_account_id' not in columns:
+        conn.execute(text("ALTER TABLE campaigns ADD COLUMN dispatch_account_id INTEGER REFERENCES instagram_accounts (id)"))
@@ -0,0 +1,13 @@
+"""
+Keep LSH buckets for cluster representatives only (see app.dedup).
+
+New clones are matched against a cluster's representative, so the buckets of
+prospects already marked as duplicates are dead weight in every lookup.
+"""
+from sqlalchemy import text
+
+def upgrade(conn):
+    conn.execute(text(
+        "DELETE FROM bio_lsh_buckets WHERE prospect_id IN "
+        "(SELECT id FROM prospects WHERE duplicate_of_id IS NOT NULL)"
+    ))
@@ -0,0 +1,20 @@
+"""
+Queue index on prospect_priorities ordered (campaign_id, score, prospect_id).
+
+Dispatch runs page through a campaign's queue from the (score, prospect_id) of
+the last row they read (see prioritization.top_candidates), which the old
+(campaign_id, score) index couldn't serve without sorting ties. Built online,
+like v0007, then the old index is dropped.
+"""
+from sqlalchemy import text
+
+from app.migrations import create_index_online, model_index
+
+transactional = False
+
+def upgrade(conn):
+    from app import models
+
+    create_index_online(conn, model_index(models.ProspectPriority.__table__, 'ix_prospect_priorities_campaign_queue'))
+    concurrently = ' CONCURRENTLY' if conn.dialect.name == 'postgresql' else ''
+    conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS ix_prospect_priorities_campaign_score"))
@@ -0,0 +1,33 @@
+"""
+messages.updated_at, and the rollup watermark that follows it instead of response_at.
+
+Rollups found late replies by response_at, the reply's Instagram timestamp, so
+a reply recorded after the watermark but sent before it was never rolled up.
+They now look for messages updated since the last refresh. Existing messages
+start with a NULL updated_at, since they were rolled up as they stand; new
+messages and any later write (a reply being recorded) set it. The index is built online, like
+v0007, so this runs outside a transaction; each step checks what is already
+there, so an interrupted run is simply run again.
+"""
+from sqlalchemy import inspect, text
+
+from app.migrations import create_index_online, model_index
+
+transactional = False
+
+# (table, column) to add, typed as on the model
+COLUMNS = [('messages', 'updated_at'), ('rollup_watermarks', 'last_message_update')]
+
+def upgrade(conn):
+    from app import models
+
+    inspector = inspect(conn)
+    existing = {table: {column['name'] for column in inspector.get_columns(table)} for table, _ in COLUMNS}
+    for table, name in COLUMNS:
+        if name not in existing[table]:
+            column_type = models.Base.metadata.tables[table].c[name].type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+    create_index_online(conn, model_index(models.Message.__table__, 'ix_messages_updated_at'))
+    if 'last_response_at' in existing['rollup_watermarks']:
+        conn.execute(text("ALTER TABLE rollup_watermarks DROP COLUMN last_response_at"))
@@ -1,6 +1,7 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Enum, Float, Text, Date, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, BigInteger, String, DateTime, Enum, Float, Text, Date, ForeignKey, Index, LargeBinary, DDL, event
+from sqlalchemy.orm import object_session, relationship
 from datetime import datetime
+import json
 from enum import Enum as PyEnum
 
 from app.database import Base
@@ -31,55 +32,324 @@ class Prospect(Base):
     bio = Column(Text)
     coach_score = Column(Float, default=0.0)
     value_score = Column(Float, default=0.0)
-    niche = Column(String(100))
-    status = Column(Enum(ProspectStatus), default=ProspectStatus.DISCOVERED)
+    niche = Column(String(100), index=True)
+    status = Column(Enum(ProspectStatus), default=ProspectStatus.DISCOVERED, index=True)
     dm_sent = Column(Boolean, default=False)
     dm_sent_at = Column(DateTime)
     response_received = Column(Boolean, default=False)
     response_received_at = Column(DateTime)
     profile_url = Column(String(500))
     profile_pic_url = Column(String(500))
+    duplicate_of_id = Column(Integer, ForeignKey('prospects.id'), index=True)  # Cluster representative when the bio is a near-duplicate, see app.dedup
+    lookalike_score = Column(Float)  # Cosine similarity to converted/responded prospects, see app.lookalike
+    thumbnail_digest = Column(String(64))  # Cached picture in app.thumbnails; NULL when none (yet)
+    thumbnail_source = Column(String(500))  # profile_pic_url the thumbnail was fetched from
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     messages = relationship('Message', back_populates='prospect')
 
+# SQLite FTS5 index over prospect bios, kept in sync by triggers (see app.search)
+PROSPECT_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS prospects_fts USING fts5(
+        bio, content='prospects', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS prospects_fts_ai AFTER INSERT ON prospects BEGIN
+        INSERT INTO prospects_fts(rowid, bio) VALUES (new.id, new.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prospects_fts_ad AFTER DELETE ON prospects BEGIN
+        INSERT INTO prospects_fts(prospects_fts, rowid, bio) VALUES ('delete', old.id, old.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prospects_fts_au AFTER UPDATE OF bio ON prospects BEGIN
+        INSERT INTO prospects_fts(prospects_fts, rowid, bio) VALUES ('delete', old.id, old.bio);
+        INSERT INTO prospects_fts(rowid, bio) VALUES (new.id, new.bio);
+    END"""
+]
+
+for statement in PROSPECT_FTS_DDL:
+    event.listen(Prospect.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Dispatch only reads prospects nobody has messaged (see prioritization._eligible); a
+# partial index over just those stays small while messaged prospects pile up
+_UNMESSAGED = (Prospect.dm_sent == False) & Prospect.duplicate_of_id.is_(None)
+Index('ix_prospects_unmessaged_status', Prospect.status, postgresql_where=_UNMESSAGED, sqlite_where=_UNMESSAGED)
+
+class BioSignature(Base):
+    __tablename__ = 'bio_signatures'
+    
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # MinHash of the normalized bio, NUM_PERM uint32s
+
+class BioLshBucket(Base):
+    __tablename__ = 'bio_lsh_buckets'
+    __table_args__ = {'sqlite_with_rowid': False}  # Lookups only ever go through the primary key
+    
+    bucket = Column(BigInteger, primary_key=True)  # Hash of one band of a BioSignature, band number included
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), primary_key=True)
+
+class ProspectVector(Base):
+    __tablename__ = 'prospect_vectors'
+    
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), primary_key=True)
+    features = Column(LargeBinary, nullable=False)  # Hashed n-gram indices then counts, uint32 each
+
+class LookalikeModel(Base):
+    __tablename__ = 'lookalike_models'
+    
+    id = Column(Integer, primary_key=True)
+    document_count = Column(Integer, default=0)
+    doc_freq = Column(LargeBinary)  # int32 per hashed feature
+    centroid = Column(LargeBinary)  # float32 per hashed feature, unit length
+    positive_ids = Column(LargeBinary)  # int32 prospect ids the centroid was built from
+    last_prospect_id = Column(Integer, default=0)  # Vectorization watermark
+    scored_document_count = Column(Integer, default=0)  # document_count at the last full rescore
+    generation = Column(Integer, default=0)  # Bumped on every full rescore
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ScrapeCursor(Base):
+    __tablename__ = 'scrape_cursors'
+    
+    source_type = Column(String(20), primary_key=True)  # hashtag, followers
+    source = Column(String(200), primary_key=True)  # Hashtag without '#', or competitor username
+    dataset_id = Column(String(100))  # Dataset of a run that hasn't been fully consumed yet
+    dataset_offset = Column(Integer, default=0)  # Items of that dataset already upserted
+    newest_marker = Column(String(200))  # Newest item of the last completed run; re-runs stop there
+    pending_marker = Column(String(200))  # Newest item of the run in progress
+    items_fetched = Column(Integer, default=0)
+    prospects_added = Column(Integer, default=0)
+    last_status = Column(String(20))  # running, completed, failed
+    last_run_at = Column(DateTime)
+
+class InboxCursor(Base):
+    __tablename__ = 'inbox_cursors'
+    
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'), primary_key=True)
+    newest_marker = Column(String(50))  # Latest thread activity (ISO timestamp) already synced
+    threads_seen = Column(Integer, default=0)
+    replies_recorded = Column(Integer, default=0)
+    last_status = Column(String(20))  # completed, failed
+    last_synced_at = Column(DateTime)
+
 class Campaign(Base):
     __tablename__ = 'campaigns'
     
     id = Column(Integer, primary_key=True)
     name = Column(String(200), nullable=False)
     description = Column(Text)
-    hashtags = Column(Text)  # JSON string of hashtags
-    target_accounts = Column(Text)  # JSON string of target accounts
     instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'), nullable=True)  # Link to Instagram account
+    dispatch_account_id = Column(Integer, ForeignKey('instagram_accounts.id'), nullable=True)  # Sender claimed for an unpinned campaign, see worker.account_campaigns
     status = Column(Enum(CampaignStatus), default=CampaignStatus.ACTIVE)
     messages_sent = Column(Integer, default=0)
     responses_received = Column(Integer, default=0)
     conversions = Column(Integer, default=0)
     daily_limit = Column(Integer, default=50)
+    priority_weights = Column(Text)  # JSON string of feature weights, see app.prioritization.DEFAULT_WEIGHTS
+    follow_up_delay_hours = Column(Integer, default=72)  # Follow up unanswered DMs after this long; 0 disables
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     messages = relationship('Message', back_populates='campaign')
-    instagram_account = relationship('InstagramAccount', back_populates='campaigns')
+    instagram_account = relationship('InstagramAccount', back_populates='campaigns', foreign_keys=[instagram_account_id])
+    hashtag_links = relationship('CampaignHashtag', order_by='CampaignHashtag.position',
+                                 cascade='all, delete-orphan')
+    target_account_links = relationship('CampaignTargetAccount', order_by='CampaignTargetAccount.position',
+                                        cascade='all, delete-orphan')
+    
+    # JSON strings (None when empty), the shape these had when they were Text columns
+    @property
+    def hashtags(self):
+        return json.dumps([link.hashtag for link in self.hashtag_links]) if self.hashtag_links else None
+    
+    @hashtags.setter
+    def hashtags(self, value):
+        tags = dict.fromkeys(filter(None, (normalize_hashtag(tag) for tag in _json_list(value))))
+        self.hashtag_links = [CampaignHashtag(hashtag=tag, position=i) for i, tag in enumerate(tags)]
+    
+    @property
+    def target_accounts(self):
+        return json.dumps([link.username for link in self.target_account_links]) if self.target_account_links else None
+    
+    @target_accounts.setter
+    def target_accounts(self, value):
+        usernames = dict.fromkeys(filter(None, (normalize_username(username) for username in _json_list(value))))
+        self.target_account_links = [CampaignTargetAccount(username=username, position=i)
+                                     for i, username in enumerate(usernames)]
+
+def _json_list(value):
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else []
+    if not isinstance(value, (list, tuple, type(None))):
+        raise ValueError(f"expected a JSON list, got {type(value).__name__}")
+    return [str(item) for item in value or []]
+
+def normalize_hashtag(tag: str) -> str:
+    return (tag or '').strip().lstrip('#').lower()
+
+def normalize_username(username: str) -> str:
+    return (username or '').strip().lstrip('@').lower()
+
+class CampaignHashtag(Base):
+    __tablename__ = 'campaign_hashtags'
+    
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    hashtag = Column(String(200), primary_key=True, index=True)  # Lowercase, without '#'
+    position = Column(Integer, default=0)
+
+class CampaignTargetAccount(Base):
+    __tablename__ = 'campaign_target_accounts'
+    
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    username = Column(String(200), primary_key=True, index=True)  # Lowercase, without '@'
+    position = Column(Integer, default=0)
+
+class ProspectSource(Base):
+    __tablename__ = 'prospect_sources'
+    __table_args__ = (
+        Index('ix_prospect_sources_source', 'source_type', 'source', 'prospect_id'),
+    )
+    
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), primary_key=True)
+    source_type = Column(String(20), primary_key=True)  # hashtag, followers
+    source = Column(String(200), primary_key=True)  # Normalized hashtag or competitor username
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+
+class ProspectPriority(Base):
+    __tablename__ = 'prospect_priorities'
+    __table_args__ = (
+        Index('ix_prospect_priorities_campaign_queue', 'campaign_id', 'score', 'prospect_id'),  # See prioritization.top_candidates
+    )
+    
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), primary_key=True, index=True)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+class CampaignQueueState(Base):
+    __tablename__ = 'campaign_queue_states'
+    
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    refreshed_at = Column(DateTime)  # prospects.updated_at watermark for incremental refreshes
+    config_signature = Column(String(40))  # Hash of weights, targeting and lookalike generation; a change forces a full rebuild
+
+class MessageTemplate(Base):
+    __tablename__ = 'message_templates'
+    
+    id = Column(Integer, primary_key=True)
+    variant = Column(String(50), index=True)  # MessageTemplates.get_template_variant key
+    version = Column(Integer, default=1)  # Next version each time the text behind a variant changes
+    body = Column(Text, nullable=False, unique=True)  # str.format template
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class Message(Base):
     __tablename__ = 'messages'
     
     id = Column(Integer, primary_key=True)
-    prospect_id = Column(Integer, ForeignKey('prospects.id'), nullable=False)
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), nullable=False, index=True)
     campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
-    content = Column(Text, nullable=False)
-    sent_at = Column(DateTime, default=datetime.utcnow)
-    response_at = Column(DateTime)
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'), nullable=True)  # Account that sent the DM
+    stored_content = Column('content', Text, nullable=False, default='')  # Verbatim text; empty when template_id is set
+    template_id = Column(Integer, ForeignKey('message_templates.id'))  # See app.message_content
+    template_values = Column(Text)  # JSON substitution values rendered into the template
+    template_variant = Column(String(50))  # e.g. business:2, see MessageTemplates.get_template_variant
+    sent_at = Column(DateTime, default=datetime.utcnow, index=True)
+    response_at = Column(DateTime, index=True)
     response_content = Column(Text)
     message_type = Column(String(50), default='initial')  # initial, follow_up
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # When a reply was recorded, see app.analytics
 
     prospect = relationship('Prospect', back_populates='messages')
     campaign = relationship('Campaign', back_populates='messages')
 
+    @property
+    def content(self) -> str:
+        """The DM text, rendered from its template on read"""
+        if self.template_id is None:
+            return self.stored_content
+        from app.message_content import render
+        return render(object_session(self), self.template_id, self.template_values)
+
+    @content.setter
+    def content(self, value: str):
+        """Store text verbatim; app.message_content.reference gives the compact columns instead"""
+        self.stored_content = value
+        self.template_id = None
+        self.template_values = None
+
+class FollowUp(Base):
+    __tablename__ = 'follow_ups'
+    __table_args__ = (
+        Index('ix_follow_ups_due', 'campaign_id', 'instagram_account_id', 'status', 'due_at'),
+    )
+    
+    message_id = Column(Integer, ForeignKey('messages.id'), primary_key=True)  # The initial DM; one follow-up each
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
+    prospect_id = Column(Integer, ForeignKey('prospects.id'), nullable=False)
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'))  # Sender of the original DM
+    due_at = Column(DateTime, nullable=False)
+    status = Column(String(20), default='pending')  # pending, sending, sent, cancelled
+    attempts = Column(Integer, default=0)
+    follow_up_message_id = Column(Integer, ForeignKey('messages.id'), index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SendBatch(Base):
+    __tablename__ = 'send_batches'
+    __table_args__ = (
+        Index('ix_send_batches_status', 'status', 'instagram_account_id'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'))
+    message_type = Column(String(50), default='initial')  # initial, follow_up
+    content = Column(Text, nullable=False)
+    template_variant = Column(String(50))
+    targets = Column(Text, nullable=False)  # JSON list of {prospect_id, username, follow_up_of}
+    apify_run_id = Column(String(100))  # Set as soon as the actor run starts
+    status = Column(String(20), default='pending')  # pending, started, completed, abandoned
+    sent_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+class MessageRollup(Base):
+    __tablename__ = 'message_rollups'
+    __table_args__ = (
+        Index('ix_message_rollups_bucket', 'granularity', 'bucket_start'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'))
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'))
+    niche = Column(String(100))
+    template_variant = Column(String(50))
+    sent = Column(Integer, default=0)
+    responded = Column(Integer, default=0)
+    converted = Column(Integer, default=0)
+    median_response_seconds = Column(Float)  # NULL when nothing in the bucket was answered
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RollupWatermark(Base):
+    __tablename__ = 'rollup_watermarks'
+    
+    name = Column(String(50), primary_key=True)
+    last_message_id = Column(Integer, default=0)  # Highest messages.id already rolled up
+    last_message_update = Column(DateTime)  # Latest messages.updated_at already rolled up (late replies)
+    last_prospect_update = Column(DateTime)  # Latest prospects.updated_at already rolled up (conversions)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MessageArchive(Base):
+    __tablename__ = 'message_archives'
+    
+    month = Column(String(7), primary_key=True)  # YYYY-MM of sent_at
+    path = Column(String(500), nullable=False)  # SQLite partition file, see app.archive
+    messages = Column(Integer, default=0)
+    first_sent_at = Column(DateTime)
+    last_sent_at = Column(DateTime)
+    archived_before = Column(DateTime)  # Cutoff of the latest run that wrote here; rollups before it are frozen
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -101,10 +371,33 @@ class InstagramAccount(Base):
     daily_limit = Column(Integer, default=40)  # Max messages per day for this account
     last_activity = Column(DateTime)
     last_reset_date = Column(Date, default=datetime.utcnow().date)  # Track daily limit resets
-    account_status = Column(String(50), default='active')  # active, suspended, limited
+    account_status = Column(String(50), default='active')  # active, suspended, limited, session_expired
+    current_batch_size = Column(Integer)  # Adaptive pacing state, see rate_controller.AdaptiveRateController
+    current_delay_seconds = Column(Float)
+    failure_rate = Column(Float, default=0.0)  # EWMA of per-username send failures
+    cooldown_until = Column(DateTime)  # Set when a failure spike marks the account limited
+    active_hours_start = Column(Integer, default=9)  # Local hour sends may start
+    active_hours_end = Column(Integer, default=21)  # Local hour sends must stop
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    campaigns = relationship('Campaign', back_populates='instagram_account')
+    campaigns = relationship('Campaign', back_populates='instagram_account', foreign_keys='Campaign.instagram_account_id')
+
+class WorkerProcess(Base):
+    __tablename__ = 'workers'
+    
+    id = Column(String(64), primary_key=True)  # hostname:pid:random
+    hostname = Column(String(255))
+    pid = Column(Integer)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, index=True)  # Workers silent for a lease period count as dead
+
+class AccountLease(Base):
+    __tablename__ = 'account_leases'
+    
+    instagram_account_id = Column(Integer, ForeignKey('instagram_accounts.id'), primary_key=True)
+    worker_id = Column(String(64), index=True)  # NULL when free
+    acquired_at = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False)  # Renewed by the holder's heartbeat; free to take once past
 
 class DeploymentStatus(PyEnum):
     PENDING = "pending"
@@ -139,8 +432,56 @@ class Deployment(Base):
     status = Column(Enum(DeploymentStatus), default=DeploymentStatus.PENDING)
     build_logs = Column(Text)
     deployment_url = Column(String(500))
-    environment_variables = Column(Text)  # JSON string of env vars
+    environment_variables = Column(Text)  # JSON string of this deployment's own env vars; override its shared sets
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     coolify_config = relationship('CoolifyConfig', back_populates='deployments')
+
+class EnvironmentVariableSet(Base):
+    __tablename__ = 'environment_variable_sets'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    variables = Column(Text, nullable=False, default='{}')  # JSON object, shared by every deployment linked to the set
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DeploymentVariableSet(Base):
+    __tablename__ = 'deployment_variable_sets'
+    
+    deployment_id = Column(Integer, ForeignKey('deployments.id'), primary_key=True)
+    variable_set_id = Column(Integer, ForeignKey('environment_variable_sets.id'), primary_key=True, index=True)
+    position = Column(Integer, default=0)  # Later sets override earlier ones on the same key
+
+class DeploymentEnvironment(Base):
+    __tablename__ = 'deployment_environments'
+    
+    deployment_id = Column(Integer, ForeignKey('deployments.id'), primary_key=True)
+    applied = Column(Text, nullable=False)  # JSON of the variables Coolify last accepted; updates send the difference
+    applied_at = Column(DateTime)
+
+class DeploymentBatch(Base):
+    __tablename__ = 'deployment_batches'
+    
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20), default='queued')  # queued, running, finished
+    parallelism = Column(Integer)  # Pipelines in flight per Coolify config; NULL for COOLIFY_BULK_PARALLELISM
+    total = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    
+    items = relationship('DeploymentBatchItem', order_by='DeploymentBatchItem.deployment_id')
+
+class DeploymentBatchItem(Base):
+    __tablename__ = 'deployment_batch_items'
+    
+    batch_id = Column(Integer, ForeignKey('deployment_batches.id'), primary_key=True)
+    deployment_id = Column(Integer, ForeignKey('deployments.id'), primary_key=True)
+    step = Column(String(20), default='create')  # create, deploy, poll, done, failed
+    attempts = Column(Integer, default=0)  # Failed tries of the current step
+    last_error = Column(Text)
+    deploy_started_at = Column(DateTime)  # When the deploy was triggered; polling gives up COOLIFY_DEPLOY_TIMEOUT after
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
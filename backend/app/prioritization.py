@@ -0,0 +1,234 @@
+"""
+Per-campaign prospect priority queue.
+
+Each campaign scores eligible prospects (qualified, not yet messaged, not a
+near-duplicate of another prospect) with a weighted formula and keeps the
+scores in prospect_priorities, indexed on (campaign_id, score, prospect_id).
+Dispatchers pull the top-K straight off that index, and a run continues from
+the (score, prospect_id) of the last row it read, so each batch costs the same
+regardless of how many prospects are queued or already tried.
+
+A prospect matches a campaign's hashtags and target accounts on whole words of
+its bio or niche, or a few adjacent words run together ('life coach' matches
+#lifecoach).
+
+Scores are refreshed incrementally from prospects.updated_at; changing a
+campaign's weights, hashtags or target accounts, or a full lookalike rescore,
+triggers a full rebuild.
+"""
+import hashlib
+import json
+import math
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app import models
+
+DEFAULT_WEIGHTS = {
+    'coach_score': 1.0,
+    'value_score': 1.5,
+    'engagement_rate': 0.5,
+    'followers': 0.5,
+    'source_match': 1.0,
+    'lookalike': 1.0
+}
+STREAM_CHUNK_SIZE = 10000
+MAX_PHRASE_WORDS = 3
+SCORING_VERSION = 2  # Bump when score_prospect changes, so every queue is rebuilt
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+QueueCursor = Tuple[float, int]  # (score, prospect_id) of the last queue row read
+
+def _normalize(text: Optional[str]) -> str:
+    return _NON_ALNUM.sub('', (text or '').lower())
+
+def _phrases(words: List[str]) -> Set[str]:
+    """Each word, and each run of up to MAX_PHRASE_WORDS adjacent words joined together"""
+    return {''.join(words[start:start + size]) for size in range(1, MAX_PHRASE_WORDS + 1)
+            for start in range(len(words) - size + 1)}
+
+def prospect_phrases(bio: Optional[str], niche: Optional[str]) -> Set[str]:
+    """What campaign terms can match: phrases of the bio and of the niche, plus '<niche>coach'"""
+    niche_words = _WORD.findall((niche or '').lower())
+    phrases = _phrases(_WORD.findall((bio or '').lower())) | _phrases(niche_words)
+    if niche_words:
+        phrases.add(''.join(niche_words) + 'coach')
+    return phrases
+
+def campaign_weights(campaign: models.Campaign) -> Dict[str, float]:
+    weights = dict(DEFAULT_WEIGHTS)
+    if campaign.priority_weights:
+        # The API only accepts known numeric weights; rows saved before it checked are ignored, not fatal
+        try:
+            configured = json.loads(campaign.priority_weights)
+            weights.update({key: float(value) for key, value in configured.items() if key in DEFAULT_WEIGHTS})
+        except (AttributeError, TypeError, ValueError):
+            print(f"Ignoring invalid priority_weights on campaign {campaign.id}: {campaign.priority_weights!r}")
+    return weights
+
+def campaign_terms(campaign: models.Campaign) -> Set[str]:
+    """Normalized hashtags and target accounts a prospect's bio or niche can match"""
+    terms = {_normalize(link.hashtag) for link in campaign.hashtag_links}
+    terms |= {_normalize(link.username) for link in campaign.target_account_links}
+    return {term for term in terms if term}
+
+def _signature(weights: Dict[str, float], terms: Set[str], lookalike_generation: int) -> str:
+    payload = json.dumps({'weights': weights, 'terms': sorted(terms), 'lookalike': lookalike_generation,
+                          'scoring': SCORING_VERSION}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def score_prospect(coach_score, value_score, engagement_rate, followers, bio, niche,
+                   weights: Dict[str, float], terms: Set[str], lookalike_score: float = None) -> float:
+    """Weighted sum of features each scaled to roughly 0..1"""
+    followers_feature = 0.0
+    if followers and followers > 0:
+        # 10K -> 0, 100K -> 1, the sweet spot for our offer
+        followers_feature = min(1.0, max(0.0, math.log10(followers) - 4.0))
+
+    source_match = 0.0
+    if terms and not terms.isdisjoint(prospect_phrases(bio, niche)):
+        source_match = 1.0
+
+    return (
+        weights['coach_score'] * min(1.0, (coach_score or 0.0) / 10.0)
+        + weights['value_score'] * min(1.0, (value_score or 0.0) / 10.0)
+        + weights['engagement_rate'] * min(1.0, (engagement_rate or 0.0) / 10.0)
+        + weights['followers'] * followers_feature
+        + weights['source_match'] * source_match
+        + weights['lookalike'] * (lookalike_score or 0.0)
+    )
+
+def _eligible(query):
+    return query.filter(
+        models.Prospect.status == models.ProspectStatus.QUALIFIED,
+        models.Prospect.dm_sent == False,
+        models.Prospect.duplicate_of_id.is_(None)
+    )
+
+def refresh_campaign_queue(db: Session, campaign: models.Campaign) -> Dict:
+    """Bring a campaign's priority rows up to date; does not commit"""
+    weights = campaign_weights(campaign)
+    terms = campaign_terms(campaign)
+    from app import lookalike  # numpy; only needed once a queue is refreshed
+    signature = _signature(weights, terms, lookalike.current_generation(db))
+
+    state = db.query(models.CampaignQueueState).get(campaign.id)
+    full = not state or state.config_signature != signature
+    started_at = datetime.utcnow()
+
+    if full:
+        db.query(models.ProspectPriority).filter(
+            models.ProspectPriority.campaign_id == campaign.id
+        ).delete(synchronize_session=False)
+        changed = db.query(models.Prospect.id)
+    else:
+        changed = db.query(models.Prospect.id).filter(models.Prospect.updated_at > state.refreshed_at)
+
+        # Drop rows for prospects that changed and may no longer be eligible; eligible ones are re-added below
+        changed_ids = [prospect_id for prospect_id, in changed.yield_per(STREAM_CHUNK_SIZE)]
+        for offset in range(0, len(changed_ids), 900):
+            db.query(models.ProspectPriority).filter(
+                models.ProspectPriority.campaign_id == campaign.id,
+                models.ProspectPriority.prospect_id.in_(changed_ids[offset:offset + 900])
+            ).delete(synchronize_session=False)
+
+    candidates = _eligible(db.query(
+        models.Prospect.id,
+        models.Prospect.coach_score,
+        models.Prospect.value_score,
+        models.Prospect.engagement_rate,
+        models.Prospect.followers,
+        models.Prospect.bio,
+        models.Prospect.niche,
+        models.Prospect.lookalike_score
+    ))
+    if not full:
+        candidates = candidates.filter(models.Prospect.updated_at > state.refreshed_at)
+
+    scored = 0
+    rows = []
+    for prospect_id, coach_score, value_score, engagement_rate, followers, bio, niche, lookalike_score in candidates.yield_per(STREAM_CHUNK_SIZE):
+        rows.append({
+            'campaign_id': campaign.id,
+            'prospect_id': prospect_id,
+            'score': score_prospect(coach_score, value_score, engagement_rate, followers, bio, niche, weights, terms,
+                                    lookalike_score),
+            'computed_at': started_at
+        })
+        if len(rows) >= STREAM_CHUNK_SIZE:
+            db.bulk_insert_mappings(models.ProspectPriority, rows)
+            scored += len(rows)
+            rows = []
+    if rows:
+        db.bulk_insert_mappings(models.ProspectPriority, rows)
+        scored += len(rows)
+
+    if not state:
+        state = models.CampaignQueueState(campaign_id=campaign.id)
+        db.add(state)
+    state.refreshed_at = started_at
+    state.config_signature = signature
+    db.flush()
+
+    return {'full_rebuild': full, 'scored': scored}
+
+def top_candidates(db: Session, campaign_id: int, limit: int,
+                   after: Optional[QueueCursor] = None) -> List[Tuple[models.Prospect, QueueCursor]]:
+    """
+    Highest-priority eligible prospects for a campaign with each one's queue
+    cursor, read off the (campaign_id, score, prospect_id) index. With `after`,
+    the queue continues below that cursor.
+    """
+    if limit <= 0:
+        return []
+    query = _eligible(db.query(models.Prospect, models.ProspectPriority.score).join(
+        models.ProspectPriority, models.ProspectPriority.prospect_id == models.Prospect.id
+    ).filter(models.ProspectPriority.campaign_id == campaign_id))
+    if after is not None:
+        query = query.filter(tuple_(models.ProspectPriority.score, models.ProspectPriority.prospect_id) < tuple_(*after))
+
+    rows = query.order_by(models.ProspectPriority.score.desc(), models.ProspectPriority.prospect_id.desc()).limit(limit)
+    return [(prospect, (score, prospect.id)) for prospect, score in rows]
+
+def claim_prospects(db: Session, prospect_ids: Iterable[int]) -> List[int]:
+    """
+    Mark prospects as being messaged (dm_sent) ahead of a send so no other worker
+    or campaign can pick them; returns the ids this call won. On Postgres the
+    unsent ones are locked FOR UPDATE SKIP LOCKED and claimed in one update, so
+    racing dispatchers split a batch instead of queueing on each other's rows.
+    Elsewhere each claim is a conditional update, so of two racing dispatchers
+    only one gets a prospect. Unsent claims are released by
+    send_journal.apply_results. Does not commit.
+    """
+    now = datetime.utcnow()
+    if db.get_bind().dialect.name == 'postgresql':
+        claimed = [prospect_id for prospect_id, in db.query(models.Prospect.id).filter(
+            models.Prospect.id.in_(list(prospect_ids)),
+            models.Prospect.dm_sent == False
+        ).order_by(models.Prospect.id).with_for_update(skip_locked=True)]
+        if claimed:
+            db.query(models.Prospect).filter(models.Prospect.id.in_(claimed)).update(
+                {'dm_sent': True, 'updated_at': now}, synchronize_session='evaluate')
+    else:
+        claimed = []
+        for prospect_id in prospect_ids:
+            if db.query(models.Prospect).filter(
+                models.Prospect.id == prospect_id,
+                models.Prospect.dm_sent == False
+            ).update({'dm_sent': True, 'updated_at': now}, synchronize_session='evaluate'):
+                claimed.append(prospect_id)
+    dequeue_prospects(db, claimed)
+    return claimed
+
+def dequeue_prospects(db: Session, prospect_ids: Iterable[int]):
+    """Remove messaged prospects from every campaign's queue; does not commit"""
+    prospect_ids = list(prospect_ids)
+    for offset in range(0, len(prospect_ids), 900):
+        db.query(models.ProspectPriority).filter(
+            models.ProspectPriority.prospect_id.in_(prospect_ids[offset:offset + 900])
+        ).delete(synchronize_session=False)
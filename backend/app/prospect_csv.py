@@ -0,0 +1,176 @@
+"""
+Bulk prospect import and export as CSV.
+
+On Postgres both directions go through COPY. An import is COPYed into a
+temporary staging table of text columns, then moved into prospects with one
+INSERT ... SELECT ... ON CONFLICT (username). An export is a COPY of the
+filtered SELECT straight to the output file. Elsewhere (SQLite) an import is
+chunked executemany through crud.upsert_prospects, and an export streams the
+same SELECT through csv.writer.
+
+Imports follow the scraper's rules. Rows are keyed on username and need
+followers. New prospects start as discovered and are indexed for
+near-duplicates. Existing ones only get the SCRAPED_STAT_FIELDS the file
+carries refreshed. Columns outside IMPORT_FIELDS are ignored, so an export
+can be re-imported as is.
+
+    POST /api/prospects/import      (multipart file)
+    GET  /api/prospects/export?status=qualified&niche=fitness
+"""
+import csv
+from datetime import datetime
+from typing import Dict, List, Optional, TextIO
+
+from sqlalchemy import Integer, Numeric, String, cast, column, func, literal_column, select, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import crud, models
+
+IMPORT_FIELDS = ('username', 'full_name', 'followers', 'following', 'posts_count', 'engagement_rate', 'bio',
+                 'niche', 'profile_url', 'profile_pic_url')
+REQUIRED_FIELDS = ('username', 'followers')
+EXPORT_FIELDS = ('id', 'username', 'full_name', 'followers', 'following', 'posts_count', 'engagement_rate', 'bio',
+                 'niche', 'status', 'coach_score', 'value_score', 'dm_sent', 'response_received', 'profile_url',
+                 'profile_pic_url', 'created_at')
+IMPORT_CHUNK_SIZE = 5000
+STAGING_TABLE = 'prospect_import'
+
+def _postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == 'postgresql'
+
+def _read_header(source: TextIO) -> List[str]:
+    header = [name.strip().lower() for name in next(csv.reader([source.readline()]), [])]
+    missing = [field for field in REQUIRED_FIELDS if field not in header]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return header
+
+def _refreshed(header: List[str]) -> List[str]:
+    return [field for field in crud.SCRAPED_STAT_FIELDS if field in header]
+
+def _convert(field: str, value: str):
+    value = value.strip()
+    if value == '':
+        return None
+    python_type = models.Prospect.__table__.c[field].type.python_type
+    return python_type(float(value)) if python_type is int else python_type(value)
+
+def _import_rows(db: Session, source: TextIO, header: List[str]) -> Dict[str, int]:
+    positions = {field: header.index(field) for field in IMPORT_FIELDS if field in header}
+    refresh = _refreshed(header)
+    totals = {'rows': 0, 'created': 0, 'updated': 0}
+
+    def flush(chunk):
+        created = len(crud.upsert_prospects(db, chunk, refresh=refresh))
+        totals['rows'] += len(chunk)
+        totals['created'] += created
+        totals['updated'] += len(chunk) - created
+
+    chunk = []
+    for record in csv.reader(source):
+        if not record or len(record) < len(header):
+            continue
+        row = {field: _convert(field, record[position]) for field, position in positions.items()}
+        if not row['username'] or row['followers'] is None:
+            continue
+        chunk.append(row)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return totals
+
+def _import_copy(db: Session, source: TextIO, header: List[str]) -> Dict[str, int]:
+    # Staging columns are positional (c0, c1, ...) so nothing from the file ends up in SQL
+    staging = table(STAGING_TABLE, *[column(f'c{i}') for i in range(len(header))])
+    db.execute(text(f"CREATE TEMP TABLE {STAGING_TABLE} ({', '.join(f'c{i} text' for i in range(len(header)))}) ON COMMIT DROP"))
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {STAGING_TABLE} FROM STDIN WITH (FORMAT csv)", source)
+        copied = cursor.rowcount
+    finally:
+        cursor.close()
+
+    prospects = models.Prospect.__table__
+    fields = [field for field in IMPORT_FIELDS if field in header]
+    value = {}
+    for field in fields:
+        raw = func.nullif(func.trim(staging.c[f'c{header.index(field)}']), '')
+        if isinstance(prospects.c[field].type, Integer):
+            raw = cast(raw, Numeric)  # Accept '1200.0' the way the SQLite path does
+        value[field] = cast(raw, prospects.c[field].type)
+    now = datetime.utcnow()
+    defaults = {
+        'status': models.ProspectStatus.DISCOVERED,
+        'dm_sent': False,
+        'response_received': False,
+        'coach_score': 0.0,
+        'value_score': 0.0,
+        'created_at': now,
+        'updated_at': now
+    }
+    rows = select(*[value[field].label(field) for field in fields],
+                  *[cast(default, prospects.c[name].type).label(name) for name, default in defaults.items()]).where(
+        value['username'].isnot(None),
+        value['followers'].isnot(None)
+    ).distinct(value['username']).order_by(value['username'])
+
+    insert = pg_insert(prospects).from_select(fields + list(defaults), rows)
+    refresh = {field: insert.excluded[field] for field in _refreshed(header)}
+    results = db.execute(insert.on_conflict_do_update(
+        index_elements=['username'], set_={**refresh, 'updated_at': now}
+    ).returning(prospects.c.id, literal_column('xmax = 0'))).fetchall()
+
+    created_ids = [prospect_id for prospect_id, created in results if created]
+    from app import dedup
+    for offset in range(0, len(created_ids), 900):
+        dedup.index_prospects(db, db.query(models.Prospect).filter(
+            models.Prospect.id.in_(created_ids[offset:offset + 900])
+        ).all())
+    return {'rows': copied, 'created': len(created_ids), 'updated': len(results) - len(created_ids)}
+
+def import_csv(db: Session, source: TextIO) -> Dict[str, int]:
+    """
+    Upsert the prospects in a CSV text stream; returns rows read, created and
+    updated. Raises ValueError when a required column is missing. Does not commit.
+    """
+    header = _read_header(source)
+    if _postgres(db):
+        return _import_copy(db, source, header)
+    return _import_rows(db, source, header)
+
+def export_query(status: Optional[str] = None, niche: Optional[str] = None):
+    prospect = models.Prospect
+    columns = {field: getattr(prospect, field) for field in EXPORT_FIELDS}
+    # Same text on both backends: the enum's value rather than its name, booleans as 0/1
+    columns['status'] = func.lower(cast(prospect.status, String))
+    for flag in ('dm_sent', 'response_received'):
+        columns[flag] = cast(getattr(prospect, flag), Integer)
+    query = select(*[expression.label(field) for field, expression in columns.items()]).order_by(prospect.id)
+    if status:
+        query = query.where(prospect.status == models.ProspectStatus(status))
+    if niche:
+        query = query.where(prospect.niche == niche)
+    return query
+
+def export_csv(db: Session, out: TextIO, status: Optional[str] = None, niche: Optional[str] = None) -> int:
+    """Write matching prospects as CSV with a header row; returns the number of prospects written"""
+    query = export_query(status, niche)
+    if _postgres(db):
+        sql = query.compile(dialect=db.get_bind().dialect, compile_kwargs={'literal_binds': True})
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", out)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_FIELDS)
+    written = 0
+    for rows in db.execute(query.execution_options(stream_results=True)).partitions(IMPORT_CHUNK_SIZE):
+        writer.writerows(rows)
+        written += len(rows)
+    return written
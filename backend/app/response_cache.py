@@ -0,0 +1,154 @@
+"""
+Response cache with ETags for the dashboard's list endpoints.
+
+Each table has an in-process version counter. Engine hooks note the tables
+every INSERT/UPDATE/DELETE touches and bump their versions when the
+transaction commits, so the CRUD create and update paths (and anything else
+writing through this process's engine) invalidate what they change.
+
+A cached response is the serialized JSON body plus an ETag built from the
+versions of the tables it was read from and a digest of the body. While those
+versions are unchanged the entry is served as is, and a request whose
+If-None-Match carries the ETag gets a 304 without touching the database.
+Entries also expire after RESPONSE_CACHE_TTL seconds, which bounds how stale
+a response can be when another process (a dispatch worker, another API
+worker) wrote the table. Bodies live in an LRU capped at
+RESPONSE_CACHE_MAX_BYTES.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import metrics
+
+CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+_WRITE = re.compile(r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`]?(\w+)', re.IGNORECASE)
+
+_versions: Dict[str, int] = defaultdict(int)
+_versions_lock = threading.Lock()
+
+def bump(*tables: str):
+    with _versions_lock:
+        for table in tables:
+            _versions[table] += 1
+
+def versions(tables: Iterable[str]) -> Tuple[int, ...]:
+    with _versions_lock:
+        return tuple(_versions[table] for table in tables)
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    match = _WRITE.match(statement)
+    if match:
+        conn.info.setdefault('response_cache_writes', set()).add(match.group(1).lower())
+
+@event.listens_for(Engine, 'commit')
+def _bump_written(conn):
+    bump(*conn.info.pop('response_cache_writes', ()))
+
+@event.listens_for(Engine, 'rollback')
+def _forget_written(conn):
+    conn.info.pop('response_cache_writes', None)
+
+class _Entry:
+    __slots__ = ('versions', 'etag', 'body', 'expires_at')
+
+    def __init__(self, versions: Tuple[int, ...], etag: str, body: bytes, expires_at: float):
+        self.versions = versions
+        self.etag = etag
+        self.body = body
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """LRU of serialized responses, evicting least recently used bodies beyond max_bytes"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, current: Tuple[int, ...], now: float = None) -> Optional[_Entry]:
+        now = now or time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.versions != current or entry.expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: _Entry):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(entry.body) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                metrics.RESPONSE_CACHE_EVICTIONS.labels().inc()
+            metrics.RESPONSE_CACHE_BYTES.labels().set(self.size)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
+        metrics.RESPONSE_CACHE_BYTES.labels().set(self.size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            metrics.RESPONSE_CACHE_BYTES.labels().set(0)
+
+cache = ResponseCache()
+
+def _etag(current: Tuple[int, ...], body: bytes) -> str:
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    return '"' + '.'.join(str(version) for version in current) + f'-{digest}"'
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+def _response(request: Request, etag: str, body: bytes) -> Response:
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+def cached_json(request: Request, endpoint: str, tables: Tuple[str, ...], load: Callable, adapter: TypeAdapter) -> Response:
+    """
+    Serve `load()` serialized with `adapter`, from the cache while `tables` are unchanged.
+    Versions are read before loading, so a write committed meanwhile invalidates the entry.
+    """
+    key = f'{request.url.path}?{request.url.query}'
+    current = versions(tables)
+    entry = cache.get(key, current)
+    if entry is not None:
+        response = _response(request, entry.etag, entry.body)
+        metrics.RESPONSE_CACHE_REQUESTS.labels(endpoint, 'not_modified' if response.status_code == 304 else 'hit').inc()
+        return response
+
+    body = adapter.dump_json(adapter.validate_python(load(), from_attributes=True))
+    etag = _etag(current, body)
+    cache.put(key, _Entry(current, etag, body, time.monotonic() + cache.ttl))
+    metrics.RESPONSE_CACHE_REQUESTS.labels(endpoint, 'miss').inc()
+    return _response(request, etag, body)
@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Json
-from typing import List, Optional
+import json
+
+from pydantic import BaseModel, Field, FiniteFloat, Json, field_validator
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 
+from app.prioritization import DEFAULT_WEIGHTS
+
 class ProspectStatus(str, Enum):
     DISCOVERED = "discovered"
     QUALIFIED = "qualified"
@@ -48,12 +52,20 @@ class ProspectCreate(ProspectBase):
 
 class Prospect(ProspectBase):
     id: int
+    duplicate_of_id: Optional[int] = None
+    lookalike_score: Optional[float] = None
+    thumbnail_digest: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+class ProspectImportResult(BaseModel):
+    rows: int
+    created: int
+    updated: int
+
 class CampaignBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -65,9 +77,30 @@ class CampaignBase(BaseModel):
     responses_received: Optional[int] = 0
     conversions: Optional[int] = 0
     daily_limit: Optional[int] = 50
+    priority_weights: Optional[Json] = None
+    follow_up_delay_hours: Optional[int] = 72
+
+def _reject_constant(name: str):
+    raise ValueError(f"{name} is not a number")
 
 class CampaignCreate(CampaignBase):
-    pass
+    hashtags: Optional[Json[List[str]]] = None
+    target_accounts: Optional[Json[List[str]]] = None
+    priority_weights: Optional[Dict[str, FiniteFloat]] = None
+
+    @field_validator('priority_weights', mode='before')
+    @classmethod
+    def parse_weights(cls, value):
+        # JSON text like the other Json fields, minus NaN/Infinity: the 422 echoes the parsed input and can't encode them
+        return json.loads(value, parse_constant=_reject_constant) if isinstance(value, str) else value
+
+    @field_validator('priority_weights')
+    @classmethod
+    def known_weights(cls, weights):
+        unknown = sorted(set(weights or {}) - set(DEFAULT_WEIGHTS))
+        if unknown:
+            raise ValueError(f"unknown weight(s) {', '.join(unknown)}; expected {', '.join(DEFAULT_WEIGHTS)}")
+        return weights
 
 class Campaign(CampaignBase):
     id: int
@@ -117,15 +150,22 @@ class InstagramAccountBase(BaseModel):
     is_active: Optional[bool] = True
     daily_limit: Optional[int] = 40
     account_status: Optional[str] = 'active'
+    active_hours_start: Optional[int] = 9
+    active_hours_end: Optional[int] = 21
 
 class InstagramAccountCreate(InstagramAccountBase):
-    pass
+    active_hours_start: Optional[int] = Field(9, ge=0, le=24)
+    active_hours_end: Optional[int] = Field(21, ge=0, le=24)
 
 class InstagramAccount(InstagramAccountBase):
     id: int
     daily_messages_sent: int
     last_activity: Optional[datetime] = None
     last_reset_date: Optional[datetime] = None
+    current_batch_size: Optional[int] = None
+    current_delay_seconds: Optional[float] = None
+    failure_rate: Optional[float] = None
+    cooldown_until: Optional[datetime] = None
     created_at: datetime
 
     class Config:
@@ -170,6 +210,157 @@ class Deployment(DeploymentBase):
     class Config:
         from_attributes = True
 
+class EnvironmentVariableSetCreate(BaseModel):
+    name: str
+    variables: Dict[str, str] = {}
+
+class EnvironmentVariableSet(BaseModel):
+    id: int
+    name: str
+    variables: Json
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class EnvironmentVariableSetUpdate(BaseModel):
+    values: Dict[str, str] = {}  # Keys to add or change
+    unset: List[str] = []  # Keys to remove
+
+class DeploymentVariableSets(BaseModel):
+    variable_set_ids: List[int]  # Later sets override earlier ones on the same key
+
+class EnvironmentPushResult(BaseModel):
+    deployment_id: int
+    name: str
+    status: str  # updated, unchanged, failed, not_deployed
+    changed: List[str] = []  # Keys sent; values are never echoed back
+    removed: List[str] = []
+    error: Optional[str] = None
+
+class EnvironmentFanOut(BaseModel):
+    variable_set_id: Optional[int] = None
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[EnvironmentPushResult]
+
+class BulkDeploymentRequest(BaseModel):
+    deployment_ids: List[int] = []  # Existing deployments to (re)deploy
+    deployments: List[DeploymentCreate] = []  # New deployments to create and deploy
+    parallelism: Optional[int] = None  # Calls in flight per Coolify config; COOLIFY_BULK_PARALLELISM if unset
+
+class DeploymentBatchItem(BaseModel):
+    deployment_id: int
+    step: str
+    attempts: int
+    last_error: Optional[str] = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class DeploymentBatch(BaseModel):
+    id: int
+    status: str
+    parallelism: Optional[int] = None
+    total: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    items: List[DeploymentBatchItem] = []
+
+    class Config:
+        from_attributes = True
+
+class RollupBucket(BaseModel):
+    bucket_start: datetime
+    sent: int
+    responded: int
+    converted: int
+    response_rate: float
+    conversion_rate: float
+    median_response_seconds: Optional[float] = None
+
+class DailyMessages(BaseModel):
+    date: str
+    messages: int
+
+class NicheCount(BaseModel):
+    niche: str
+    count: int
+
+class PerformanceAnalytics(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    buckets: List[RollupBucket]
+    daily_messages: List[DailyMessages]
+    niche_distribution: List[NicheCount]
+
+class SourcePerformance(BaseModel):
+    source_type: str
+    source: str
+    prospects: int
+    qualified: int
+    messaged: int
+    responded: int
+    converted: int
+    response_rate: float
+    conversion_rate: float
+
+class ScrapeRequest(BaseModel):
+    source: str  # Hashtag or competitor username
+    limit: Optional[int] = 1000
+
+class ScrapeCursor(BaseModel):
+    source_type: str
+    source: str
+    newest_marker: Optional[str] = None
+    dataset_offset: Optional[int] = 0
+    items_fetched: Optional[int] = 0
+    prospects_added: Optional[int] = 0
+    last_status: Optional[str] = None
+    last_run_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class InboxCursor(BaseModel):
+    instagram_account_id: int
+    newest_marker: Optional[str] = None
+    threads_seen: Optional[int] = 0
+    replies_recorded: Optional[int] = 0
+    last_status: Optional[str] = None
+    last_synced_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class MessageArchive(BaseModel):
+    month: str
+    messages: int
+    first_sent_at: Optional[datetime] = None
+    last_sent_at: Optional[datetime] = None
+    archived_before: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ArchivedMessage(BaseModel):
+    id: int
+    prospect_id: int
+    campaign_id: int
+    instagram_account_id: Optional[int] = None
+    content: str
+    template_variant: Optional[str] = None
+    message_type: Optional[str] = None
+    sent_at: datetime
+    response_at: Optional[datetime] = None
+    response_content: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,283 @@
+"""
+Prospect discovery from hashtags and competitor followers via Apify profile scrapers.
+
+Each source (a hashtag or a competitor account) has a ScrapeCursor. A scrape
+runs the source's actor, then streams the run's dataset PAGE_SIZE items at a
+time instead of loading it whole. Profiles go through crud.upsert_prospects in
+chunks of UPSERT_CHUNK_SIZE, and the cursor's dataset offset is committed after
+every chunk, so an interrupted scrape resumes where it stopped without paying
+for another actor run. When a run is fully consumed, its newest item becomes
+the cursor's marker:
+
+    hashtag     items are posts with a timestamp; the next run asks the actor
+                for posts newer than the marker and drops anything older
+    followers   followers come newest first; the next run stops at the marker
+
+Every prospect a source turns up gets a prospect_sources row, which is what
+the per-source yield analytics group by. Profiles already in prospects go
+through the same upsert, which refreshes their follower stats, and get a row
+for the new source next to the ones they have; the prospect_sources primary
+key keeps a source from being recorded twice. Telling new profiles from known
+ones is an IN query on the unique username index per chunk, so a scrape never
+reads the whole prospects table.
+
+    python -m app.scraper hashtag lifecoach --limit 500
+    python -m app.scraper followers some_competitor
+    python -m app.scraper campaign 3
+"""
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.metrics import track_outbound
+
+PAGE_SIZE = 500
+UPSERT_CHUNK_SIZE = 1000
+DEFAULT_LIMIT = 1000
+SOURCE_TYPES = ('hashtag', 'followers')
+
+def normalize_source(source_type: str, source: str) -> str:
+    return models.normalize_hashtag(source) if source_type == 'hashtag' else models.normalize_username(source)
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def profile_from_item(item: Dict) -> Optional[Dict]:
+    """Map one scraper dataset item onto prospect columns; hashtag items carry the post's owner"""
+    username = item.get('username') or item.get('ownerUsername')
+    if not username:
+        return None
+    username = username.strip().lower()
+    return {
+        'username': username,
+        'full_name': item.get('fullName') or item.get('ownerFullName'),
+        'followers': _int(item.get('followersCount')) or 0,
+        'following': _int(item.get('followsCount')),
+        'posts_count': _int(item.get('postsCount')),
+        'bio': item.get('biography'),
+        'profile_url': item.get('url') or f'https://instagram.com/{username}',
+        'profile_pic_url': item.get('profilePicUrl')
+    }
+
+def apify_client_from_env():
+    token = os.getenv('APIFY_API_TOKEN')
+    if not token:
+        raise ValueError("APIFY_API_TOKEN environment variable is required")
+    from apify_client import ApifyClient
+    return ApifyClient(token)
+
+class ProspectScraper:
+
+    def __init__(self, db: Session, apify_client=None, page_size: int = PAGE_SIZE,
+                 chunk_size: int = UPSERT_CHUNK_SIZE):
+        self.db = db
+        self.apify_client = apify_client or apify_client_from_env()
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.actors = {
+            'hashtag': os.getenv('APIFY_HASHTAG_ACTOR_ID', 'apify/instagram-hashtag-scraper'),
+            'followers': os.getenv('APIFY_FOLLOWERS_ACTOR_ID', 'apify/instagram-followers-scraper')
+        }
+        self.min_followers = int(os.getenv('SCRAPE_MIN_FOLLOWERS', 10000))
+        self.max_followers = int(os.getenv('SCRAPE_MAX_FOLLOWERS', 100000))
+
+    def _cursor(self, source_type: str, source: str) -> models.ScrapeCursor:
+        cursor = self.db.query(models.ScrapeCursor).get((source_type, source))
+        if not cursor:
+            cursor = models.ScrapeCursor(source_type=source_type, source=source, dataset_offset=0,
+                                         items_fetched=0, prospects_added=0)
+            self.db.add(cursor)
+        return cursor
+
+    def _run_input(self, source_type: str, source: str, cursor: models.ScrapeCursor, limit: int) -> Dict:
+        if source_type == 'hashtag':
+            run_input = {'hashtags': [source], 'resultsLimit': limit}
+            if cursor.newest_marker:
+                run_input['onlyPostsNewerThan'] = cursor.newest_marker
+            return run_input
+        return {'usernames': [source], 'resultsLimit': limit}
+
+    def _start_run(self, source_type: str, source: str, cursor: models.ScrapeCursor, limit: int) -> bool:
+        run_input = self._run_input(source_type, source, cursor, limit)
+        with track_outbound('apify', f'scrape_{source_type}'):
+            run = self.apify_client.actor(self.actors[source_type]).call(run_input=run_input)
+
+        if not run or run.get('status') != 'SUCCEEDED':
+            cursor.last_status = 'failed'
+            self.db.commit()
+            print(f"Scrape of {source_type} '{source}' failed: {run.get('status') if run else 'no run'}")
+            return False
+
+        cursor.dataset_id = run['defaultDatasetId']
+        cursor.dataset_offset = 0
+        cursor.pending_marker = None
+        cursor.last_status = 'running'
+        self.db.commit()
+        return True
+
+    def _is_new_item(self, source_type: str, item: Dict, cursor: models.ScrapeCursor) -> Optional[bool]:
+        """False to skip the item, None to stop streaming (reached the previous run's newest item)"""
+        if source_type == 'hashtag':
+            timestamp = item.get('timestamp')
+            if timestamp and (not cursor.pending_marker or timestamp > cursor.pending_marker):
+                cursor.pending_marker = timestamp
+            return not (cursor.newest_marker and timestamp and timestamp <= cursor.newest_marker)
+
+        username = (item.get('username') or '').lower()
+        if cursor.pending_marker is None:
+            cursor.pending_marker = username
+        if cursor.newest_marker and username == cursor.newest_marker:
+            return None
+        return True
+
+    def _in_range(self, profile: Dict) -> bool:
+        return self.min_followers <= profile['followers'] <= self.max_followers
+
+    def _link_source(self, usernames: List[str], cursor: models.ScrapeCursor):
+        """Record the cursor's source for these prospects, new or known; sources they already have are kept"""
+        links = models.ProspectSource.__table__
+        insert = crud._insert_for(self.db)(links)
+        now = datetime.utcnow()
+        for offset in range(0, len(usernames), 900):
+            prospect_ids = [prospect_id for prospect_id, in self.db.query(models.Prospect.id).filter(
+                models.Prospect.username.in_(usernames[offset:offset + 900]))]
+            if prospect_ids:
+                self.db.execute(insert.on_conflict_do_nothing(), [{
+                    'prospect_id': prospect_id,
+                    'source_type': cursor.source_type,
+                    'source': cursor.source,
+                    'first_seen_at': now
+                } for prospect_id in prospect_ids])
+
+    def _flush(self, pending: Dict[str, Dict], cursor: models.ScrapeCursor, offset: int) -> Tuple[int, int]:
+        """Upsert the pending profiles and link them to the source; returns (created, refreshed)"""
+        created = crud.upsert_prospects(self.db, list(pending.values())) if pending else []
+        if pending:
+            self._link_source(list(pending), cursor)
+        cursor.dataset_offset = offset
+        cursor.prospects_added = (cursor.prospects_added or 0) + len(created)
+        self.db.commit()
+        refreshed = len(pending) - len(created)
+        pending.clear()
+        return len(created), refreshed
+
+    def scrape(self, source_type: str, source: str, limit: int = DEFAULT_LIMIT) -> Dict:
+        """Run (or resume) one source and stream its dataset into prospects"""
+        if source_type not in SOURCE_TYPES:
+            raise ValueError(f"Unknown source type: {source_type}")
+        source = normalize_source(source_type, source)
+        cursor = self._cursor(source_type, source)
+        cursor.last_run_at = datetime.utcnow()
+
+        resumed = bool(cursor.dataset_id)
+        if not resumed and not self._start_run(source_type, source, cursor, limit):
+            return {'source_type': source_type, 'source': source, 'status': 'failed', 'fetched': 0, 'added': 0}
+
+        dataset = self.apify_client.dataset(cursor.dataset_id)
+        offset = cursor.dataset_offset or 0
+        fetched = added = refreshed = 0
+        pending: Dict[str, Dict] = {}
+        reached_marker = False
+
+        while not reached_marker:
+            with track_outbound('apify', 'list_items'):
+                page = dataset.list_items(offset=offset, limit=self.page_size)
+            items = page.items or []
+            if not items:
+                break
+
+            profiles = []
+            for item in items:
+                is_new = self._is_new_item(source_type, item, cursor)
+                if is_new is None:
+                    reached_marker = True
+                    break
+                profile = profile_from_item(item) if is_new else None
+                if profile and self._in_range(profile):
+                    profiles.append(profile)
+
+            fetched += len(items)
+            offset += len(items)
+            pending.update((profile['username'], profile) for profile in profiles)
+
+            if len(pending) >= self.chunk_size:
+                created, updated = self._flush(pending, cursor, offset)
+                added += created
+                refreshed += updated
+            if len(items) < self.page_size:
+                break
+
+        created, updated = self._flush(pending, cursor, offset)
+        added += created
+        refreshed += updated
+        cursor.items_fetched = (cursor.items_fetched or 0) + fetched
+        cursor.newest_marker = cursor.pending_marker or cursor.newest_marker
+        cursor.pending_marker = None
+        cursor.dataset_id = None
+        cursor.dataset_offset = 0
+        cursor.last_status = 'completed'
+        self.db.commit()
+
+        return {
+            'source_type': source_type,
+            'source': source,
+            'status': 'completed',
+            'resumed': resumed,
+            'fetched': fetched,
+            'added': added,
+            'refreshed': refreshed
+        }
+
+    def scrape_hashtag(self, hashtag: str, limit: int = DEFAULT_LIMIT) -> Dict:
+        return self.scrape('hashtag', hashtag, limit)
+
+    def scrape_followers(self, username: str, limit: int = DEFAULT_LIMIT) -> Dict:
+        return self.scrape('followers', username, limit)
+
+    def scrape_campaign(self, campaign: models.Campaign, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+        """Scrape every hashtag and target account configured on a campaign"""
+        results = [self.scrape('hashtag', link.hashtag, limit) for link in campaign.hashtag_links]
+        results += [self.scrape('followers', link.username, limit) for link in campaign.target_account_links]
+        return results
+
+def run_scrape(source_type: str, source: str, limit: int = DEFAULT_LIMIT):
+    """Background-task entry point: scrapes with its own session"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(ProspectScraper(db).scrape(source_type, source, limit))
+    except Exception as e:
+        print(f"Scrape of {source_type} '{source}' failed: {str(e)}")
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Scrape prospects from hashtags and competitor followers')
+    parser.add_argument('source_type', choices=SOURCE_TYPES + ('campaign',))
+    parser.add_argument('source', help='hashtag, competitor username, or campaign id')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        scraper = ProspectScraper(db)
+        if args.source_type == 'campaign':
+            campaign = db.query(models.Campaign).get(int(args.source))
+            if not campaign:
+                parser.error(f"Campaign {args.source} not found")
+            for result in scraper.scrape_campaign(campaign, args.limit):
+                print(result)
+        else:
+            print(scraper.scrape(args.source_type, args.source, args.limit))
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+"""
+Full-text search over prospect bios.
+
+On SQLite, bios are indexed by the prospects_fts FTS5 table (an external-content
+index over prospects, kept in sync by the triggers in app.models) and results are
+ranked by BM25. Other databases fall back to a case-insensitive LIKE.
+
+Query syntax accepted on ?q=:
+    high ticket         both words, any order
+    "high ticket"       exact phrase
+    mentor*             prefix
+    coach OR mentor     either word
+"""
+import re
+
+from sqlalchemy import column, func, literal_column, table
+from sqlalchemy.exc import OperationalError
+
+from app import models
+
+FTS_TABLE = 'prospects_fts'
+_TOKEN = re.compile(r'"[^"]*"|\S+')
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+prospects_fts = table(FTS_TABLE, column('rowid'))
+
+class SearchQueryError(ValueError):
+    pass
+
+def fts_enabled(bind) -> bool:
+    return bind.dialect.name == 'sqlite'
+
+def build_match_query(q: str) -> str:
+    """
+    Turn user input into an FTS5 MATCH expression. Bare words are quoted so
+    punctuation like '1:1' or 'DM-me' can't be read as FTS syntax; phrases,
+    trailing-* prefixes and OR are passed through.
+    """
+    terms = []
+    for token in _TOKEN.findall(q or ''):
+        if token == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append(token)
+            continue
+        prefix = token.endswith('*')
+        words = _WORD.findall(token.strip('"').rstrip('*'))
+        if not words:
+            continue
+        term = '"%s"' % ' '.join(words)
+        terms.append(term + '*' if prefix else term)
+
+    while terms and terms[-1] == 'OR':
+        terms.pop()
+    if not terms:
+        raise SearchQueryError("Search query has no searchable words")
+    return ' '.join(terms)
+
+def apply_bio_search(query, q: str):
+    """Restrict a Prospect query to bios matching q, best matches first"""
+    bind = query.session.get_bind()
+    if not fts_enabled(bind):
+        pattern = '%' + q.strip().strip('"').rstrip('*') + '%'
+        return query.filter(models.Prospect.bio.ilike(pattern))
+
+    return query.join(
+        prospects_fts, prospects_fts.c.rowid == models.Prospect.id
+    ).filter(
+        literal_column(FTS_TABLE).op('MATCH')(build_match_query(q))
+    ).order_by(func.bm25(literal_column(FTS_TABLE)))
+
+def run_search(query):
+    """Execute a search query, turning FTS syntax errors into SearchQueryError"""
+    try:
+        return query.all()
+    except OperationalError as e:
+        if 'fts5' in str(e.orig).lower():
+            query.session.rollback()
+            raise SearchQueryError(str(e.orig))
+        raise
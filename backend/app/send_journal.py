@@ -0,0 +1,193 @@
+"""
+Write-ahead journal for DM batches.
+
+Every batch the bot sends is written to send_batches and committed before the
+Apify actor is started (status 'pending'), again as soon as the run exists
+('started', with the run id), and its outcome - Message rows, prospect and
+follow-up updates, queue removal, campaign and account counters - is committed
+in one short transaction right after the batch ('completed'). A crash therefore
+loses at most the batch in flight, and that batch is still in the journal.
+
+recover_pending() reconciles whatever a crashed run left behind: started
+batches are settled from their actor run's dataset, so the DMs that went out
+are recorded and nobody is messaged twice; batches that never got a run id
+were never sent and are abandoned, returning their follow-ups to the schedule.
+Outcomes are applied behind a conditional status update, so a batch is only
+ever recorded once even if recovery and the original sender race. Prospects
+in an initial batch were claimed (prioritization.claim_prospects) when it was
+opened; the ones it failed to reach are released back to the queues.
+
+    python -m app.send_journal     reconcile unfinished batches
+"""
+import json
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import message_content, models
+from app.follow_ups import finish_follow_ups, schedule_follow_ups
+from app.metrics import track_outbound
+from app.prioritization import dequeue_prospects
+
+OPEN_STATUSES = ('pending', 'started')
+
+Target = Tuple[models.Prospect, Optional[int]]
+
+def open_batch(db: Session, campaign_id: int, account_id: Optional[int], message_type: str, content: str,
+               template_variant: str, targets: List[Target]) -> models.SendBatch:
+    """
+    Journal the intent to send `content` to each (prospect, follow_up_of message id)
+    target. The caller commits before sending.
+    """
+    batch = models.SendBatch(
+        campaign_id=campaign_id,
+        instagram_account_id=account_id,
+        message_type=message_type,
+        content=content,
+        template_variant=template_variant,
+        targets=json.dumps([
+            {'prospect_id': prospect.id, 'username': prospect.username, 'follow_up_of': follow_up_of}
+            for prospect, follow_up_of in targets
+        ]),
+        status='pending'
+    )
+    db.add(batch)
+    db.flush()
+    return batch
+
+def usernames(batch: models.SendBatch) -> List[str]:
+    return [target['username'] for target in json.loads(batch.targets)]
+
+def dm_results(apify_client, run: Optional[Dict], batch_usernames: List[str]) -> Dict[str, bool]:
+    """Per-username success map from a finished DM actor run; a failed run fails everyone"""
+    results = {}
+    if run and run.get('status') == 'SUCCEEDED':
+        with track_outbound('apify', 'list_items'):
+            dataset_items = apify_client.dataset(run['defaultDatasetId']).list_items().items
+
+        for item in dataset_items:
+            username = item.get('username')
+            status = item.get('status')
+            if username:
+                results[username] = status == 'success'
+                if status == 'success':
+                    print(f"Message sent successfully to {username}")
+                else:
+                    print(f"Failed to send message to {username}: {status}")
+    else:
+        print(f"Apify actor run failed: {run.get('status') if run else 'No run data'}")
+        for username in batch_usernames:
+            results[username] = False
+    return results
+
+def apply_results(db: Session, batch: models.SendBatch, results: Dict[str, bool], sent_at: datetime = None,
+                  status: str = 'completed') -> int:
+    """
+    Record a batch's outcome and close it; returns how many DMs went out. Returns 0
+    without touching anything if the batch was already closed. Does not commit.
+    """
+    closed = db.query(models.SendBatch).filter(
+        models.SendBatch.id == batch.id,
+        models.SendBatch.status.in_(OPEN_STATUSES)
+    ).update({'status': status, 'completed_at': datetime.utcnow()}, synchronize_session=False)
+    if not closed:
+        return 0
+
+    sent_at = sent_at or datetime.utcnow()
+    targets = json.loads(batch.targets)
+    prospects = {prospect.id: prospect for prospect in db.query(models.Prospect).filter(
+        models.Prospect.id.in_([target['prospect_id'] for target in targets])
+    )}
+
+    # Every DM in a batch has the same text, stored as a template reference where possible
+    content = message_content.reference(db, batch.content, batch.template_variant)
+    sent = {}
+    for target in targets:
+        prospect = prospects.get(target['prospect_id'])
+        if not prospect:
+            continue
+        if not results.get(target['username'], False):
+            if batch.message_type == 'initial':
+                # Release the dispatch claim; the updated_at bump puts them back in the queues
+                prospect.dm_sent = False
+                prospect.updated_at = datetime.utcnow()
+            continue
+        if batch.message_type == 'initial':
+            prospect.dm_sent = True
+            prospect.dm_sent_at = sent_at
+            prospect.status = models.ProspectStatus.MESSAGED
+        message = models.Message(
+            prospect_id=prospect.id,
+            campaign_id=batch.campaign_id,
+            instagram_account_id=batch.instagram_account_id,
+            template_variant=batch.template_variant,
+            message_type=batch.message_type,
+            sent_at=sent_at,
+            **content
+        )
+        db.add(message)
+        sent[target['prospect_id']] = (target, message)
+    db.flush()
+
+    campaign = db.query(models.Campaign).get(batch.campaign_id)
+    if batch.message_type == 'follow_up':
+        claimed = [
+            (follow_up, prospects.get(follow_up.prospect_id))
+            for follow_up in db.query(models.FollowUp).filter(models.FollowUp.message_id.in_(
+                [target['follow_up_of'] for target in targets if target['follow_up_of']]
+            ))
+        ]
+        finish_follow_ups(db, claimed, {
+            target['follow_up_of']: message.id for target, message in sent.values() if target['follow_up_of']
+        }, now=sent_at)
+    else:
+        dequeue_prospects(db, sent.keys())
+        schedule_follow_ups(db, campaign, [message for _, message in sent.values()])
+
+    campaign.messages_sent = (campaign.messages_sent or 0) + len(sent)
+    batch.status = status
+    batch.sent_count = len(sent)
+    db.flush()
+    return len(sent)
+
+def _count_against_account(db: Session, account_id: Optional[int], sent: int, sent_on: date):
+    account = db.query(models.InstagramAccount).get(account_id) if account_id else None
+    if not account or not sent or sent_on != datetime.utcnow().date():
+        return
+    if account.last_reset_date < sent_on:
+        account.daily_messages_sent = 0
+        account.last_reset_date = sent_on
+    account.daily_messages_sent += sent
+
+def recover_pending(db: Session, apify_client, account_id: Optional[int] = None) -> Dict:
+    """Settle batches a crashed run left open, committing each one"""
+    query = db.query(models.SendBatch).filter(models.SendBatch.status.in_(OPEN_STATUSES))
+    if account_id:
+        query = query.filter(models.SendBatch.instagram_account_id == account_id)
+
+    totals = {'recovered': 0, 'abandoned': 0, 'sent': 0}
+    for batch in query.order_by(models.SendBatch.id).all():
+        if not batch.apify_run_id:
+            apply_results(db, batch, {}, status='abandoned')
+            totals['abandoned'] += 1
+        else:
+            with track_outbound('apify', 'recover_run'):
+                run = apify_client.run(batch.apify_run_id).wait_for_finish()
+            results = dm_results(apify_client, run, usernames(batch))
+            sent = apply_results(db, batch, results, sent_at=batch.created_at)
+            _count_against_account(db, batch.instagram_account_id, sent, batch.created_at.date())
+            totals['recovered'] += 1
+            totals['sent'] += sent
+        db.commit()
+    return totals
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+    from app.scraper import apify_client_from_env
+
+    db = SessionLocal()
+    try:
+        print(recover_pending(db, apify_client_from_env()))
+    finally:
+        db.close()
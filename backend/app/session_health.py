@@ -0,0 +1,147 @@
+"""
+Session health checks for the Instagram account pool.
+
+An expired session_id otherwise only shows up when a whole DM batch fails in
+send_dm_batch, after the Apify run and the time slot are spent. The checker
+has a lightweight profile actor (APIFY_SESSION_CHECK_ACTOR_ID) load each
+account's own profile with its session, for every active account at once on a
+pool of HEALTH_CHECK_WORKERS threads. The threads only make the calls; results
+are written with one executemany and one commit:
+
+    - a session that can't load its profile marks the account 'session_expired'
+    - a live session bumps last_activity and brings an expired account back
+      ('limited' if its cool-down hasn't ended yet, else 'active')
+    - a failed run says nothing about the session and changes nothing
+
+Each update is conditional on the status and session_id the check started
+from, so a session replaced or a cool-down started meanwhile isn't overwritten.
+Expired accounts stay out of select_best_available_account, worker leases and
+the campaign simulator until a check finds them healthy again.
+
+    python -m app.session_health                  check every active account once
+    python -m app.session_health --interval 900   keep checking every 15 minutes
+"""
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.metrics import SESSION_HEALTH_CHECKS, track_outbound
+from app.scraper import apify_client_from_env
+
+SESSION_EXPIRED = 'session_expired'
+HEALTH_CHECK_WORKERS = int(os.getenv('HEALTH_CHECK_WORKERS', 8))
+HEALTH_CHECK_INTERVAL = int(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', 900))
+
+def dispatchable():
+    """Filter for accounts whose session isn't known to be dead"""
+    return func.coalesce(models.InstagramAccount.account_status, 'active') != SESSION_EXPIRED
+
+class SessionHealthChecker:
+
+    def __init__(self, db: Session, apify_client=None, max_workers: int = HEALTH_CHECK_WORKERS):
+        self.db = db
+        self.apify_client = apify_client or apify_client_from_env()
+        self.max_workers = max_workers
+        self.actor_id = os.getenv('APIFY_SESSION_CHECK_ACTOR_ID', 'apify/instagram-profile-scraper')
+
+    def check_session(self, username: str, session_id: str) -> Optional[bool]:
+        """Whether the session can load the account's profile; None if the check itself failed"""
+        run_input = {'sessionid': session_id, 'usernames': [username], 'resultsLimit': 1}
+        try:
+            with track_outbound('apify', 'session_check'):
+                run = self.apify_client.actor(self.actor_id).call(run_input=run_input)
+                if not run or run.get('status') != 'SUCCEEDED':
+                    print(f"Session check for {username} failed: {run.get('status') if run else 'no run'}")
+                    return None
+                items = self.apify_client.dataset(run['defaultDatasetId']).list_items(limit=1).items or []
+        except Exception as e:
+            print(f"Session check for {username} failed: {str(e)}")
+            return None
+        # Logged-out sessions get an empty dataset or an item carrying an error instead of the profile
+        return bool(items) and not items[0].get('error') and items[0].get('loggedIn', True) is not False
+
+    def check_all(self) -> Dict[str, int]:
+        accounts = self.db.query(
+            models.InstagramAccount.id,
+            models.InstagramAccount.username,
+            models.InstagramAccount.session_id,
+            func.coalesce(models.InstagramAccount.account_status, 'active'),
+            models.InstagramAccount.cooldown_until
+        ).filter(models.InstagramAccount.is_active == True).order_by(models.InstagramAccount.id).all()
+        if not accounts:
+            return {'checked': 0, 'healthy': 0, 'expired': 0, 'unknown': 0, 'marked_expired': 0, 'recovered': 0}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(accounts)),
+                                thread_name_prefix='session-health') as pool:
+            results = list(pool.map(lambda account: self.check_session(account[1], account[2]), accounts))
+
+        now, local_now = datetime.utcnow(), datetime.now()
+        counts = Counter()
+        updates = []
+        for (account_id, _, session_id, status, cooldown_until), healthy in zip(accounts, results):
+            counts['unknown' if healthy is None else 'healthy' if healthy else 'expired'] += 1
+            if healthy is None:
+                continue
+            if not healthy:
+                new_status = SESSION_EXPIRED
+                counts['marked_expired'] += status != SESSION_EXPIRED
+            elif status == SESSION_EXPIRED:
+                # cooldown_until is local time, see rate_controller
+                new_status = 'limited' if cooldown_until and cooldown_until > local_now else 'active'
+                counts['recovered'] += 1
+            else:
+                new_status = status
+            updates.append({
+                'account_id': account_id, 'checked_status': status, 'checked_session': session_id,
+                'new_status': new_status, 'seen_at': now if healthy else None
+            })
+
+        if updates:
+            table = models.InstagramAccount.__table__
+            self.db.execute(table.update().where(
+                (table.c.id == bindparam('account_id'))
+                & (func.coalesce(table.c.account_status, 'active') == bindparam('checked_status'))
+                & (table.c.session_id == bindparam('checked_session'))
+            ).values(
+                account_status=bindparam('new_status'),
+                last_activity=func.coalesce(bindparam('seen_at'), table.c.last_activity)
+            ), updates)
+        self.db.commit()
+
+        for result in ('healthy', 'expired', 'unknown'):
+            if counts[result]:
+                SESSION_HEALTH_CHECKS.labels(result).inc(counts[result])
+        return {'checked': len(accounts), **{key: counts[key] for key in
+                                             ('healthy', 'expired', 'unknown', 'marked_expired', 'recovered')}}
+
+def run_checks(interval: Optional[int] = None):
+    """Background-task entry point: checks with its own session, every `interval` seconds if given"""
+    from app.database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            print(SessionHealthChecker(db).check_all())
+        except Exception as e:
+            print(f"Session health check failed: {str(e)}")
+        finally:
+            db.close()
+        if not interval:
+            return
+        time.sleep(interval)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check the Instagram sessions of every active account')
+    parser.add_argument('--interval', type=int, nargs='?', const=HEALTH_CHECK_INTERVAL,
+                        help=f'keep checking every INTERVAL seconds (default {HEALTH_CHECK_INTERVAL})')
+    args = parser.parse_args()
+    run_checks(args.interval)
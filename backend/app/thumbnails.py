@@ -0,0 +1,308 @@
+"""
+Profile-picture thumbnails, cached on disk and served by the API.
+
+Instagram's CDN URLs in Prospect.profile_pic_url expire and are slow, and a
+grid view used to load hundreds of them. A background pass downloads each
+prospect's picture once on a pool of THUMBNAIL_WORKERS threads. It resizes
+the picture into square WebP thumbnails (THUMBNAIL_SIZES) and stores them
+under THUMBNAIL_DIR, keyed by the SHA-256 of the downloaded image. Identical
+pictures (the default avatar, a picture behind a re-signed URL) share their
+files. The threads only download, resize and write files; prospects get
+thumbnail_digest and thumbnail_source with one executemany per batch.
+
+    - thumbnail_source records which profile_pic_url the digest came from; a
+      rescrape that changes the URL makes the prospect pending again
+    - a 4xx or an undecodable image is recorded with no digest, so it isn't
+      retried until the URL changes; timeouts and 5xx are retried next pass
+    - the cache is kept under THUMBNAIL_CACHE_MAX_BYTES by evicting the least
+      recently served pictures; their prospects lose the digest (and show
+      initials) until a rescrape brings a new URL
+
+Thumbnails are served without auth at /api/thumbnails/{digest}/{size}.webp,
+which never changes for a digest, so responses are cacheable for a year.
+GET /api/thumbnails/sizes lists the sizes on offer, so clients follow
+THUMBNAIL_SIZES instead of hard-coding it. Resizing needs Pillow with WebP
+support, which the pillow wheels (a Poetry dependency) include.
+
+    python -m app.thumbnails                  fetch every pending picture once
+    python -m app.thumbnails --interval 300   keep fetching every 5 minutes
+"""
+import hashlib
+import io
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.metrics import THUMBNAIL_FETCHES, track_outbound
+
+THUMBNAIL_DIR = os.getenv('THUMBNAIL_DIR', './data/thumbnails')
+THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv('THUMBNAIL_SIZES', '64,160').split(','))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 8))
+THUMBNAIL_INTERVAL = int(os.getenv('THUMBNAIL_INTERVAL_SECONDS', 300))
+BATCH_SIZE = 500
+DOWNLOAD_TIMEOUT = 10
+MAX_DOWNLOAD_BYTES = 5 * 1024 * 1024
+WEBP_QUALITY = 80
+EVICT_TO = 0.9  # Eviction goes down to this fraction of the limit, so it doesn't run on every write
+TOUCH_SECONDS = 3600  # A served file's mtime (its LRU position) is refreshed at most this often
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+class PermanentFetchError(Exception):
+    """The URL won't give a usable picture no matter how often it is retried"""
+
+class ThumbnailCache:
+    """Content-addressed WebP files, {digest[:2]}/{digest}-{size}.webp, evicted least recently served first"""
+
+    def __init__(self, directory: str = THUMBNAIL_DIR, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES,
+                 sizes: Tuple[int, ...] = THUMBNAIL_SIZES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sizes = sizes
+
+    def path(self, digest: str, size: int) -> str:
+        return os.path.join(self.directory, digest[:2], f'{digest}-{size}.webp')
+
+    def has(self, digest: str) -> bool:
+        return all(os.path.exists(self.path(digest, size)) for size in self.sizes)
+
+    def put(self, digest: str, images: Dict[int, bytes]):
+        os.makedirs(os.path.dirname(self.path(digest, self.sizes[0])), exist_ok=True)
+        for size, data in images.items():
+            path = self.path(digest, size)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)  # Readers never see a partial file
+
+    def open(self, digest: str, size: int) -> Optional[str]:
+        """Path of a cached thumbnail, marking it recently used; None if it isn't cached"""
+        path = self.path(digest, size)
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_SECONDS:
+                os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def evict(self) -> List[str]:
+        """Remove least recently served pictures while over max_bytes; returns the digests removed"""
+        files, total = [], 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.webp'):
+                    stat = os.stat(os.path.join(root, name))
+                    files.append((stat.st_mtime, name[:64], stat.st_size))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return []
+
+        evicted = []
+        for _, digest, _ in sorted(files):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if digest in evicted:
+                continue
+            for size in self.sizes:
+                try:
+                    total -= os.path.getsize(self.path(digest, size))
+                    os.remove(self.path(digest, size))
+                except FileNotFoundError:
+                    pass
+            evicted.append(digest)
+        return evicted
+
+thumbnail_cache = ThumbnailCache()
+
+def make_thumbnails(data: bytes, sizes: Tuple[int, ...] = THUMBNAIL_SIZES) -> Dict[int, bytes]:
+    """Square, centre-cropped WebP thumbnails of an image; raises PermanentFetchError if it can't be decoded"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft('RGB', (max(sizes) * 2, max(sizes) * 2))  # JPEGs decode at reduced scale, much faster
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            thumbnails = {}
+            for size in sizes:
+                out = io.BytesIO()
+                ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS).save(
+                    out, 'WEBP', quality=WEBP_QUALITY, method=4)
+                thumbnails[size] = out.getvalue()
+            return thumbnails
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise PermanentFetchError(f"not a usable image: {e}")
+
+def _http(max_workers: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def pending(db: Session, after_id: int = 0, limit: int = BATCH_SIZE):
+    """(id, profile_pic_url) of prospects whose picture hasn't been fetched from its current URL"""
+    prospects = models.Prospect.__table__
+    return db.execute(select(prospects.c.id, prospects.c.profile_pic_url).where(
+        prospects.c.id > after_id,
+        prospects.c.profile_pic_url.isnot(None),
+        prospects.c.profile_pic_url != '',
+        (prospects.c.thumbnail_source.is_(None)) | (prospects.c.thumbnail_source != prospects.c.profile_pic_url)
+    ).order_by(prospects.c.id).limit(limit)).fetchall()
+
+class ThumbnailFetcher:
+
+    def __init__(self, db: Session, cache: Optional[ThumbnailCache] = None, http=None,
+                 max_workers: int = THUMBNAIL_WORKERS):
+        self.db = db
+        self.cache = cache or thumbnail_cache
+        self.max_workers = max_workers
+        self.http = http or _http(max_workers)
+
+    def download(self, url: str) -> bytes:
+        with track_outbound('instagram_cdn', 'profile_picture'):
+            response = self.http.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True)
+        try:
+            if 400 <= response.status_code < 500:
+                raise PermanentFetchError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            if int(response.headers.get('Content-Length') or 0) > MAX_DOWNLOAD_BYTES:
+                raise PermanentFetchError("picture too large")
+            data = b''
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_DOWNLOAD_BYTES:
+                    raise PermanentFetchError("picture too large")
+            return data
+        finally:
+            response.close()
+
+    def fetch(self, url: str) -> Tuple[str, Optional[str]]:
+        """(result, digest) for one URL: cached, reused (already on disk), missing or failed. Runs on the pool"""
+        try:
+            data = self.download(url)
+            digest = hashlib.sha256(data).hexdigest()
+            if self.cache.has(digest):
+                return 'reused', digest
+            self.cache.put(digest, make_thumbnails(data, self.cache.sizes))
+            return 'cached', digest
+        except PermanentFetchError:
+            return 'missing', None  # Counted in THUMBNAIL_FETCHES; expected for deleted accounts
+        except ImportError:
+            raise  # No Pillow: stop the pass rather than fail every picture
+        except Exception as e:
+            print(f"Thumbnail download failed for {url[:80]}: {str(e)}")
+            return 'failed', None
+
+    def _record(self, rows, results: Dict[str, Tuple[str, Optional[str]]]):
+        prospects = models.Prospect.__table__
+        updates = [{'prospect_id': prospect_id, 'source': url, 'digest': results[url][1]}
+                   for prospect_id, url in rows if results[url][0] != 'failed']
+        if updates:
+            # Conditional on the URL, so a rescrape meanwhile isn't marked done; updated_at is
+            # kept so the dispatch queues don't rescore prospects for a new picture
+            self.db.execute(prospects.update().where(
+                (prospects.c.id == bindparam('prospect_id'))
+                & (prospects.c.profile_pic_url == bindparam('source'))
+            ).values(
+                thumbnail_digest=bindparam('digest'),
+                thumbnail_source=bindparam('source'),
+                updated_at=prospects.c.updated_at
+            ), updates)
+
+    def _forget(self, digests: List[str]):
+        prospects = models.Prospect.__table__
+        for offset in range(0, len(digests), 900):
+            self.db.execute(prospects.update().where(
+                prospects.c.thumbnail_digest.in_(digests[offset:offset + 900])
+            ).values(thumbnail_digest=None, updated_at=prospects.c.updated_at))
+
+    def _reset(self):
+        # A new or wiped cache volume: no digest on record points at a file any more, so fetch everything again
+        prospects = models.Prospect.__table__
+        self.db.execute(prospects.update().where(prospects.c.thumbnail_source.isnot(None)).values(
+            thumbnail_digest=None, thumbnail_source=None, updated_at=prospects.c.updated_at))
+        self.db.commit()
+
+    def run(self) -> Dict[str, int]:
+        """Fetch every pending picture, batch by batch, then evict down to the size limit"""
+        if not os.path.isdir(self.cache.directory):
+            self._reset()
+        counts = Counter()
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                rows = pending(self.db, last_id)
+                if not rows:
+                    break
+                urls = list(dict.fromkeys(url for _, url in rows))
+                results = dict(zip(urls, pool.map(self.fetch, urls)))
+                self._record(rows, results)
+                self.db.commit()
+                counts.update(result for result, _ in results.values())
+                counts['prospects'] += len(rows)
+                last_id = rows[-1][0]
+
+        evicted = self.cache.evict()
+        if evicted:
+            self._forget(evicted)
+            self.db.commit()
+
+        for result in ('cached', 'reused', 'missing', 'failed'):
+            if counts[result]:
+                THUMBNAIL_FETCHES.labels(result).inc(counts[result])
+        return {'prospects': counts['prospects'], 'evicted': len(evicted),
+                **{key: counts[key] for key in ('cached', 'reused', 'missing', 'failed')}}
+
+def run_fetcher(interval: Optional[int] = None):
+    """Background-task entry point: fetches with its own session, every `interval` seconds if given"""
+    from app.database import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            print(ThumbnailFetcher(db).run())
+        except ImportError:
+            raise  # Pillow missing from the environment: retrying won't help
+        except Exception as e:
+            print(f"Thumbnail fetch failed: {str(e)}")
+        finally:
+            db.close()
+        if not interval:
+            return
+        time.sleep(interval)
+
+# Mounted without the API's auth dependency: <img> tags can't send a bearer token
+router = APIRouter()
+
+@router.get("/thumbnails/sizes")
+def read_thumbnail_sizes():
+    return {"sizes": list(thumbnail_cache.sizes)}
+
+@router.get("/thumbnails/{digest}/{size}.webp", include_in_schema=False)
+def read_thumbnail(digest: str, size: int):
+    path = thumbnail_cache.open(digest, size) if _DIGEST.match(digest) and size in thumbnail_cache.sizes else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(path, media_type='image/webp', headers={'Cache-Control': CACHE_CONTROL})
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Download and cache profile-picture thumbnails')
+    parser.add_argument('--interval', type=int, nargs='?', const=THUMBNAIL_INTERVAL,
+                        help=f'keep fetching every INTERVAL seconds (default {THUMBNAIL_INTERVAL})')
+    args = parser.parse_args()
+    run_fetcher(args.interval)
@@ -0,0 +1,5 @@
+import os
+
+# Benchmarks build their own throwaway databases; keep app.main's import-time
+# create_all (and anything else reading DATABASE_URL) off the real one.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
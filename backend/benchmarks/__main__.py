@@ -0,0 +1,134 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks run --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks run --only micro --only rollups --scale 0.1
+    python -m benchmarks compare bench-old.json bench-new.json --threshold 0.15
+
+`run` writes one JSON document with the commit, timestamp and every benchmark's
+metrics. `compare` flags metrics that got worse by more than the threshold:
+*_seconds and *_ms are lower-is-better, *_per_second is higher-is-better.
+Exits 1 when anything regressed. `run` itself exits 1 when a benchmark with a
+fixed budget (cold_start, metrics_overhead) reports within_budget false.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+
+from benchmarks import bench_archive, bench_auth, bench_bulk_deploy, bench_cache, bench_cold_start, bench_dedup, bench_env_fanout, bench_message_storage, bench_metrics, bench_micro, bench_prospect_csv, bench_rollups, bench_search, bench_session_health, bench_thumbnails, bench_workers, load_api
+
+def _suite(scale: float) -> Dict:
+    def n(value: int) -> int:
+        return max(1, int(value * scale))
+    return {
+        'micro': lambda: bench_micro.run(iterations=n(20000), campaign_prospects=n(2000)),
+        'load_api': lambda: load_api.run(requests=n(1000), concurrency=10, prospects=n(100000)),
+        'rollups': lambda: bench_rollups.run(messages=n(1_000_000), days=90),
+        'metrics_overhead': lambda: bench_metrics.run(requests=n(2000), prospects=n(50000)),
+        'search': lambda: bench_search.run(prospects=n(1_000_000)),
+        'dedup': lambda: bench_dedup.run(prospects=n(1_000_000)),
+        'workers': lambda: bench_workers.run(prospects=n(600)),
+        'auth': lambda: bench_auth.run(requests=n(2000), logins=n(40)),
+        'response_cache': lambda: bench_cache.run(requests=n(2000), campaigns=n(200)),
+        'archive': lambda: bench_archive.run(messages=n(200000), prospects=n(50000)),
+        'message_storage': lambda: bench_message_storage.run(messages=n(10_000_000), convert=n(200_000)),
+        'session_health': lambda: bench_session_health.run(accounts=n(100)),
+        'bulk_deploy': lambda: bench_bulk_deploy.run(deployments=n(20)),
+        'env_fanout': lambda: bench_env_fanout.run(deployments=n(100)),
+        'cold_start': lambda: bench_cold_start.run(),
+        'prospect_csv': lambda: bench_prospect_csv.run(prospects=n(20000)),
+        'thumbnails': lambda: bench_thumbnails.run(prospects=n(300))
+    }
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def _flatten(value, prefix: str = '') -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+def compare(old: Dict, new: Dict, threshold: float) -> Dict:
+    old_metrics = dict(_flatten(old.get('results', {})))
+    regressions, improvements = [], []
+
+    for key, new_value in _flatten(new.get('results', {})):
+        old_value = old_metrics.get(key)
+        if not old_value:
+            continue
+        if key.endswith('_seconds') or key.endswith('_ms'):
+            change = (new_value - old_value) / old_value
+        elif key.endswith('_per_second'):
+            change = (old_value - new_value) / old_value
+        else:
+            continue
+        entry = {'metric': key, 'old': old_value, 'new': new_value, 'change': round(change, 4)}
+        if change > threshold:
+            regressions.append(entry)
+        elif change < -threshold:
+            improvements.append(entry)
+
+    return {
+        'old_commit': old.get('commit'),
+        'new_commit': new.get('commit'),
+        'threshold': threshold,
+        'regressions': regressions,
+        'improvements': improvements
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--only', action='append')
+    run_parser.add_argument('--scale', type=float, default=1.0, help='multiply every dataset size')
+    run_parser.add_argument('--output')
+
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.old) as old_file, open(args.new) as new_file:
+            report = compare(json.load(old_file), json.load(new_file), args.threshold)
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if report['regressions'] else 0)
+
+    suite = _suite(args.scale)
+    selected = args.only or list(suite)
+    unknown = set(selected) - set(suite)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    document = {
+        'commit': _commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'results': {name: suite[name]() for name in selected}
+    }
+    output = json.dumps(document, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    over_budget = [name for name, result in document['results'].items() if result.get('within_budget') is False]
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
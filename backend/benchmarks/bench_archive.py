@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Message archival: hot-table size and query times before and after.
+
+    python -m benchmarks.bench_archive --messages 1000000 --days 365 --older-than-days 90
+
+Loads a year of synthetic messages, times the hot-table queries the bot and
+dashboard run (an account's sends today, a prospect's history, the rollup
+refresh), archives everything older than --older-than-days into monthly
+partitions, vacuums, and times the same queries again. Also reports the bytes
+per message in the partitions against the hot table, archive query latency,
+and whether the daily rollups still add up to every message generated.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import func
+
+from app import analytics, archive, models
+from benchmarks.common import emit, latency_summary, temp_database, timed
+from benchmarks.generator import SyntheticDataset
+
+def _hot_queries(db, dataset: SyntheticDataset, now: datetime, samples: int = 200) -> Dict:
+    day_start = analytics.truncate(now, 'day')
+    sends_today, history = [], []
+    for i in range(samples):
+        _, seconds = timed(lambda: db.query(func.count(models.Message.id)).filter(
+            models.Message.instagram_account_id == i % dataset.accounts + 1,
+            models.Message.sent_at >= day_start
+        ).scalar())
+        sends_today.append(seconds)
+        _, seconds = timed(lambda: db.query(models.Message).filter(
+            models.Message.prospect_id == (i * 7919) % dataset.prospects + 1
+        ).all())
+        history.append(seconds)
+    _, refresh_seconds = timed(analytics.rebuild_rollups, db)
+    return {
+        'account_sends_today': latency_summary(sends_today),
+        'prospect_history': latency_summary(history),
+        'rollup_rebuild_seconds': round(refresh_seconds, 3)
+    }
+
+def run(messages: int = 1_000_000, prospects: int = 100_000, days: int = 365, older_than_days: int = 90) -> Dict:
+    with temp_database() as (engine, Session, url):
+        path = url.replace('sqlite:///', '')
+        directory = os.path.join(os.path.dirname(path), 'archive')
+        dataset = SyntheticDataset(campaigns=10, accounts=20, prospects=prospects, messages=messages, days=days)
+        dataset.load(engine)
+        now = dataset.start_at + timedelta(days=days)
+
+        db = Session()
+        analytics.refresh_rollups(db)
+        hot_bytes_before = os.path.getsize(path)
+        before = _hot_queries(db, dataset, now)
+
+        started = time.perf_counter()
+        result = archive.archive_messages(db, older_than_days=older_than_days, now=now, directory=directory)
+        archive_seconds = time.perf_counter() - started
+        _, vacuum_seconds = timed(archive.vacuum, db)
+        hot_bytes_after = os.path.getsize(path)
+        hot_messages = db.query(models.Message).count()
+        after = _hot_queries(db, dataset, now)
+
+        partition_bytes = sum(os.path.getsize(partition.path) for partition in archive.get_partitions(db))
+        archive_latencies = []
+        for i in range(50):
+            _, seconds = timed(archive.query_archived_messages, db, prospect_id=(i * 7919) % prospects + 1, limit=1000)
+            archive_latencies.append(seconds)
+        _, month_seconds = timed(archive.query_archived_messages, db, start=dataset.start_at,
+                                 end=dataset.start_at + timedelta(days=31), limit=10000)
+        rolled_up = db.query(func.sum(models.MessageRollup.sent)).filter(
+            models.MessageRollup.granularity == 'day'
+        ).scalar()
+        db.close()
+
+    return {
+        'messages': messages,
+        'archived': result['archived'],
+        'partitions': len(result['months']),
+        'hot_messages_after': hot_messages,
+        'archive_seconds': round(archive_seconds, 3),
+        'archived_per_second': round(result['archived'] / archive_seconds, 1) if archive_seconds else 0.0,
+        'vacuum_seconds': round(vacuum_seconds, 3),
+        'hot_db_bytes_before': hot_bytes_before,
+        'hot_db_bytes_after': hot_bytes_after,
+        'hot_bytes_per_message': round(hot_bytes_before / messages, 1) if messages else 0.0,
+        'archived_bytes_per_message': round(partition_bytes / result['archived'], 1) if result['archived'] else 0.0,
+        'before': before,
+        'after': after,
+        'archive_prospect_history': latency_summary(archive_latencies),
+        'archive_month_scan_seconds': round(month_seconds, 3),
+        'rollups_cover_all_messages': rolled_up == messages
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--prospects', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--older-than-days', type=int, default=90)
+    args = parser.parse_args()
+    emit({'benchmark': 'archive', **run(args.messages, args.prospects, args.days, args.older_than_days)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Authentication overhead: cached bearer-token checks and concurrent logins.
+
+    python -m benchmarks.bench_auth --requests 2000 --logins 40 --concurrency 20
+
+`authenticated` drives GET /api/auth/me over in-process ASGI with one token,
+first with the token and user caches in place, then with both disabled (every
+request decodes the JWT and loads the user row). `logins` fires concurrent
+logins while a probe keeps hitting /healthz; since bcrypt runs on the
+password-hash pool, probe latency should stay low while the logins queue.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from app import auth
+from benchmarks.common import emit, latency_summary, temp_database
+from benchmarks.load_api import authenticate
+
+async def _hammer(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in indexes:
+            started = time.perf_counter()
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'errors': errors,
+        'requests_per_second': round(requests / elapsed, 1) if elapsed else 0.0,
+        **latency_summary(latencies)
+    }
+
+async def _authenticated(client: httpx.AsyncClient, requests: int, concurrency: int) -> Dict:
+    await authenticate(client)
+    cached = await _hammer(client, '/api/auth/me', requests, concurrency)
+
+    size, ttl = auth.token_cache.size, auth.user_cache.ttl
+    auth.token_cache.size, auth.user_cache.ttl = 0, 0
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    try:
+        uncached = await _hammer(client, '/api/auth/me', requests, concurrency)
+    finally:
+        auth.token_cache.size, auth.user_cache.ttl = size, ttl
+    return {'cached': cached, 'uncached': uncached}
+
+async def _logins(client: httpx.AsyncClient, logins: int, concurrency: int) -> Dict:
+    login_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    errors = 0
+    done = asyncio.Event()
+
+    async def login_worker(count: int):
+        nonlocal errors
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.post('/api/auth/login', data={'username': 'admin', 'password': 'admin'})
+            if response.status_code != 200:
+                errors += 1
+            login_latencies.append(time.perf_counter() - started)
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get('/healthz')
+            probe_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(login_worker(logins // concurrency + (1 if i < logins % concurrency else 0))
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    return {
+        'logins': logins,
+        'concurrency': concurrency,
+        'password_hash_workers': auth.PASSWORD_HASH_WORKERS,
+        'errors': errors,
+        'logins_per_second': round(logins / elapsed, 2) if elapsed else 0.0,
+        'login': latency_summary(login_latencies),
+        'healthz_during_logins': latency_summary(probe_latencies)
+    }
+
+def run(requests: int = 2000, logins: int = 40, concurrency: int = 20) -> Dict:
+    from app.database import get_db
+    from app.main import app
+    from benchmarks.generator import SyntheticDataset
+
+    with temp_database() as (engine, Session, _):
+        SyntheticDataset(campaigns=1, accounts=1, prospects=100, messages=0).load(engine)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            async def local():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+                    return {
+                        'authenticated': await _authenticated(client, requests, concurrency),
+                        'logins': await _logins(client, logins, concurrency)
+                    }
+            return asyncio.run(local())
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    emit({'benchmark': 'auth', **run(args.requests, args.logins, args.concurrency)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bulk Coolify deployments: a serial loop against BulkDeployer.
+
+    python -m benchmarks.bench_bulk_deploy --deployments 20 --parallelism 8 --failure-rate 0.05
+
+Rolls out --deployments applications against FakeCoolifyHTTP twice. First as
+a serial loop of create_application, deploy_application and status polls,
+the way a rollout was scripted before. Then as one DeploymentBatch run by
+BulkDeployer. Every call takes --latency seconds, a build --build-seconds, and
+a --failure-rate fraction of calls get a 503. The fake answers 429 above
+--coolify-rps, and our limiter is set to --limit-rps. Reports wall time,
+deployments running at the end, and the calls, retries and 429s it took.
+"""
+import argparse
+import time
+import uuid
+from typing import Dict
+
+import coolify_service
+from app import crud, models, schemas
+from benchmarks.common import emit, temp_database
+from fake_coolify import FakeCoolifyHTTP
+
+def _setup(Session, deployments: int):
+    db = Session()
+    config = models.CoolifyConfig(name='bench', api_url=f'https://coolify-{uuid.uuid4().hex[:8]}.example.com',
+                                  api_token='token')
+    db.add(config)
+    db.flush()
+    db.add_all([models.Deployment(name=f'coach-landing-{i}', github_url=f'https://github.com/coaches/landing-{i}',
+                                  coolify_config_id=config.id) for i in range(deployments)])
+    db.commit()
+    return db, config.id
+
+def _calls(http: FakeCoolifyHTTP) -> Dict:
+    return {
+        'coolify_calls': sum(count for key, count in http.calls.items() if isinstance(key, tuple)),
+        'rate_limited': http.calls['rate_limited'],
+        'injected_failures': http.calls['failed']
+    }
+
+def _serial(deployments: int, http: FakeCoolifyHTTP, poll_seconds: float) -> Dict:
+    with temp_database() as (engine, Session, _):
+        db, config_id = _setup(Session, deployments)
+        service = coolify_service.CoolifyService(db, config_id, http)
+        started = time.perf_counter()
+        for deployment in db.query(models.Deployment).order_by(models.Deployment.id).all():
+            if not service.create_application(deployment) or not service.deploy_application(deployment):
+                continue
+            while service.get_deployment_status(deployment)['status'] in ('building', 'deploying', 'error'):
+                time.sleep(poll_seconds)
+        seconds = time.perf_counter() - started
+        running = db.query(models.Deployment).filter(models.Deployment.status == models.DeploymentStatus.RUNNING).count()
+        db.close()
+    return {'seconds': round(seconds, 3), 'running': running, **_calls(http)}
+
+def _bulk(deployments: int, http: FakeCoolifyHTTP, poll_seconds: float, parallelism: int) -> Dict:
+    with temp_database() as (engine, Session, _):
+        db, _ = _setup(Session, deployments)
+        ids = [deployment_id for deployment_id, in db.query(models.Deployment.id)]
+        batch = crud.create_deployment_batch(db, schemas.BulkDeploymentRequest(deployment_ids=ids, parallelism=parallelism))
+        deployer = coolify_service.BulkDeployer(db, batch.id, http, poll_seconds=poll_seconds, backoff_seconds=0.2)
+        result = deployer.run()
+        running = db.query(models.Deployment).filter(models.Deployment.status == models.DeploymentStatus.RUNNING).count()
+        retries = sum(1 for item in batch.items if item.last_error)
+        db.close()
+    return {**result, 'running': running, 'items_retried': retries, **_calls(http)}
+
+def run(deployments: int = 20, parallelism: int = 8, latency: float = 0.05, build_seconds: float = 1.0,
+        poll_seconds: float = 0.25, failure_rate: float = 0.05, coolify_rps: float = 40, limit_rps: float = 30) -> Dict:
+    coolify_service.REQUESTS_PER_SECOND = limit_rps  # Limiters are made per api_url, and each run gets a fresh one
+
+    def http():
+        return FakeCoolifyHTTP(latency=latency, build_seconds=build_seconds, failure_rate=failure_rate,
+                               requests_per_second=coolify_rps)
+
+    serial = _serial(deployments, http(), poll_seconds)
+    bulk = _bulk(deployments, http(), poll_seconds, parallelism)
+    return {
+        'deployments': deployments,
+        'parallelism': parallelism,
+        'serial': serial,
+        'bulk': bulk,
+        'speedup': round(serial['seconds'] / bulk['seconds'], 2) if bulk['seconds'] else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deployments', type=int, default=20)
+    parser.add_argument('--parallelism', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--build-seconds', type=float, default=1.0)
+    parser.add_argument('--poll-seconds', type=float, default=0.25)
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--coolify-rps', type=float, default=40)
+    parser.add_argument('--limit-rps', type=float, default=30)
+    args = parser.parse_args()
+    emit({'benchmark': 'bulk_deploy', **run(args.deployments, args.parallelism, args.latency, args.build_seconds,
+                                            args.poll_seconds, args.failure_rate, args.coolify_rps, args.limit_rps)})
+
+if __name__ == '__main__':
+    main()
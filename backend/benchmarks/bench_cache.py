@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Response cache: list endpoints with and without ETags.
+
+    python -m benchmarks.bench_cache --requests 2000 --campaigns 200 --concurrency 10
+
+Drives GET /api/campaigns/ over in-process ASGI three ways: with the response
+cache disabled (every request queries and serializes), with the cache warm
+(body served from memory), and as conditional GETs carrying the last ETag (304,
+no body). A final pass mixes in a campaign update every `--write-every`
+requests to show the hit rate under writes.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from app import response_cache
+from benchmarks.common import emit, latency_summary, temp_database
+from benchmarks.load_api import authenticate
+
+PATH = '/api/campaigns/?limit=1000'
+
+async def _hammer(client: httpx.AsyncClient, requests: int, concurrency: int, headers: Dict = None,
+                  write_every: int = 0) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    indexes = iter(range(requests))
+
+    async def worker():
+        for i in indexes:
+            if write_every and i % write_every == 0:
+                await client.post('/api/campaigns/', json={'name': f'Bench write {i}', 'daily_limit': 50})
+            started = time.perf_counter()
+            response = await client.get(PATH, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'requests_per_second': round(requests / elapsed, 1) if elapsed else 0.0,
+        **latency_summary(latencies)
+    }
+
+async def _scenarios(client: httpx.AsyncClient, requests: int, concurrency: int, write_every: int) -> Dict:
+    await authenticate(client)
+
+    max_bytes = response_cache.cache.max_bytes
+    response_cache.cache.max_bytes = 0
+    response_cache.cache.clear()
+    try:
+        uncached = await _hammer(client, requests, concurrency)
+    finally:
+        response_cache.cache.max_bytes = max_bytes
+
+    etag = (await client.get(PATH)).headers['etag']
+    cached = await _hammer(client, requests, concurrency)
+    conditional = await _hammer(client, requests, concurrency, headers={'If-None-Match': etag})
+    with_writes = await _hammer(client, requests, concurrency, write_every=write_every)
+    return {
+        'uncached': uncached,
+        'cached': cached,
+        'conditional': conditional,
+        'with_writes': {'write_every': write_every, **with_writes},
+        'body_bytes': response_cache.cache.size
+    }
+
+def run(requests: int = 2000, campaigns: int = 200, concurrency: int = 10, write_every: int = 100) -> Dict:
+    from app.database import get_db
+    from app.main import app
+    from benchmarks.generator import SyntheticDataset
+
+    with temp_database() as (engine, Session, _):
+        SyntheticDataset(campaigns=campaigns, accounts=5, prospects=100, messages=0).load(engine)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        response_cache.cache.clear()
+        try:
+            async def local():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+                    return await _scenarios(client, requests, concurrency, write_every)
+            return {'campaigns': campaigns, **asyncio.run(local())}
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            response_cache.cache.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--campaigns', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--write-every', type=int, default=100)
+    args = parser.parse_args()
+    emit({'benchmark': 'response_cache', **run(args.requests, args.campaigns, args.concurrency, args.write_every)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cold start of the API: `uvicorn app.main:app` until it answers.
+
+    python -m benchmarks.bench_cold_start --runs 5 --budget 1.25
+
+Migrates a throwaway SQLite database and adds one user. Then it measures
+three things, each in a fresh interpreter. First, how long `import app.main`
+takes and which heavy modules it pulled in. Startup should run no DDL and
+defer numpy, requests and jose until they're used. Second, the time from
+launching uvicorn to the first 200 from /healthz, --runs times. Third, the
+first authenticated request, GET /api/auth/me with a bearer token. The median
+time to ready is compared with --budget (default: COLD_START_BUDGET_SECONDS,
+else 1.25s). main() exits 1 when it is over budget, and so does
+`python -m benchmarks run`.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from typing import Dict, Optional
+
+from app import migrations, models
+from benchmarks.common import emit, temp_database
+
+DEFAULT_BUDGET_SECONDS = float(os.getenv('COLD_START_BUDGET_SECONDS', '1.25'))
+DEFERRED_MODULES = ('numpy', 'requests', 'jose', 'coolify_service', 'app.dedup', 'app.lookalike')
+READY_TIMEOUT = 30
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({{'seconds': time.perf_counter() - started,
+                  'loaded': [name for name in {DEFERRED_MODULES!r} if name in sys.modules]}}))
+"""
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _get(url: str, token: Optional[str] = None) -> int:
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'} if token else {})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.status
+
+def _start(env: Dict) -> Dict:
+    """Launch uvicorn, wait for /healthz, then make the first authenticated request"""
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode} before it was ready")
+            if time.perf_counter() - started > READY_TIMEOUT:
+                raise RuntimeError(f"uvicorn not ready after {READY_TIMEOUT}s")
+            try:
+                _get(f'{base}/healthz')
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+        requested = time.perf_counter()
+        status = _get(f'{base}/api/auth/me', env['BENCH_TOKEN'])
+        return {'ready': ready, 'first_request': time.perf_counter() - requested, 'status': status}
+    finally:
+        server.terminate()
+        server.wait()
+
+def run(runs: int = 5, budget: float = DEFAULT_BUDGET_SECONDS) -> Dict:
+    from app import auth  # Only to sign the token; the server under test loads jose itself
+
+    with temp_database(create_schema=False) as (engine, Session, url):
+        migrations.upgrade(engine)
+        db = Session()
+        db.add(models.User(username='bench', email='bench@example.com'))
+        db.commit()
+        db.close()
+
+        env = dict(os.environ, DATABASE_URL=url,
+                   BENCH_TOKEN=auth.create_access_token({'sub': 'bench'}, timedelta(minutes=10)))
+        probe = json.loads(subprocess.check_output([sys.executable, '-c', _IMPORT_PROBE], env=env, text=True))
+        samples = [_start(env) for _ in range(runs)]
+
+    ready = statistics.median(sample['ready'] for sample in samples)
+    return {
+        'runs': runs,
+        'import_seconds': round(probe['seconds'], 3),
+        'deferred_modules_loaded': probe['loaded'],
+        'ready_seconds': round(ready, 3),
+        'ready_max_seconds': round(max(sample['ready'] for sample in samples), 3),
+        'first_request_ms': round(statistics.median(sample['first_request'] for sample in samples) * 1000, 3),
+        'first_request_ok': all(sample['status'] == 200 for sample in samples),
+        'budget_seconds': budget,
+        'within_budget': ready <= budget
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS)
+    args = parser.parse_args()
+    result = run(args.runs, args.budget)
+    emit({'benchmark': 'cold_start', **result})
+    sys.exit(0 if result['within_budget'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark near-duplicate bio detection: accuracy, bulk throughput and per-profile latency.
+
+    python -m benchmarks.bench_dedup --prospects 1000000
+
+Bios are random sentences over a synthetic vocabulary; a share of them are
+cloned with the edits spam farms make (different handle, link, emoji, casing,
+punctuation, one or two swapped words). Every clone knows its source, so after
+the bulk index we can score duplicate_of_id against ground truth:
+
+    recall      clones flagged as a duplicate of their own cluster
+    precision   flagged prospects that really belong to that cluster
+
+Then single new profiles are pushed through the same path crud.create_prospect
+uses, to time the per-profile lookup against the full index. Prints one JSON object.
+"""
+import argparse
+import random
+from datetime import datetime
+
+import numpy as np
+
+from app import dedup, models
+from benchmarks.common import emit, latency_summary, temp_database, timed
+from benchmarks.generator import insert_chunked
+
+EMOJI = ['🔥', '💪', '🚀', '✨', '👇', '💯', '']
+LINKS = ['linktr.ee/{}', 'https://{}.com', 'www.{}.io/apply', '']
+
+def _vocabulary(rng: random.Random, size: int = 5000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+def _decorate(rng: random.Random, words, handle: str) -> str:
+    text = ' '.join(words)
+    if rng.random() < 0.5:
+        text = text.upper() if rng.random() < 0.2 else text.title()
+    link = rng.choice(LINKS).format(handle)
+    return f"{rng.choice(EMOJI)} {text}{rng.choice(['', '!', '!!', ' |', '.'])} {link} @{handle}".strip()
+
+class BioCorpus:
+    """Unique bios plus clones of them, with the index of the bio each clone was made from"""
+
+    def __init__(self, count: int, clone_rate: float = 0.2, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.vocabulary = _vocabulary(self.rng)
+        self.count = count
+        self.clone_rate = clone_rate
+
+    def rows(self):
+        bases = []
+        for i in range(self.count):
+            handle = f'coach_{i:08d}'
+            if bases and self.rng.random() < self.clone_rate:
+                source, words = self.rng.choice(bases)
+                words = list(words)
+                for _ in range(self.rng.choice([0, 1, 1, 2])):
+                    words[self.rng.randrange(len(words))] = self.rng.choice(self.vocabulary)
+            else:
+                source = i
+                words = [self.rng.choice(self.vocabulary) for _ in range(self.rng.randint(12, 24))]
+                bases.append((i, words))
+            yield i, source, _decorate(self.rng, words, handle)
+
+def _prospect_row(i: int, bio: str) -> dict:
+    return {
+        'id': i + 1,
+        'username': f'coach_{i:08d}',
+        'followers': 10000,
+        'bio': bio,
+        'status': models.ProspectStatus.DISCOVERED,
+        'dm_sent': False,
+        'created_at': datetime(2025, 1, 1),
+        'updated_at': datetime(2025, 1, 1)
+    }
+
+def run(prospects: int = 1_000_000, probes: int = 1000, clone_rate: float = 0.2, seed: int = 42) -> dict:
+    corpus = BioCorpus(prospects + probes, clone_rate, seed)
+    sources, bios = {}, {}
+    for i, source, bio in corpus.rows():
+        sources[i + 1] = source + 1
+        bios[i + 1] = bio
+
+    with temp_database() as (engine, Session, _):
+        with engine.begin() as conn:
+            insert_chunked(conn, models.Prospect, (_prospect_row(i - 1, bios[i]) for i in range(1, prospects + 1)))
+
+        db = Session()
+        _, signature_seconds = timed(dedup.minhash_many, [bios[i] for i in range(1, min(prospects, 10000) + 1)])
+        totals, index_seconds = timed(dedup.index_unsigned, db)
+
+        clones = [i for i in range(1, prospects + 1) if sources[i] != i]
+        flagged = dict(db.query(models.Prospect.id, models.Prospect.duplicate_of_id).filter(
+            models.Prospect.duplicate_of_id.isnot(None)
+        ))
+        true_positives = sum(1 for i, representative in flagged.items() if sources[i] == sources[representative])
+
+        # Per-profile path: insert one prospect, look it up against the full index, store its buckets
+        lookup_samples, ingest_samples = [], []
+        for i in range(prospects + 1, prospects + probes + 1):
+            prospect = models.Prospect(**_prospect_row(i - 1, bios[i]))
+            db.add(prospect)
+            db.flush()
+            signature = dedup.minhash(prospect.bio)
+            _, lookup_seconds = timed(dedup._existing_candidates, db, dedup.band_buckets(signature))
+            _, ingest_seconds = timed(dedup.index_prospects, db, [prospect])
+            lookup_samples.append(lookup_seconds)
+            ingest_samples.append(ingest_seconds)
+        db.rollback()
+        db.close()
+
+    sample_size = min(prospects, 10000)
+    return {
+        'prospects': prospects,
+        'clones': len(clones),
+        'flagged': len(flagged),
+        'recall': round(true_positives / len(clones), 4) if clones else 1.0,
+        'precision': round(true_positives / len(flagged), 4) if flagged else 1.0,
+        'signatures_per_second': round(sample_size / signature_seconds, 1),
+        'index_seconds': round(index_seconds, 3),
+        'index_bios_per_second': round(totals['indexed'] / index_seconds, 1),
+        'lookup': latency_summary(lookup_samples),
+        'ingest_one': latency_summary(ingest_samples),
+        'numpy': np.__version__
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prospects', type=int, default=1_000_000)
+    parser.add_argument('--probes', type=int, default=1000)
+    parser.add_argument('--clone-rate', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    emit({'benchmark': 'dedup', **run(args.prospects, args.probes, args.clone_rate, args.seed)})
+
+if __name__ == '__main__':
+    main()
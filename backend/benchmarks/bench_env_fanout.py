@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Rotating a shared environment variable across many deployments.
+
+    python -m benchmarks.bench_env_fanout --deployments 100 --shared-keys 30 --parallelism 8
+
+Sets up --deployments applications in FakeCoolifyHTTP that share one variable
+set of --shared-keys keys, each with a few variables of its own. One of them
+overrides the rotated key itself. Then rotates one shared key twice. First the
+old way: one after another, PUT the whole map and rewrite the deployment's
+JSON blob. Then through EnvironmentFanOut.update_set, which changes the set
+once and sends each deployment only the key that changed. Every call takes
+--latency seconds. Reports wall time, variables sent to Coolify, SQL
+statements, and whether every application ended with the right value.
+"""
+import argparse
+import json
+import time
+import uuid
+from typing import Dict
+
+from sqlalchemy import event
+
+import coolify_service
+from app import models
+from benchmarks.common import emit, temp_database
+from fake_coolify import FakeCoolifyHTTP
+
+ROTATED_KEY = 'SHARED_KEY_0'
+
+def _setup(db, http: FakeCoolifyHTTP, deployments: int, shared_keys: int):
+    config = models.CoolifyConfig(name='bench', api_url=f'https://coolify-{uuid.uuid4().hex[:8]}.example.com',
+                                  api_token='token')
+    variable_set = models.EnvironmentVariableSet(name='shared', variables=json.dumps(
+        {f'SHARED_KEY_{i}': f'value-{i}' for i in range(shared_keys)}))
+    db.add_all([config, variable_set])
+    db.flush()
+    rows = []
+    for i in range(deployments):
+        own = {'COACH_NAME': f'coach-{i}', 'SITE_URL': f'https://coach-{i}.example.com', 'PLAN': 'pro'}
+        if i == 0:
+            own[ROTATED_KEY] = 'pinned'  # Its own value wins, so the rotation leaves it alone
+        rows.append(models.Deployment(name=f'coach-landing-{i}', github_url=f'https://github.com/coaches/landing-{i}',
+                                      coolify_config_id=config.id, environment_variables=json.dumps(own)))
+    db.add_all(rows)
+    db.flush()
+    db.add_all([models.DeploymentVariableSet(deployment_id=deployment.id, variable_set_id=variable_set.id)
+                for deployment in rows])
+    db.flush()
+
+    service = coolify_service.CoolifyService(db, config.id, http)
+    environments = coolify_service.effective_environment(db, [deployment.id for deployment in rows])
+    for deployment in rows:
+        deployment.coolify_app_id = service.request_create(deployment.name, deployment.github_url,
+                                                           environments[deployment.id])['coolify_app_id']
+    coolify_service.record_applied(db, environments)
+    db.commit()
+    return service, variable_set, rows
+
+def _statements(engine):
+    statements = []
+    def count(*args):
+        statements.append(1)
+    event.listen(engine, 'before_cursor_execute', count)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', count)
+
+def _correct(http: FakeCoolifyHTTP, value: str) -> bool:
+    apps = list(http.apps.values())
+    return apps[0]['env'][ROTATED_KEY] == 'pinned' and all(app['env'][ROTATED_KEY] == value for app in apps[1:])
+
+def _full_rewrite(deployments: int, shared_keys: int, latency: float) -> Dict:
+    http = FakeCoolifyHTTP()
+    with temp_database() as (engine, Session, _):
+        db = Session()
+        service, variable_set, rows = _setup(db, http, deployments, shared_keys)
+        http.latency, http.keys_sent = latency, 0
+        statements, stop = _statements(engine)
+        started = time.perf_counter()
+        shared = json.loads(variable_set.variables)
+        shared[ROTATED_KEY] = 'rotated'
+        for deployment in rows:
+            env_vars = {**shared, **json.loads(deployment.environment_variables)}
+            service._request('PUT', f"/api/v1/applications/{deployment.coolify_app_id}/environment-variables",
+                             'update_environment_variables', json=env_vars)
+            deployment.environment_variables = json.dumps(env_vars)
+            db.commit()
+        seconds = time.perf_counter() - started
+        stop()
+        db.close()
+    return {'seconds': round(seconds, 3), 'keys_sent': http.keys_sent, 'statements': len(statements),
+            'correct': _correct(http, 'rotated')}
+
+def _fan_out(deployments: int, shared_keys: int, latency: float, parallelism: int) -> Dict:
+    http = FakeCoolifyHTTP()
+    with temp_database() as (engine, Session, _):
+        db = Session()
+        _, variable_set, _ = _setup(db, http, deployments, shared_keys)
+        http.latency, http.keys_sent = latency, 0
+        statements, stop = _statements(engine)
+        started = time.perf_counter()
+        results = coolify_service.EnvironmentFanOut(db, http, parallelism=parallelism).update_set(
+            variable_set, {ROTATED_KEY: 'rotated'})
+        seconds = time.perf_counter() - started
+        stop()
+        db.close()
+    return {
+        'seconds': round(seconds, 3),
+        'keys_sent': http.keys_sent,
+        'statements': len(statements),
+        'updated': sum(1 for result in results if result['status'] == 'updated'),
+        'unchanged': sum(1 for result in results if result['status'] == 'unchanged'),
+        'failed': sum(1 for result in results if result['status'] == 'failed'),
+        'correct': _correct(http, 'rotated')
+    }
+
+def run(deployments: int = 100, shared_keys: int = 30, latency: float = 0.05, parallelism: int = 8) -> Dict:
+    coolify_service.REQUESTS_PER_SECOND = 0  # Measure the calls themselves, not the pacing
+    full = _full_rewrite(deployments, shared_keys, latency)
+    fan_out = _fan_out(deployments, shared_keys, latency, parallelism)
+    return {
+        'deployments': deployments,
+        'shared_keys': shared_keys,
+        'full_rewrite': full,
+        'fan_out': fan_out,
+        'speedup': round(full['seconds'] / fan_out['seconds'], 2) if fan_out['seconds'] else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deployments', type=int, default=100)
+    parser.add_argument('--shared-keys', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--parallelism', type=int, default=8)
+    args = parser.parse_args()
+    emit({'benchmark': 'env_fanout', **run(args.deployments, args.shared_keys, args.latency, args.parallelism)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Message storage: rendered text against template references.
+
+    python -m benchmarks.bench_message_storage --messages 10000000 --convert 200000
+
+Inserts the same synthetic messages into two throwaway SQLite files, once with
+the rendered text in `content` (how rows were stored before app.message_content)
+and once as template id plus JSON values, and reports the insert rate and file
+size of each. Rows arrive in batches of --batch-size sharing one text, as the
+bot sends them, and the reference is computed once per batch as send_journal
+does. Then times reading messages back through Message.content, and the
+conversion migration (message_content.convert_messages) on --convert rendered rows.
+"""
+import argparse
+import os
+import time
+from typing import Dict, Iterator, List
+
+from app import message_content, models
+from benchmarks.common import emit, temp_database, timed
+from benchmarks.generator import INSERT_CHUNK_SIZE, SyntheticDataset
+
+def _batches(dataset: SyntheticDataset, count: int, batch_size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in dataset.message_rows(count=count):
+        if batch and len(batch) >= batch_size:
+            yield batch
+            batch = []
+        # Everyone in a batch gets the first prospect's text
+        row['content'] = batch[0]['content'] if batch else row['content']
+        row['template_variant'] = batch[0]['template_variant'] if batch else row['template_variant']
+        batch.append(row)
+    if batch:
+        yield batch
+
+def _load(dataset: SyntheticDataset, count: int, batch_size: int, referenced: bool) -> Dict:
+    with temp_database() as (engine, Session, url):
+        db = Session()
+        table = models.Message.__table__
+        started = time.perf_counter()
+        chunk = []
+        for batch in _batches(dataset, count, batch_size):
+            if referenced:
+                columns = message_content.reference(db, batch[0]['content'], batch[0]['template_variant'])
+                columns['content'] = columns.pop('stored_content')
+                for row in batch:
+                    row.update(columns)
+            chunk += batch
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                db.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            db.execute(table.insert(), chunk)
+        db.commit()
+        seconds = time.perf_counter() - started
+
+        reads = db.query(models.Message).order_by(models.Message.id).limit(100000).all()
+        _, read_seconds = timed(lambda: [message.content for message in reads])
+        db.close()
+        engine.dispose()
+        size = os.path.getsize(url.replace('sqlite:///', ''))
+
+    return {
+        'seconds': round(seconds, 3),
+        'inserts_per_second': round(count / seconds, 1) if seconds else 0.0,
+        'db_bytes': size,
+        'bytes_per_message': round(size / count, 1) if count else 0.0,
+        'render_100k_seconds': round(read_seconds, 3)
+    }
+
+def _convert(dataset: SyntheticDataset, count: int) -> Dict:
+    with temp_database() as (engine, Session, _):
+        db = Session()
+        db.execute(models.Message.__table__.insert(), list(dataset.message_rows(count=count)))
+        db.commit()
+        result, seconds = timed(message_content.convert_messages, db)
+        db.close()
+    return {**result, 'seconds': round(seconds, 3),
+            'converted_per_second': round(result['converted'] / seconds, 1) if seconds else 0.0}
+
+def run(messages: int = 10_000_000, batch_size: int = 20, convert: int = 200_000) -> Dict:
+    dataset = SyntheticDataset(prospects=100_000, messages=messages)
+    rendered = _load(dataset, messages, batch_size, referenced=False)
+    referenced = _load(dataset, messages, batch_size, referenced=True)
+    return {
+        'messages': messages,
+        'batch_size': batch_size,
+        'rendered': rendered,
+        'referenced': referenced,
+        'size_ratio': round(referenced['db_bytes'] / rendered['db_bytes'], 3) if rendered['db_bytes'] else 0.0,
+        'convert': _convert(dataset, convert)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--convert', type=int, default=200_000)
+    args = parser.parse_args()
+    emit({'benchmark': 'message_storage', **run(args.messages, args.batch_size, args.convert)})
+
+if __name__ == '__main__':
+    main()
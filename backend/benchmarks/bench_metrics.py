@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Measure the overhead of request/DB instrumentation.
+
+    python -m benchmarks.bench_metrics --requests 2000 --rounds 3
+
+Loads one synthetic dataset, then runs the list/filter load scenarios
+in-process against it in alternating blocks with metrics collection switched
+off and on, so both sides see the same data and the same warm caches, and
+reports the throughput difference. Blocks have at least MIN_REQUESTS requests.
+
+That difference swings by several percent between identical runs, more than
+the budget, so the budget is checked against overhead_pct instead: the cost
+of MetricsMiddleware per request plus the engine hooks' cost per statement
+times the statements per request, each timed directly, as a share of the
+baseline time per request. Reports within_budget false (so
+`python -m benchmarks run` fails) and exits 1 if it exceeds --budget
+(default 5%).
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from app import metrics
+from benchmarks import load_api
+from benchmarks.common import emit, temp_database
+from benchmarks.generator import SyntheticDataset
+
+SCENARIOS = ['list', 'filter']
+MIN_REQUESTS = 200
+DEFAULT_BUDGET_PCT = 5.0
+
+def _throughput(result: dict) -> float:
+    scenarios = result['scenarios'].values()
+    return sum(s['requests_per_second'] for s in scenarios) / len(scenarios)
+
+def bench_observe(iterations: int = 200000) -> float:
+    """Cost of one histogram observation in microseconds"""
+    child = metrics.DB_QUERY_DURATION.labels('BENCH')
+    started = time.perf_counter()
+    for i in range(iterations):
+        child.observe(0.003)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def bench_middleware(iterations: int = 100000) -> float:
+    """Cost MetricsMiddleware adds to one request, in microseconds, around an app that does nothing"""
+    class Route:
+        path = '/bench'
+
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        pass
+
+    async def timed_calls(handler) -> float:
+        scope = {'type': 'http', 'method': 'GET', 'route': Route()}
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await handler(scope, None, send)
+        return time.perf_counter() - started
+
+    bare = asyncio.run(timed_calls(app))
+    instrumented = asyncio.run(timed_calls(metrics.MetricsMiddleware(app)))
+    return max(0.0, instrumented - bare) / iterations * 1e6
+
+def bench_query_hooks(iterations: int = 200000) -> float:
+    """Cost of the engine hooks around one statement, in microseconds"""
+    class Context:
+        pass
+
+    context = Context()
+    statement = 'SELECT prospects.id FROM prospects WHERE prospects.id = ?'
+    previous = metrics.enabled()
+    metrics.set_enabled(True)
+    try:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            metrics._before_cursor_execute(None, None, statement, (), context, False)
+            metrics._after_cursor_execute(None, None, statement, (), context, False)
+        return (time.perf_counter() - started) / iterations * 1e6
+    finally:
+        metrics.set_enabled(previous)
+
+def _queries_per_request_totals():
+    children = list(metrics.DB_QUERIES_PER_REQUEST._children.values())
+    return sum(child.sum for child in children), sum(child.count for child in children)
+
+async def _rounds(client: httpx.AsyncClient, requests: int, rounds: int, concurrency: int) -> dict:
+    await load_api.authenticate(client)
+    for name in SCENARIOS:  # Warm-up, not counted
+        await load_api.run_scenario(client, name, requests // 4, concurrency)
+    queries_before, requests_before = _queries_per_request_totals()
+    samples = {False: [], True: []}
+    for i in range(rounds):
+        # Alternate which side goes first, so drift during the run doesn't favour one
+        for enabled in ((False, True) if i % 2 == 0 else (True, False)):
+            metrics.set_enabled(enabled)
+            samples[enabled].append(_throughput({'scenarios': {
+                name: await load_api.run_scenario(client, name, requests, concurrency) for name in SCENARIOS
+            }}))
+    queries_after, requests_after = _queries_per_request_totals()
+    samples['queries_per_request'] = (queries_after - queries_before) / max(1, requests_after - requests_before)
+    return samples
+
+def run(requests: int = 2000, rounds: int = 3, prospects: int = 50000, concurrency: int = 10,
+        budget: float = DEFAULT_BUDGET_PCT) -> dict:
+    from app.database import get_db
+    from app.main import app
+
+    requests = max(requests, MIN_REQUESTS)
+    previous = metrics.enabled()
+    with temp_database() as (engine, Session, _):
+        SyntheticDataset(prospects=prospects).load(engine)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        async def measure():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+                return await _rounds(client, requests, rounds, concurrency)
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            samples = asyncio.run(measure())
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            metrics.set_enabled(previous)
+
+    baseline = max(samples[False])
+    instrumented = max(samples[True])
+    middleware_us = bench_middleware()
+    query_hooks_us = bench_query_hooks()
+    instrumentation_us = middleware_us + samples['queries_per_request'] * query_hooks_us
+    overhead = round(instrumentation_us * baseline / 1e6 * 100, 2)  # Over the baseline time per request
+    return {
+        'requests_per_scenario': requests,
+        'rounds': rounds,
+        'baseline_requests_per_second': round(baseline, 2),
+        'instrumented_requests_per_second': round(instrumented, 2),
+        'throughput_difference_pct': round((baseline - instrumented) / baseline * 100, 2) if baseline else 0.0,
+        'queries_per_request': round(samples['queries_per_request'], 2),
+        'middleware_us': round(middleware_us, 3),
+        'query_hooks_us': round(query_hooks_us, 3),
+        'observe_us': round(bench_observe(), 3),
+        'instrumentation_us_per_request': round(instrumentation_us, 3),
+        'overhead_pct': overhead,
+        'budget_pct': budget,
+        'within_budget': overhead <= budget
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--prospects', type=int, default=50000)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_PCT, help='max acceptable overhead in percent')
+    args = parser.parse_args()
+
+    result = run(args.requests, args.rounds, args.prospects, budget=args.budget)
+    emit({'benchmark': 'metrics_overhead', **result})
+    sys.exit(0 if result['within_budget'] else 1)
+
+if __name__ == '__main__':
+    main()
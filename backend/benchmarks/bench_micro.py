@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for hot paths: message templating, CRUD inserts and run_campaign.
+
+    python -m benchmarks.bench_micro --iterations 20000 --campaign-prospects 500
+
+run_campaign is driven by FakeApifyClient with sleeps skipped, so the numbers are
+pure bookkeeping overhead (queries, ORM work, commits) per DM.
+"""
+import argparse
+import random
+
+from app import crud, models, schemas
+from benchmarks.common import emit, temp_database, timed
+from benchmarks.generator import SyntheticDataset
+from message_templates import MessageTemplates
+
+def bench_templates(iterations: int) -> dict:
+    rng = random.Random(7)
+    prospects = [{
+        'username': f'coach_{i}',
+        'full_name': f'Coach Number{i}',
+        'niche': rng.choice(['business', 'life', 'fitness', 'mindset', None]),
+        'followers': 25000
+    } for i in range(1000)]
+
+    def render():
+        for i in range(iterations):
+            MessageTemplates.get_personalized_message(prospects[i % len(prospects)])
+
+    _, seconds = timed(render)
+    return {'iterations': iterations, 'seconds': round(seconds, 4), 'ops_per_second': round(iterations / seconds, 1)}
+
+def bench_crud_inserts(iterations: int) -> dict:
+    with temp_database() as (_, Session, _url):
+        db = Session()
+
+        def insert():
+            for i in range(iterations):
+                crud.create_prospect(db, schemas.ProspectCreate(username=f'crud_{i}', followers=20000, niche='business'))
+
+        _, seconds = timed(insert)
+        db.close()
+    return {'iterations': iterations, 'seconds': round(seconds, 4), 'inserts_per_second': round(iterations / seconds, 1)}
+
+def bench_run_campaign(prospects: int, failure_rate: float) -> dict:
+    from fake_apify import FakeApifyClient
+    from instagram_bot import ApifyInstagramBot
+
+    dataset = SyntheticDataset(campaigns=1, accounts=1, prospects=prospects, messages=0)
+
+    with temp_database() as (engine, Session, _):
+        dataset.load(engine)
+        db = Session()
+        campaign = db.query(models.Campaign).get(1)
+        campaign.daily_limit = prospects
+        account = db.query(models.InstagramAccount).get(1)
+        account.daily_limit = prospects
+        db.commit()
+        qualified = db.query(models.Prospect).filter(models.Prospect.status == models.ProspectStatus.QUALIFIED).count()
+
+        client = FakeApifyClient(failure_rate=failure_rate, seed=1)
+        bot = ApifyInstagramBot(account_id=1, db=db, apify_client=client)
+        bot.sleep = lambda seconds: None
+
+        _, seconds = timed(bot.run_campaign, 1)
+        sent = db.query(models.Message).count()
+        db.close()
+
+    return {
+        'qualified_prospects': qualified,
+        'messages_sent': sent,
+        'actor_calls': len(client.calls),
+        'seconds': round(seconds, 4),
+        'messages_per_second': round(sent / seconds, 1) if seconds else 0.0
+    }
+
+def run(iterations: int = 20000, campaign_prospects: int = 2000, failure_rate: float = 0.05) -> dict:
+    return {
+        'templates': bench_templates(iterations),
+        'crud_inserts': bench_crud_inserts(max(1, iterations // 20)),
+        'run_campaign': bench_run_campaign(campaign_prospects, failure_rate)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--campaign-prospects', type=int, default=2000)
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    args = parser.parse_args()
+    emit({'benchmark': 'micro', **run(args.iterations, args.campaign_prospects, args.failure_rate)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analytics rollup job over synthetic messages.
+
+    python -m benchmarks.bench_rollups --messages 10000000
+
+Builds a throwaway SQLite database, times a full rollup build, an incremental
+refresh after one more day of traffic, and the range queries the API runs.
+Prints one JSON object.
+"""
+import argparse
+from datetime import timedelta
+
+from app import analytics, models
+from benchmarks.common import emit, temp_database, timed
+from benchmarks.generator import SyntheticDataset, insert_chunked
+
+def run(messages: int = 10_000_000, days: int = 365, seed: int = 42) -> dict:
+    dataset = SyntheticDataset(seed=seed, prospects=max(1, messages // 4), messages=messages, days=days)
+
+    with temp_database() as (engine, Session, _):
+        _, seed_seconds = timed(dataset.load, engine)
+
+        db = Session()
+        full, full_seconds = timed(analytics.refresh_rollups, db)
+        _, noop_seconds = timed(analytics.refresh_rollups, db)
+
+        daily_volume = max(1, messages // days)
+        last_day = dataset.start_at + timedelta(days=days)
+        with engine.begin() as conn:
+            insert_chunked(conn, models.Message, dataset.message_rows(daily_volume, start_id=messages + 1, start_at=last_day, days=1))
+        incremental, incremental_seconds = timed(analytics.refresh_rollups, db)
+
+        end = last_day + timedelta(days=1)
+        daily_rows, daily_query_seconds = timed(analytics.get_rollups, db, 'day', end - timedelta(days=30), end)
+        hourly_rows, hourly_query_seconds = timed(analytics.get_rollups, db, 'hour', end - timedelta(days=7), end)
+        _, summarize_seconds = timed(analytics.summarize_rollups, daily_rows)
+        db.close()
+
+    return {
+        'messages': messages,
+        'days': days,
+        'seed_seconds': round(seed_seconds, 3),
+        'full_build_seconds': round(full_seconds, 3),
+        'full_build_rollups': full['rollups_written'],
+        'noop_refresh_seconds': round(noop_seconds, 4),
+        'incremental_messages': daily_volume,
+        'incremental_refresh_seconds': round(incremental_seconds, 3),
+        'incremental_days_recomputed': incremental['days_recomputed'],
+        'query_30d_daily_seconds': round(daily_query_seconds, 4),
+        'query_30d_daily_rows': len(daily_rows),
+        'query_7d_hourly_seconds': round(hourly_query_seconds, 4),
+        'query_7d_hourly_rows': len(hourly_rows),
+        'summarize_30d_seconds': round(summarize_seconds, 4)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    emit({'benchmark': 'rollups', **run(args.messages, args.days, args.seed)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark bio search: FTS5 MATCH with BM25 ranking against a LIKE '%...%' scan.
+
+    python -m benchmarks.bench_search --prospects 1000000
+
+Loads synthetic prospects into a throwaway SQLite database (the FTS index is
+filled by the insert triggers) and plants a rare phrase in one bio in every
+RARE_EVERY through the update trigger. Each query then runs through
+crud.get_prospects both ways, alone and combined with the status/niche filters,
+plus a full match count. The synthetic vocabulary is small, so common terms let
+LIKE ... LIMIT stop early; the rare phrase and the counts show the full-scan cost.
+Prints one JSON object.
+"""
+import argparse
+
+from sqlalchemy import func, text
+
+from app import crud, models, search
+from benchmarks.common import emit, latency_summary, temp_database, timed
+from benchmarks.generator import SyntheticDataset
+
+RARE_EVERY = 10000
+RARE_PHRASE = 'keynote speaker'
+QUERIES = [
+    ('rare_phrase', f'"{RARE_PHRASE}"', RARE_PHRASE),
+    ('phrase', '"high ticket"', 'high ticket'),
+    ('word', 'mentorship', 'mentorship'),
+    ('prefix', 'transform*', 'transform'),
+    ('two_words', 'podcast masterclass', None)
+]
+
+def _like(db, pattern, status=None, niche=None, limit=50):
+    query = db.query(models.Prospect).filter(models.Prospect.bio.like(f'%{pattern}%'))
+    if status:
+        query = query.filter(models.Prospect.status == models.ProspectStatus(status))
+    if niche:
+        query = query.filter(models.Prospect.niche == niche)
+    return query.limit(limit).all()
+
+def _like_count(db, pattern):
+    return db.query(func.count(models.Prospect.id)).filter(models.Prospect.bio.like(f'%{pattern}%')).scalar()
+
+def _fts_count(db, q):
+    return db.execute(text(f"SELECT count(*) FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH :q"),
+                      {'q': search.build_match_query(q)}).scalar()
+
+def _sample(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        _, seconds = timed(fn)
+        samples.append(seconds)
+    return latency_summary(samples)
+
+def run(prospects: int = 1_000_000, repeat: int = 5, seed: int = 42) -> dict:
+    dataset = SyntheticDataset(seed=seed, prospects=prospects, messages=0)
+    results = {'prospects': prospects}
+
+    with temp_database() as (engine, Session, _):
+        _, load_seconds = timed(dataset.load, engine)
+        results['load_with_fts_triggers_seconds'] = round(load_seconds, 3)
+        db = Session()
+
+        _, update_seconds = timed(lambda: (db.execute(
+            text("UPDATE prospects SET bio = bio || :extra WHERE id % :every = 0"),
+            {'extra': f' | {RARE_PHRASE}', 'every': RARE_EVERY}
+        ), db.commit()))
+        results['rare_bio_update_seconds'] = round(update_seconds, 4)
+
+        for name, q, like_pattern in QUERIES:
+            entry = {'fts': _sample(lambda: crud.get_prospects(db, limit=50, q=q), repeat)}
+            entry['fts_filtered'] = _sample(
+                lambda: crud.get_prospects(db, limit=50, status='qualified', niche='business', q=q), repeat)
+            entry['fts_count'] = _sample(lambda: _fts_count(db, q), repeat)
+            entry['matches'] = _fts_count(db, q)
+            if like_pattern:
+                entry['like'] = _sample(lambda: _like(db, like_pattern), repeat)
+                entry['like_filtered'] = _sample(lambda: _like(db, like_pattern, 'qualified', 'business'), repeat)
+                entry['like_count'] = _sample(lambda: _like_count(db, like_pattern), repeat)
+            results[name] = entry
+
+        db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prospects', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    emit({'benchmark': 'search', **run(args.prospects, args.repeat, args.seed)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Session health checks: one account at a time against the checker's pool.
+
+    python -m benchmarks.bench_session_health --accounts 100 --latency 0.05 --workers 16
+
+Checks --accounts synthetic accounts against FakeSessionCheck, whose runs each
+sleep --latency seconds in place of the actor round trip, with every
+--expired-every-th session expired. Times a pass with one worker against one
+with --workers, counts the statements each pass sends to the database, then
+renews the expired sessions and checks again. Reports whether expired accounts
+were kept out of worker leases and select_best_available_account, and whether
+renewed ones came back.
+"""
+import argparse
+from typing import Dict
+
+from sqlalchemy import event
+
+from app import leases, models, session_health
+from benchmarks.common import emit, temp_database, timed
+from benchmarks.generator import SyntheticDataset
+from fake_apify import FakeApifyClient, FakeSessionCheck
+from instagram_bot import ApifyInstagramBot
+
+ACTOR_ID = 'apify/instagram-profile-scraper'
+
+def _pass(Session, client: FakeApifyClient, workers: int, engine) -> Dict:
+    statements = []
+    count = lambda *args: statements.append(1)
+    event.listen(engine, 'before_cursor_execute', count)
+    db = Session()
+    try:
+        result, seconds = timed(session_health.SessionHealthChecker(db, client, max_workers=workers).check_all)
+    finally:
+        db.close()
+        event.remove(engine, 'before_cursor_execute', count)
+    return {**result, 'workers': workers, 'seconds': round(seconds, 3),
+            'checks_per_second': round(result['checked'] / seconds, 1) if seconds else 0.0,
+            'statements': len(statements)}
+
+def run(accounts: int = 100, latency: float = 0.05, workers: int = 16, expired_every: int = 5) -> Dict:
+    dataset = SyntheticDataset(accounts=accounts)
+    expired = {f'session-{i}' for i in range(1, accounts + 1) if i % expired_every == 0}
+    client = FakeApifyClient()
+    client.handlers[ACTOR_ID] = FakeSessionCheck(expired=expired, latency=latency)
+
+    with temp_database() as (engine, Session, _):
+        with engine.begin() as conn:
+            conn.execute(models.InstagramAccount.__table__.insert(), list(dataset.account_rows()))
+
+        sequential = _pass(Session, client, 1, engine)
+        pooled = _pass(Session, client, workers, engine)
+
+        db = Session()
+        expired_ids = {account_id for account_id, in db.query(models.InstagramAccount.id).filter(
+            models.InstagramAccount.account_status == session_health.SESSION_EXPIRED)}
+        leased = set(leases.active_accounts(db))
+        # Spread sends so the selector has to walk past the expired accounts to the least used
+        for account in db.query(models.InstagramAccount):
+            account.daily_messages_sent = 0 if account.id in expired_ids else 1
+        db.commit()
+        selected = ApifyInstagramBot.select_best_available_account(db)
+        db.close()
+
+        client.handlers[ACTOR_ID].expired.clear()
+        renewed = _pass(Session, client, workers, engine)
+        db = Session()
+        still_expired = db.query(models.InstagramAccount).filter(
+            models.InstagramAccount.account_status == session_health.SESSION_EXPIRED).count()
+        db.close()
+
+    return {
+        'accounts': accounts,
+        'latency_seconds': latency,
+        'sequential': sequential,
+        'pooled': pooled,
+        'speedup': round(sequential['seconds'] / pooled['seconds'], 2) if pooled['seconds'] else 0.0,
+        'renewed': renewed,
+        'marked_expired_correctly': expired_ids == {int(session[len('session-'):]) for session in expired},
+        'expired_kept_out_of_leases': not (leased & expired_ids) and len(leased) == accounts - len(expired_ids),
+        'expired_never_selected': selected is not None and selected.id not in expired_ids,
+        'renewed_accounts_recovered': still_expired == 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--expired-every', type=int, default=5)
+    args = parser.parse_args()
+    emit({'benchmark': 'session_health', **run(args.accounts, args.latency, args.workers, args.expired_every)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Profile-picture thumbnails (app.thumbnails): fetching pictures and serving them.
+
+    python -m benchmarks.bench_thumbnails --prospects 300 --latency 0.05 --workers 8
+
+Gives --prospects synthetic prospects picture URLs on FakeImageServer, which
+sleeps --latency seconds per download. Every 10th shares the default avatar,
+every 20th is a 404 and every 50th isn't an image. Times a fetch pass with one
+worker against one with --workers, each into a new cache directory (which
+makes the fetcher start over). Then times a
+second pass, which should find nothing pending, and serves every cached
+thumbnail through the API router. Finally it shrinks the cache limit to half
+of what is on disk and evicts. Reports whether each picture was downloaded
+once, whether responses carry the immutable Cache-Control, and whether evicted
+pictures lost their digests.
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from typing import Dict
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models, thumbnails
+from benchmarks.common import emit, temp_database, timed
+from benchmarks.generator import SyntheticDataset
+from fake_images import FakeImageServer
+
+def _picture(server: FakeImageServer, i: int) -> str:
+    if i % 50 == 0:
+        return server.url(f'broken-{i}')
+    if i % 20 == 0:
+        return server.url(f'missing-{i}')
+    if i % 10 == 0:
+        return server.url(f'same-{i}')
+    return server.url(f'user-{i}')
+
+def _disk_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def _pass(Session, server: FakeImageServer, workers: int) -> Dict:
+    db = Session()
+    server.hits.clear()
+    with tempfile.TemporaryDirectory() as parent:
+        # A cache directory that doesn't exist yet, so the fetcher starts over
+        thumbnails.thumbnail_cache = thumbnails.ThumbnailCache(os.path.join(parent, 'thumbnails'))
+        fetcher = thumbnails.ThumbnailFetcher(db, max_workers=workers)
+        result, seconds = timed(fetcher.run)
+    db.close()
+    return {**result, 'workers': workers, 'seconds': round(seconds, 3),
+            'pictures_per_second': round(result['prospects'] / seconds, 1) if seconds else 0.0,
+            'downloads': sum(server.hits.values())}
+
+def run(prospects: int = 300, latency: float = 0.05, workers: int = thumbnails.THUMBNAIL_WORKERS) -> Dict:
+    original = thumbnails.thumbnail_cache
+    with FakeImageServer(latency=latency) as server, temp_database() as (engine, Session, _), \
+            tempfile.TemporaryDirectory() as parent:
+        rows = list(itertools.islice(SyntheticDataset(prospects=prospects).prospect_rows(), prospects))
+        for i, row in enumerate(rows, 1):
+            row['profile_pic_url'] = _picture(server, i)
+        with engine.begin() as conn:
+            conn.execute(models.Prospect.__table__.insert(), rows)
+        distinct_urls = len({row['profile_pic_url'] for row in rows})
+
+        sequential = _pass(Session, server, 1)
+        pooled = _pass(Session, server, workers)
+
+        directory = os.path.join(parent, 'thumbnails')
+        thumbnails.thumbnail_cache = cache = thumbnails.ThumbnailCache(directory)
+        db = Session()
+        fetcher = thumbnails.ThumbnailFetcher(db, max_workers=workers)
+        fetcher.run()
+        server.hits.clear()
+        again, again_seconds = timed(fetcher.run)
+        digests = sorted({digest for digest, in db.query(models.Prospect.thumbnail_digest).filter(
+            models.Prospect.thumbnail_digest.isnot(None))})
+
+        app = FastAPI()
+        app.include_router(thumbnails.router, prefix='/api')
+        client = TestClient(app)
+        paths = [f'/api/thumbnails/{digest}/{size}.webp' for digest in digests for size in cache.sizes]
+        started = time.perf_counter()
+        responses = [client.get(path) for path in paths]
+        serve_seconds = time.perf_counter() - started
+        not_found = client.get(f"/api/thumbnails/{'0' * 64}/{cache.sizes[0]}.webp").status_code
+
+        on_disk = _disk_bytes(directory)
+        cache.max_bytes = on_disk // 2
+        fetcher.run()
+        after_eviction = _disk_bytes(directory)
+        kept = {digest for digest, in db.query(models.Prospect.thumbnail_digest).filter(
+            models.Prospect.thumbnail_digest.isnot(None))}
+        # Every digest still on a prospect must still be on disk
+        dangling = [digest for digest in kept if not cache.has(digest)]
+        db.close()
+    thumbnails.thumbnail_cache = original
+
+    return {
+        'prospects': prospects,
+        'distinct_urls': distinct_urls,
+        'latency_seconds': latency,
+        'sequential': sequential,
+        'pooled': pooled,
+        'speedup': round(sequential['seconds'] / pooled['seconds'], 2) if pooled['seconds'] else 0.0,
+        'second_pass_seconds': round(again_seconds, 3),
+        'serve': {
+            'thumbnails': len(paths),
+            'seconds': round(serve_seconds, 3),
+            'requests_per_second': round(len(paths) / serve_seconds, 1) if serve_seconds else 0.0,
+            'bytes_per_thumbnail': on_disk // len(paths) if paths else 0
+        },
+        'each_url_downloaded_once': pooled['downloads'] == distinct_urls,
+        'second_pass_idle': again['prospects'] == 0 and not server.hits,
+        'served_immutable': all(r.status_code == 200 and r.headers['content-type'] == 'image/webp'
+                                and r.headers['cache-control'] == thumbnails.CACHE_CONTROL for r in responses),
+        'unknown_digest_404': not_found == 404,
+        'evicted_to_limit': after_eviction <= cache.max_bytes,
+        'evicted': len(set(digests) - kept),
+        'evicted_digests_cleared': len(kept) < len(digests) and not dangling
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prospects', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=thumbnails.THUMBNAIL_WORKERS)
+    args = parser.parse_args()
+    emit({'benchmark': 'thumbnails', **run(args.prospects, args.latency, args.workers)})
+
+if __name__ == '__main__':
+    main()
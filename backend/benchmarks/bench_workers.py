@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Multi-process dispatch: worker leases, takeover and rebalancing.
+
+    python -m benchmarks.bench_workers --processes 3 --accounts 6 --prospects 600
+
+Starts worker processes (worker.Worker) against a throwaway SQLite file (or a
+Postgres database with --backend postgresql and BENCH_POSTGRES_URL), with
+a FakeApifyClient whose runs and datasets live in a shared directory so any
+process can settle a batch another one started, as with real Apify runs. Once
+the accounts are spread out, one worker is SIGKILLed mid-campaign and the time
+until the survivors hold its accounts is measured; then more accounts are added
+and the time until they are leased is measured. Sleeps between batches are
+scaled down by --time-scale.
+
+Every successful DM is read back from the fake's datasets, so the duplicate
+counts cover sends the killed worker made as well as the ones recorded in
+messages. Both should be 0.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import engine_options
+from benchmarks.common import emit, temp_database
+from fake_apify import FakeApifyClient
+
+class _JsonDir:
+    """dict-like store of JSON files, shared between processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def __setitem__(self, key: str, value):
+        tmp = os.path.join(self.path, f'.{key}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp, os.path.join(self.path, key))
+
+    def get(self, key: str, default=None):
+        try:
+            with open(os.path.join(self.path, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def values(self):
+        return [self.get(key) for key in os.listdir(self.path) if not key.startswith('.')]
+
+class SharedFakeApifyClient(FakeApifyClient):
+    """FakeApifyClient whose runs and datasets are visible to every process; DM runs take send_seconds"""
+
+    def __init__(self, directory: str, send_seconds: float = 0.0):
+        super().__init__()
+        self.runs = _JsonDir(os.path.join(directory, 'runs'))
+        self.datasets = _JsonDir(os.path.join(directory, 'datasets'))
+        self.send_seconds = send_seconds
+
+    def default_handler(self, run_input: Dict) -> List[Dict]:
+        time.sleep(self.send_seconds)
+        return super().default_handler(run_input)
+
+def _worker_process(url: str, directory: str, lease_seconds: int, time_scale: float, send_seconds: float):
+    from worker import Worker
+
+    options = engine_options(url)
+    if url.startswith('sqlite'):
+        options['connect_args']['timeout'] = 30
+    engine = create_engine(url, **options)
+    worker = Worker(
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        apify_client=SharedFakeApifyClient(directory, send_seconds),
+        lease_seconds=lease_seconds,
+        poll_seconds=lease_seconds / 3,
+        sleep=lambda seconds: time.sleep(seconds * time_scale)
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+def _add_accounts(db, start: int, count: int, daily_limit: int):
+    for i in range(start, start + count):
+        account = models.InstagramAccount(
+            username=f'sender_{i}', session_id=f'session-{i}', daily_limit=daily_limit,
+            daily_messages_sent=0, last_reset_date=date.today(), active_hours_start=0, active_hours_end=24
+        )
+        db.add(account)
+        db.flush()
+        db.add(models.Campaign(name=f'Pinned {i}', instagram_account_id=account.id, daily_limit=daily_limit,
+                               follow_up_delay_hours=0))
+    db.commit()
+
+def _leases(db) -> Dict[int, str]:
+    db.expire_all()
+    now = datetime.utcnow()
+    return {lease.instagram_account_id: lease.worker_id for lease in db.query(models.AccountLease).filter(
+        models.AccountLease.worker_id.isnot(None), models.AccountLease.expires_at > now
+    )}
+
+def _spread(db, processes: int, accounts: int) -> bool:
+    leases = _leases(db)
+    return len(set(leases.values())) == processes and len(leases) == accounts
+
+def _taken_over(db, account_ids: List[int], pid: int) -> bool:
+    """Every one of these accounts is leased again, by a worker other than `pid`"""
+    leases = _leases(db)
+    return all(leases.get(account_id) and leases[account_id].split(':')[1] != str(pid) for account_id in account_ids)
+
+def _wait_for(condition, timeout: float, interval: float = 0.1) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if condition():
+            return time.perf_counter() - started
+        time.sleep(interval)
+    return -1.0
+
+def run(processes: int = 3, accounts: int = 6, added_accounts: int = 3, prospects: int = 600,
+        lease_seconds: int = 3, time_scale: float = 0.0001, send_seconds: float = 0.05, timeout: float = 120,
+        backend: str = 'sqlite') -> dict:
+    with temp_database(backend=backend) as (engine, Session, url), tempfile.TemporaryDirectory() as shared:
+        directory = os.path.join(shared, 'apify')
+        db = Session()
+        _add_accounts(db, 1, accounts, daily_limit=prospects)
+        db.add(models.Campaign(name='Unpinned', daily_limit=prospects, follow_up_delay_hours=0))
+        db.bulk_insert_mappings(models.Prospect, [{
+            'username': f'worker_prospect_{i}', 'followers': 20000 + i, 'niche': 'business',
+            'bio': f'business coach {uuid.UUID(int=i).hex[:6]}', 'coach_score': 0.9, 'value_score': 0.9,
+            'status': models.ProspectStatus.QUALIFIED, 'dm_sent': False
+        } for i in range(prospects)])
+        db.commit()
+
+        context = multiprocessing.get_context('spawn')
+        children = [context.Process(target=_worker_process,
+                                    args=(url, directory, lease_seconds, time_scale, send_seconds))
+                    for _ in range(processes)]
+        started = time.perf_counter()
+        try:
+            for child in children:
+                child.start()
+
+            spread_seconds = _wait_for(lambda: _spread(db, processes, accounts), timeout)
+            _wait_for(lambda: db.query(models.Message).count() >= prospects // 4, timeout)
+
+            # Kill a worker that holds accounts, as if its machine died
+            held = _leases(db)
+            victim = children[0]
+            victim_accounts = [account_id for account_id, worker_id in held.items()
+                               if worker_id.split(':')[1] == str(victim.pid)]
+            os.kill(victim.pid, signal.SIGKILL)
+            victim.join()
+            survivors = [child for child in children if child is not victim]
+            takeover_seconds = _wait_for(lambda: _taken_over(db, victim_accounts, victim.pid), timeout)
+
+            _add_accounts(db, accounts + 1, added_accounts, daily_limit=prospects)
+            total_accounts = accounts + added_accounts
+            rebalance_seconds = _wait_for(lambda: len(_leases(db)) == total_accounts, timeout)
+            shares = Counter(_leases(db).values())
+
+            _wait_for(lambda: db.query(models.Prospect).filter(models.Prospect.dm_sent == False).count() == 0, timeout)
+            elapsed = time.perf_counter() - started
+            for child in survivors:
+                os.kill(child.pid, signal.SIGTERM)
+            for child in survivors:
+                child.join()
+        finally:
+            # Never leave workers looping on a database that is about to be dropped
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+            for child in children:
+                if child.pid is not None:
+                    child.join()
+
+        db.expire_all()
+        messages = db.query(models.Message.prospect_id).all()
+        recorded = Counter(prospect_id for prospect_id, in messages)
+        delivered = Counter(
+            item['username'] for items in _JsonDir(os.path.join(directory, 'datasets')).values()
+            for item in items if item['status'] == 'success'
+        )
+        remaining = db.query(models.Prospect).filter(models.Prospect.dm_sent == False).count()
+        open_batches = db.query(models.SendBatch).filter(models.SendBatch.status.in_(('pending', 'started'))).count()
+        db.close()
+
+    return {
+        'backend': backend,
+        'processes': processes,
+        'accounts': total_accounts,
+        'prospects': prospects,
+        'killed_worker_accounts': len(victim_accounts),
+        'spread_seconds': round(spread_seconds, 3),
+        'takeover_seconds': round(takeover_seconds, 3),
+        'rebalance_seconds': round(rebalance_seconds, 3),
+        'accounts_per_worker_after_rebalance': sorted(shares.values()),
+        'messages_recorded': len(messages),
+        'dms_delivered': sum(delivered.values()),
+        'duplicate_messages': sum(1 for count in recorded.values() if count > 1),
+        'duplicate_deliveries': sum(1 for count in delivered.values() if count > 1),
+        'prospects_left': remaining,
+        'open_batches': open_batches,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(len(messages) / elapsed, 1) if elapsed else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--accounts', type=int, default=6)
+    parser.add_argument('--added-accounts', type=int, default=3)
+    parser.add_argument('--prospects', type=int, default=600)
+    parser.add_argument('--lease-seconds', type=int, default=3)
+    parser.add_argument('--time-scale', type=float, default=0.0001)
+    parser.add_argument('--send-seconds', type=float, default=0.05)
+    parser.add_argument('--backend', choices=['sqlite', 'postgresql'], default='sqlite')
+    args = parser.parse_args()
+    emit({'benchmark': 'workers', **run(args.processes, args.accounts, args.added_accounts, args.prospects,
+                                        args.lease_seconds, args.time_scale, args.send_seconds,
+                                        backend=args.backend)})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic data for benchmarks and load tests.
+
+    python -m benchmarks.generator --database-url sqlite:///bench.db --prospects 1000000 --messages 5000000
+
+The same seed always yields the same rows. Each table draws from its own RNG, so
+generating more messages doesn't change the prospects and vice versa.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import create_engine, text
+
+from app import models
+from app.database import Base, database_url, engine_options
+from message_templates import MessageTemplates
+
+NICHES = ['business', 'life', 'fitness', 'mindset', None]
+NICHE_WORDS = {
+    'business': ['business coach', 'scale your agency', '7-figure entrepreneur', 'sales mentor'],
+    'life': ['life coach', 'personal growth', 'find your purpose', 'transformation mentor'],
+    'fitness': ['fitness coach', 'online PT', 'body transformation', 'nutrition coaching'],
+    'mindset': ['mindset coach', 'limiting beliefs', 'NLP practitioner', 'mental performance'],
+    None: ['creator', 'travel', 'photography', 'dog mom']
+}
+BIO_EXTRAS = ['DM me', 'high ticket', 'apply below', '1:1 mentorship', 'free masterclass',
+              'link in bio', 'book a call', 'limited spots', 'premium program', 'podcast host']
+STATUS_WEIGHTS = [
+    (models.ProspectStatus.DISCOVERED, 0.35),
+    (models.ProspectStatus.QUALIFIED, 0.30),
+    (models.ProspectStatus.MESSAGED, 0.22),
+    (models.ProspectStatus.RESPONDED, 0.06),
+    (models.ProspectStatus.CONVERTED, 0.02),
+    (models.ProspectStatus.REJECTED, 0.05)
+]
+MESSAGED_STATUSES = {models.ProspectStatus.MESSAGED, models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED}
+INSERT_CHUNK_SIZE = 50000
+
+class SyntheticDataset:
+
+    def __init__(self, seed: int = 42, campaigns: int = 10, accounts: int = 20, prospects: int = 100000,
+                 messages: int = 500000, days: int = 365, start_at: datetime = datetime(2025, 1, 1),
+                 response_rate: float = 0.15):
+        self.seed = seed
+        self.campaigns = campaigns
+        self.accounts = accounts
+        self.prospects = prospects
+        self.messages = messages
+        self.days = days
+        self.start_at = start_at
+        self.response_rate = response_rate
+
+    def _rng(self, table: str) -> random.Random:
+        return random.Random(f"{self.seed}:{table}")
+
+    def niche_for(self, prospect_id: int):
+        return NICHES[prospect_id % len(NICHES)]
+
+    def account_rows(self) -> Iterator[Dict]:
+        for i in range(1, self.accounts + 1):
+            yield {
+                'id': i,
+                'username': f'outreach_account_{i}',
+                'session_id': f'session-{i}',
+                'is_active': True,
+                'daily_messages_sent': 0,
+                'daily_limit': 40,
+                'last_reset_date': self.start_at.date(),
+                'account_status': 'active',
+                'active_hours_start': 0,
+                'active_hours_end': 24,
+                'created_at': self.start_at
+            }
+
+    def campaign_rows(self) -> Iterator[Dict]:
+        rng = self._rng('campaigns')
+        for i in range(1, self.campaigns + 1):
+            niche = NICHES[i % (len(NICHES) - 1)]
+            yield {
+                'id': i,
+                'name': f'{niche.title()} coaches #{i}',
+                'description': 'Synthetic campaign',
+                'instagram_account_id': (i - 1) % self.accounts + 1 if self.accounts else None,
+                'status': models.CampaignStatus.ACTIVE,
+                'messages_sent': 0,
+                'responses_received': 0,
+                'conversions': 0,
+                'daily_limit': 50,
+                'created_at': self.start_at,
+                'updated_at': self.start_at
+            }
+
+    def campaign_target_rows(self) -> Tuple[List[Dict], List[Dict]]:
+        """Hashtag and target-account join rows for every campaign"""
+        rng = self._rng('campaign_targets')
+        hashtags, accounts = [], []
+        for i in range(1, self.campaigns + 1):
+            niche = NICHES[i % (len(NICHES) - 1)]
+            hashtags += [{'campaign_id': i, 'hashtag': tag, 'position': position}
+                         for position, tag in enumerate([f'{niche}coach', f'{niche}coaching'])]
+            accounts.append({'campaign_id': i, 'username': f'competitor_{rng.randrange(100)}', 'position': 0})
+        return hashtags, accounts
+
+    def prospect_source_rows(self) -> Iterator[Dict]:
+        """Provenance for every prospect: its niche's hashtag or one of 100 competitor accounts"""
+        rng = self._rng('prospect_sources')
+        for i in range(1, self.prospects + 1):
+            niche = self.niche_for(i)
+            if niche and rng.random() < 0.6:
+                source_type, source = 'hashtag', f'{niche}coach'
+            else:
+                source_type, source = 'followers', f'competitor_{rng.randrange(100)}'
+            yield {'prospect_id': i, 'source_type': source_type, 'source': source, 'first_seen_at': self.start_at}
+
+    def prospect_rows(self) -> Iterator[Dict]:
+        rng = self._rng('prospects')
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        for i in range(1, self.prospects + 1):
+            niche = self.niche_for(i)
+            status = rng.choices(statuses, weights)[0]
+            followers = int(min(500000, max(1000, rng.lognormvariate(10.2, 0.8))))
+            created_at = self.start_at + timedelta(seconds=rng.randrange(self.days * 86400))
+            messaged = status in MESSAGED_STATUSES
+            yield {
+                'id': i,
+                'username': f'coach_{i:08d}',
+                'full_name': f'Coach {i}',
+                'followers': followers,
+                'following': rng.randrange(100, 3000),
+                'posts_count': rng.randrange(10, 2000),
+                'engagement_rate': round(rng.uniform(0.2, 8.0), 2),
+                'bio': ' | '.join([rng.choice(NICHE_WORDS[niche])] + rng.sample(BIO_EXTRAS, 2)),
+                'coach_score': round(rng.uniform(0, 10), 1),
+                'value_score': round(rng.uniform(0, 10), 1),
+                'niche': niche,
+                'status': status,
+                'dm_sent': messaged,
+                'dm_sent_at': created_at + timedelta(days=1) if messaged else None,
+                'response_received': status in (models.ProspectStatus.RESPONDED, models.ProspectStatus.CONVERTED),
+                'profile_url': f'https://instagram.com/coach_{i:08d}',
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+
+    def message_rows(self, count: int = None, start_id: int = 1, start_at: datetime = None, days: int = None) -> Iterator[Dict]:
+        """Messages spread uniformly over `days` from `start_at`; pass start_id to extend an existing set"""
+        rng = self._rng(f'messages:{start_id}')
+        count = self.messages if count is None else count
+        start_at = start_at or self.start_at
+        span_seconds = (days or self.days) * 86400
+        for i in range(count):
+            sent_at = start_at + timedelta(seconds=rng.randrange(span_seconds))
+            prospect_id = rng.randint(1, self.prospects)
+            campaign_id = rng.randint(1, self.campaigns)
+            responded = rng.random() < self.response_rate
+            niche = self.niche_for(prospect_id)
+            variant = f"{niche or 'business'}:{rng.randrange(5)}"
+            # Campaigns pin their account, templates are picked by niche
+            row = {
+                'id': start_id + i,
+                'prospect_id': prospect_id,
+                'campaign_id': campaign_id,
+                'instagram_account_id': (campaign_id - 1) % self.accounts + 1 if self.accounts else None,
+                'content': MessageTemplates.personalize_message(MessageTemplates.get_template_by_variant(variant), {
+                    'username': f'coach_{prospect_id:08d}', 'full_name': f'Coach {prospect_id}', 'niche': niche or 'coaching'
+                }),
+                'template_variant': variant,
+                'sent_at': sent_at,
+                'response_at': sent_at + timedelta(seconds=rng.randrange(60, 3 * 86400)) if responded else None,
+                'response_content': 'Sounds interesting, tell me more' if responded else None,
+                'message_type': 'initial',
+                'created_at': sent_at
+            }
+            row['updated_at'] = row['response_at'] or sent_at  # When the reply was recorded
+            yield row
+
+    def user_rows(self) -> List[Dict]:
+        from app.auth import pwd_context
+        return [{
+            'id': 1,
+            'username': 'admin',
+            'email': 'admin@example.com',
+            'password_hash': pwd_context.hash('admin'),
+            'is_active': True,
+            'created_at': self.start_at
+        }]
+
+    def load(self, engine, chunk_size: int = INSERT_CHUNK_SIZE) -> Dict[str, int]:
+        """Create the schema if needed and insert every table with chunked executemany"""
+        Base.metadata.create_all(bind=engine)
+        counts = {}
+        with engine.begin() as conn:
+            hashtags, accounts = self.campaign_target_rows()
+            for model, rows in [
+                (models.User, self.user_rows()),
+                (models.InstagramAccount, self.account_rows()),
+                (models.Campaign, self.campaign_rows()),
+                (models.CampaignHashtag, hashtags),
+                (models.CampaignTargetAccount, accounts),
+                (models.Prospect, self.prospect_rows()),
+                (models.ProspectSource, self.prospect_source_rows()),
+                (models.Message, self.message_rows())
+            ]:
+                counts[model.__tablename__] = insert_chunked(conn, model, rows, chunk_size)
+                if engine.dialect.name == 'postgresql' and 'id' in model.__table__.c:
+                    # Rows carry their own ids, so move the sequence past them for later inserts
+                    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                                      f"COALESCE(MAX(id), 1)) FROM {model.__tablename__}"))
+        return counts
+
+def insert_chunked(conn, model, rows, chunk_size: int = INSERT_CHUNK_SIZE) -> int:
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.execute(model.__table__.insert(), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(model.__table__.insert(), chunk)
+        total += len(chunk)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--campaigns', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--prospects', type=int, default=1_000_000)
+    parser.add_argument('--messages', type=int, default=5_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(seed=args.seed, campaigns=args.campaigns, accounts=args.accounts,
+                               prospects=args.prospects, messages=args.messages, days=args.days)
+    started = time.perf_counter()
+    url = database_url(args.database_url)
+    counts = dataset.load(create_engine(url, **engine_options(url)))
+    print(json.dumps({'rows': counts, 'seconds': round(time.perf_counter() - started, 3)}))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+httpx load scenarios against the FastAPI app.
+
+    python -m benchmarks.load_api --prospects 200000 --concurrency 20 --requests 2000
+    python -m benchmarks.load_api --base-url http://localhost:8001 --scenario list --scenario login
+
+Without --base-url the app runs in-process over ASGI against a freshly generated
+SQLite database. With --base-url the target must already hold generator data
+(python -m benchmarks.generator) including the admin/admin user.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+from benchmarks.common import emit, latency_summary, temp_database
+from benchmarks.generator import SyntheticDataset
+
+_counter = itertools.count()
+
+def _list(client: httpx.AsyncClient, i: int):
+    return client.get('/api/prospects/', params={'skip': (i * 100) % 10000, 'limit': 100})
+
+def _filter(client: httpx.AsyncClient, i: int):
+    niche = ['business', 'life', 'fitness', 'mindset'][i % 4]
+    return client.get('/api/prospects/', params={'status': 'qualified', 'niche': niche, 'limit': 50})
+
+def _create(client: httpx.AsyncClient, i: int):
+    n = next(_counter)
+    return client.post('/api/prospects/', json={
+        'username': f'load_{os.getpid()}_{time.time_ns()}_{n}',
+        'followers': 25000,
+        'niche': 'business',
+        'bio': 'Business coach | DM me'
+    })
+
+def _login(client: httpx.AsyncClient, i: int):
+    return client.post('/api/auth/login', data={'username': 'admin', 'password': 'admin'})
+
+SCENARIOS: Dict[str, Callable] = {
+    'list': _list,
+    'filter': _filter,
+    'create': _create,
+    'login': _login
+}
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int) -> Dict:
+    request = SCENARIOS[name]
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                response = await request(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else 0.0,
+        'elapsed_seconds': round(elapsed, 3),
+        **latency_summary(latencies)
+    }
+
+async def authenticate(client: httpx.AsyncClient, username: str = 'admin', password: str = 'admin'):
+    """Log in once and send the bearer token with every later request"""
+    response = await client.post('/api/auth/login', data={'username': username, 'password': password})
+    response.raise_for_status()
+    client.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+
+async def run_all(client: httpx.AsyncClient, scenarios: List[str], requests: int, concurrency: int) -> Dict:
+    await authenticate(client)
+    return {name: await run_scenario(client, name, requests, concurrency) for name in scenarios}
+
+def run(scenarios: List[str] = None, requests: int = 1000, concurrency: int = 10,
+        prospects: int = 100000, messages: int = 0, base_url: str = None, seed: int = 42) -> Dict:
+    scenarios = scenarios or list(SCENARIOS)
+
+    if base_url:
+        async def remote():
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+                return await run_all(client, scenarios, requests, concurrency)
+        return {'target': base_url, 'scenarios': asyncio.run(remote())}
+
+    from app.database import get_db
+    from app.main import app
+
+    with temp_database() as (engine, Session, _):
+        SyntheticDataset(seed=seed, prospects=prospects, messages=messages).load(engine)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            async def local():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+                    return await run_all(client, scenarios, requests, concurrency)
+            results = asyncio.run(local())
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+    return {'target': 'in-process', 'prospects': prospects, 'scenarios': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=1000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--prospects', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    emit({'benchmark': 'load_api', **run(args.scenario, args.requests, args.concurrency,
+                                         args.prospects, base_url=args.base_url, seed=args.seed)})
+
+if __name__ == '__main__':
+    main()
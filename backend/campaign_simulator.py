@@ -0,0 +1,329 @@
+"""
+Dry-run campaign simulator for capacity planning.
+
+Copies the data a campaign run reads (accounts, campaigns, queued prospects,
+pending follow-ups and today's messages) into a throwaway SQLite database and
+runs the real ApifyInstagramBot.run_campaign against it on a virtual clock,
+with a FakeApifyClient as the sender. Each account is dispatched the way
+worker.py would - its pinned campaigns and its share of the unpinned ones -
+so batch sizes, MESSAGE_DELAY pacing and jitter, active hours, cool-downs,
+account and campaign daily limits and the midnight resets all come from the
+production code paths.
+
+It is a discrete-event simulation: every account runs in its own thread, but
+only one runs at a time. When a bot sleeps, or its DM actor run is busy
+sending (delay_between_messages per target, as the real actor does), its
+thread parks and the clock jumps to the next wake-up, so weeks of sending
+take seconds. The run stops once every prospect has been messaged and no
+follow-ups are left, or at the horizon.
+
+    python campaign_simulator.py                      all active campaigns, 28 days
+    python campaign_simulator.py --days 60 --failure-rate 0.05
+    MESSAGE_DELAY=90 python campaign_simulator.py     what-if on pacing settings
+"""
+import contextlib
+import heapq
+import io
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models, session_health
+from app.database import Base, engine as default_engine
+from fake_apify import FakeApifyClient
+from instagram_bot import ApifyInstagramBot
+from rate_controller import AdaptiveRateController, release_expired_cooldowns
+from worker import account_campaigns
+
+DEFAULT_DAYS = 28
+IDLE_SECONDS = 15 * 60
+COPY_CHUNK_SIZE = 10000
+SIMULATED_TABLES = [
+    'instagram_accounts', 'campaigns', 'campaign_hashtags', 'campaign_target_accounts', 'prospects',
+    'prospect_sources', 'prospect_vectors', 'lookalike_models', 'prospect_priorities', 'campaign_queue_states',
+    'message_templates', 'messages', 'follow_ups'
+]
+
+class SimulationEnded(BaseException):
+    """
+    Unwinds an account's thread when the simulation stops. A BaseException, so the
+    bot's own error handling (except Exception) can't swallow it.
+    """
+
+def copy_database(source, target, start: datetime, chunk_size: int = COPY_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Copy what a dispatch reads from the source engine into the target. Messages are
+    limited to the ones pending follow-ups refer to and the ones sent since the start
+    of the simulated day, which is all the daily limits and follow-ups look at.
+    """
+    Base.metadata.create_all(bind=target)
+    tables = Base.metadata.tables
+    messages, follow_ups = tables['messages'], tables['follow_ups']
+    filters = {
+        'follow_ups': follow_ups.c.status == 'pending',
+        'messages': or_(
+            messages.c.sent_at >= start.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1),
+            messages.c.id.in_(select([follow_ups.c.message_id]).where(follow_ups.c.status == 'pending'))
+        )
+    }
+
+    copied = {}
+    with source.connect() as reader, target.begin() as writer:
+        for name in SIMULATED_TABLES:
+            table = tables[name]
+            query = table.select()
+            if name in filters:
+                query = query.where(filters[name])
+            result = reader.execution_options(stream_results=True).execute(query)
+            copied[name] = 0
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.execute(table.insert(), [dict(row._mapping) for row in rows])
+                copied[name] += len(rows)
+    return copied
+
+class VirtualClock:
+    """Event queue of parked account threads; run() hands the baton to one thread at a time"""
+
+    def __init__(self, start: datetime, end: datetime):
+        self.now = start
+        self.end = end
+        self.stopped = False
+        self._events = []
+        self._sequence = itertools.count()
+        self._turn_over = threading.Event()
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def schedule(self, at: datetime, wake: threading.Event):
+        heapq.heappush(self._events, (at, next(self._sequence), wake))
+
+    def park(self, seconds: float):
+        """Called from an account thread: sleep `seconds` of virtual time"""
+        if self.stopped:
+            raise SimulationEnded()
+        wake = threading.Event()
+        self.schedule(self.now + timedelta(seconds=max(0.0, seconds)), wake)
+        self._turn_over.set()
+        wake.wait()
+        if self.stopped:
+            raise SimulationEnded()
+
+    def finish_turn(self):
+        """Called from an account thread that is done for good"""
+        self._turn_over.set()
+
+    def run(self, done) -> None:
+        while self._events and not done():
+            if self._events[0][0] > self.end:
+                break
+            at, _, wake = heapq.heappop(self._events)
+            self.now = max(self.now, at)
+            self._turn_over.clear()
+            wake.set()
+            self._turn_over.wait()
+        self.stopped = True
+        for _, _, wake in self._events:
+            wake.set()
+
+class CampaignSimulator:
+
+    def __init__(self, session_factory, start: datetime = None, days: int = DEFAULT_DAYS,
+                 campaign_ids: Optional[List[int]] = None, failure_rate: float = 0.0, seed: int = 0):
+        """session_factory opens sessions on the simulation's (throwaway) database"""
+        self.session_factory = session_factory
+        self.start = start or datetime.now()
+        self.days = days
+        self.campaign_ids = campaign_ids
+        self.seed = seed
+        self.clock = VirtualClock(self.start, self.start + timedelta(days=days))
+        self.apify_client = FakeApifyClient(failure_rate=failure_rate, seed=seed)
+        self.sent = defaultdict(Counter)  # account id -> local date -> DMs delivered
+        self.accounts: Dict[str, int] = {}
+        self.finished_at: Optional[datetime] = None
+        self.initial_finished_at: Optional[datetime] = None
+        self.errors: List[str] = []
+
+    def _dm_actor(self, run_input: Dict) -> List[Dict]:
+        """DM actor stand-in: takes delay_between_messages per target on the virtual clock"""
+        usernames = run_input.get('target_usernames', [])
+        self.clock.park(len(usernames) * run_input.get('delay_between_messages', 0))
+        items = self.apify_client.default_handler(run_input)
+        account_id = self.accounts.get(run_input.get('sessionid'))
+        self.sent[account_id][self.clock.now.date()] += sum(1 for item in items if item['status'] == 'success')
+        return items
+
+    def _remaining_work(self, db: Session) -> Dict[str, int]:
+        """Prospects still to message (every active campaign queues all eligible ones) and follow-ups still to send"""
+        prospects = db.query(models.Prospect.id).filter(
+            models.Prospect.status == models.ProspectStatus.QUALIFIED,
+            models.Prospect.dm_sent == False,
+            models.Prospect.duplicate_of_id.is_(None)
+        )
+        follow_ups = db.query(models.FollowUp.message_id).filter(models.FollowUp.status.in_(('pending', 'sending')))
+        if self.campaign_ids:
+            follow_ups = follow_ups.filter(models.FollowUp.campaign_id.in_(self.campaign_ids))
+        return {'prospects': prospects.count(), 'follow_ups': follow_ups.count()}
+
+    def _check_done(self, db: Session):
+        remaining = self._remaining_work(db)
+        if not remaining['prospects'] and not self.initial_finished_at:
+            self.initial_finished_at = self.clock.now
+        if not remaining['prospects'] and not remaining['follow_ups'] and not self.finished_at:
+            self.finished_at = self.clock.now
+
+    def _next_wake(self, db: Session, bot: ApifyInstagramBot) -> float:
+        """Seconds until dispatching this account could do anything again"""
+        now = self.clock.now
+        controller = AdaptiveRateController(bot.account, bot.rate_config, clock=self.clock)
+        waits = [IDLE_SECONDS]
+        if controller.in_cooldown(now):
+            waits.append((bot.account.cooldown_until - now).total_seconds())
+        elif not controller.in_active_hours(now):
+            waits.append(controller.seconds_until_active(now))
+        elif ApifyInstagramBot.get_account_daily_remaining(db, bot.account_id, now.date()) <= 0:
+            midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            waits.append((midnight - now).total_seconds())
+        return max(waits)
+
+    def _account_loop(self, account_id: int, started: threading.Event):
+        db = self.session_factory()
+        wake = threading.Event()
+        self.clock.schedule(self.start, wake)
+        started.set()
+        wake.wait()
+        try:
+            while not self.clock.stopped:
+                release_expired_cooldowns(db, self.clock.now)
+                db.commit()
+                account_ids = [account for account, in db.query(models.InstagramAccount.id).filter(
+                    models.InstagramAccount.is_active == True,
+                    session_health.dispatchable()
+                ).order_by(models.InstagramAccount.id)]
+                bot = ApifyInstagramBot(account_id=account_id, db=db, apify_client=self.apify_client)
+                bot.sleep = self.clock.park
+                bot.clock = self.clock
+                bot.rng = random.Random(self.seed * 1000 + account_id)
+                campaign_ids = [campaign_id for campaign_id in account_campaigns(db, account_id, account_ids)
+                                if not self.campaign_ids or campaign_id in self.campaign_ids]
+                if not campaign_ids:
+                    return  # Accounts don't change during a simulation, so this one never gets work
+                for campaign_id in campaign_ids:
+                    try:
+                        bot.run_campaign(campaign_id)
+                    except Exception as e:
+                        self.errors.append(f"{self.clock.now.isoformat()} campaign {campaign_id}: {str(e)}")
+                        db.rollback()
+                self._check_done(db)
+                self.clock.park(self._next_wake(db, bot))
+        except SimulationEnded:
+            db.rollback()
+        except Exception as e:
+            self.errors.append(f"{self.clock.now.isoformat()} account {account_id}: {str(e)}")
+        finally:
+            db.close()
+            self.clock.finish_turn()
+
+    def run(self, quiet: bool = True) -> Dict:
+        db = self.session_factory()
+        accounts = db.query(models.InstagramAccount).filter(
+            models.InstagramAccount.is_active == True,
+            session_health.dispatchable()
+        ).all()
+        self.accounts = {account.session_id: account.id for account in accounts}
+        limits = {account.id: (account.username, account.daily_limit) for account in accounts}
+        work = self._remaining_work(db)
+        db.close()
+
+        actor_id = os.getenv('APIFY_ACTOR_ID', 'deepanshusharm/instagram-dms-automation')
+        self.apify_client.handlers[actor_id] = self._dm_actor
+
+        output = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            threads = []
+            for account_id in sorted(limits):
+                started = threading.Event()
+                thread = threading.Thread(target=self._account_loop, args=(account_id, started), daemon=True)
+                thread.start()
+                started.wait()
+                threads.append(thread)
+            self.clock.run(lambda: self.finished_at is not None)
+            for thread in threads:
+                thread.join()
+
+        return self.report(limits, work)
+
+    def report(self, limits: Dict[int, tuple], work: Dict[str, int]) -> Dict:
+        until = min(self.finished_at or self.clock.end, self.clock.end)
+        elapsed_days = max((until - self.start).total_seconds() / 86400, 1 / 24)
+        days = [self.start.date() + timedelta(days=i) for i in range((until.date() - self.start.date()).days + 1)]
+        per_day = {day.isoformat(): sum(self.sent[account_id][day] for account_id in limits) for day in days}
+
+        accounts = []
+        for account_id, (username, daily_limit) in sorted(limits.items()):
+            sent = sum(self.sent[account_id].values())
+            capacity = (daily_limit or 0) * len(days)  # Limits reset at midnight, so every calendar day touched counts
+            accounts.append({
+                'account_id': account_id,
+                'username': username,
+                'daily_limit': daily_limit,
+                'sent': sent,
+                'utilization': round(sent / capacity, 3) if capacity else 0.0
+            })
+
+        total = sum(per_day.values())
+        return {
+            'start': self.start.isoformat(),
+            'simulated_until': until.isoformat(),
+            'prospects_queued': work['prospects'],
+            'follow_ups_pending': work['follow_ups'],
+            'messages_sent': total,
+            'average_sends_per_day': round(total / elapsed_days, 1),
+            'initial_messages_complete_at': self.initial_finished_at.isoformat() if self.initial_finished_at else None,
+            'complete_at': self.finished_at.isoformat() if self.finished_at else None,
+            'sends_per_day': per_day,
+            'accounts': accounts,
+            'errors': self.errors[:20]
+        }
+
+def simulate(source=None, days: int = DEFAULT_DAYS, campaign_ids: Optional[List[int]] = None,
+             failure_rate: float = 0.0, seed: int = 0, start: datetime = None, quiet: bool = True) -> Dict:
+    """Snapshot the source database and simulate dispatching from it; the source is only read"""
+    start = start or datetime.now()
+    tmp = tempfile.mkdtemp(prefix='campaign-sim-')
+    target = create_engine(f"sqlite:///{os.path.join(tmp, 'simulation.db')}", connect_args={"check_same_thread": False})
+    try:
+        copy_database(source or default_engine, target, start)
+        simulator = CampaignSimulator(sessionmaker(autocommit=False, autoflush=False, bind=target), start, days,
+                                      campaign_ids, failure_rate, seed)
+        return simulator.run(quiet)
+    finally:
+        target.dispose()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Project how long active campaigns take to send with the current accounts')
+    parser.add_argument('--campaign', type=int, action='append', dest='campaign_ids', help='only these campaigns')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='simulation horizon')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of DMs the fake sender fails')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=datetime.fromisoformat, help='virtual start time (local), default now')
+    parser.add_argument('--verbose', action='store_true', help="show the bot's own output")
+    args = parser.parse_args()
+    print(json.dumps(simulate(days=args.days, campaign_ids=args.campaign_ids, failure_rate=args.failure_rate,
+                              seed=args.seed, start=args.start, quiet=not args.verbose), indent=2))
@@ -1,25 +1,197 @@
-import requests
+"""
+Coolify deployments, one at a time through CoolifyService or in bulk through BulkDeployer.
+
+A bulk rollout is a DeploymentBatch: one DeploymentBatchItem per deployment
+records which step of its create -> deploy -> poll pipeline it is on, how many
+times that step has failed and the last error. BulkDeployer runs every
+pipeline at once, with at most `parallelism` (COOLIFY_BULK_PARALLELISM) calls in
+flight per Coolify config, and every call to one Coolify instance goes through
+a shared limiter (COOLIFY_REQUESTS_PER_SECOND). A 429 pauses the limiter
+for its Retry-After.
+
+Each step is a single call on a pool thread, so a build being polled or a
+failed step waiting out its backoff doesn't hold a slot. Failed steps are
+retried COOLIFY_BULK_MAX_ATTEMPTS times with exponential backoff while the rest
+carry on. Creating an application isn't idempotent, so a create retried after a
+failure (or resumed after an interruption) first looks the application up by
+name and adopts it if the earlier call went through. Threads only talk HTTP; progress is written from the orchestrating
+thread, committed once per round of finished calls. A batch that was
+interrupted picks up each item from its recorded step when run again.
+
+A deployment's environment is its shared EnvironmentVariableSets (stored once,
+linked through deployment_variable_sets, later positions winning) with its own
+environment_variables on top. DeploymentEnvironment keeps what Coolify last
+accepted, so updates send only the keys that changed and delete the ones that
+went away. EnvironmentFanOut pushes a set change to every deployment using it
+concurrently, under the same per-config parallelism and rate limit, and reports
+each deployment's outcome.
+
+    python coolify_service.py BATCH_ID    run (or resume) a batch queued with POST /api/deployments/bulk
+"""
+import heapq
 import json
+import os
+import random
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
-from models import db, CoolifyConfig, Deployment, DeploymentStatus
-import re
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlparse
 
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy.orm import Session
+
+from app.metrics import DEPLOYMENT_STEPS, track_outbound
+from app import crud
+from app.models import (CoolifyConfig, Deployment, DeploymentBatch, DeploymentBatchItem, DeploymentEnvironment,
+                        DeploymentStatus, DeploymentVariableSet, EnvironmentVariableSet)
+
+BULK_PARALLELISM = int(os.getenv('COOLIFY_BULK_PARALLELISM', 4))
+REQUESTS_PER_SECOND = float(os.getenv('COOLIFY_REQUESTS_PER_SECOND', 5))
+MAX_ATTEMPTS = int(os.getenv('COOLIFY_BULK_MAX_ATTEMPTS', 3))
+RETRY_BACKOFF_SECONDS = float(os.getenv('COOLIFY_RETRY_BACKOFF_SECONDS', 5))
+POLL_SECONDS = float(os.getenv('COOLIFY_POLL_SECONDS', 10))
+DEPLOY_TIMEOUT_SECONDS = int(os.getenv('COOLIFY_DEPLOY_TIMEOUT', 1800))
+REQUEST_TIMEOUT_SECONDS = 30
+
+STATUS_MAPPING = {
+    'running': DeploymentStatus.RUNNING,
+    'building': DeploymentStatus.BUILDING,
+    'deploying': DeploymentStatus.DEPLOYING,
+    'stopped': DeploymentStatus.STOPPED,
+    'failed': DeploymentStatus.FAILED
+}
+
+class CoolifyError(Exception):
+    """A failed call to Coolify; retry_after is set when Coolify asked us to slow down"""
+
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Spaces calls from every thread to one Coolify instance `rate` per second apart, no bursts"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                delay = self.paused_until - now
+                if delay <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def limiter_for(api_url: str) -> RateLimiter:
+    with _limiters_lock:
+        if api_url not in _limiters:
+            _limiters[api_url] = RateLimiter(REQUESTS_PER_SECOND)
+        return _limiters[api_url]
+
+def _http_session() -> requests.Session:
+    http = requests.Session()
+    http.mount('https://', HTTPAdapter(pool_maxsize=max(10, BULK_PARALLELISM)))
+    http.mount('http://', HTTPAdapter(pool_maxsize=max(10, BULK_PARALLELISM)))
+    return http
+
+def _retry_after(response) -> float:
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+def effective_environment(db: Session, deployment_ids: Iterable[int],
+                          own: Optional[Dict[int, Dict]] = None) -> Dict[int, Dict[str, str]]:
+    """Variables each deployment should have: its sets in position order, then its own (or `own`) variables on top"""
+    deployment_ids = list(deployment_ids)
+    environments = {deployment_id: {} for deployment_id in deployment_ids}
+    if not deployment_ids:
+        return environments
+    for deployment_id, variables in db.query(DeploymentVariableSet.deployment_id, EnvironmentVariableSet.variables).join(
+        EnvironmentVariableSet, EnvironmentVariableSet.id == DeploymentVariableSet.variable_set_id
+    ).filter(DeploymentVariableSet.deployment_id.in_(deployment_ids)).order_by(
+        DeploymentVariableSet.deployment_id, DeploymentVariableSet.position
+    ):
+        environments[deployment_id].update(json.loads(variables))
+    own = own or {}
+    for deployment_id, variables in db.query(Deployment.id, Deployment.environment_variables).filter(
+        Deployment.id.in_(deployment_ids)
+    ):
+        if deployment_id in own:
+            environments[deployment_id].update(own[deployment_id])
+        elif variables:
+            environments[deployment_id].update(json.loads(variables))
+    return environments
+
+def applied_environment(db: Session, deployment_ids: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """What Coolify last accepted for each deployment; {} for one never pushed from here"""
+    deployment_ids = list(deployment_ids)
+    applied = {deployment_id: {} for deployment_id in deployment_ids}
+    if deployment_ids:
+        for deployment_id, variables in db.query(DeploymentEnvironment.deployment_id, DeploymentEnvironment.applied).filter(
+            DeploymentEnvironment.deployment_id.in_(deployment_ids)
+        ):
+            applied[deployment_id] = json.loads(variables)
+    return applied
+
+def diff_environment(applied: Dict[str, str], wanted: Dict[str, str]) -> Tuple[Dict[str, str], List[str]]:
+    """(keys to set with their values, keys to delete)"""
+    changed = {key: value for key, value in wanted.items() if applied.get(key) != value}
+    return changed, sorted(set(applied) - set(wanted))
+
+def record_applied(db: Session, environments: Dict[int, Dict[str, str]]):
+    if not environments:
+        return
+    now = datetime.utcnow()
+    insert = crud._insert_for(db)(DeploymentEnvironment.__table__)
+    db.execute(insert.on_conflict_do_update(
+        index_elements=['deployment_id'],
+        set_={'applied': insert.excluded.applied, 'applied_at': insert.excluded.applied_at}
+    ), [{'deployment_id': deployment_id, 'applied': json.dumps(variables, sort_keys=True), 'applied_at': now}
+        for deployment_id, variables in environments.items()])
+
 class CoolifyService:
-    
-    def __init__(self, config_id: int):
-        self.config = CoolifyConfig.query.get(config_id)
+
+    def __init__(self, db: Session, config_id: int, http=None):
+        """`http` is anything with requests.Session's request() and get(), e.g. FakeCoolifyHTTP in benchmarks"""
+        self.db = db
+        self.config = db.query(CoolifyConfig).get(config_id)
         if not self.config:
             raise ValueError(f"Coolify config with ID {config_id} not found")
-        
+
         self.api_url = self.config.api_url.rstrip('/')
         self.headers = {
             'Authorization': f'Bearer {self.config.api_token}',
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
-    
+        self.http = http or _http_session()
+        self.limiter = limiter_for(self.api_url)
+
     def detect_project_type(self, github_url: str) -> Tuple[str, Dict]:
         """Detect project type from GitHub repository"""
         try:
@@ -27,26 +199,27 @@ class CoolifyService:
             path_parts = parsed.path.strip('/').split('/')
             if len(path_parts) < 2:
                 return 'unknown', {}
-            
+
             owner, repo = path_parts[0], path_parts[1]
-            
+
             files_to_check = [
                 'package.json',
-                'requirements.txt', 
+                'requirements.txt',
                 'pyproject.toml',
                 'Dockerfile',
                 'docker-compose.yml',
                 'pom.xml',
                 'go.mod'
             ]
-            
+
             detected_files = []
             for file in files_to_check:
                 url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file}"
-                response = requests.get(url)
+                with track_outbound('github', 'contents'):
+                    response = self.http.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
                 if response.status_code == 200:
                     detected_files.append(file)
-            
+
             if 'Dockerfile' in detected_files:
                 return 'docker', {'detected_files': detected_files}
             elif 'package.json' in detected_files:
@@ -61,134 +234,164 @@ class CoolifyService:
                 return 'go', {'detected_files': detected_files}
             else:
                 return 'static', {'detected_files': detected_files}
-                
+
         except Exception as e:
             print(f"Error detecting project type: {str(e)}")
             return 'unknown', {'error': str(e)}
-    
+
+    def _request(self, method: str, path: str, operation: str, **kwargs):
+        """One rate-limited call to the Coolify API; anything but a 200/201 raises CoolifyError"""
+        self.limiter.acquire()
+        with track_outbound('coolify', operation):
+            try:
+                response = self.http.request(method, f"{self.api_url}{path}", headers=self.headers,
+                                             timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+            except requests.RequestException as e:
+                raise CoolifyError(str(e))
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                self.limiter.pause(retry_after)
+                raise CoolifyError(f"rate limited for {retry_after:g}s", retry_after=retry_after)
+            if response.status_code not in [200, 201]:
+                raise CoolifyError(f"{response.status_code} - {response.text}",
+                                   retryable=response.status_code >= 500 or response.status_code == 408)
+        return response
+
+    # HTTP only, safe to call from BulkDeployer's threads: these don't touch the database
+
+    def request_find(self, name: str) -> Optional[str]:
+        """coolify_app_id of the application called `name`, or None"""
+        applications = self._request('GET', '/api/v1/applications', 'list_applications').json()
+        for application in applications if isinstance(applications, list) else []:
+            if application.get('name') == name:
+                return application.get('uuid', application.get('id'))
+        return None
+
+    def request_create(self, name: str, github_url: str, environment: Dict[str, str],
+                       adopt_existing: bool = False) -> Dict:
+        """
+        Create the application; returns its project_type and coolify_app_id. With
+        adopt_existing, an application already called `name` is used instead - for
+        retrying a create that may have reached Coolify before it failed.
+        """
+        project_type, _ = self.detect_project_type(github_url)
+        existing = self.request_find(name) if adopt_existing else None
+        if existing:
+            return {'project_type': project_type, 'coolify_app_id': existing}
+        app_data = {
+            'name': name,
+            'git_repository': github_url,
+            'git_branch': 'main',
+            'build_pack': self._get_build_pack(project_type),
+            'ports_exposes': self._get_default_port(project_type),
+            'environment_variables': environment
+        }
+        created = self._request('POST', '/api/v1/applications', 'create_application', json=app_data).json()
+        return {'project_type': project_type, 'coolify_app_id': created.get('uuid', created.get('id'))}
+
+    def request_deploy(self, coolify_app_id: str):
+        self._request('POST', f"/api/v1/applications/{coolify_app_id}/deploy", 'deploy_application')
+
+    def request_status(self, coolify_app_id: str) -> Dict:
+        return self._request('GET', f"/api/v1/applications/{coolify_app_id}", 'get_deployment_status').json()
+
+    def request_env_update(self, coolify_app_id: str, changed: Dict[str, str], removed: List[str]):
+        """Upsert the changed variables in one call and delete the removed ones"""
+        if changed:
+            self._request('PATCH', f"/api/v1/applications/{coolify_app_id}/envs/bulk", 'update_environment_variables',
+                          json={'data': [{'key': key, 'value': value} for key, value in changed.items()]})
+        if not removed:
+            return
+        # Coolify deletes a variable by its uuid, not its key; one key can have several (e.g. a preview copy)
+        removed = set(removed)
+        listed = self._request('GET', f"/api/v1/applications/{coolify_app_id}/envs", 'list_environment_variables').json()
+        for variable in listed if isinstance(listed, list) else []:
+            if variable.get('key') in removed:
+                self._request('DELETE', f"/api/v1/applications/{coolify_app_id}/envs/{variable['uuid']}",
+                              'delete_environment_variable')
+
     def create_application(self, deployment: Deployment) -> bool:
         """Create application in Coolify"""
         try:
-            project_type, detection_info = self.detect_project_type(deployment.github_url)
-            deployment.project_type = project_type
-            
-            app_data = {
-                'name': deployment.name,
-                'git_repository': deployment.github_url,
-                'git_branch': 'main',
-                'build_pack': self._get_build_pack(project_type),
-                'ports_exposes': self._get_default_port(project_type),
-                'environment_variables': json.loads(deployment.environment_variables) if deployment.environment_variables else {}
-            }
-            
-            response = requests.post(
-                f"{self.api_url}/api/v1/applications",
-                headers=self.headers,
-                json=app_data
-            )
-            
-            if response.status_code in [200, 201]:
-                app_data = response.json()
-                deployment.coolify_app_id = app_data.get('uuid', app_data.get('id'))
-                deployment.status = DeploymentStatus.BUILDING
-                db.session.commit()
-                return True
-            else:
-                print(f"Failed to create application: {response.status_code} - {response.text}")
-                return False
-                
+            environment = effective_environment(self.db, [deployment.id])[deployment.id]
+            created = self.request_create(deployment.name, deployment.github_url, environment)
+            deployment.project_type = created['project_type']
+            deployment.coolify_app_id = created['coolify_app_id']
+            deployment.status = DeploymentStatus.BUILDING
+            record_applied(self.db, {deployment.id: environment})
+            self.db.commit()
+            return True
+        except CoolifyError as e:
+            print(f"Failed to create application: {str(e)}")
+            return False
         except Exception as e:
             print(f"Error creating application: {str(e)}")
             deployment.status = DeploymentStatus.FAILED
-            db.session.commit()
+            self.db.commit()
             return False
-    
+
     def deploy_application(self, deployment: Deployment) -> bool:
         """Deploy application in Coolify"""
         try:
             if not deployment.coolify_app_id:
                 return False
-            
-            response = requests.post(
-                f"{self.api_url}/api/v1/applications/{deployment.coolify_app_id}/deploy",
-                headers=self.headers
-            )
-            
-            if response.status_code in [200, 201]:
-                deployment.status = DeploymentStatus.DEPLOYING
-                db.session.commit()
-                return True
-            else:
-                print(f"Failed to deploy application: {response.status_code} - {response.text}")
-                return False
-                
+
+            self.request_deploy(deployment.coolify_app_id)
+            deployment.status = DeploymentStatus.DEPLOYING
+            self.db.commit()
+            return True
+
+        except CoolifyError as e:
+            print(f"Failed to deploy application: {str(e)}")
+            return False
         except Exception as e:
             print(f"Error deploying application: {str(e)}")
             return False
-    
+
     def get_deployment_status(self, deployment: Deployment) -> Dict:
         """Get deployment status from Coolify"""
         try:
             if not deployment.coolify_app_id:
                 return {'status': 'unknown'}
-            
-            response = requests.get(
-                f"{self.api_url}/api/v1/applications/{deployment.coolify_app_id}",
-                headers=self.headers
-            )
-            
-            if response.status_code == 200:
-                app_data = response.json()
-                status = app_data.get('status', 'unknown')
-                
-                status_mapping = {
-                    'running': DeploymentStatus.RUNNING,
-                    'building': DeploymentStatus.BUILDING,
-                    'deploying': DeploymentStatus.DEPLOYING,
-                    'stopped': DeploymentStatus.STOPPED,
-                    'failed': DeploymentStatus.FAILED
-                }
-                
-                deployment.status = status_mapping.get(status, DeploymentStatus.PENDING)
-                deployment.deployment_url = app_data.get('fqdn', app_data.get('url'))
-                db.session.commit()
-                
-                return {
-                    'status': deployment.status.value,
-                    'url': deployment.deployment_url,
-                    'logs': app_data.get('logs', '')
-                }
-            else:
-                return {'status': 'error', 'message': 'Failed to fetch status'}
-                
+
+            app_data = self.request_status(deployment.coolify_app_id)
+            deployment.status = STATUS_MAPPING.get(app_data.get('status', 'unknown'), DeploymentStatus.PENDING)
+            deployment.deployment_url = app_data.get('fqdn', app_data.get('url'))
+            self.db.commit()
+
+            return {
+                'status': deployment.status.value,
+                'url': deployment.deployment_url,
+                'logs': app_data.get('logs', '')
+            }
+
+        except CoolifyError:
+            return {'status': 'error', 'message': 'Failed to fetch status'}
         except Exception as e:
             print(f"Error getting deployment status: {str(e)}")
             return {'status': 'error', 'message': str(e)}
-    
+
     def update_environment_variables(self, deployment: Deployment, env_vars: Dict) -> bool:
-        """Update environment variables for deployment"""
+        """Replace the deployment's own variables, sending Coolify only the keys that change"""
         try:
             if not deployment.coolify_app_id:
                 return False
-            
-            response = requests.put(
-                f"{self.api_url}/api/v1/applications/{deployment.coolify_app_id}/environment-variables",
-                headers=self.headers,
-                json=env_vars
-            )
-            
-            if response.status_code in [200, 201]:
-                deployment.environment_variables = json.dumps(env_vars)
-                db.session.commit()
-                return True
-            else:
-                print(f"Failed to update environment variables: {response.status_code} - {response.text}")
-                return False
-                
+
+            wanted = effective_environment(self.db, [deployment.id], own={deployment.id: env_vars})[deployment.id]
+            changed, removed = diff_environment(applied_environment(self.db, [deployment.id])[deployment.id], wanted)
+            self.request_env_update(deployment.coolify_app_id, changed, removed)
+            deployment.environment_variables = json.dumps(env_vars)
+            record_applied(self.db, {deployment.id: wanted})
+            self.db.commit()
+            return True
+
+        except CoolifyError as e:
+            print(f"Failed to update environment variables: {str(e)}")
+            return False
         except Exception as e:
             print(f"Error updating environment variables: {str(e)}")
             return False
-    
+
     def _get_build_pack(self, project_type: str) -> str:
         """Get appropriate build pack for project type"""
         build_packs = {
@@ -201,7 +404,7 @@ class CoolifyService:
             'go': 'go'
         }
         return build_packs.get(project_type, 'static')
-    
+
     def _get_default_port(self, project_type: str) -> str:
         """Get default port for project type"""
         default_ports = {
@@ -212,3 +415,286 @@ class CoolifyService:
             'static': '80'
         }
         return default_ports.get(project_type, '3000')
+
+class BulkDeployer:
+    """Runs a DeploymentBatch's create -> deploy -> poll pipelines concurrently"""
+
+    def __init__(self, db: Session, batch_id: int, http=None, poll_seconds: float = POLL_SECONDS,
+                 backoff_seconds: float = RETRY_BACKOFF_SECONDS, max_attempts: int = MAX_ATTEMPTS,
+                 deploy_timeout: float = DEPLOY_TIMEOUT_SECONDS):
+        self.db = db
+        self.batch = db.query(DeploymentBatch).get(batch_id)
+        if not self.batch:
+            raise ValueError(f"Deployment batch {batch_id} not found")
+        self.http = http or _http_session()
+        self.poll_seconds = poll_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_attempts = max_attempts
+        self.deploy_timeout = deploy_timeout
+        self.rng = random.Random()
+
+    @staticmethod
+    def _call(service: CoolifyService, step: str, spec: Dict):
+        if step == 'create':
+            return service.request_create(spec['name'], spec['github_url'], spec['environment'],
+                                          adopt_existing=spec['create_attempted'])
+        if step == 'deploy':
+            return service.request_deploy(spec['coolify_app_id'])
+        return service.request_status(spec['coolify_app_id'])
+
+    def _finish(self, item: DeploymentBatchItem, deployment: Deployment, succeeded: bool, error: str = None):
+        item.step = 'done' if succeeded else 'failed'
+        if succeeded:
+            self.batch.succeeded += 1
+        else:
+            item.last_error = error
+            deployment.status = DeploymentStatus.FAILED
+            self.batch.failed += 1
+            print(f"Deployment {deployment.name} failed: {error}")
+
+    def _apply(self, item: DeploymentBatchItem, deployment: Deployment, spec: Dict, result, error) -> Optional[float]:
+        """Record a finished call; returns how many seconds until the item's next call, None when it's done"""
+        step = item.step
+        if error is not None:
+            retryable = getattr(error, 'retryable', True)
+            retry_after = getattr(error, 'retry_after', None)
+            if retry_after is None:
+                item.attempts += 1  # Being throttled isn't the deployment's fault
+            item.last_error = str(error)
+            if step == 'create':
+                spec['create_attempted'] = True  # Coolify may have created it before the call failed
+            if not retryable or item.attempts >= self.max_attempts:
+                DEPLOYMENT_STEPS.labels(step, 'failed').inc()
+                self._finish(item, deployment, False, f"{step}: {str(error)}")
+                return None
+            DEPLOYMENT_STEPS.labels(step, 'retry').inc()
+            if retry_after is not None:
+                return retry_after
+            return self.backoff_seconds * 2 ** (item.attempts - 1) * (0.5 + self.rng.random())
+
+        DEPLOYMENT_STEPS.labels(step, 'ok').inc()
+        item.attempts = 0
+        if step == 'create':
+            deployment.project_type = result['project_type']
+            deployment.coolify_app_id = spec['coolify_app_id'] = result['coolify_app_id']
+            deployment.status = DeploymentStatus.BUILDING
+            record_applied(self.db, {deployment.id: spec['environment']})
+            item.step = 'deploy'
+            return 0.0
+        if step == 'deploy':
+            deployment.status = DeploymentStatus.DEPLOYING
+            item.step = 'poll'
+            item.deploy_started_at = datetime.utcnow()
+            return self.poll_seconds
+
+        deployment.status = STATUS_MAPPING.get(result.get('status', 'unknown'), DeploymentStatus.PENDING)
+        deployment.deployment_url = result.get('fqdn', result.get('url'))
+        if deployment.status == DeploymentStatus.RUNNING:
+            self._finish(item, deployment, True)
+            return None
+        if deployment.status in (DeploymentStatus.FAILED, DeploymentStatus.STOPPED):
+            self._finish(item, deployment, False, f"Coolify reports the application {result.get('status')}")
+            return None
+        if datetime.utcnow() - item.deploy_started_at > timedelta(seconds=self.deploy_timeout):
+            self._finish(item, deployment, False, f"not running {self.deploy_timeout:g}s after deploying")
+            return None
+        return self.poll_seconds
+
+    def run(self, parallelism: Optional[int] = None) -> Dict:
+        started = time.monotonic()
+        parallelism = parallelism or self.batch.parallelism or BULK_PARALLELISM
+        items = self.db.query(DeploymentBatchItem).filter(
+            DeploymentBatchItem.batch_id == self.batch.id,
+            DeploymentBatchItem.step.notin_(('done', 'failed'))
+        ).all()
+        deployments = {deployment.id: deployment for deployment in self.db.query(Deployment).filter(
+            Deployment.id.in_([item.deployment_id for item in items])
+        )} if items else {}
+
+        environments = effective_environment(self.db, list(deployments))
+        services = {}
+        ready = defaultdict(list)  # config id -> heap of (due, deployment id)
+        by_id, specs = {}, {}
+        for item in items:
+            deployment = deployments[item.deployment_id]
+            config_id = deployment.coolify_config_id
+            if config_id not in services:
+                try:
+                    services[config_id] = CoolifyService(self.db, config_id, self.http)
+                except ValueError as e:
+                    services[config_id] = e
+            if isinstance(services[config_id], Exception):
+                self._finish(item, deployment, False, str(services[config_id]))
+                continue
+            if item.step == 'poll' and not item.deploy_started_at:
+                item.deploy_started_at = datetime.utcnow()
+            # Snapshot for the threads, which never touch the ORM objects
+            specs[item.deployment_id] = {
+                'name': deployment.name,
+                'github_url': deployment.github_url,
+                'environment': environments[deployment.id],
+                'coolify_app_id': deployment.coolify_app_id,
+                'config_id': config_id,
+                # A create that failed or was cut off by an interrupted run may still have gone through
+                'create_attempted': item.step == 'create' and (bool(item.attempts) or self.batch.status == 'running')
+            }
+            by_id[item.deployment_id] = item
+            heapq.heappush(ready[config_id], (started, item.deployment_id))
+        self.batch.status = 'running'
+        self.db.commit()
+
+        in_flight = defaultdict(int)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=max(1, parallelism * len(ready)), thread_name_prefix='coolify') as pool:
+            while futures or any(ready.values()):
+                now = time.monotonic()
+                next_due = None
+                for config_id, heap in ready.items():
+                    while heap and heap[0][0] <= now and in_flight[config_id] < parallelism:
+                        _, deployment_id = heapq.heappop(heap)
+                        future = pool.submit(self._call, services[config_id], by_id[deployment_id].step,
+                                             specs[deployment_id])
+                        futures[future] = deployment_id
+                        in_flight[config_id] += 1
+                    if heap and in_flight[config_id] < parallelism:
+                        next_due = min(next_due if next_due is not None else heap[0][0], heap[0][0])
+
+                timeout = max(0.0, next_due - now) if next_due is not None else None
+                if not futures:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    deployment_id = futures.pop(future)
+                    spec = specs[deployment_id]
+                    in_flight[spec['config_id']] -= 1
+                    error = future.exception()
+                    delay = self._apply(by_id[deployment_id], deployments[deployment_id], spec,
+                                        None if error else future.result(), error)
+                    if delay is not None:
+                        heapq.heappush(ready[spec['config_id']], (time.monotonic() + delay, deployment_id))
+                if done:
+                    self.db.commit()
+
+        self.batch.status = 'finished'
+        self.batch.finished_at = datetime.utcnow()
+        self.db.commit()
+        return {
+            'batch_id': self.batch.id,
+            'total': self.batch.total,
+            'succeeded': self.batch.succeeded,
+            'failed': self.batch.failed,
+            'seconds': round(time.monotonic() - started, 3)
+        }
+
+class EnvironmentFanOut:
+    """
+    Pushes environment changes to many deployments at once. Each deployment gets
+    only the keys that differ from what Coolify last accepted, at most
+    `parallelism` deployments in flight per Coolify config, and the accepted
+    state of every deployment that succeeded is recorded in one statement.
+    """
+
+    def __init__(self, db: Session, http=None, parallelism: int = BULK_PARALLELISM,
+                 max_attempts: int = MAX_ATTEMPTS, backoff_seconds: float = RETRY_BACKOFF_SECONDS):
+        self.db = db
+        self.http = http or _http_session()
+        self.parallelism = parallelism
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+
+    def _send(self, service: CoolifyService, slots: threading.Semaphore, app_id: str, changed: Dict, removed: List):
+        for attempt in range(1, self.max_attempts + 1):
+            with slots:
+                try:
+                    service.request_env_update(app_id, changed, removed)
+                    return None
+                except CoolifyError as e:
+                    error = e
+            if not error.retryable or attempt == self.max_attempts:
+                return error
+            time.sleep(error.retry_after if error.retry_after is not None
+                       else self.backoff_seconds * 2 ** (attempt - 1))
+
+    def push(self, deployment_ids: Iterable[int]) -> List[Dict]:
+        """Bring each deployment's variables in Coolify in line with its sets and own variables"""
+        deployments = self.db.query(Deployment).filter(Deployment.id.in_(list(deployment_ids))).order_by(Deployment.id).all()
+        wanted = effective_environment(self.db, [deployment.id for deployment in deployments])
+        applied = applied_environment(self.db, [deployment.id for deployment in deployments])
+
+        results, futures = {}, {}
+        services, slots = {}, {}
+        configs = {deployment.coolify_config_id for deployment in deployments if deployment.coolify_app_id}
+        with ThreadPoolExecutor(max_workers=max(1, self.parallelism * len(configs)), thread_name_prefix='coolify-env') as pool:
+            for deployment in deployments:
+                changed, removed = diff_environment(applied[deployment.id], wanted[deployment.id])
+                result = {'deployment_id': deployment.id, 'name': deployment.name, 'status': 'unchanged',
+                          'changed': sorted(changed), 'removed': removed, 'error': None}
+                results[deployment.id] = result
+                if not deployment.coolify_app_id:
+                    result['status'] = 'not_deployed'
+                    continue
+                if not changed and not removed:
+                    continue
+                config_id = deployment.coolify_config_id
+                if config_id not in services:
+                    try:
+                        services[config_id] = CoolifyService(self.db, config_id, self.http)
+                    except ValueError as e:
+                        services[config_id] = e
+                    slots[config_id] = threading.Semaphore(self.parallelism)
+                if isinstance(services[config_id], Exception):
+                    result.update(status='failed', error=str(services[config_id]))
+                    DEPLOYMENT_STEPS.labels('env', 'failed').inc()
+                    continue
+                futures[pool.submit(self._send, services[config_id], slots[config_id],
+                                    deployment.coolify_app_id, changed, removed)] = deployment.id
+
+            accepted = {}
+            for future, deployment_id in futures.items():
+                error = future.result()
+                if error is None:
+                    results[deployment_id]['status'] = 'updated'
+                    accepted[deployment_id] = wanted[deployment_id]
+                    DEPLOYMENT_STEPS.labels('env', 'ok').inc()
+                else:
+                    results[deployment_id].update(status='failed', error=str(error))
+                    DEPLOYMENT_STEPS.labels('env', 'failed').inc()
+
+        record_applied(self.db, accepted)
+        self.db.commit()
+        return list(results.values())
+
+    def update_set(self, variable_set: EnvironmentVariableSet, values: Dict[str, str] = None,
+                   unset: Iterable[str] = ()) -> List[Dict]:
+        """Change a shared set once, then push it to every deployment that uses it"""
+        variables = json.loads(variable_set.variables or '{}')
+        variables.update(values or {})
+        for key in unset:
+            variables.pop(key, None)
+        variable_set.variables = json.dumps(variables, sort_keys=True)
+        deployment_ids = [deployment_id for deployment_id, in self.db.query(DeploymentVariableSet.deployment_id).filter(
+            DeploymentVariableSet.variable_set_id == variable_set.id
+        )]
+        self.db.commit()
+        return self.push(deployment_ids)
+
+def run_batch(batch_id: int):
+    """Background-task entry point: runs a batch with its own session"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(BulkDeployer(db, batch_id).run())
+    except Exception as e:
+        print(f"Deployment batch {batch_id} failed: {str(e)}")
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run or resume a bulk deployment batch')
+    parser.add_argument('batch_id', type=int)
+    args = parser.parse_args()
+    run_batch(args.batch_id)
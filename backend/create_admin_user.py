@@ -1,6 +1,6 @@
 from app.database import SessionLocal, engine
 from app.models import User
-from app.crud import pwd_context
+from app.auth import pwd_context
 from datetime import datetime
 
 db = SessionLocal()
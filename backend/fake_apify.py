@@ -0,0 +1,211 @@
+"""
+In-process stand-in for apify_client.ApifyClient.
+
+Implements the small surface the backend uses (actor().call()/start(), run().wait_for_finish(),
+dataset().list_items()) so the bot, the scraper, the inbox sync and session checks can be driven locally in
+benchmarks without network or Apify credits.
+"""
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+class FakeListPage:
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.count = len(items)
+        self.total = len(items)
+
+class FakeDataset:
+    def __init__(self, client: 'FakeApifyClient', dataset_id: str):
+        self.client = client
+        self.dataset_id = dataset_id
+
+    def list_items(self, offset: int = 0, limit: Optional[int] = None) -> FakeListPage:
+        items = self.client.datasets.get(self.dataset_id, [])
+        end = None if limit is None else offset + limit
+        self.client.pages_read += 1
+        return FakeListPage(items[offset:end])
+
+class FakeActor:
+    def __init__(self, client: 'FakeApifyClient', actor_id: str):
+        self.client = client
+        self.actor_id = actor_id
+
+    def call(self, run_input: Dict = None, **kwargs) -> Dict:
+        self.client.calls.append({'actor_id': self.actor_id, 'run_input': run_input or {}})
+        handler = self.client.handlers.get(self.actor_id, self.client.default_handler)
+        items = handler(run_input or {})
+        run_id = uuid.uuid4().hex
+        if items is None:
+            run = {'id': run_id, 'status': 'FAILED'}
+        else:
+            dataset_id = uuid.uuid4().hex
+            self.client.datasets[dataset_id] = items
+            run = {'id': run_id, 'status': 'SUCCEEDED', 'defaultDatasetId': dataset_id}
+        self.client.runs[run_id] = run
+        return run
+
+    def start(self, run_input: Dict = None, **kwargs) -> Dict:
+        """Runs finish instantly; start() just reports them as still running"""
+        run = self.call(run_input, **kwargs)
+        return dict(run, status='RUNNING')
+
+class FakeRun:
+    def __init__(self, client: 'FakeApifyClient', run_id: str):
+        self.client = client
+        self.run_id = run_id
+
+    def get(self) -> Optional[Dict]:
+        return self.client.runs.get(self.run_id)
+
+    def wait_for_finish(self, **kwargs) -> Optional[Dict]:
+        return self.get()
+
+class FakeApifyClient:
+    """
+    Fake Apify client. Actor runs are answered by per-actor handlers that take the
+    run_input and return dataset items (or None for a failed run). By default DM runs
+    succeed for every target username, failing a `failure_rate` fraction at random.
+    """
+
+    def __init__(self, failure_rate: float = 0.0, seed: int = 0):
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.handlers: Dict[str, Callable[[Dict], Optional[List[Dict]]]] = {}
+        self.datasets: Dict[str, List[Dict]] = {}
+        self.runs: Dict[str, Dict] = {}
+        self.calls: List[Dict] = []
+        self.pages_read = 0
+
+    def default_handler(self, run_input: Dict) -> List[Dict]:
+        return [
+            {'username': username, 'status': 'failed' if self.rng.random() < self.failure_rate else 'success'}
+            for username in run_input.get('target_usernames', [])
+        ]
+
+    def actor(self, actor_id: str) -> FakeActor:
+        return FakeActor(self, actor_id)
+
+    def dataset(self, dataset_id: str) -> FakeDataset:
+        return FakeDataset(self, dataset_id)
+
+    def run(self, run_id: str) -> FakeRun:
+        return FakeRun(self, run_id)
+
+BIO_PHRASES = [
+    'business coach', 'life coach', 'online fitness coach', 'mindset mentor', 'scale to 6 figures',
+    'DM me to apply', 'helping women find purpose', 'body transformations', 'high performance for founders',
+    'podcast host', 'author of two books', 'ex corporate lawyer', 'mum of three', 'NLP practitioner',
+    'free masterclass below', 'sales systems for agencies', 'marathon runner', 'plant based nutrition',
+    'limited 1:1 spots', 'TEDx speaker', 'faith and family first', 'burnout recovery', 'dog lover',
+    'premium mastermind', 'book a discovery call', 'yoga teacher', 'real estate investor', 'coffee addict'
+]
+CITIES = ['London', 'Austin', 'Sydney', 'Toronto', 'Dubai', 'Lisbon', 'Miami', 'Berlin', 'Denver', 'Cape Town',
+          'Dublin', 'Auckland', 'Chicago', 'Bali', 'Amsterdam', 'Nashville', 'Vancouver', 'Manchester']
+
+class FakeProfileSource:
+    """
+    Handler for the profile scraper actors. Each hashtag or competitor account has a
+    growing list of profiles, newest first; grow() adds more as if time had passed.
+    Hashtag runs honour onlyPostsNewerThan, follower runs always return the full list
+    (capped by resultsLimit) like the real follower scrapers.
+    """
+
+    def __init__(self, seed: int = 0, start_at: datetime = datetime(2025, 1, 1), shared_rate: float = 0.1):
+        self.rng = random.Random(seed)
+        self.clock = start_at
+        self.shared_rate = shared_rate
+        self.sources: Dict[str, List[Dict]] = {}
+        self.created = 0
+
+    def _profile(self, source: str) -> Dict:
+        self.clock += timedelta(minutes=self.rng.randrange(1, 30))
+        everyone = [item for items in self.sources.values() for item in items[:50]]
+        if everyone and self.rng.random() < self.shared_rate:
+            # Same coach showing up under another hashtag or follower list
+            item = dict(self.rng.choice(everyone))
+        else:
+            self.created += 1
+            username = f'{source}_coach_{self.created:07d}'
+            item = {
+                'username': username,
+                'fullName': f'Coach {self.created}',
+                'biography': ' | '.join(self.rng.sample(BIO_PHRASES, 3) + [f'based in {self.rng.choice(CITIES)}']),
+                'followersCount': self.rng.randrange(5000, 150000),
+                'followsCount': self.rng.randrange(100, 3000),
+                'postsCount': self.rng.randrange(10, 2000),
+                'url': f'https://instagram.com/{username}',
+                'profilePicUrl': f'https://cdn.example.com/{username}.jpg'
+            }
+        item['timestamp'] = self.clock.isoformat()
+        return item
+
+    def grow(self, source: str, count: int):
+        items = self.sources.setdefault(source, [])
+        items[:0] = [self._profile(source) for _ in range(count)][::-1]
+
+    def __call__(self, run_input: Dict) -> List[Dict]:
+        if 'hashtags' in run_input:
+            items = [item for tag in run_input['hashtags'] for item in self.sources.get(tag, [])]
+            newer_than = run_input.get('onlyPostsNewerThan')
+            if newer_than:
+                items = [item for item in items if item['timestamp'] > newer_than]
+        else:
+            items = [item for username in run_input.get('usernames', []) for item in self.sources.get(username, [])]
+        return items[:run_input.get('resultsLimit', len(items))]
+
+class FakeInbox:
+    """
+    Handler for the inbox actor: DM threads per session id. reply() and send() add
+    messages as if they arrived at `at`; runs return the threads with activity newer
+    than newerThan, most recently active first.
+    """
+
+    def __init__(self):
+        self.threads: Dict[str, Dict[str, Dict]] = {}
+
+    def _add(self, session_id: str, username: str, text: str, at: datetime, outgoing: bool):
+        thread = self.threads.setdefault(session_id, {}).setdefault(username, {
+            'threadId': uuid.uuid4().hex,
+            'username': username,
+            'messages': []
+        })
+        thread['messages'].append({'isOutgoing': outgoing, 'text': text, 'timestamp': at.isoformat()})
+        if 'lastActivityAt' not in thread or at > datetime.fromisoformat(thread['lastActivityAt']):
+            thread['lastActivityAt'] = at.isoformat()
+
+    def reply(self, session_id: str, username: str, text: str, at: datetime):
+        self._add(session_id, username, text, at, outgoing=False)
+
+    def send(self, session_id: str, username: str, text: str, at: datetime):
+        self._add(session_id, username, text, at, outgoing=True)
+
+    def __call__(self, run_input: Dict) -> List[Dict]:
+        threads = list(self.threads.get(run_input.get('sessionid'), {}).values())
+        newer_than = run_input.get('newerThan')
+        if newer_than:
+            threads = [thread for thread in threads
+                       if datetime.fromisoformat(thread['lastActivityAt']) > datetime.fromisoformat(newer_than)]
+        threads.sort(key=lambda thread: datetime.fromisoformat(thread['lastActivityAt']), reverse=True)
+        return [dict(thread, messages=list(thread['messages'])) for thread in threads[:run_input.get('resultsLimit', len(threads))]]
+
+class FakeSessionCheck:
+    """
+    Handler for the session check actor: the account's own profile when its session
+    is live, an error item once the session id is in `expired`. `latency` seconds of
+    sleep per run stand in for the actor's round trip.
+    """
+
+    def __init__(self, expired: Optional[set] = None, latency: float = 0.0):
+        self.expired = set(expired or ())
+        self.latency = latency
+
+    def __call__(self, run_input: Dict) -> List[Dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        username = run_input.get('usernames', [None])[0]
+        if run_input.get('sessionid') in self.expired:
+            return [{'username': username, 'error': 'login_required'}]
+        return [{'username': username, 'loggedIn': True}]
@@ -0,0 +1,121 @@
+"""
+In-process stand-in for a Coolify instance (and GitHub's contents API), in place of requests.Session.
+
+Implements the calls CoolifyService makes: creating and listing applications,
+deploying one, reading its status, and listing, writing or deleting (by uuid)
+its environment variables (the old whole-map PUT is kept for comparison). Each call sleeps `latency` seconds.
+A deployed application reports 'building' until `build_seconds` have passed,
+then 'running'. A `failure_rate` fraction of calls answer 503, and
+more than `requests_per_second` Coolify calls within a second answer 429.
+The next `lost_creates` creates make the application but time out before
+answering, as when the response is lost on the way back.
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: Optional[Dict] = None, headers: Optional[Dict] = None):
+        self.status_code = status_code
+        self.body = body if body is not None else {}
+        self.headers = headers or {}
+        self.text = str(self.body)
+
+    def json(self) -> Dict:
+        return self.body
+
+class FakeCoolifyHTTP:
+
+    def __init__(self, latency: float = 0.0, build_seconds: float = 0.0, failure_rate: float = 0.0,
+                 requests_per_second: Optional[float] = None, github_files=('package.json',), seed: int = 0):
+        self.latency = latency
+        self.build_seconds = build_seconds
+        self.failure_rate = failure_rate
+        self.requests_per_second = requests_per_second
+        self.github_files = set(github_files)
+        self.lost_creates = 0
+        self.rng = random.Random(seed)
+        self.apps: Dict[str, Dict] = {}
+        self.calls = Counter()  # (method, route) -> count, including rejected ones
+        self.keys_sent = 0  # Environment variables written or deleted
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        return self.request('GET', url, **kwargs)
+
+    def request(self, method: str, url: str, json: Dict = None, **kwargs) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(url)
+        if parsed.hostname == 'api.github.com':
+            return FakeResponse(200 if parsed.path.rsplit('/', 1)[-1] in self.github_files else 404)
+
+        route = re.sub(r'/envs/(?!bulk$)[^/]+$', '/envs/{env_uuid}', re.sub(r'/applications/[^/]+', '/applications/{uuid}', parsed.path))
+        now = time.monotonic()
+        with self.lock:
+            self.calls[(method, route)] += 1
+            while self.recent and self.recent[0] <= now - 1:
+                self.recent.popleft()
+            if self.requests_per_second and len(self.recent) >= self.requests_per_second:
+                self.calls['rate_limited'] += 1
+                return FakeResponse(429, {'message': 'Too many requests'}, {'Retry-After': '1'})
+            self.recent.append(now)
+            if self.rng.random() < self.failure_rate:
+                self.calls['failed'] += 1
+                return FakeResponse(503, {'message': 'Service unavailable'})
+
+            app_id = parsed.path.split('/applications/')[-1].split('/')[0] if '/applications/' in parsed.path else None
+            if method == 'POST' and route == '/api/v1/applications':
+                app_id = uuid.uuid4().hex
+                self.apps[app_id] = {'name': (json or {}).get('name'), 'deployed_at': None,
+                                     'env': dict((json or {}).get('environment_variables') or {})}
+                if self.lost_creates:
+                    self.lost_creates -= 1
+                    raise requests.Timeout('Read timed out')
+                return FakeResponse(201, {'uuid': app_id})
+            if method == 'GET' and route == '/api/v1/applications':
+                return FakeResponse(200, [{'uuid': app_id, 'name': app['name']} for app_id, app in self.apps.items()])
+            app = self.apps.get(app_id)
+            if app is None:
+                return FakeResponse(404, {'message': 'Application not found'})
+            if method == 'POST' and route.endswith('/deploy'):
+                app['deployed_at'] = now
+                return FakeResponse(200, {'message': 'Deployment queued'})
+            if method == 'PUT' and route.endswith('/environment-variables'):
+                app['env'] = dict(json or {})
+                self.keys_sent += len(app['env'])
+                return FakeResponse(200, {'message': 'Updated'})
+            if method == 'PATCH' and route.endswith('/envs/bulk'):
+                data = (json or {}).get('data', [])
+                app['env'].update({variable['key']: variable['value'] for variable in data})
+                self.keys_sent += len(data)
+                return FakeResponse(201, {'message': 'Updated'})
+            if method == 'GET' and route.endswith('/envs'):
+                env_ids = app.setdefault('env_ids', {})
+                return FakeResponse(200, [{'uuid': env_ids.setdefault(key, uuid.uuid4().hex), 'key': key, 'value': value}
+                                          for key, value in app['env'].items()])
+            if method == 'DELETE' and route.endswith('/envs/{env_uuid}'):
+                env_uuid = parsed.path.rsplit('/', 1)[-1]
+                key = next((key for key, value in app.get('env_ids', {}).items() if value == env_uuid), None)
+                if key is None or key not in app['env']:
+                    return FakeResponse(404, {'message': 'Environment variable not found'})
+                del app['env'][key], app['env_ids'][key]
+                self.keys_sent += 1
+                return FakeResponse(200, {'message': 'Deleted'})
+            if method == 'GET':
+                if app['deployed_at'] is None:
+                    status = 'stopped'
+                elif now - app['deployed_at'] < self.build_seconds:
+                    status = 'building'
+                else:
+                    status = 'running'
+                return FakeResponse(200, {'uuid': app_id, 'status': status, 'fqdn': f"https://{app_id[:8]}.example.com"})
+            return FakeResponse(404, {'message': 'Not found'})
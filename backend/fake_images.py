@@ -0,0 +1,83 @@
+"""
+Local image server standing in for Instagram's CDN, for app.thumbnails.
+
+Serves GET /{name}.png as a generated PNG (a colour derived from the name) of
+`size` pixels square, after sleeping `latency` seconds. Names starting with
+'missing' answer 404, names starting with 'broken' answer 200 with bytes that
+aren't an image, and names starting with 'same' all serve identical bytes, like
+Instagram's default avatar. Counts requests per path in `hits`.
+
+    with FakeImageServer(latency=0.05) as server:
+        url = server.url('alice')   # http://127.0.0.1:<port>/alice.png
+"""
+import hashlib
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def png(width: int, height: int, rgb) -> bytes:
+    """A solid-colour RGB PNG, encoded without Pillow"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+class FakeImageServer:
+
+    def __init__(self, latency: float = 0.0, size: int = 320):
+        self.latency = latency
+        self.size = size
+        self.hits = Counter()
+        self._lock = threading.Lock()
+        self._images = {}
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/{name}.png'
+
+    def image(self, name: str) -> bytes:
+        with self._lock:
+            if name not in self._images:
+                seed = 'same' if name.startswith('same') else name
+                self._images[name] = png(self.size, self.size, hashlib.md5(seed.encode()).digest()[:3])
+            return self._images[name]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.hits[self.path] += 1
+                time.sleep(server.latency)
+                name = self.path.strip('/').rsplit('.', 1)[0]
+                if name.startswith('missing'):
+                    self.send_error(404)
+                    return
+                body = b'<html>not an image</html>' if name.startswith('broken') else server.image(name)
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,22 +1,34 @@
 import time
-import random
 import json
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 from typing import List, Dict, Optional
 from apify_client import ApifyClient
 import openai
 import os
-from models import db, Prospect, Campaign, Message, ProspectStatus, InstagramAccount
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.metrics import track_outbound, record_dm_results
+from app.follow_ups import claim_due_follow_ups
+from app.lookalike import refresh_scores as refresh_lookalike_scores
+from app.prioritization import claim_prospects, refresh_campaign_queue, top_candidates
+from app.models import Prospect, Campaign, CampaignStatus, Message, InstagramAccount, SendBatch
+from app.session_health import SESSION_EXPIRED
+from app.send_journal import apply_results as apply_send_results, dm_results, open_batch as open_send_batch, recover_pending
 from message_templates import MessageTemplates
+from rate_controller import AdaptiveRateController, RateControllerConfig, release_expired_cooldowns
 
 class ApifyInstagramBot:
     
-    def __init__(self, account_id: int = None, session_id: str = None):
+    def __init__(self, account_id: int = None, session_id: str = None, db: Session = None, apify_client=None):
         """
-        Initialize bot with either an account_id (preferred) or session_id (fallback)
+        Initialize bot with either an account_id (preferred) or session_id (fallback).
+        A database session and Apify client can be injected, e.g. a FakeApifyClient in benchmarks,
+        and so can sleep, clock and rng, which campaign_simulator replaces with a virtual clock.
         """
+        self.db = db or SessionLocal()
+        
         if account_id:
-            self.account = InstagramAccount.query.get(account_id)
+            self.account = self.db.query(InstagramAccount).get(account_id)
             if not self.account:
                 raise ValueError(f"Instagram account with ID {account_id} not found")
             if not self.account.is_active:
@@ -31,23 +43,29 @@ class ApifyInstagramBot:
             raise ValueError("Either account_id or session_id must be provided")
         
         self.message_delay = int(os.getenv('MESSAGE_DELAY', 60))
+        self.rate_config = RateControllerConfig(self.message_delay)
+        self.sleep = time.sleep
+        self.clock = datetime.now  # Local time, like AdaptiveRateController
+        self.rng = None
         self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY')) if os.getenv('OPENAI_API_KEY') else None
         
-        apify_token = os.getenv('APIFY_API_TOKEN')
-        if not apify_token:
-            raise ValueError("APIFY_API_TOKEN environment variable is required")
+        if apify_client is None:
+            apify_token = os.getenv('APIFY_API_TOKEN')
+            if not apify_token:
+                raise ValueError("APIFY_API_TOKEN environment variable is required")
+            apify_client = ApifyClient(apify_token)
         
-        self.apify_client = ApifyClient(apify_token)
+        self.apify_client = apify_client
         self.actor_id = os.getenv('APIFY_ACTOR_ID', 'deepanshusharm/instagram-dms-automation')
         
     @staticmethod
-    def select_best_available_account() -> Optional[InstagramAccount]:
+    def select_best_available_account(db: Session) -> Optional[InstagramAccount]:
         """
         Select the best available Instagram account based on daily limits and status
         """
         today = date.today()
         
-        accounts_to_reset = InstagramAccount.query.filter(
+        accounts_to_reset = db.query(InstagramAccount).filter(
             InstagramAccount.last_reset_date < today,
             InstagramAccount.is_active == True
         ).all()
@@ -56,9 +74,10 @@ class ApifyInstagramBot:
             account.daily_messages_sent = 0
             account.last_reset_date = today
         
-        db.session.commit()
+        release_expired_cooldowns(db)
+        db.commit()
         
-        available_account = InstagramAccount.query.filter(
+        available_account = db.query(InstagramAccount).filter(
             InstagramAccount.is_active == True,
             InstagramAccount.account_status == 'active',
             InstagramAccount.daily_messages_sent < InstagramAccount.daily_limit
@@ -67,15 +86,15 @@ class ApifyInstagramBot:
         return available_account
     
     @staticmethod
-    def get_account_daily_remaining(account_id: int) -> int:
+    def get_account_daily_remaining(db: Session, account_id: int, today: date = None) -> int:
         """
         Get remaining daily message limit for an account
         """
-        account = InstagramAccount.query.get(account_id)
+        account = db.query(InstagramAccount).get(account_id)
         if not account:
             return 0
         
-        today = date.today()
+        today = today or date.today()
         if account.last_reset_date < today:
             return account.daily_limit
         
@@ -86,14 +105,14 @@ class ApifyInstagramBot:
         Update the account's daily message count
         """
         if self.account:
-            today = date.today()
+            today = self.clock().date()
             if self.account.last_reset_date < today:
                 self.account.daily_messages_sent = 0
                 self.account.last_reset_date = today
             
             self.account.daily_messages_sent += messages_sent
-            self.account.last_activity = datetime.utcnow()
-            db.session.commit()
+            self.account.last_activity = self._utcnow()
+            self.db.commit()
 
     def analyze_bio_with_ai(self, bio: str) -> Dict:
         """Use OpenAI to analyze bio and score prospect"""
@@ -115,12 +134,13 @@ class ApifyInstagramBot:
             {{"coach_score": 8.5, "value_score": 7.2, "niche": "business"}}
             """
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=100,
-                temperature=0.3
-            )
+            with track_outbound('openai', 'analyze_bio'):
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=100,
+                    temperature=0.3
+                )
             
             result = json.loads(response.choices[0].message.content)
             return {
@@ -133,12 +153,15 @@ class ApifyInstagramBot:
             print(f"AI analysis error: {str(e)}")
             return {'coach_score': 0.0, 'value_score': 0.0, 'niche': 'general'}
     
-    def send_dm_batch(self, usernames: List[str], message: str) -> Dict[str, bool]:
-        """Send DMs to a batch of users using Apify actor"""
+    def send_dm_batch(self, usernames: List[str], message: str, batch: SendBatch = None) -> Dict[str, bool]:
+        """
+        Send DMs to a batch of users using Apify actor. With a journal batch, the run id
+        is committed as soon as the run starts so a crash can be reconciled later.
+        """
         if not usernames:
             return {}
         
-        batch_size = min(5, len(usernames))
+        batch_size = min(self.rate_config.max_batch_size, len(usernames))
         batch_usernames = usernames[:batch_size]
         
         try:
@@ -155,51 +178,53 @@ class ApifyInstagramBot:
             }
             
             print(f"Starting Apify actor run for {len(batch_usernames)} users...")
-            run = self.apify_client.actor(self.actor_id).call(run_input=run_input)
-            
-            results = {}
-            if run and run.get('status') == 'SUCCEEDED':
-                dataset_items = self.apify_client.dataset(run['defaultDatasetId']).list_items().items
-                
-                for item in dataset_items:
-                    username = item.get('username')
-                    status = item.get('status')
-                    if username:
-                        results[username] = status == 'success'
-                        if status == 'success':
-                            print(f"Message sent successfully to {username}")
-                        else:
-                            print(f"Failed to send message to {username}: {status}")
-            else:
-                print(f"Apify actor run failed: {run.get('status') if run else 'No run data'}")
-                for username in batch_usernames:
-                    results[username] = False
+            with track_outbound('apify', 'send_dm_batch'):
+                run = self.apify_client.actor(self.actor_id).start(run_input=run_input)
+                if batch is not None and run:
+                    batch.apify_run_id = run['id']
+                    batch.status = 'started'
+                    self.db.commit()
+                if run:
+                    run = self.apify_client.run(run['id']).wait_for_finish()
             
+            results = dm_results(self.apify_client, run, batch_usernames)
+            record_dm_results(self._account_label(), results)
             return results
             
         except Exception as e:
             print(f"Error in Apify actor run: {str(e)}")
-            return {username: False for username in batch_usernames}
+            if batch is not None and batch.apify_run_id:
+                raise  # The run may still be sending; leave the batch for recover_pending
+            results = {username: False for username in batch_usernames}
+            record_dm_results(self._account_label(), results)
+            return results
+    
+    def _utcnow(self) -> datetime:
+        """The bot's clock as naive UTC, for the stored timestamps"""
+        return self.clock().astimezone(timezone.utc).replace(tzinfo=None)
+    
+    def _account_label(self) -> str:
+        return self.account.username if self.account else 'session'
     
     def run_campaign(self, campaign_id: int):
         """Run a campaign with safety limits using Apify"""
         try:
-            campaign = Campaign.query.get(campaign_id)
-            if not campaign or campaign.status != 'active':
+            campaign = self.db.query(Campaign).get(campaign_id)
+            if not campaign or campaign.status != CampaignStatus.ACTIVE:
                 print(f"Campaign {campaign_id} is not active or not found")
                 return
             
             if campaign.instagram_account_id:
                 if self.account_id != campaign.instagram_account_id:
                     print(f"Switching to campaign-specific account {campaign.instagram_account_id}")
-                    self.account = InstagramAccount.query.get(campaign.instagram_account_id)
+                    self.account = self.db.query(InstagramAccount).get(campaign.instagram_account_id)
                     if not self.account or not self.account.is_active:
                         print(f"Campaign account {campaign.instagram_account_id} is not available")
                         return
                     self.session_id = self.account.session_id
                     self.account_id = self.account.id
             elif not self.account:
-                self.account = self.select_best_available_account()
+                self.account = self.select_best_available_account(self.db)
                 if not self.account:
                     print("No available Instagram accounts found")
                     return
@@ -207,15 +232,35 @@ class ApifyInstagramBot:
                 self.account_id = self.account.id
                 print(f"Auto-selected account: {self.account.username}")
             
-            remaining_limit = self.get_account_daily_remaining(self.account_id)
+            if self.account and self.account.account_status == SESSION_EXPIRED:
+                print(f"Account {self.account.username} has an expired session; update its session_id")
+                return
+            
+            recovered = recover_pending(self.db, self.apify_client, self.account_id)
+            if recovered['recovered'] or recovered['abandoned']:
+                print(f"Reconciled unfinished batches from an earlier run: {recovered['recovered']} settled "
+                      f"({recovered['sent']} DMs recorded), {recovered['abandoned']} never sent")
+            
+            controller = AdaptiveRateController(self.account, self.rate_config, clock=self.clock, rng=self.rng)
+            if controller.in_cooldown():
+                print(f"Account {self.account.username} is cooling down until {self.account.cooldown_until}")
+                return
+            if not controller.in_active_hours():
+                print(f"Account {self.account.username} is outside its active hours "
+                      f"({controller.seconds_until_active() / 3600:.1f}h until the next window)")
+                return
+            
+            remaining_limit = self.get_account_daily_remaining(self.db, self.account_id, self.clock().date())
             if remaining_limit <= 0:
                 print(f"Daily limit reached for account {self.account.username}")
                 return
             
-            today = datetime.now().date()
-            campaign_messages_today = Message.query.filter(
+            # A range on sent_at rather than date(sent_at): portable, and it can use the sent_at index
+            day_start = datetime.combine(self.clock().date(), datetime.min.time())
+            campaign_messages_today = self.db.query(Message).filter(
                 Message.campaign_id == campaign_id,
-                db.func.date(Message.sent_at) == today
+                Message.sent_at >= day_start,
+                Message.sent_at < day_start + timedelta(days=1)
             ).count()
             
             campaign_remaining = campaign.daily_limit - campaign_messages_today
@@ -225,76 +270,88 @@ class ApifyInstagramBot:
                 print(f"Daily limit reached for campaign {campaign_id}")
                 return
             
-            prospects = Prospect.query.filter(
-                Prospect.status == ProspectStatus.QUALIFIED,
-                Prospect.dm_sent == False
-            ).limit(remaining_limit).all()
+            lookalike = refresh_lookalike_scores(self.db)
+            self.db.commit()
+            if lookalike['vectorized'] or lookalike['full_rescore']:
+                print(f"Lookalike scores refreshed ({lookalike['vectorized']} new prospects, "
+                      f"{'full rescore' if lookalike['full_rescore'] else 'incremental'}, {lookalike['scored']} scored)")
             
-            if not prospects:
-                print("No qualified prospects to message")
-                return
+            queue = refresh_campaign_queue(self.db, campaign)
+            self.db.commit()
+            print(f"Priority queue refreshed ({'full rebuild' if queue['full_rebuild'] else 'incremental'}, "
+                  f"{queue['scored']} prospects scored)")
             
-            print(f"Found {len(prospects)} qualified prospects to message")
             print(f"Using account: {self.account.username} (remaining limit: {remaining_limit})")
             
             messages_sent = 0
-            batch_size = 5
+            queue_cursor = None  # Each batch continues below the last prospect tried
             
-            for i in range(0, len(prospects), batch_size):
-                if messages_sent >= remaining_limit:
-                    break
+            while messages_sent < remaining_limit:
+                batch_size = controller.next_batch_size(remaining_limit - messages_sent)
                 
-                batch_prospects = prospects[i:i + batch_size]
-                usernames = [p.username for p in batch_prospects]
+                # Due follow-ups go first; they share the batch pacing and daily limits
+                claimed = claim_due_follow_ups(self.db, campaign, self.account_id, batch_size, now=self._utcnow())
+                if claimed:
+                    message_type = 'follow_up'
+                    targets = [(prospect, follow_up.message_id) for follow_up, prospect in claimed]
+                else:
+                    message_type = 'initial'
+                    candidates = top_candidates(self.db, campaign_id, batch_size, after=queue_cursor)
+                    if not candidates:
+                        if queue_cursor is None:
+                            print("No qualified prospects to message")
+                        break
+                    queue_cursor = candidates[-1][1]
+                    batch_prospects = [prospect for prospect, _ in candidates]
+                    # Another worker may have taken some of these since the queue was read
+                    claimed_ids = set(claim_prospects(self.db, [p.id for p in batch_prospects]))
+                    batch_prospects = [p for p in batch_prospects if p.id in claimed_ids]
+                    if not batch_prospects:
+                        self.db.commit()
+                        continue
+                    targets = [(prospect, None) for prospect in batch_prospects]
                 
                 prospect_data = {
-                    'username': batch_prospects[0].username,
-                    'full_name': batch_prospects[0].full_name,
-                    'niche': batch_prospects[0].niche,
-                    'followers': batch_prospects[0].followers
+                    'username': targets[0][0].username,
+                    'full_name': targets[0][0].full_name,
+                    'niche': targets[0][0].niche,
+                    'followers': targets[0][0].followers
                 }
                 
-                message_content = MessageTemplates.get_personalized_message(prospect_data)
+                template = MessageTemplates.get_template(prospect_data['niche'], message_type)
+                template_variant = MessageTemplates.get_template_variant(template)
+                message_content = MessageTemplates.personalize_message(template, prospect_data)
                 
-                print(f"Sending batch of {len(usernames)} messages...")
-                results = self.send_dm_batch(usernames, message_content)
+                # Journal the batch (and any follow-up claims) before anything goes out
+                batch = open_send_batch(self.db, campaign_id, self.account_id, message_type,
+                                        message_content, template_variant, targets)
+                self.db.commit()
                 
-                for prospect in batch_prospects:
-                    if messages_sent >= remaining_limit:
-                        break
-                    
-                    success = results.get(prospect.username, False)
-                    
-                    if success:
-                        prospect.dm_sent = True
-                        prospect.dm_sent_at = datetime.utcnow()
-                        prospect.status = ProspectStatus.MESSAGED
-                        
-                        message = Message(
-                            prospect_id=prospect.id,
-                            campaign_id=campaign_id,
-                            content=message_content
-                        )
-                        db.session.add(message)
-                        
-                        campaign.messages_sent += 1
-                        messages_sent += 1
-                        
-                        print(f"Successfully processed message for {prospect.username}")
-                    else:
-                        print(f"Failed to send message to {prospect.username}")
+                print(f"Sending batch of {len(targets)} {'follow-ups' if claimed else 'messages'}...")
+                results = self.send_dm_batch([prospect.username for prospect, _ in targets], message_content, batch)
                 
-                if i + batch_size < len(prospects) and messages_sent < remaining_limit:
-                    delay = random.uniform(self.message_delay * 2, self.message_delay * 3)
-                    print(f"Waiting {delay:.1f} seconds before next batch...")
-                    time.sleep(delay)
-            
-            self.update_account_usage(messages_sent)
+                # Each batch's outcome is committed on its own, with the account's usage
+                sent = apply_send_results(self.db, batch, results, sent_at=self._utcnow())
+                self.update_account_usage(sent)
+                messages_sent += sent
+                print(f"Recorded {sent} of {len(targets)} {'follow-ups' if claimed else 'messages'}")
+                
+                outcome = controller.record_results(results)
+                if outcome['limited']:
+                    break
+                
+                if messages_sent < remaining_limit:
+                    delay = controller.next_delay(remaining_limit - messages_sent)
+                    if delay is None:
+                        print(f"Stopping for now: {self.account.username} is outside active hours or cooling down")
+                        break
+                    print(f"Waiting {delay:.1f} seconds before next batch (batch size {controller.batch_size})...")
+                    self.sleep(delay)
             
-            db.session.commit()
+            self.db.commit()
             print(f"Campaign completed. Sent {messages_sent} messages using account {self.account.username}.")
             
         except Exception as e:
             print(f"Campaign error: {str(e)}")
-            db.session.rollback()
+            self.db.rollback()
             raise
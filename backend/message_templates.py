@@ -1,5 +1,8 @@
 import random
-from typing import Dict, List
+import re
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, List, Optional
 
 class MessageTemplates:
     
@@ -65,6 +68,36 @@ class MessageTemplates:
             
         return random.choice(templates)
     
+    @classmethod
+    def get_template_variant(cls, template: str) -> str:
+        """Get a stable key like 'business:2' identifying a template, used for analytics"""
+        
+        for group, templates in TEMPLATE_GROUPS.items():
+            if template in templates:
+                return f"{group}:{templates.index(template)}"
+        
+        return 'custom'
+    
+    @classmethod
+    def get_template_by_variant(cls, variant: Optional[str]) -> Optional[str]:
+        """The template a get_template_variant key like 'business:2' refers to, or None"""
+        
+        group, _, index = (variant or '').partition(':')
+        templates = TEMPLATE_GROUPS.get(group)
+        if templates is None or not index.isdigit() or int(index) >= len(templates):
+            return None
+        return templates[int(index)]
+    
+    @classmethod
+    def extract_values(cls, template: str, content: str) -> Optional[Dict[str, str]]:
+        """The substitution values that render `template` as exactly `content`, or None if it can't"""
+        
+        match = _template_pattern(template).fullmatch(content)
+        if not match:
+            return None
+        values = match.groupdict()
+        return values if template.format(**values) == content else None
+    
     @classmethod
     def personalize_message(cls, template: str, prospect_data: Dict) -> str:
         """Personalize a template with prospect data"""
@@ -89,3 +122,25 @@ class MessageTemplates:
         niche = prospect_data.get('niche', 'business')
         template = cls.get_template(niche, message_type)
         return cls.personalize_message(template, prospect_data)
+
+# Variant key prefix -> templates; the index within the list completes the key (see get_template_variant)
+TEMPLATE_GROUPS: Dict[str, List[str]] = {
+    'business': MessageTemplates.BUSINESS_COACH_TEMPLATES,
+    'life': MessageTemplates.LIFE_COACH_TEMPLATES,
+    'fitness': MessageTemplates.FITNESS_COACH_TEMPLATES,
+    'mindset': MessageTemplates.MINDSET_COACH_TEMPLATES,
+    'follow_up': MessageTemplates.FOLLOW_UP_TEMPLATES
+}
+
+@lru_cache(maxsize=None)
+def _template_pattern(template: str) -> re.Pattern:
+    """Regex matching any rendering of a template, one named group per placeholder"""
+    parts = []
+    seen = set()
+    for literal, field, _, _ in Formatter().parse(template):
+        parts.append(re.escape(literal))
+        if field is None:
+            continue
+        parts.append(f'(?P={field})' if field in seen else f'(?P<{field}>.*?)')
+        seen.add(field)
+    return re.compile(''.join(parts), re.DOTALL)
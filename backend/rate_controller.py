@@ -0,0 +1,183 @@
+import math
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+from app.models import InstagramAccount
+
+class RateControllerConfig:
+    """Bounds for the adaptive controller, read from the environment like MESSAGE_DELAY"""
+
+    def __init__(self, message_delay: int = None):
+        message_delay = message_delay if message_delay is not None else int(os.getenv('MESSAGE_DELAY', 60))
+        self.min_batch_size = int(os.getenv('RATE_MIN_BATCH_SIZE', 1))
+        self.max_batch_size = int(os.getenv('RATE_MAX_BATCH_SIZE', 5))
+        self.min_delay = float(os.getenv('RATE_MIN_DELAY', message_delay * 2))
+        self.max_delay = float(os.getenv('RATE_MAX_DELAY', message_delay * 20))
+        self.failure_tolerance = float(os.getenv('RATE_FAILURE_TOLERANCE', 0.2))
+        self.failure_spike_rate = float(os.getenv('RATE_FAILURE_SPIKE_RATE', 0.5))
+        self.spike_min_attempts = int(os.getenv('RATE_SPIKE_MIN_ATTEMPTS', 4))
+        self.failure_ewma_limit = float(os.getenv('RATE_FAILURE_EWMA_LIMIT', 0.35))
+        self.ewma_alpha = float(os.getenv('RATE_EWMA_ALPHA', 0.3))
+        self.cooldown_hours = float(os.getenv('RATE_COOLDOWN_HOURS', 6))
+        self.jitter = float(os.getenv('RATE_DELAY_JITTER', 0.2))
+
+class AdaptiveRateController:
+    """
+    Per-account pacing for DM batches.
+
+    Batch size and delay adapt AIMD-style to the failure rate observed in
+    send_dm_batch results: clean batches grow the batch and shorten the delay,
+    batches failing above the tolerance halve the batch and back the delay off,
+    anything in between holds steady. A failure spike puts the account into
+    'limited' with a cool-down. The delay never drops below what's needed to
+    spread the remaining daily quota over the account's active hours. State
+    lives on the InstagramAccount row so it survives restarts.
+    """
+
+    def __init__(self, account: InstagramAccount, config: RateControllerConfig = None,
+                 clock: Callable[[], datetime] = datetime.now, rng: random.Random = None):
+        self.account = account
+        self.config = config or RateControllerConfig()
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+        if not account.current_batch_size:
+            account.current_batch_size = self.config.max_batch_size
+        if not account.current_delay_seconds:
+            account.current_delay_seconds = self.config.min_delay
+        if account.failure_rate is None:
+            account.failure_rate = 0.0
+
+    @property
+    def batch_size(self) -> int:
+        return max(self.config.min_batch_size, min(self.config.max_batch_size, self.account.current_batch_size))
+
+    @property
+    def delay(self) -> float:
+        return max(self.config.min_delay, min(self.config.max_delay, self.account.current_delay_seconds))
+
+    def in_cooldown(self, now: datetime = None) -> bool:
+        now = now or self.clock()
+        return bool(self.account.cooldown_until and self.account.cooldown_until > now)
+
+    def _window(self, now: datetime):
+        """Start and end of the active-hours window containing (or next after) now"""
+        start_hour = self.account.active_hours_start if self.account.active_hours_start is not None else 0
+        end_hour = self.account.active_hours_end if self.account.active_hours_end is not None else 24
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        if start_hour == end_hour or (start_hour == 0 and end_hour == 24):
+            return day, day + timedelta(days=1)
+
+        if start_hour < end_hour:
+            start, end = day + timedelta(hours=start_hour), day + timedelta(hours=end_hour)
+            if now >= end:
+                start, end = start + timedelta(days=1), end + timedelta(days=1)
+            return start, end
+
+        # Window wraps midnight, e.g. 20 -> 2
+        if now.hour < end_hour:
+            return day - timedelta(days=1) + timedelta(hours=start_hour), day + timedelta(hours=end_hour)
+        return day + timedelta(hours=start_hour), day + timedelta(days=1, hours=end_hour)
+
+    def in_active_hours(self, now: datetime = None) -> bool:
+        now = now or self.clock()
+        start, end = self._window(now)
+        return start <= now < end
+
+    def seconds_until_active(self, now: datetime = None) -> float:
+        now = now or self.clock()
+        start, _ = self._window(now)
+        return max(0.0, (start - now).total_seconds())
+
+    def can_send(self, now: datetime = None) -> bool:
+        now = now or self.clock()
+        return not self.in_cooldown(now) and self.in_active_hours(now)
+
+    def next_batch_size(self, remaining: int) -> int:
+        return max(0, min(self.batch_size, remaining))
+
+    def paced_delay(self, remaining: int, now: datetime = None) -> float:
+        """
+        Delay that spreads `remaining` sends evenly over what's left of the active
+        window. The window is split into one more gap than there are batches, so the
+        last batch lands a gap before the end rather than on it, where jitter would
+        push it out of the window.
+        """
+        now = now or self.clock()
+        if remaining <= 0:
+            return 0.0
+        _, end = self._window(now)
+        batches_left = math.ceil(remaining / self.batch_size)
+        return max(0.0, (end - now).total_seconds()) / (batches_left + 1)
+
+    def next_delay(self, remaining: int, now: datetime = None) -> Optional[float]:
+        """
+        Seconds to wait before the next batch, or None if the account must stop for now
+        (cool-down, or the next batch would land outside active hours).
+        """
+        now = now or self.clock()
+        if self.in_cooldown(now):
+            return None
+
+        base = max(self.delay, self.paced_delay(remaining, now))
+        delay = base * self.rng.uniform(1 - self.config.jitter, 1 + self.config.jitter)
+
+        _, end = self._window(now)
+        latest = (end - now).total_seconds()
+        if base < latest <= delay:
+            delay = self.rng.uniform(base, latest)  # Jitter alone mustn't end the day early
+
+        if not self.in_active_hours(now + timedelta(seconds=delay)):
+            return None
+        return delay
+
+    def record_results(self, results: Dict[str, bool], now: datetime = None) -> Dict:
+        """Feed one send_dm_batch result map back into the controller"""
+        now = now or self.clock()
+        attempted = len(results)
+        if not attempted:
+            return {'failure_rate': 0.0, 'limited': False}
+
+        failed = sum(1 for success in results.values() if not success)
+        batch_failure_rate = failed / attempted
+        alpha = self.config.ewma_alpha
+        self.account.failure_rate = alpha * batch_failure_rate + (1 - alpha) * (self.account.failure_rate or 0.0)
+
+        spike = (attempted >= self.config.spike_min_attempts and batch_failure_rate >= self.config.failure_spike_rate) \
+            or self.account.failure_rate >= self.config.failure_ewma_limit
+
+        if spike:
+            self.account.account_status = 'limited'
+            self.account.cooldown_until = now + timedelta(hours=self.config.cooldown_hours)
+            self.account.current_batch_size = self.config.min_batch_size
+            self.account.current_delay_seconds = self.config.max_delay
+            print(f"Failure spike on {self.account.username} ({failed}/{attempted} failed), "
+                  f"cooling down until {self.account.cooldown_until}")
+        elif batch_failure_rate > self.config.failure_tolerance:
+            self.account.current_batch_size = max(self.config.min_batch_size, self.batch_size // 2)
+            self.account.current_delay_seconds = min(self.config.max_delay, self.delay * 1.5)
+        elif not failed:
+            self.account.current_batch_size = min(self.config.max_batch_size, self.batch_size + 1)
+            self.account.current_delay_seconds = max(self.config.min_delay, self.delay * 0.9)
+
+        return {'failure_rate': batch_failure_rate, 'limited': spike}
+
+def release_expired_cooldowns(db: Session, now: datetime = None) -> int:
+    """Return accounts the controller limited back to 'active' once their cool-down has passed"""
+    now = now or datetime.now()
+    accounts = db.query(InstagramAccount).filter(
+        InstagramAccount.account_status == 'limited',
+        InstagramAccount.cooldown_until.isnot(None),
+        InstagramAccount.cooldown_until <= now
+    ).all()
+
+    for account in accounts:
+        account.account_status = 'active'
+        account.cooldown_until = None
+        account.failure_rate = 0.0
+
+    return len(accounts)
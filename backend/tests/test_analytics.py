@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import analytics, models
+
+DAY = datetime(2026, 3, 2)
+
+@pytest.fixture
+def campaign(db):
+    campaign = models.Campaign(name='Coaches')
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+def _send(db, campaign, sent_at, niche='life', variant='life:1', response_at=None):
+    prospect = models.Prospect(username=f'coach_{db.query(models.Prospect).count()}', followers=20000, niche=niche,
+                               status=models.ProspectStatus.MESSAGED)
+    message = models.Message(prospect=prospect, campaign_id=campaign.id, content='Hi there!', sent_at=sent_at,
+                             template_variant=variant, response_at=response_at)
+    db.add(message)
+    db.commit()
+    return message
+
+def _daily(db, day=DAY):
+    return {(rollup.niche, rollup.template_variant): (rollup.sent, rollup.responded, rollup.converted)
+            for rollup in analytics.get_rollups(db, 'day', day, day + timedelta(days=1))}
+
+def _snapshot(db):
+    return sorted((rollup.granularity, rollup.bucket_start, rollup.niche, rollup.template_variant, rollup.sent,
+                   rollup.responded, rollup.converted, rollup.median_response_seconds)
+                  for rollup in db.query(models.MessageRollup))
+
+def test_rollups_bucket_by_hour_and_day_per_dimension(db, campaign):
+    _send(db, campaign, DAY + timedelta(hours=9), response_at=DAY + timedelta(hours=10))
+    _send(db, campaign, DAY + timedelta(hours=9, minutes=30), response_at=DAY + timedelta(hours=12, minutes=30))
+    _send(db, campaign, DAY + timedelta(hours=15))
+    _send(db, campaign, DAY + timedelta(hours=15), niche='fitness', variant='fitness:0')
+
+    result = analytics.refresh_rollups(db)
+    assert (result['days_recomputed'], result['ranges']) == (1, 1)
+    assert _daily(db) == {('life', 'life:1'): (3, 2, 0), ('fitness', 'fitness:0'): (1, 0, 0)}
+    hours = {(rollup.bucket_start.hour, rollup.niche): (rollup.sent, rollup.median_response_seconds)
+             for rollup in analytics.get_rollups(db, 'hour', DAY, DAY + timedelta(days=1))}
+    assert hours == {(9, 'life'): (2, 7200.0), (15, 'life'): (1, None), (15, 'fitness'): (1, None)}
+
+    summary = analytics.summarize_rollups(analytics.get_rollups(db, 'day', DAY, DAY + timedelta(days=1)))
+    bucket, = summary['buckets']
+    assert (bucket['sent'], bucket['responded'], bucket['response_rate']) == (4, 2, 0.5)
+    assert summary['niche_distribution'] == [{'niche': 'fitness', 'count': 1}, {'niche': 'life', 'count': 3}]
+
+def test_refresh_recomputes_only_the_days_that_changed(db, campaign):
+    for offset in range(5):
+        _send(db, campaign, DAY + timedelta(days=offset, hours=9))
+    assert analytics.refresh_rollups(db)['days_recomputed'] == 5
+    assert analytics.refresh_rollups(db)['days_recomputed'] == 0
+
+    _send(db, campaign, DAY + timedelta(days=6, hours=9))
+    assert analytics.refresh_rollups(db)['days_recomputed'] == 1
+
+    # A conversion dirties the day the prospect was messaged
+    converted = db.query(models.Prospect).filter_by(username='coach_2').one()
+    converted.status = models.ProspectStatus.CONVERTED
+    db.commit()
+    result = analytics.refresh_rollups(db)
+    assert result['days_recomputed'] == 1
+    assert _daily(db, DAY + timedelta(days=2)) == {('life', 'life:1'): (1, 0, 1)}
+
+def test_late_reply_with_an_older_timestamp_is_rolled_up(db, campaign):
+    first = _send(db, campaign, DAY + timedelta(hours=9))
+    second = _send(db, campaign, DAY + timedelta(days=1, hours=9))
+    first.response_at = DAY + timedelta(days=3)
+    db.commit()
+    analytics.refresh_rollups(db)
+    assert _daily(db) == {('life', 'life:1'): (1, 1, 0)}
+
+    # Recorded after the refresh above, though the prospect answered before the first reply
+    second.response_at = DAY + timedelta(days=2)
+    second.response_content = 'Yes please'
+    db.commit()
+    assert analytics.refresh_rollups(db)['days_recomputed'] == 1
+    assert _daily(db, DAY + timedelta(days=1)) == {('life', 'life:1'): (1, 1, 0)}
+    assert analytics.refresh_rollups(db)['days_recomputed'] == 0
+
+def test_incremental_refreshes_match_a_rebuild(db, campaign):
+    messages = [_send(db, campaign, DAY + timedelta(days=offset % 3, hours=offset)) for offset in range(9)]
+    analytics.refresh_rollups(db)
+    for message in messages[::2]:
+        message.response_at = message.sent_at + timedelta(hours=5)
+    messages[1].prospect.status = models.ProspectStatus.CONVERTED
+    db.commit()
+    _send(db, campaign, DAY + timedelta(days=4))
+    analytics.refresh_rollups(db)
+
+    incremental = _snapshot(db)
+    analytics.rebuild_rollups(db)
+    assert _snapshot(db) == incremental
+
+def test_performance_endpoint_reads_the_rollups(client, db, campaign):
+    _send(db, campaign, DAY + timedelta(hours=9), response_at=DAY + timedelta(hours=11))
+    _send(db, campaign, DAY + timedelta(days=1, hours=9))
+    analytics.refresh_rollups(db)
+
+    response = client.get('/api/analytics/performance', params={
+        'granularity': 'day', 'start': DAY.isoformat(), 'end': (DAY + timedelta(days=2)).isoformat()})
+    assert response.status_code == 200
+    body = response.json()
+    assert [(bucket['sent'], bucket['responded']) for bucket in body['buckets']] == [(1, 1), (1, 0)]
+    assert body['daily_messages'] == [{'date': '2026-03-02', 'messages': 1}, {'date': '2026-03-03', 'messages': 1}]
+    assert client.get('/api/analytics/performance', params={'granularity': 'week'}).status_code == 400
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import analytics, archive, message_content, models
+from message_templates import MessageTemplates
+
+NOW = datetime(2026, 9, 1, 12, 0)
+CUTOFF = datetime(2026, 3, 5)  # NOW less the default 180 days, at the start of the day
+PROSPECT = {'username': 'coach_jane', 'full_name': 'Jane Doe', 'niche': 'life', 'followers': 20000}
+
+@pytest.fixture
+def sent(db):
+    """Messages on both sides of the cutoff, one of them templated and one still awaiting its follow-up"""
+    prospects = [models.Prospect(username=f'coach_{i}', followers=20000, niche='life',
+                                 status=models.ProspectStatus.MESSAGED) for i in range(4)]
+    campaign = models.Campaign(name='Coaches')
+    db.add_all(prospects + [campaign])
+    db.flush()
+    templated = MessageTemplates.personalize_message(MessageTemplates.get_template_by_variant('life:1'), PROSPECT)
+    messages = {}
+    for prospect, (name, sent_at) in zip(prospects, [('january', datetime(2026, 1, 15, 9)),
+                                                     ('february', datetime(2026, 2, 10, 9)),
+                                                     ('following_up', datetime(2026, 2, 20, 9)),
+                                                     ('recent', datetime(2026, 6, 1, 9))]):
+        message = models.Message(prospect_id=prospect.id, campaign_id=campaign.id, sent_at=sent_at,
+                                 template_variant='life:1')
+        if name == 'january':
+            for column, value in message_content.reference(db, templated, 'life:1').items():
+                setattr(message, column, value)
+        else:
+            message.content = f'Hi {prospect.username}!'
+        db.add(message)
+        messages[name] = message
+    db.flush()
+    db.add(models.FollowUp(message_id=messages['following_up'].id, campaign_id=campaign.id,
+                           prospect_id=messages['following_up'].prospect_id, due_at=NOW + timedelta(days=1)))
+    db.commit()
+    ids = {name: message.id for name, message in messages.items()}
+    ids.update({f'{name}_prospect': message.prospect_id for name, message in messages.items()}, templated=templated)
+    return ids
+
+def test_old_messages_move_to_monthly_partitions(db, sent, tmp_path):
+    result = archive.archive_messages(db, now=NOW, directory=str(tmp_path))
+    assert result == {'archived': 2, 'months': ['2026-01', '2026-02'], 'cutoff': CUTOFF}
+
+    hot = {message.id for message in db.query(models.Message)}
+    assert hot == {sent['following_up'], sent['recent']}
+    partitions = archive.get_partitions(db)
+    assert [(partition.month, partition.messages, partition.archived_before) for partition in partitions] == [
+        ('2026-01', 1, CUTOFF), ('2026-02', 1, CUTOFF)]
+    assert all(partition.path.startswith(str(tmp_path)) for partition in partitions)
+
+    rows = archive.query_archived_messages(db)
+    assert [(row['id'], row['content']) for row in rows] == [
+        (sent['january'], sent['templated']), (sent['february'], 'Hi coach_1!')]
+    assert [row['id'] for row in archive.query_archived_messages(db, start=datetime(2026, 2, 1))] == [
+        sent['february']]
+
+    # Nothing left to move; the follow-up's message goes once the follow-up is out
+    assert archive.archive_messages(db, now=NOW, directory=str(tmp_path))['archived'] == 0
+    db.query(models.FollowUp).update({'status': 'sent'})
+    db.commit()
+    assert archive.archive_messages(db, now=NOW, directory=str(tmp_path))['archived'] == 1
+    assert archive.get_partitions(db)[1].messages == 2
+
+def test_archived_messages_are_served_over_the_api(client, db, sent, tmp_path):
+    archive.archive_messages(db, now=NOW, directory=str(tmp_path))
+    assert [partition['month'] for partition in client.get('/api/archive/partitions').json()] == ['2026-01', '2026-02']
+    response = client.get('/api/archive/messages', params={'end': '2026-02-01T00:00:00'})
+    assert [row['content'] for row in response.json()] == [sent['templated']]
+
+def _daily(db, day):
+    return [(rollup.sent, rollup.responded, rollup.converted)
+            for rollup in analytics.get_rollups(db, 'day', day, day + timedelta(days=1))]
+
+def test_days_before_the_horizon_keep_their_rollups(db, sent, tmp_path):
+    archive.archive_messages(db, now=NOW, directory=str(tmp_path))
+    assert analytics.archive_horizon(db) == CUTOFF
+    january, june = datetime(2026, 1, 15), datetime(2026, 6, 1)
+    assert _daily(db, january) == [(1, 0, 0)] and _daily(db, june) == [(1, 0, 0)]
+
+    # A late conversion would rebuild January from a hot table that no longer has its message
+    for message in ('january', 'recent'):
+        db.query(models.Prospect).filter_by(id=sent[f'{message}_prospect']).update(
+            {'status': models.ProspectStatus.CONVERTED, 'updated_at': datetime.utcnow() + timedelta(seconds=1)})
+    db.commit()
+    analytics.refresh_rollups(db)
+    assert _daily(db, january) == [(1, 0, 0)]
+    assert _daily(db, june) == [(1, 0, 1)]
+
+    analytics.rebuild_rollups(db)
+    assert _daily(db, january) == [(1, 0, 0)] and _daily(db, june) == [(1, 0, 1)]
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+
+from app import auth, models
+
+@pytest.fixture
+def anonymous(client):
+    """The API client with real authentication, and cold auth caches"""
+    from app.main import app
+
+    app.dependency_overrides.pop(auth.get_current_user)
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    return client
+
+@pytest.fixture
+def user(db):
+    user = models.User(username='coach', email='coach@example.com', password_hash=auth.pwd_context.hash('secret'))
+    db.add(user)
+    db.commit()
+    return user
+
+def _login(client, password='secret'):
+    return client.post('/api/auth/login', data={'username': 'coach', 'password': password})
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_login_issues_a_token_that_opens_the_api(anonymous, user):
+    response = _login(anonymous)
+    assert response.status_code == 200
+    token = response.json()['access_token']
+    assert anonymous.get('/api/auth/me', headers=_bearer(token)).json()['username'] == 'coach'
+    assert anonymous.get('/api/campaigns/', headers=_bearer(token)).status_code == 200
+
+    # Verified once, then served from the caches
+    assert auth.token_cache.get(token) == 'coach'
+    assert auth.user_cache.get('coach').email == 'coach@example.com'
+
+@pytest.mark.parametrize('username, password', [('coach', 'wrong'), ('nobody', 'secret')])
+def test_bad_credentials_are_rejected(anonymous, user, username, password):
+    response = anonymous.post('/api/auth/login', data={'username': username, 'password': password})
+    assert response.status_code == 401
+    assert response.headers['www-authenticate'] == 'Bearer'
+
+@pytest.mark.parametrize('headers', [{}, _bearer('not-a-jwt'), _bearer(auth.create_access_token(
+    {'sub': 'coach'}, expires_delta=timedelta(minutes=-1)))])
+def test_missing_invalid_and_expired_tokens_get_401(anonymous, user, headers):
+    response = anonymous.get('/api/campaigns/', headers=headers)
+    assert response.status_code == 401
+    assert response.headers['www-authenticate'] == 'Bearer'
+
+def test_deactivated_user_is_locked_out_once_the_cache_entry_goes(anonymous, user, db):
+    token = _login(anonymous).json()['access_token']
+    user.is_active = False
+    db.commit()
+    assert anonymous.get('/api/auth/me', headers=_bearer(token)).status_code == 200  # Cached for USER_CACHE_TTL
+
+    auth.user_cache.forget('coach')
+    assert anonymous.get('/api/auth/me', headers=_bearer(token)).status_code == 401
+    assert _login(anonymous).status_code == 401
+
+def test_create_user_hashes_the_password_off_the_request_thread(anonymous, user, db):
+    token = _login(anonymous).json()['access_token']
+    new = {'username': 'mentor', 'email': 'mentor@example.com', 'password': 'hunter2'}
+    assert anonymous.post('/api/auth/users', json=new).status_code == 401
+
+    response = anonymous.post('/api/auth/users', json=new, headers=_bearer(token))
+    assert response.status_code == 200 and 'password' not in response.json()
+    stored = db.query(models.User).filter_by(username='mentor').one()
+    assert auth.pwd_context.verify('hunter2', stored.password_hash)
+    assert anonymous.post('/api/auth/users', json=new, headers=_bearer(token)).status_code == 400
+
+def test_token_cache_expires_and_evicts_the_least_recently_used():
+    cache = auth.TokenCache(size=2)
+    cache.put('a', 'alice', expires_at=100)
+    cache.put('b', 'bob', expires_at=200)
+    assert cache.get('a', now=50) == 'alice'
+    cache.put('c', 'carol', expires_at=200)
+    assert (cache.get('a', now=50), cache.get('b', now=50), cache.get('c', now=50)) == ('alice', None, 'carol')
+    assert cache.get('a', now=100) is None
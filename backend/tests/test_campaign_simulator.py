@@ -0,0 +1,38 @@
+from collections import Counter
+from datetime import date, datetime
+
+import campaign_simulator
+from app import models
+
+START = datetime(2026, 3, 2, 10, 0)
+
+def test_simulation_sends_up_to_the_daily_limit_each_calendar_day(database, db):
+    engine, _ = database
+    db.add(models.InstagramAccount(username='sender', session_id='session-1', daily_limit=10,
+                                   last_reset_date=date(2026, 3, 1)))
+    db.add(models.Campaign(name='Coaches', follow_up_delay_hours=0))
+    db.add_all(models.Prospect(username=f'coach_{i}', followers=20000, bio='life coach',
+                               status=models.ProspectStatus.QUALIFIED) for i in range(35))
+    db.commit()
+
+    report = campaign_simulator.simulate(engine, days=7, start=START)
+    assert report['errors'] == []
+    assert report['sends_per_day'] == {'2026-03-02': 10, '2026-03-03': 10, '2026-03-04': 10, '2026-03-05': 5}
+    assert report['complete_at'].startswith('2026-03-05')
+    # 35 sends over four calendar days of 10, not over the ~3.2 days elapsed (which would exceed 1.0)
+    account, = report['accounts']
+    assert (account['sent'], account['utilization']) == (35, 0.875)
+
+    # The source database is only read
+    assert db.query(models.Message).count() == 0
+
+def test_utilization_counts_every_calendar_day_the_run_touches():
+    simulator = campaign_simulator.CampaignSimulator(None, start=datetime(2026, 3, 2, 22, 0), days=7)
+    simulator.finished_at = datetime(2026, 3, 3, 2, 0)
+    simulator.sent[1] = Counter({date(2026, 3, 2): 40, date(2026, 3, 3): 40})
+    simulator.sent[2] = Counter({date(2026, 3, 3): 10})
+
+    report = simulator.report({1: ('full', 40), 2: ('idle', 20)}, {'prospects': 90, 'follow_ups': 0})
+    assert report['sends_per_day'] == {'2026-03-02': 40, '2026-03-03': 50}
+    assert [account['utilization'] for account in report['accounts']] == [1.0, 0.25]
+    assert report['average_sends_per_day'] == 540.0  # 90 sends in four hours
@@ -0,0 +1,92 @@
+import pytest
+
+from app import models, prioritization
+
+@pytest.mark.parametrize('weights', ['[1, 2]', '{"coach_score": "x"}', '{"coach_score": Infinity}', '{"nope": 1}', 'not json'])
+def test_create_rejects_invalid_priority_weights(client, weights):
+    response = client.post('/api/campaigns/', json={'name': 'c', 'priority_weights': weights})
+    assert response.status_code == 422
+    assert client.get('/api/campaigns/').json() == []
+
+def test_create_and_rank_with_priority_weights(client):
+    response = client.post('/api/campaigns/', json={'name': 'c', 'priority_weights': '{"coach_score": 2, "followers": 0}'})
+    assert response.status_code == 200
+    assert response.json()['priority_weights'] == {'coach_score': 2.0, 'followers': 0.0}
+    assert client.get(f"/api/campaigns/{response.json()['id']}/queue").status_code == 200
+
+@pytest.mark.parametrize('stored', ['[1, 2]', '{"coach_score": "x"}', '{broken'])
+def test_stored_invalid_weights_fall_back_to_defaults(stored):
+    campaign = models.Campaign(id=1, name='c', priority_weights=stored)
+    assert prioritization.campaign_weights(campaign) == prioritization.DEFAULT_WEIGHTS
+
+@pytest.mark.parametrize('field', ['hashtags', 'target_accounts'])
+@pytest.mark.parametrize('value', ['"x"', '{"a": 1}', '[1, 2]', '[["a"]]', 'not json'])
+def test_create_rejects_targets_that_are_not_lists_of_strings(client, field, value):
+    response = client.post('/api/campaigns/', json={'name': 'c', field: value})
+    assert response.status_code == 422
+    assert client.get('/api/campaigns/').json() == []
+
+def test_create_normalizes_hashtags_and_target_accounts(client):
+    response = client.post('/api/campaigns/', json={'name': 'c', 'hashtags': '["#LifeCoach", "lifecoach", "mindset"]',
+                                                    'target_accounts': '["@Competitor"]'})
+    assert response.status_code == 200
+    assert response.json()['hashtags'] == ['lifecoach', 'mindset']
+    assert response.json()['target_accounts'] == ['competitor']
+    assert client.get('/api/campaigns/', params={'hashtag': 'MINDSET'}).json()[0]['id'] == response.json()['id']
+
+@pytest.mark.parametrize('value', ['"x"', '{"a": 1}'])
+def test_model_rejects_json_that_is_not_a_list(value):
+    with pytest.raises(ValueError):
+        models.Campaign(name='c', hashtags=value)
+
+def test_source_performance_per_campaign(client, db):
+    campaign = client.post('/api/campaigns/', json={'name': 'c', 'hashtags': '["lifecoach"]'}).json()
+    for i, (source, status) in enumerate([('lifecoach', models.ProspectStatus.RESPONDED),
+                                          ('lifecoach', models.ProspectStatus.DISCOVERED),
+                                          ('fitness', models.ProspectStatus.DISCOVERED)]):
+        prospect = models.Prospect(username=f'p{i}', followers=20000, status=status,
+                                   dm_sent=status == models.ProspectStatus.RESPONDED)
+        db.add(prospect)
+        db.flush()
+        db.add(models.ProspectSource(prospect_id=prospect.id, source_type='hashtag', source=source))
+    db.commit()
+
+    rows = client.get('/api/analytics/sources', params={'campaign_id': campaign['id']}).json()
+    assert rows == [{'source_type': 'hashtag', 'source': 'lifecoach', 'prospects': 2, 'qualified': 1, 'messaged': 1,
+                     'responded': 1, 'converted': 0, 'response_rate': 1.0, 'conversion_rate': 0.0}]
+
+@pytest.mark.parametrize('bio, niche, terms, matched', [
+    ('Business mentor for founders', None, {'coach'}, False),
+    ('I coach founders', None, {'coach'}, True),
+    ('Coaching founders', None, {'coach'}, False),
+    ('Certified life coach for moms', None, {'lifecoach'}, True),
+    ('#LifeCoach and podcaster', None, {'lifecoach'}, True),
+    ('Loving life', 'coaching', {'lifecoaching'}, False),
+    (None, 'fitness', {'fitnesscoach'}, True),
+])
+def test_source_match_is_on_words_of_one_field(bio, niche, terms, matched):
+    weights = dict.fromkeys(prioritization.DEFAULT_WEIGHTS, 0.0)
+    weights['source_match'] = 1.0
+    assert prioritization.score_prospect(0, 0, 0, 0, bio, niche, weights, terms) == float(matched)
+
+def test_queue_pages_from_a_cursor_and_get_does_not_refresh(client, db):
+    campaign = client.post('/api/campaigns/', json={'name': 'c'}).json()
+    db.add_all(models.Prospect(username=f'p{i}', followers=20000, coach_score=score, value_score=0,
+                               status=models.ProspectStatus.QUALIFIED) for i, score in enumerate([3, 9, 5, 5, 1]))
+    db.commit()
+
+    assert client.get(f"/api/campaigns/{campaign['id']}/queue").json() == []
+    assert db.query(models.CampaignQueueState).count() == 0
+    assert client.post(f"/api/campaigns/{campaign['id']}/queue/refresh").json() == {'full_rebuild': True, 'scored': 5}
+    ranked = [prospect['username'] for prospect in client.get(f"/api/campaigns/{campaign['id']}/queue").json()]
+    assert ranked == ['p1', 'p3', 'p2', 'p0', 'p4']
+
+    # A run pages below the last row it tried, whether or not that prospect was sent
+    pages, cursor = [], None
+    while True:
+        page = prioritization.top_candidates(db, campaign['id'], 2, after=cursor)
+        if not page:
+            break
+        pages.append([prospect.username for prospect, _ in page])
+        cursor = page[-1][1]
+    assert pages == [['p1', 'p3'], ['p2', 'p0'], ['p4']]
@@ -0,0 +1,147 @@
+import json
+import uuid
+
+import pytest
+
+import coolify_service
+from app import crud, models, schemas
+from fake_coolify import FakeCoolifyHTTP
+
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(coolify_service, 'REQUESTS_PER_SECOND', 0)
+
+@pytest.fixture
+def http():
+    return FakeCoolifyHTTP()
+
+def _deployments(db, count, **columns):
+    config = models.CoolifyConfig(name='test', api_url=f'https://coolify-{uuid.uuid4().hex[:8]}.example.com',
+                                  api_token='token')
+    db.add(config)
+    db.flush()
+    deployments = [models.Deployment(name=f'coach-landing-{i}', github_url=f'https://github.com/coaches/landing-{i}',
+                                     coolify_config_id=config.id, **columns) for i in range(count)]
+    db.add_all(deployments)
+    db.commit()
+    return deployments
+
+def _deployer(db, deployments, http, **options):
+    batch = crud.create_deployment_batch(db, schemas.BulkDeploymentRequest(
+        deployment_ids=[deployment.id for deployment in deployments]))
+    options = {'poll_seconds': 0.01, 'backoff_seconds': 0.01, **options}
+    return coolify_service.BulkDeployer(db, batch.id, http, **options)
+
+def test_bulk_deploy_creates_deploys_and_records_each_environment(db, http):
+    deployments = _deployments(db, 3, environment_variables=json.dumps({'PLAN': 'pro'}))
+    result = _deployer(db, deployments, http).run()
+
+    assert (result['succeeded'], result['failed']) == (3, 0)
+    assert len(http.apps) == 3
+    for deployment in deployments:
+        db.refresh(deployment)
+        assert deployment.status == models.DeploymentStatus.RUNNING
+        assert http.apps[deployment.coolify_app_id]['env'] == {'PLAN': 'pro'}
+    assert coolify_service.applied_environment(db, [deployments[0].id]) == {deployments[0].id: {'PLAN': 'pro'}}
+
+def test_create_that_timed_out_is_adopted_rather_than_repeated(db, http):
+    deployments = _deployments(db, 2)
+    http.lost_creates = 1
+    deployer = _deployer(db, deployments, http)
+    result = deployer.run()
+
+    assert (result['succeeded'], result['failed']) == (2, 0)
+    assert sorted(app['name'] for app in http.apps.values()) == ['coach-landing-0', 'coach-landing-1']
+    assert any('timed out' in (item.last_error or '') for item in deployer.batch.items)
+
+def test_interrupted_create_is_adopted_when_the_batch_resumes(db, http):
+    deployment, = _deployments(db, 1)
+    deployer = _deployer(db, [deployment], http)
+    # The earlier run got as far as Coolify creating the app before it died
+    coolify_service.CoolifyService(db, deployment.coolify_config_id, http).request_create(
+        deployment.name, deployment.github_url, {})
+    deployer.batch.status = 'running'
+    db.commit()
+
+    assert deployer.run()['succeeded'] == 1
+    assert len(http.apps) == 1
+    db.refresh(deployment)
+    assert deployment.coolify_app_id in http.apps
+
+def test_failing_steps_give_up_after_max_attempts(db):
+    http = FakeCoolifyHTTP(failure_rate=1.0)
+    deployments = _deployments(db, 2)
+    deployer = _deployer(db, deployments, http, max_attempts=2)
+
+    assert deployer.run()['failed'] == 2
+    assert {(item.step, item.attempts) for item in deployer.batch.items} == {('failed', 2)}
+    assert all(deployment.status == models.DeploymentStatus.FAILED for deployment in deployments)
+
+def test_fan_out_reports_a_missing_config_instead_of_raising(db, http, monkeypatch):
+    deployment, = _deployments(db, 1, coolify_app_id='app-1', environment_variables=json.dumps({'PLAN': 'pro'}))
+
+    def missing(db, config_id, http=None):
+        raise ValueError(f"Coolify config with ID {config_id} not found")
+    monkeypatch.setattr(coolify_service, 'CoolifyService', missing)
+
+    result, = coolify_service.EnvironmentFanOut(db, http).push([deployment.id])
+    assert result['status'] == 'failed' and 'not found' in result['error']
+    assert coolify_service.applied_environment(db, [deployment.id]) == {deployment.id: {}}
+
+def test_diff_sends_only_changed_keys_and_deletes_dropped_ones():
+    applied = {'A': '1', 'B': '2', 'C': '3'}
+    assert coolify_service.diff_environment(applied, {'A': '1', 'B': '20', 'D': '4'}) == ({'B': '20', 'D': '4'}, ['C'])
+    assert coolify_service.diff_environment(applied, dict(applied)) == ({}, [])
+
+def _shared(db, http, count):
+    """`count` created deployments sharing one variable set; the first overrides SHARED itself"""
+    variable_set = models.EnvironmentVariableSet(name='shared', variables=json.dumps({'SHARED': 'v1', 'OLD': 'x'}))
+    db.add(variable_set)
+    deployments = _deployments(db, count)
+    deployments[0].environment_variables = json.dumps({'SHARED': 'pinned'})
+    db.add_all(models.DeploymentVariableSet(deployment_id=deployment.id, variable_set_id=variable_set.id)
+               for deployment in deployments)
+    db.flush()
+    service = coolify_service.CoolifyService(db, deployments[0].coolify_config_id, http)
+    environments = coolify_service.effective_environment(db, [deployment.id for deployment in deployments])
+    for deployment in deployments:
+        deployment.coolify_app_id = service.request_create(deployment.name, deployment.github_url,
+                                                           environments[deployment.id])['coolify_app_id']
+    coolify_service.record_applied(db, environments)
+    db.commit()
+    return variable_set, deployments
+
+def test_set_change_fans_out_only_what_each_deployment_is_missing(db, http):
+    variable_set, deployments = _shared(db, http, 3)
+    http.calls.clear()
+    results = coolify_service.EnvironmentFanOut(db, http).update_set(variable_set, {'SHARED': 'v2'}, unset=['OLD'])
+
+    assert [result['status'] for result in results] == ['updated'] * 3
+    assert [result['changed'] for result in results] == [[], ['SHARED'], ['SHARED']]
+    assert all(result['removed'] == ['OLD'] for result in results)
+    envs = [http.apps[deployment.coolify_app_id]['env'] for deployment in deployments]
+    assert envs == [{'SHARED': 'pinned'}, {'SHARED': 'v2'}, {'SHARED': 'v2'}]
+    assert http.calls[('DELETE', '/api/v1/applications/{uuid}/envs/{env_uuid}')] == 3
+    assert coolify_service.applied_environment(db, [deployments[1].id])[deployments[1].id] == {'SHARED': 'v2'}
+
+    # Everything is in line now, so pushing again sends nothing
+    http.calls.clear()
+    assert {result['status'] for result in coolify_service.EnvironmentFanOut(db, http).push(
+        [deployment.id for deployment in deployments])} == {'unchanged'}
+    assert not http.calls
+
+def test_failed_deployment_keeps_its_old_state_and_is_retried_next_push(db, http):
+    variable_set, deployments = _shared(db, http, 3)
+    lost = http.apps.pop(deployments[2].coolify_app_id)
+    fan_out = coolify_service.EnvironmentFanOut(db, http, backoff_seconds=0)
+
+    results = fan_out.update_set(variable_set, {'SHARED': 'v2'})
+    assert [result['status'] for result in results] == ['unchanged', 'updated', 'failed']
+    assert '404' in results[2]['error']
+    applied = coolify_service.applied_environment(db, [deployment.id for deployment in deployments])
+    assert applied[deployments[1].id]['SHARED'] == 'v2' and applied[deployments[2].id]['SHARED'] == 'v1'
+
+    http.apps[deployments[2].coolify_app_id] = lost
+    retried = fan_out.push([deployment.id for deployment in deployments])
+    assert [result['status'] for result in retried] == ['unchanged', 'unchanged', 'updated']
+    assert lost['env']['SHARED'] == 'v2'
@@ -0,0 +1,127 @@
+"""Code with separate SQLite and Postgres paths (COPY, SKIP LOCKED, migrations), run on each backend"""
+import io
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app import follow_ups, migrations, models, prioritization, prospect_csv
+from app.database import Base, database_url, engine_options
+from benchmarks.common import temp_database
+
+INSTANCE_DB = os.path.join(os.path.dirname(__file__), '..', 'instance', 'coach_outreach.db')
+
+CSV = """username,full_name,followers,engagement_rate,bio,niche
+coach_anna,Anna,12000,3.5,Business coach for founders,business
+coach_ben,Ben,15000.0,2.1,Fitness coaching online,fitness
+,Nobody,100,1.0,no username,fitness
+coach_cara,Cara,,4.0,no followers,fitness
+"""
+
+def _prospects(db, count: int):
+    db.add_all([models.Prospect(username=f'user{i}', followers=10000 + i) for i in range(count)])
+    db.commit()
+    return [prospect_id for prospect_id, in db.query(models.Prospect.id).order_by(models.Prospect.id)]
+
+def test_database_url_accepts_postgres_scheme():
+    assert database_url('postgres://u:p@host/db') == 'postgresql://u:p@host/db'
+    assert database_url('sqlite:///x.db') == 'sqlite:///x.db'
+    assert 'pool_size' in engine_options('postgresql://u:p@host/db')
+    assert 'pool_size' not in engine_options('sqlite:///x.db')
+
+def test_migrations_on_empty_database(backend):
+    with temp_database(create_schema=False, backend=backend) as (engine, _, _):
+        applied = migrations.upgrade(engine)
+        assert applied == [name for _, name in migrations.available()]
+        assert migrations.pending(engine) == []
+        assert set(Base.metadata.tables) <= set(inspect(engine).get_table_names())
+        assert migrations.upgrade(engine) == []
+
+def test_migrations_upgrade_pre_versioning_database(tmp_path):
+    # The schema shipped in backend/instance predates every column and index added since
+    path = tmp_path / 'old.db'
+    shutil.copy(INSTANCE_DB, path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO campaigns (name, hashtags, target_accounts) VALUES ('old', '[\"#Fit\"]', '[\"@Coach\"]')")
+    url = f'sqlite:///{path}'
+    engine = create_engine(url, **engine_options(url))
+    try:
+        migrations.upgrade(engine)
+        inspector = inspect(engine)
+        for table in ('prospects', 'campaigns', 'messages', 'instagram_accounts'):
+            columns = {column['name'] for column in inspector.get_columns(table)}
+            assert set(Base.metadata.tables[table].c.keys()) <= columns, table
+            indexes = {index['name'] for index in inspector.get_indexes(table)}
+            assert {index.name for index in Base.metadata.tables[table].indexes} <= indexes, table
+        with engine.connect() as conn:
+            assert conn.execute(models.CampaignHashtag.__table__.select()).fetchone().hashtag == 'fit'
+    finally:
+        engine.dispose()
+
+def test_csv_import_and_export(db):
+    assert prospect_csv.import_csv(db, io.StringIO(CSV))['created'] == 2
+    db.commit()
+    again = prospect_csv.import_csv(db, io.StringIO(CSV.replace('12000', '13000')))
+    db.commit()
+    assert again['created'] == 0 and again['updated'] == 2
+    assert db.query(models.Prospect).filter_by(username='coach_anna').one().followers == 13000
+    assert db.query(models.Prospect).filter_by(username='coach_ben').one().followers == 15000
+
+    out = io.StringIO()
+    assert prospect_csv.export_csv(db, out, niche='fitness') == 1
+    header, row = out.getvalue().splitlines()
+    assert header.split(',') == list(prospect_csv.EXPORT_FIELDS)
+    assert 'coach_ben' in row and ',discovered,' in row
+
+def test_csv_import_requires_columns(db):
+    with pytest.raises(ValueError):
+        prospect_csv.import_csv(db, io.StringIO('username,bio\nanna,coach\n'))
+
+def test_claim_prospects_once(db):
+    ids = _prospects(db, 5)
+    assert prioritization.claim_prospects(db, ids[:3]) == ids[:3]
+    db.commit()
+    assert prioritization.claim_prospects(db, ids) == ids[3:]
+    db.commit()
+    assert prioritization.claim_prospects(db, ids) == []
+
+def test_claim_prospects_skips_locked_rows(backend, database):
+    if backend != 'postgresql':
+        pytest.skip('SQLite serializes writers; a second claimer waits instead of skipping')
+    _, Session = database
+    first, second = Session(), Session()
+    try:
+        ids = _prospects(first, 6)
+        assert prioritization.claim_prospects(first, ids[:3]) == ids[:3]  # Locked until first commits
+        assert prioritization.claim_prospects(second, ids) == ids[3:]
+        second.commit()
+        first.commit()
+    finally:
+        first.close()
+        second.close()
+
+def test_claim_due_follow_ups(db):
+    account = models.InstagramAccount(username='sender', session_id='s')
+    campaign = models.Campaign(name='c', follow_up_delay_hours=1)
+    answered = models.Prospect(username='answered', followers=1, status=models.ProspectStatus.RESPONDED)
+    waiting = models.Prospect(username='waiting', followers=1)
+    db.add_all([account, campaign, answered, waiting])
+    db.flush()
+    sent_at = datetime.utcnow() - timedelta(hours=2)
+    for prospect in (answered, waiting):
+        message = models.Message(prospect_id=prospect.id, campaign_id=campaign.id, instagram_account_id=account.id,
+                                 content='hi', sent_at=sent_at)
+        db.add(message)
+        db.flush()
+        db.add(models.FollowUp(message_id=message.id, campaign_id=campaign.id, prospect_id=prospect.id,
+                               instagram_account_id=account.id, due_at=sent_at + timedelta(hours=1)))
+    db.commit()
+
+    claimed = follow_ups.claim_due_follow_ups(db, campaign, account.id, limit=10)
+    db.commit()
+    assert [prospect.username for _, prospect in claimed] == ['waiting']
+    assert {row.status for row in db.query(models.FollowUp)} == {'sending', 'cancelled'}
+    assert follow_ups.claim_due_follow_ups(db, campaign, account.id, limit=10) == []
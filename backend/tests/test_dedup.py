@@ -0,0 +1,29 @@
+from app import dedup, models
+
+BIO = 'Certified life coach helping busy moms find balance, book a free discovery call today'
+CLONES = [BIO + ' ' + suffix for suffix in ('!', 'now', 'xx', 'ok')]
+
+def _add(db, bios):
+    prospects = [models.Prospect(username=f'user{db.query(models.Prospect).count() + i}', followers=20000, bio=bio)
+                 for i, bio in enumerate(bios)]
+    db.add_all(prospects)
+    db.flush()
+    return prospects
+
+def test_clones_point_at_the_representative_which_alone_is_bucketed(db):
+    representative, *batch_clones = _add(db, [BIO] + CLONES[:2])
+    other, = _add(db, ['Marathon runner and nutrition nerd sharing weekly training plans'])
+    assert dedup.index_prospects(db, [representative, *batch_clones, other]) == {'indexed': 4, 'duplicates': 2}
+    db.commit()
+
+    # A later clone matches through the representative's buckets
+    later = _add(db, CLONES[2:])
+    assert dedup.index_unsigned(db) == {'indexed': 2, 'duplicates': 2}
+    clones = batch_clones + later
+    assert all(clone.duplicate_of_id == representative.id for clone in clones)
+    assert other.duplicate_of_id is None
+    assert [p.id for p in dedup.cluster_members(db, clones[-1].id)] == [representative.id] + [c.id for c in clones]
+
+    bucketed = {prospect_id for prospect_id, in db.query(models.BioLshBucket.prospect_id).distinct()}
+    assert bucketed == {representative.id, other.id}
+    assert db.query(models.BioSignature).count() == 6
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.inbox import InboxSync
+from fake_apify import FakeApifyClient, FakeInbox
+
+INBOX_ACTOR = 'apify/instagram-inbox-scraper'
+SENT_AT = datetime(2026, 3, 2, 12, 0)
+
+@pytest.fixture
+def inbox():
+    return FakeInbox()
+
+@pytest.fixture
+def sync(db, inbox):
+    apify = FakeApifyClient()
+    apify.handlers[INBOX_ACTOR] = inbox
+    return InboxSync(db, apify)
+
+@pytest.fixture
+def account(db):
+    account = models.InstagramAccount(username='sender', session_id='session-1')
+    db.add(account)
+    db.commit()
+    return account
+
+def _send(db, account, username, sent_at=SENT_AT, **prospect):
+    prospect = db.query(models.Prospect).filter_by(username=username).first() or models.Prospect(
+        username=username, followers=20000, status=models.ProspectStatus.MESSAGED, **prospect)
+    campaign = db.query(models.Campaign).first() or models.Campaign(name='Coaches')
+    message = models.Message(prospect=prospect, campaign=campaign, instagram_account_id=account.id,
+                             content='Hi there!', sent_at=sent_at)
+    db.add(message)
+    db.flush()
+    db.add(models.FollowUp(message_id=message.id, campaign_id=campaign.id, prospect_id=prospect.id,
+                           instagram_account_id=account.id, due_at=sent_at + timedelta(days=3)))
+    db.commit()
+    return message
+
+def test_sync_records_replies_and_only_fetches_newer_threads(db, sync, inbox, account):
+    message = _send(db, account, 'coach_a')
+    _send(db, account, 'coach_b')
+    inbox.send('session-1', 'coach_a', 'Hi there!', SENT_AT)
+    inbox.reply('session-1', 'coach_a', 'Tell me more', SENT_AT + timedelta(hours=1))
+
+    assert sync.sync_account(account) == {'account': 'sender', 'status': 'completed', 'threads': 1, 'replies': 1}
+    db.expire_all()
+    assert (message.response_at, message.response_content) == (SENT_AT + timedelta(hours=1), 'Tell me more')
+    assert message.prospect.status == models.ProspectStatus.RESPONDED
+    assert message.prospect.response_received_at == SENT_AT + timedelta(hours=1)
+    assert message.campaign.responses_received == 1
+    assert db.query(models.FollowUp).get(message.id).status == 'cancelled'
+    cursor = db.query(models.InboxCursor).get(account.id)
+    assert cursor.newest_marker == (SENT_AT + timedelta(hours=1)).isoformat()
+
+    # Nothing newer than the cursor: the actor is asked for newer threads only and none come back
+    assert sync.sync_account(account)['threads'] == 0
+    inbox.reply('session-1', 'coach_b', 'Sounds good', SENT_AT + timedelta(hours=3))
+    assert sync.sync_account(account)['replies'] == 1
+    assert db.query(models.Campaign).one().responses_received == 2
+
+def test_inbound_message_from_before_the_dm_does_not_hide_the_reply(db, sync, inbox, account):
+    message = _send(db, account, 'coach_a')
+    inbox.reply('session-1', 'coach_a', 'Old chat', SENT_AT - timedelta(days=3))
+    inbox.reply('session-1', 'coach_a', 'Interested!', SENT_AT + timedelta(hours=2))
+
+    assert sync.sync_account(account)['replies'] == 1
+    db.expire_all()
+    assert (message.response_at, message.response_content) == (SENT_AT + timedelta(hours=2), 'Interested!')
+    assert message.prospect.response_received_at == SENT_AT + timedelta(hours=2)
+    assert sync.sync_account(account)['replies'] == 0
+
+def test_reply_to_a_later_dm_keeps_the_first_response_time(db, sync, inbox, account):
+    first_response = SENT_AT - timedelta(days=10)
+    message = _send(db, account, 'coach_a', response_received=True, response_received_at=first_response)
+    inbox.reply('session-1', 'coach_a', 'Back again', SENT_AT + timedelta(hours=1))
+
+    assert sync.sync_account(account)['replies'] == 1
+    db.expire_all()
+    assert message.response_at == SENT_AT + timedelta(hours=1)
+    assert message.prospect.response_received_at == first_response
+
+def test_one_reply_answers_every_open_dm_before_it_and_counts_once(db, sync, inbox, account):
+    initial = _send(db, account, 'coach_a')
+    follow_up = _send(db, account, 'coach_a', sent_at=SENT_AT + timedelta(days=3))
+    inbox.reply('session-1', 'coach_a', 'Sorry, missed this', SENT_AT + timedelta(days=4))
+
+    assert sync.sync_account(account)['replies'] == 2
+    db.expire_all()
+    assert initial.response_at == follow_up.response_at == SENT_AT + timedelta(days=4)
+    assert db.query(models.Campaign).one().responses_received == 1
+
+def test_failed_actor_run_keeps_the_cursor(db, sync, inbox, account):
+    _send(db, account, 'coach_a')
+    inbox.reply('session-1', 'coach_a', 'Yes', SENT_AT + timedelta(hours=1))
+    sync.apify_client.handlers[INBOX_ACTOR] = lambda run_input: None
+    assert sync.sync_account(account)['status'] == 'failed'
+    assert db.query(models.InboxCursor).get(account.id).newest_marker is None
+
+    sync.apify_client.handlers[INBOX_ACTOR] = inbox
+    assert sync.sync_account(account)['replies'] == 1
@@ -0,0 +1,72 @@
+from app import lookalike, models
+
+BUSINESS = 'Business coach helping founders scale to 6 figures with sales systems'
+YOGA = 'Yoga teacher and plant based cook sharing morning flows'
+
+def _add(db, count, bio, status=models.ProspectStatus.QUALIFIED, start=0, **columns):
+    prospects = [models.Prospect(username=f'{bio.split()[0].lower()}_{start + i}', followers=20000,
+                                 bio=f'{bio} #{start + i}', status=status, **columns) for i in range(count)]
+    db.add_all(prospects)
+    db.commit()
+    return prospects
+
+def _refresh(db):
+    result = lookalike.refresh_scores(db)
+    db.commit()
+    return result
+
+def _scores(db, prospects):
+    db.expire_all()
+    return [prospect.lookalike_score for prospect in prospects]
+
+def test_nothing_is_scored_until_someone_responds(db):
+    _add(db, 10, BUSINESS)
+    assert _refresh(db) == {'vectorized': 10, 'positives': 0, 'full_rescore': False, 'scored': 0, 'generation': 0}
+    assert _refresh(db)['vectorized'] == 0
+
+def test_full_rescore_ranks_lookalikes_of_the_responders_first(db):
+    _add(db, 4, BUSINESS, status=models.ProspectStatus.RESPONDED, dm_sent=True)
+    business = _add(db, 16, BUSINESS, start=4)
+    yoga = _add(db, 20, YOGA)
+    messaged, = _add(db, 1, BUSINESS, start=20, dm_sent=True)
+    updated_at = [prospect.updated_at for prospect in business]
+
+    result = _refresh(db)
+    assert (result['vectorized'], result['positives'], result['full_rescore'], result['scored']) == (41, 4, True, 36)
+    assert lookalike.current_generation(db) == 1
+    assert min(_scores(db, business)) > 0.5 > max(_scores(db, yoga))
+    assert messaged.lookalike_score is None
+    assert [prospect.updated_at for prospect in business] == updated_at  # The generation bump covers the queues
+
+def test_new_prospects_are_scored_incrementally_until_the_model_moves(db):
+    _add(db, 4, BUSINESS, status=models.ProspectStatus.RESPONDED, dm_sent=True)
+    existing = _add(db, 16, BUSINESS, start=4) + _add(db, 20, YOGA)
+    _refresh(db)
+    before = _scores(db, existing)
+
+    # 40 -> 43 documents is under RESCORE_GROWTH: only the new prospects are scored, against the stored centroid
+    new = _add(db, 2, BUSINESS, start=20) + _add(db, 1, YOGA, start=20)
+    result = _refresh(db)
+    assert (result['vectorized'], result['full_rescore'], result['scored'], result['generation']) == (3, False, 3, 1)
+    assert _scores(db, existing) == before
+    new_scores = _scores(db, new)
+    assert min(new_scores[:2]) > 0.5 > new_scores[2]
+
+    # Nothing new: nothing to do
+    assert (_refresh(db)['scored'], lookalike.current_generation(db)) == (0, 1)
+
+    # A new responder moves the positive set past RESCORE_POSITIVE_CHANGE: everyone un-messaged is rescored
+    existing[-1].status = models.ProspectStatus.RESPONDED
+    db.commit()
+    result = _refresh(db)
+    assert (result['positives'], result['full_rescore'], result['scored'], result['generation']) == (5, True, 39, 2)
+    assert _scores(db, existing[:16]) != before[:16]
+
+def test_corpus_growth_triggers_a_full_rescore(db):
+    _add(db, 4, BUSINESS, status=models.ProspectStatus.RESPONDED, dm_sent=True)
+    _add(db, 16, BUSINESS, start=4)
+    _refresh(db)
+
+    _add(db, 2, YOGA)  # 20 -> 22 documents reaches RESCORE_GROWTH
+    result = _refresh(db)
+    assert (result['vectorized'], result['full_rescore'], result['scored'], result['generation']) == (2, True, 18, 2)
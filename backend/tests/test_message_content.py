@@ -0,0 +1,57 @@
+from app import message_content, models
+from message_templates import TEMPLATE_GROUPS, MessageTemplates
+
+PROSPECT = {'username': 'coach_jane', 'full_name': 'Jane Doe', 'niche': 'life', 'followers': 20000}
+
+def _ids(db):
+    prospect = models.Prospect(username='coach_jane', followers=20000)
+    campaign = models.Campaign(name='Coaches')
+    db.add_all([prospect, campaign])
+    db.commit()
+    return {'prospect_id': prospect.id, 'campaign_id': campaign.id}
+
+def test_template_messages_are_stored_as_references_and_read_back_verbatim(client, db):
+    ids = _ids(db)
+    template = MessageTemplates.get_template_by_variant('life:1')
+    rendered = MessageTemplates.personalize_message(template, PROSPECT)
+    custom = 'Hey Jane, loved your last post about {morning routines}!'
+
+    for content in (rendered, custom):
+        response = client.post('/api/messages/', json={**ids, 'content': content})
+        assert response.status_code == 200 and response.json()['content'] == content
+    assert [message['content'] for message in client.get('/api/messages/').json()] == [rendered, custom]
+
+    stored = {message.stored_content: message for message in db.query(models.Message)}
+    assert stored[''].template_id is not None and stored[''].template_values == '{"name":"Jane"}'
+    assert stored[custom].template_id is None and stored[custom].template_values is None
+    template_row = db.query(models.MessageTemplate).one()
+    assert (template_row.variant, template_row.version, template_row.body) == ('life:1', 1, template)
+
+def test_every_known_template_round_trips(db):
+    for group, templates in TEMPLATE_GROUPS.items():
+        for index, template in enumerate(templates):
+            content = MessageTemplates.personalize_message(template, PROSPECT)
+            columns = message_content.reference(db, content, f'{group}:{index}')
+            assert columns['stored_content'] == ''
+            assert message_content.render(db, columns['template_id'], columns['template_values']) == content
+    db.commit()
+    assert db.query(models.MessageTemplate).count() == sum(map(len, TEMPLATE_GROUPS.values()))
+
+def test_changed_text_becomes_the_next_version_of_its_variant(db):
+    first = message_content.template_id_for(db, 'Hi {name}!', 'business:0')
+    assert message_content.template_id_for(db, 'Hi {name}!', 'business:0') == first
+    second = message_content.template_id_for(db, 'Hello {name}!', 'business:0')
+    db.commit()
+    assert dict(db.query(models.MessageTemplate.id, models.MessageTemplate.version)) == {first: 1, second: 2}
+
+def test_convert_replaces_rendered_text_with_references(db):
+    ids = _ids(db)
+    rendered = MessageTemplates.personalize_message(MessageTemplates.get_template_by_variant('follow_up:2'), PROSPECT)
+    db.add_all([models.Message(**ids, content=rendered), models.Message(**ids, content='Custom text')])
+    db.commit()
+
+    assert message_content.convert_messages(db, chunk_size=1) == {'scanned': 2, 'converted': 1}
+    db.expire_all()
+    messages = db.query(models.Message).order_by(models.Message.id).all()
+    assert [message.stored_content for message in messages] == ['', 'Custom text']
+    assert [message.content for message in messages] == [rendered, 'Custom text']
@@ -0,0 +1,25 @@
+import re
+
+from app import metrics
+
+def _sample(text: str, name: str, labels: str) -> float:
+    match = re.search(rf'^{re.escape(name + labels)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+def test_requests_are_recorded_per_route_template(client):
+    route = '{method="GET",route="/api/prospects/",status="200"}'
+    text = client.get('/metrics').text
+    before = _sample(text, 'http_request_duration_seconds_count', route)
+    queries_before = _sample(text, 'db_queries_per_request_sum', '{route="/api/prospects/"}')
+    for skip in (0, 10, 20):
+        assert client.get('/api/prospects/', params={'skip': skip}).status_code == 200
+
+    text = client.get('/metrics').text
+    assert _sample(text, 'http_request_duration_seconds_count', route) == before + 3
+    assert _sample(text, 'db_queries_per_request_sum', '{route="/api/prospects/"}') >= queries_before + 3
+
+def test_statement_metrics_are_resolved_once_per_statement():
+    first = metrics._statement_metrics('SELECT prospects.id FROM prospects')
+    assert first == ('SELECT', metrics.DB_QUERY_DURATION.labels('SELECT'))
+    assert metrics._statement_metrics('SELECT prospects.id FROM prospects') is first
+    assert metrics._statement_metrics('  update prospects SET x = 1')[0] == 'UPDATE'
@@ -0,0 +1,45 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import InstagramAccount
+from rate_controller import AdaptiveRateController, RateControllerConfig
+
+def _send_day(seed: int, start_hour: int, end_hour: int, limit: int = 40, started: datetime = None):
+    """Send clean batches back to back, as run_campaign does; returns (sent, last send time)"""
+    now = [started or datetime(2026, 1, 5, start_hour)]
+    account = InstagramAccount(username='a', session_id='s', active_hours_start=start_hour, active_hours_end=end_hour)
+    controller = AdaptiveRateController(account, RateControllerConfig(message_delay=60),
+                                        clock=lambda: now[0], rng=random.Random(seed))
+    sent, last = 0, now[0]
+    while sent < limit:
+        batch = controller.next_batch_size(limit - sent)
+        sent, last = sent + batch, now[0]
+        controller.record_results({str(i): True for i in range(batch)})
+        if sent < limit:
+            delay = controller.next_delay(limit - sent)
+            if delay is None:
+                break
+            now[0] += timedelta(seconds=delay)
+    return sent, last, controller
+
+@pytest.mark.parametrize('start_hour, end_hour', [(9, 21), (20, 2), (0, 24)])
+def test_daily_limit_fits_the_active_window(start_hour, end_hour):
+    for seed in range(200):
+        sent, last, controller = _send_day(seed, start_hour, end_hour)
+        assert sent == 40, seed
+        assert controller.in_active_hours(last)
+
+def test_sends_are_spread_over_the_window():
+    _, last, _ = _send_day(0, 9, 21)
+    assert last.hour >= 18
+
+def test_stops_when_min_delay_no_longer_fits():
+    sent, last, _ = _send_day(0, 9, 21, started=datetime(2026, 1, 5, 20, 59))
+    assert sent == 5 and last.hour == 20
+
+@pytest.mark.parametrize('hours', [{'active_hours_start': -1}, {'active_hours_end': 25}])
+def test_create_account_rejects_invalid_active_hours(client, hours):
+    response = client.post('/api/instagram-accounts/', json={'username': 'a', 'session_id': 's', **hours})
+    assert response.status_code == 422
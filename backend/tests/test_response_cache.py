@@ -0,0 +1,83 @@
+import pytest
+
+from app import crud, models, response_cache
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Counts the database reads behind GET /campaigns/"""
+    calls = []
+    get_campaigns = crud.get_campaigns
+
+    def counted(*args, **kwargs):
+        calls.append(kwargs)
+        return get_campaigns(*args, **kwargs)
+    monkeypatch.setattr(crud, 'get_campaigns', counted)
+    return calls
+
+def test_unchanged_list_is_served_from_the_cache_and_revalidates_with_304(client, loads):
+    client.post('/api/campaigns/', json={'name': 'Coaches'})
+    first = client.get('/api/campaigns/')
+    etag = first.headers['etag']
+    assert first.status_code == 200 and first.json()[0]['name'] == 'Coaches'
+
+    assert client.get('/api/campaigns/').content == first.content
+    revalidated = client.get('/api/campaigns/', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.content == b''
+    assert revalidated.headers['etag'] == etag
+    assert client.get('/api/campaigns/', headers={'If-None-Match': '"stale", ' + etag}).status_code == 304
+    assert len(loads) == 1
+
+    # Query strings are cached separately
+    assert client.get('/api/campaigns/', params={'limit': 1}).headers['etag'] == etag
+    assert len(loads) == 2
+
+def test_committed_write_invalidates_and_changes_the_etag(client, db, loads):
+    client.post('/api/campaigns/', json={'name': 'Coaches'})
+    etag = client.get('/api/campaigns/').headers['etag']
+
+    client.post('/api/campaigns/', json={'name': 'Mentors'})
+    response = client.get('/api/campaigns/', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and len(response.json()) == 2
+    assert response.headers['etag'] != etag
+
+    # A write through any session on this process's engine counts, not just the CRUD paths
+    etag = response.headers['etag']
+    db.query(models.Campaign).filter_by(name='Mentors').update({'daily_limit': 5})
+    db.commit()
+    response = client.get('/api/campaigns/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert {campaign['name']: campaign['daily_limit'] for campaign in response.json()}['Mentors'] == 5
+    assert len(loads) == 3
+
+def test_rolled_back_write_keeps_the_entry(client, db, loads):
+    client.post('/api/campaigns/', json={'name': 'Coaches'})
+    etag = client.get('/api/campaigns/').headers['etag']
+
+    db.add(models.Campaign(name='Abandoned'))
+    db.flush()
+    db.rollback()
+    assert client.get('/api/campaigns/', headers={'If-None-Match': etag}).status_code == 304
+    assert len(loads) == 1
+
+def test_writes_to_other_tables_leave_the_entry_alone(client, loads):
+    client.post('/api/campaigns/', json={'name': 'Coaches'})
+    etag = client.get('/api/campaigns/').headers['etag']
+
+    assert client.post('/api/instagram-accounts/', json={'username': 'sender', 'session_id': 'session-1'}).status_code == 200
+    assert client.get('/api/campaigns/', headers={'If-None-Match': etag}).status_code == 304
+    assert len(loads) == 1
+
+def test_cache_expires_entries_and_evicts_the_least_recently_used():
+    cache = response_cache.ResponseCache(max_bytes=10, ttl=30)
+    entry = lambda body, expires_at=100: response_cache._Entry((1,), 'etag', body, expires_at)
+    cache.put('a', entry(b'aaaa'))
+    cache.put('b', entry(b'bbbb'))
+    assert cache.get('a', (1,), now=50).body == b'aaaa'
+    cache.put('c', entry(b'cccc'))
+    assert (cache.get('b', (1,), now=50), cache.size) == (None, 8)
+
+    assert cache.get('a', (2,), now=50) is None  # A table changed since it was cached
+    assert cache.get('c', (1,), now=100) is None  # Expired
+    assert cache.size == 0
+    cache.put('big', entry(b'x' * 11))
+    assert cache.get('big', (1,), now=50) is None
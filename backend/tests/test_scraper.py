@@ -0,0 +1,108 @@
+from app import models
+from app.scraper import ProspectScraper
+from fake_apify import FakeApifyClient, FakeProfileSource
+
+HASHTAG_ACTOR = 'apify/instagram-hashtag-scraper'
+FOLLOWERS_ACTOR = 'apify/instagram-followers-scraper'
+
+def _apify(profiles: FakeProfileSource) -> FakeApifyClient:
+    client = FakeApifyClient()
+    client.handlers[HASHTAG_ACTOR] = profiles
+    client.handlers[FOLLOWERS_ACTOR] = profiles
+    return client
+
+def _in_range(items):
+    return {item['username'] for item in items if 10000 <= item['followersCount'] <= 100000}
+
+def _sources(db, source_type, source):
+    return {username for username, in db.query(models.Prospect.username).join(
+        models.ProspectSource, models.ProspectSource.prospect_id == models.Prospect.id
+    ).filter(models.ProspectSource.source_type == source_type, models.ProspectSource.source == source)}
+
+def test_hashtag_scrape_adds_in_range_profiles_and_only_newer_posts_next_time(db):
+    profiles = FakeProfileSource(shared_rate=0)
+    profiles.grow('lifecoach', 120)
+    apify = _apify(profiles)
+    scraper = ProspectScraper(db, apify, page_size=25, chunk_size=40)
+
+    result = scraper.scrape('hashtag', '#LifeCoach')
+    assert result['status'] == 'completed' and result['fetched'] == 120
+    expected = _in_range(profiles.sources['lifecoach'])
+    assert {username for username, in db.query(models.Prospect.username)} == expected
+    assert _sources(db, 'hashtag', 'lifecoach') == expected
+
+    profiles.grow('lifecoach', 30)
+    result = scraper.scrape('hashtag', 'lifecoach')
+    assert result['fetched'] == 30
+    assert apify.calls[-1]['run_input']['onlyPostsNewerThan'] == max(
+        item['timestamp'] for item in profiles.sources['lifecoach'][30:])
+    assert db.query(models.Prospect).count() == len(_in_range(profiles.sources['lifecoach']))
+
+def test_followers_scrape_stops_at_the_previous_newest_follower(db):
+    profiles = FakeProfileSource(shared_rate=0)
+    profiles.grow('competitor', 60)
+    scraper = ProspectScraper(db, _apify(profiles), page_size=25)
+    assert scraper.scrape('followers', '@Competitor')['fetched'] == 60
+
+    profiles.grow('competitor', 10)
+    result = scraper.scrape('followers', 'competitor')
+    assert result['fetched'] <= 25 and result['added'] == len(_in_range(profiles.sources['competitor'][:10]))
+    assert db.query(models.ScrapeCursor).get(('followers', 'competitor')).newest_marker == \
+        profiles.sources['competitor'][0]['username']
+
+def test_interrupted_scrape_resumes_without_another_actor_run(db):
+    profiles = FakeProfileSource(shared_rate=0)
+    profiles.grow('lifecoach', 100)
+    apify = _apify(profiles)
+    dataset = apify.dataset
+
+    def failing_dataset(dataset_id):
+        pages = dataset(dataset_id)
+        list_items = pages.list_items
+
+        def list_items_then_fail(offset=0, limit=None):
+            if offset >= 50:
+                raise ConnectionError('connection reset')
+            return list_items(offset, limit)
+        pages.list_items = list_items_then_fail
+        return pages
+
+    apify.dataset = failing_dataset
+    scraper = ProspectScraper(db, apify, page_size=25, chunk_size=25)
+    try:
+        scraper.scrape('hashtag', 'lifecoach')
+    except ConnectionError:
+        db.rollback()
+    cursor = db.query(models.ScrapeCursor).get(('hashtag', 'lifecoach'))
+    assert cursor.dataset_id and cursor.dataset_offset == 50
+
+    apify.dataset = dataset
+    result = scraper.scrape('hashtag', 'lifecoach')
+    assert result['resumed'] and result['fetched'] == 50
+    assert len(apify.calls) == 1
+    assert {username for username, in db.query(models.Prospect.username)} == _in_range(profiles.sources['lifecoach'])
+
+def test_known_profiles_are_refreshed_and_linked_to_the_new_source(db):
+    profiles = FakeProfileSource(shared_rate=0)
+    profiles.grow('lifecoach', 40)
+    scraper = ProspectScraper(db, _apify(profiles), page_size=25)
+    scraper.scrape('hashtag', 'lifecoach')
+    known = [item for item in profiles.sources['lifecoach'] if 10000 <= item['followersCount'] <= 90000][:5]
+    profiles.sources['competitor'] = [dict(item, followersCount=item['followersCount'] + 1000) for item in known]
+    profiles.grow('competitor', 5)
+
+    result = scraper.scrape('followers', 'competitor')
+    new = _in_range(profiles.sources['competitor'][:5])
+    assert (result['added'], result['refreshed']) == (len(new), 5)
+    assert _sources(db, 'followers', 'competitor') == new | {item['username'] for item in known}
+    assert _sources(db, 'hashtag', 'lifecoach') >= {item['username'] for item in known}
+    followers = dict(db.query(models.Prospect.username, models.Prospect.followers))
+    assert all(followers[item['username']] == item['followersCount'] + 1000 for item in known)
+
+    # Seeing the same profiles from the same source again adds no second link
+    linked = db.query(models.ProspectSource).filter_by(source='competitor').count()
+    db.query(models.ScrapeCursor).get(('followers', 'competitor')).newest_marker = None
+    db.commit()
+    result = scraper.scrape('followers', 'competitor')
+    assert (result['added'], result['refreshed']) == (0, linked)
+    assert db.query(models.ProspectSource).filter_by(source='competitor').count() == linked
@@ -0,0 +1,71 @@
+import pytest
+
+from app import models, search
+
+BIOS = {
+    'ticket_coach': 'High ticket business coach for founders',
+    'ticket_reversed': 'Coach selling a ticket to high performance',
+    'mentoring': 'Mindset mentoring for burnt out lawyers',
+    'mentor': 'Mentor to 1:1 clients, DM-me to apply',
+    'yoga': 'Yoga teacher and plant based cook'
+}
+
+@pytest.fixture
+def bios(db):
+    db.add_all(models.Prospect(username=username, followers=20000, bio=bio) for username, bio in BIOS.items())
+    db.commit()
+
+@pytest.fixture
+def fts(backend):
+    if backend != 'sqlite':
+        pytest.skip('FTS5 syntax is SQLite only; other databases fall back to LIKE')
+
+def _found(client, q):
+    response = client.get('/api/prospects/', params={'q': q})
+    assert response.status_code == 200, response.text
+    return {prospect['username'] for prospect in response.json()}
+
+def test_plain_words_match_on_every_backend(client, bios):
+    assert _found(client, 'yoga') == {'yoga'}
+    assert _found(client, 'lawyers') == {'mentoring'}
+
+@pytest.mark.parametrize('q, usernames', [
+    ('high ticket', {'ticket_coach', 'ticket_reversed'}),
+    ('"high ticket"', {'ticket_coach'}),
+    ('mentor*', {'mentor', 'mentoring'}),
+    ('mentor', {'mentor'}),
+    ('yoga OR founders', {'yoga', 'ticket_coach'}),
+    ('OR yoga OR', {'yoga'}),
+    ('1:1 DM-me', {'mentor'}),
+])
+def test_fts_query_syntax(client, bios, fts, q, usernames):
+    assert _found(client, q) == usernames
+
+def test_bm25_ranks_the_closer_match_first(client, db, fts):
+    db.add_all([models.Prospect(username='once', followers=1, bio='Coach for runners and cyclists and swimmers'),
+                models.Prospect(username='twice', followers=1, bio='Coach coach coach')])
+    db.commit()
+    assert [prospect['username'] for prospect in client.get('/api/prospects/', params={'q': 'coach'}).json()] == [
+        'twice', 'once']
+
+@pytest.mark.parametrize('q', ['""', 'OR', '* OR ***', '"!!"'])
+def test_query_without_searchable_words_is_a_400(client, bios, fts, q):
+    response = client.get('/api/prospects/', params={'q': q})
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Invalid search query')
+
+def test_match_query_quotes_words_and_keeps_operators():
+    assert search.build_match_query('high-ticket "life coach" ment* OR NEAR') == (
+        '"high ticket" "life coach" "ment"* OR "NEAR"')
+    with pytest.raises(search.SearchQueryError):
+        search.build_match_query('  ')
+
+def test_index_follows_bio_edits_and_deletes(client, db, bios, fts):
+    prospect = db.query(models.Prospect).filter_by(username='yoga').one()
+    prospect.bio = 'Pilates instructor'
+    db.commit()
+    assert _found(client, 'yoga') == set() and _found(client, 'pilates') == {'yoga'}
+
+    db.delete(prospect)
+    db.commit()
+    assert _found(client, 'pilates') == set()
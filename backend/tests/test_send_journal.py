@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models, send_journal
+from fake_apify import FakeApifyClient
+
+@pytest.fixture
+def apify():
+    return FakeApifyClient()
+
+@pytest.fixture
+def account(db):
+    account = models.InstagramAccount(username='sender', session_id='session-1', daily_messages_sent=5,
+                                      last_reset_date=datetime.utcnow().date() - timedelta(days=1))
+    db.add(account)
+    db.commit()
+    return account
+
+def _claimed(db, *usernames):
+    """Prospects claimed for an initial batch, as claim_prospects leaves them"""
+    prospects = [models.Prospect(username=username, followers=20000, dm_sent=True) for username in usernames]
+    db.add_all(prospects)
+    db.flush()
+    return prospects
+
+def _batch(db, account, targets, message_type='initial'):
+    campaign = db.query(models.Campaign).first() or models.Campaign(name='Coaches', follow_up_delay_hours=72)
+    db.add(campaign)
+    db.flush()
+    batch = send_journal.open_batch(db, campaign.id, account.id, message_type, 'Hi there!', 'a', targets)
+    db.commit()
+    return batch
+
+def _start(apify, batch, outcomes):
+    """Start the batch's DM run the way the bot does; outcomes maps username to the actor's status"""
+    apify.handlers['dm-actor'] = lambda run_input: [
+        {'username': username, 'status': outcomes[username]} for username in run_input['target_usernames']
+    ]
+    run = apify.actor('dm-actor').start(run_input={'target_usernames': send_journal.usernames(batch)})
+    batch.apify_run_id = run['id']
+    batch.status = 'started'
+
+def test_started_batch_is_settled_from_its_run(db, apify, account):
+    reached, missed = _claimed(db, 'coach_a', 'coach_b')
+    batch = _batch(db, account, [(reached, None), (missed, None)])
+    _start(apify, batch, {'coach_a': 'success', 'coach_b': 'failed'})
+    db.commit()
+
+    assert send_journal.recover_pending(db, apify) == {'recovered': 1, 'abandoned': 0, 'sent': 1}
+    db.expire_all()
+    message = db.query(models.Message).one()
+    assert (message.prospect_id, message.sent_at, message.content) == (reached.id, batch.created_at, 'Hi there!')
+    assert (batch.status, batch.sent_count) == ('completed', 1)
+    assert reached.status == models.ProspectStatus.MESSAGED and reached.dm_sent
+    assert not missed.dm_sent  # Claim released, so the queues pick coach_b up again
+    assert db.query(models.FollowUp).filter_by(message_id=message.id).count() == 1
+    assert (account.daily_messages_sent, account.last_reset_date) == (1, datetime.utcnow().date())
+
+    # Settled once: a second recovery finds nothing open
+    assert send_journal.recover_pending(db, apify) == {'recovered': 0, 'abandoned': 0, 'sent': 0}
+
+def test_failed_run_releases_every_claim(db, apify, account):
+    prospects = _claimed(db, 'coach_a', 'coach_b')
+    batch = _batch(db, account, [(prospect, None) for prospect in prospects])
+    apify.handlers['dm-actor'] = lambda run_input: None
+    batch.apify_run_id = apify.actor('dm-actor').call(run_input={})['id']
+    db.commit()
+
+    assert send_journal.recover_pending(db, apify)['sent'] == 0
+    db.expire_all()
+    assert not any(prospect.dm_sent for prospect in prospects)
+    assert db.query(models.Message).count() == 0
+    assert account.daily_messages_sent == 5
+
+def test_batch_that_never_started_is_abandoned_and_follow_ups_rescheduled(db, apify, account):
+    prospect, = _claimed(db, 'coach_a')
+    initial = _batch(db, account, [(prospect, None)])
+    original = models.Message(prospect_id=prospect.id, campaign_id=initial.campaign_id,
+                              instagram_account_id=account.id, content='Hi there!', sent_at=datetime.utcnow())
+    db.add(original)
+    db.flush()
+    follow_up = models.FollowUp(message_id=original.id, campaign_id=initial.campaign_id, prospect_id=prospect.id,
+                                instagram_account_id=account.id, due_at=datetime.utcnow(), status='sending',
+                                attempts=1)
+    db.add(follow_up)
+    follow_ups = _batch(db, account, [(prospect, original.id)], message_type='follow_up')
+
+    assert send_journal.recover_pending(db, apify) == {'recovered': 0, 'abandoned': 2, 'sent': 0}
+    db.expire_all()
+    assert {initial.status, follow_ups.status} == {'abandoned'}
+    assert not prospect.dm_sent
+    assert follow_up.status == 'pending' and follow_up.due_at > datetime.utcnow()
+    assert not apify.calls
+
+def test_recovery_on_a_later_day_does_not_count_against_today(db, apify, account):
+    prospect, = _claimed(db, 'coach_a')
+    batch = _batch(db, account, [(prospect, None)])
+    _start(apify, batch, {'coach_a': 'success'})
+    batch.created_at = datetime.utcnow() - timedelta(days=1)
+    db.commit()
+
+    assert send_journal.recover_pending(db, apify)['sent'] == 1
+    db.expire_all()
+    assert account.daily_messages_sent == 5
+
+def test_recovery_and_the_sender_cannot_both_record_a_batch(db, apify, account):
+    prospect, = _claimed(db, 'coach_a')
+    batch = _batch(db, account, [(prospect, None)])
+    assert send_journal.apply_results(db, batch, {'coach_a': True}) == 1
+    assert send_journal.apply_results(db, batch, {'coach_a': True}) == 0
+    db.commit()
+    assert db.query(models.Message).count() == 1
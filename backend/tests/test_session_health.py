@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import leases, models
+from app.session_health import SESSION_EXPIRED, SessionHealthChecker
+from fake_apify import FakeApifyClient, FakeSessionCheck
+
+ACTOR = 'apify/instagram-profile-scraper'
+
+@pytest.fixture
+def sessions():
+    return FakeSessionCheck()
+
+@pytest.fixture
+def checker(db, sessions):
+    apify = FakeApifyClient()
+    apify.handlers[ACTOR] = sessions
+    return SessionHealthChecker(db, apify, max_workers=4)
+
+def _accounts(db, *statuses, **columns):
+    accounts = [models.InstagramAccount(username=f'sender_{i}', session_id=f'session-{i}', account_status=status,
+                                        **columns) for i, status in enumerate(statuses)]
+    db.add_all(accounts)
+    db.commit()
+    return accounts
+
+def test_check_marks_dead_sessions_and_recovers_live_ones(db, checker, sessions):
+    live, dead, recovered, cooling = _accounts(db, 'active', 'active', SESSION_EXPIRED, SESSION_EXPIRED)
+    cooling.cooldown_until = datetime.now() + timedelta(hours=1)
+    db.commit()
+    sessions.expired.add(dead.session_id)
+
+    assert checker.check_all() == {'checked': 4, 'healthy': 3, 'expired': 1, 'unknown': 0,
+                                   'marked_expired': 1, 'recovered': 2}
+    db.expire_all()
+    assert [account.account_status for account in (live, dead, recovered, cooling)] == [
+        'active', SESSION_EXPIRED, 'active', 'limited']
+    assert live.last_activity is not None and dead.last_activity is None
+
+def test_failed_check_changes_nothing(db, checker):
+    account, = _accounts(db, SESSION_EXPIRED)
+    checker.apify_client.handlers[ACTOR] = lambda run_input: None
+
+    assert checker.check_all()['unknown'] == 1
+    db.expire_all()
+    assert (account.account_status, account.last_activity) == (SESSION_EXPIRED, None)
+
+def test_changes_made_while_checking_are_not_overwritten(db, database, checker, sessions):
+    replaced, suspended, untouched = _accounts(db, 'active', 'active', 'active')
+    sessions.expired.update({replaced.session_id, untouched.session_id})
+    engine, _ = database
+    table = models.InstagramAccount.__table__
+
+    def meanwhile(run_input):
+        # The operator pastes a fresh session for one account and suspends another mid-check
+        with engine.begin() as conn:
+            if run_input['usernames'] == [replaced.username]:
+                conn.execute(table.update().where(table.c.id == replaced.id).values(session_id='fresh'))
+            elif run_input['usernames'] == [suspended.username]:
+                conn.execute(table.update().where(table.c.id == suspended.id).values(account_status='suspended'))
+        return sessions(run_input)
+    checker.apify_client.handlers[ACTOR] = meanwhile
+
+    assert checker.check_all()['marked_expired'] == 2
+    db.expire_all()
+    assert [account.account_status for account in (replaced, suspended, untouched)] == [
+        'active', 'suspended', SESSION_EXPIRED]
+    assert suspended.last_activity is None
+
+def test_expired_accounts_are_not_dispatchable(db):
+    active, unset, limited, expired = _accounts(db, 'active', None, 'limited', SESSION_EXPIRED)
+    assert leases.active_accounts(db) == [active.id, unset.id, limited.id]
+
+    expired.account_status = 'active'
+    db.commit()
+    assert leases.active_accounts(db) == [active.id, unset.id, limited.id, expired.id]
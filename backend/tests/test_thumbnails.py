@@ -0,0 +1,74 @@
+import pytest
+
+from app import models, thumbnails
+from fake_images import FakeImageServer
+
+@pytest.fixture
+def server():
+    with FakeImageServer() as server:
+        yield server
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = thumbnails.ThumbnailCache(str(tmp_path / 'thumbnails'), sizes=(64, 160))
+    monkeypatch.setattr(thumbnails, 'thumbnail_cache', cache)
+    return cache
+
+def _add(db, pictures):
+    db.add_all(models.Prospect(username=username, followers=20000, profile_pic_url=url)
+               for username, url in pictures.items())
+    db.commit()
+
+def _digests(db):
+    db.expire_all()
+    return dict(db.query(models.Prospect.username, models.Prospect.thumbnail_digest))
+
+def test_fetch_caches_each_picture_once_and_records_failures(db, server, cache):
+    _add(db, {'alice': server.url('alice'), 'bob': server.url('same-1'), 'carol': server.url('same-2'),
+              'dave': server.url('missing-1'), 'erin': server.url('broken-1')})
+
+    result = thumbnails.ThumbnailFetcher(db, max_workers=1).run()  # One at a time, so the shared avatar is 'reused'
+    assert result['prospects'] == 5
+    assert (result['cached'], result['reused'], result['missing']) == (2, 1, 2)
+    digests = _digests(db)
+    assert digests['alice'] and digests['bob'] == digests['carol'] != digests['alice']
+    assert digests['dave'] is None and digests['erin'] is None
+    assert all(cache.has(digests[username]) for username in ('alice', 'bob'))
+
+    server.hits.clear()
+    assert thumbnails.ThumbnailFetcher(db).run()['prospects'] == 0
+    assert not server.hits
+
+def test_changed_picture_url_is_fetched_again(db, server, cache):
+    _add(db, {'alice': server.url('alice')})
+    thumbnails.ThumbnailFetcher(db).run()
+    before = _digests(db)['alice']
+
+    prospect = db.query(models.Prospect).filter_by(username='alice').one()
+    prospect.profile_pic_url = server.url('alice-new')
+    db.commit()
+    assert thumbnails.ThumbnailFetcher(db).run()['cached'] == 1
+    assert _digests(db)['alice'] not in (None, before)
+
+def test_eviction_clears_digests_of_removed_pictures(db, server, cache):
+    _add(db, {f'user{i}': server.url(f'user{i}') for i in range(6)})
+    thumbnails.ThumbnailFetcher(db).run()
+    cache.max_bytes = 1
+    result = thumbnails.ThumbnailFetcher(db).run()
+    assert result['evicted'] == 6
+    assert set(_digests(db).values()) == {None}
+
+def test_serves_cached_thumbnails_and_lists_sizes(client, database, server, cache):
+    db = database[1]()
+    _add(db, {'alice': server.url('alice')})
+    thumbnails.ThumbnailFetcher(db).run()
+    digest = _digests(db)['alice']
+    db.close()
+
+    assert client.get('/api/thumbnails/sizes').json() == {'sizes': [64, 160]}
+    response = client.get(f'/api/thumbnails/{digest}/160.webp')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'image/webp'
+    assert response.headers['cache-control'] == thumbnails.CACHE_CONTROL
+    assert client.get(f'/api/thumbnails/{digest}/100.webp').status_code == 404
+    assert client.get(f"/api/thumbnails/{'0' * 64}/64.webp").status_code == 404
@@ -0,0 +1,54 @@
+from datetime import date
+
+from app import models
+from benchmarks import bench_workers
+from worker import account_campaigns
+
+def _owners(db, active_accounts):
+    owners = {}
+    for account_id in active_accounts:
+        for campaign_id in account_campaigns(db, account_id, active_accounts):
+            assert campaign_id not in owners, f"campaign {campaign_id} dispatched from two accounts"
+            owners[campaign_id] = account_id
+    return owners
+
+def test_unpinned_campaigns_stay_with_their_account_until_it_is_deactivated(db):
+    accounts = [models.InstagramAccount(username=f'sender_{i}', session_id=f'session-{i}', daily_limit=40,
+                                        last_reset_date=date.today()) for i in range(4)]
+    db.add_all(accounts)
+    db.add_all(models.Campaign(name=f'Unpinned {i}') for i in range(12))
+    db.commit()
+    first, second, third, spare = (account.id for account in accounts)
+    pinned = models.Campaign(name='Pinned', instagram_account_id=second)
+    db.add(pinned)
+    db.commit()
+
+    owners = _owners(db, [first, second, third])
+    assert len(owners) == 13 and owners[pinned.id] == second
+
+    # The second account cools down and a fourth comes online: nothing changes hands
+    assert _owners(db, [first, third, spare]) == {campaign_id: owner for campaign_id, owner in owners.items()
+                                                  if owner != second}
+    assert _owners(db, [first, second, third, spare]) == owners
+
+    # Deactivating the third frees its campaigns for the accounts still active
+    accounts[2].is_active = False
+    db.commit()
+    moved = _owners(db, [first, second, spare])
+    for campaign_id, owner in owners.items():
+        if owner == third:
+            assert moved[campaign_id] in (first, second, spare)
+        else:
+            assert moved[campaign_id] == owner
+
+def test_workers_share_accounts_survive_a_kill_and_send_each_dm_once(backend):
+    result = bench_workers.run(processes=2, accounts=4, added_accounts=2, prospects=200, send_seconds=0.01,
+                               timeout=60, backend=backend)
+    assert result['spread_seconds'] >= 0
+    assert result['takeover_seconds'] >= 0
+    assert result['rebalance_seconds'] >= 0
+    assert result['prospects_left'] == 0
+    assert result['open_batches'] == 0
+    assert result['duplicate_messages'] == 0
+    assert result['duplicate_deliveries'] == 0
+    assert result['messages_recorded'] == result['dms_delivered'] == 200
@@ -0,0 +1,213 @@
+"""
+Campaign dispatch workers, sharded by Instagram account.
+
+Each worker process heartbeats and leases a share of the active Instagram
+accounts (see app.leases) and runs campaigns only for the accounts it holds:
+campaigns pinned to the account, plus unpinned campaigns it has claimed.
+An unpinned campaign is claimed once, by the account its id picks (campaign
+id modulo the number of dispatchable accounts), with a conditional UPDATE of
+campaigns.dispatch_account_id, and stays with that account through cooldowns,
+expired sessions and accounts being added. Only deactivating the account
+frees its campaigns for another claim. So the same campaign never runs from
+two accounts at once, as it could when the modulo was recomputed each pass.
+
+A background thread heartbeats and rebalances every third of the lease
+period, so leases are renewed and accounts change hands while a long campaign
+run is still going. Between batches the bot's sleep is checked against the
+leases, so a worker that loses an account (it was rebalanced away, or the
+worker was too slow to renew) stops dispatching for it before the next batch.
+When a worker dies its leases expire and the survivors take its accounts over,
+settling any batch it left in flight from the send journal first.
+
+    python worker.py                      one worker, until SIGTERM/SIGINT
+    python worker.py --processes 4        four worker processes
+    python worker.py --once               one dispatch pass, then exit
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import leases
+from app.database import SessionLocal
+from app.models import Campaign, CampaignStatus, InstagramAccount
+from instagram_bot import ApifyInstagramBot
+
+POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 30))
+SLEEP_CHUNK_SECONDS = 5.0
+
+class DispatchInterrupted(Exception):
+    """Raised out of a campaign run when the worker stops or loses the account's lease"""
+
+def claim_campaign(db: Session, campaign_id: int, account_id: int, owner: Optional[int]) -> bool:
+    """Make account_id the sender of an unpinned campaign, unless another account claimed it since `owner` was read"""
+    owned_by = Campaign.dispatch_account_id.is_(None) if owner is None else Campaign.dispatch_account_id == owner
+    claimed = db.query(Campaign).filter(
+        Campaign.id == campaign_id, Campaign.instagram_account_id.is_(None), owned_by
+    ).update({Campaign.dispatch_account_id: account_id}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def account_campaigns(db: Session, account_id: int, active_accounts: List[int]) -> List[int]:
+    """Active campaigns dispatched from this account: its pinned ones and the unpinned ones it has claimed"""
+    enabled = {enabled_id for enabled_id, in db.query(InstagramAccount.id).filter(InstagramAccount.is_active == True)}
+    campaign_ids = []
+    for campaign_id, pinned_to, owner in db.query(
+        Campaign.id, Campaign.instagram_account_id, Campaign.dispatch_account_id
+    ).filter(Campaign.status == CampaignStatus.ACTIVE).order_by(Campaign.id):
+        if pinned_to is not None:
+            if pinned_to == account_id:
+                campaign_ids.append(campaign_id)
+        elif owner == account_id:
+            campaign_ids.append(campaign_id)
+        elif (owner is None or owner not in enabled) and active_accounts \
+                and active_accounts[campaign_id % len(active_accounts)] == account_id \
+                and claim_campaign(db, campaign_id, account_id, owner):
+            campaign_ids.append(campaign_id)
+    return campaign_ids
+
+class Worker:
+
+    def __init__(self, worker_id: str = None, session_factory=SessionLocal, apify_client=None,
+                 lease_seconds: int = leases.LEASE_SECONDS, poll_seconds: float = POLL_SECONDS,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.worker_id = worker_id or leases.new_worker_id()
+        self.session_factory = session_factory
+        self.apify_client = apify_client
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.sleep = sleep
+        self.held = set()
+        self.stopping = threading.Event()
+        self._heartbeat_thread = None
+
+    def _heartbeat_loop(self):
+        db = self.session_factory()
+        try:
+            while not self.stopping.wait(self.lease_seconds / 3):
+                try:
+                    self.held = set(leases.rebalance(db, self.worker_id, self.lease_seconds))
+                except Exception as e:
+                    print(f"Worker {self.worker_id} heartbeat failed: {str(e)}")
+                    db.rollback()
+        finally:
+            db.close()
+
+    def start_heartbeat(self):
+        if not self._heartbeat_thread:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._heartbeat_thread.start()
+
+    def _guarded_sleep(self, account_id: int) -> Callable[[float], None]:
+        """The bot's pause between batches, cut short if the lease is lost or the worker stops"""
+        def sleep(seconds: float):
+            remaining = seconds
+            while True:
+                if self.stopping.is_set():
+                    raise DispatchInterrupted(f"worker {self.worker_id} is stopping")
+                if account_id not in self.held:
+                    raise DispatchInterrupted(f"lease on account {account_id} was lost")
+                if remaining <= 0:
+                    return
+                chunk = min(SLEEP_CHUNK_SECONDS, remaining)
+                self.sleep(chunk)
+                remaining -= chunk
+        return sleep
+
+    def dispatch(self, db: Session, account_id: int, active_accounts: List[int]) -> int:
+        """Run this account's campaigns; returns how many were run to completion"""
+        completed = 0
+        for campaign_id in account_campaigns(db, account_id, active_accounts):
+            if self.stopping.is_set() or account_id not in self.held:
+                break
+            try:
+                bot = ApifyInstagramBot(account_id=account_id, db=db, apify_client=self.apify_client)
+                bot.sleep = self._guarded_sleep(account_id)
+                bot.run_campaign(campaign_id)
+                completed += 1
+            except DispatchInterrupted as e:
+                print(f"Stopped campaign {campaign_id} on account {account_id}: {str(e)}")
+                break
+            except Exception as e:
+                print(f"Worker {self.worker_id} failed campaign {campaign_id} on account {account_id}: {str(e)}")
+                db.rollback()
+        return completed
+
+    def run_once(self) -> Dict:
+        """Rebalance leases, then dispatch every held account once"""
+        db = self.session_factory()
+        try:
+            self.held = set(leases.rebalance(db, self.worker_id, self.lease_seconds))
+            active_accounts = leases.active_accounts(db)
+            campaigns = 0
+            for account_id in sorted(self.held):
+                if self.stopping.is_set():
+                    break
+                campaigns += self.dispatch(db, account_id, active_accounts)
+            return {'worker': self.worker_id, 'accounts': sorted(self.held), 'campaigns': campaigns}
+        finally:
+            db.close()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, once: bool = False):
+        """Dispatch until stopped; leases are released on the way out"""
+        print(f"Worker {self.worker_id} started")
+        self.start_heartbeat()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    print(self.run_once())
+                except Exception as e:
+                    print(f"Worker {self.worker_id} pass failed: {str(e)}")
+                if once:
+                    break
+                self.stopping.wait(self.poll_seconds)
+        finally:
+            self.stopping.set()
+            db = self.session_factory()
+            try:
+                leases.retire(db, self.worker_id)
+            finally:
+                db.close()
+            print(f"Worker {self.worker_id} stopped")
+
+def _worker_main(once: bool):
+    worker = Worker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once)
+
+def run_workers(processes: int, once: bool = False):
+    """Run `processes` workers in separate processes until they exit; SIGTERM/SIGINT stops them all"""
+    if processes <= 1:
+        return _worker_main(once)
+
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=_worker_main, args=(once,), name=f'worker-{i}') for i in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for child in children:
+        child.join()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run campaign dispatch workers sharded by Instagram account')
+    parser.add_argument('--processes', type=int, default=int(os.getenv('WORKER_PROCESSES', 1)))
+    parser.add_argument('--once', action='store_true', help='do one dispatch pass and exit')
+    args = parser.parse_args()
+    run_workers(args.processes, args.once)
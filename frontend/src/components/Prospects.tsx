@@ -22,6 +22,7 @@ interface Prospect {
   status: string;
   dm_sent: boolean;
   response_received: boolean;
+  thumbnail_digest: string | null;
   created_at: string;
 }
 
@@ -33,6 +34,7 @@ const Prospects: React.FC = () => {
   const [nicheFilter, setNicheFilter] = useState('');
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  const [thumbnailSizes, setThumbnailSizes] = useState<number[]>([]);
 
   const API_BASE_URL = (import.meta.env as any).VITE_API_URL || '';
 
@@ -40,6 +42,22 @@ const Prospects: React.FC = () => {
     fetchProspects();
   }, [currentPage, statusFilter, nicheFilter]);
 
+  useEffect(() => {
+    fetchThumbnailSizes();
+  }, []);
+
+  const fetchThumbnailSizes = async () => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/thumbnails/sizes`);
+      setThumbnailSizes([...response.data.sizes].sort((a: number, b: number) => a - b));
+    } catch (error) {
+      console.error('Error fetching thumbnail sizes:', error);
+    }
+  };
+
+  const thumbnailUrl = (digest: string, size: number) =>
+    `${API_BASE_URL}/api/thumbnails/${digest}/${size}.webp`;
+
   const fetchProspects = async () => {
     try {
       setLoading(true);
@@ -191,11 +209,24 @@ const Prospects: React.FC = () => {
                     <td className="px-6 py-4 whitespace-nowrap">
                       <div className="flex items-center">
                         <div className="flex-shrink-0 h-10 w-10">
-                          <div className="h-10 w-10 rounded-full bg-blue-100 flex items-center justify-center">
-                            <span className="text-sm font-medium text-blue-600">
-                              {prospect.username.charAt(0).toUpperCase()}
-                            </span>
-                          </div>
+                          {prospect.thumbnail_digest && thumbnailSizes.length > 0 ? (
+                            <img
+                              className="h-10 w-10 rounded-full object-cover"
+                              src={thumbnailUrl(prospect.thumbnail_digest, thumbnailSizes[0])}
+                              srcSet={thumbnailSizes
+                                .map((size) => `${thumbnailUrl(prospect.thumbnail_digest!, size)} ${size}w`)
+                                .join(', ')}
+                              sizes="40px"
+                              alt=""
+                              loading="lazy"
+                            />
+                          ) : (
+                            <div className="h-10 w-10 rounded-full bg-blue-100 flex items-center justify-center">
+                              <span className="text-sm font-medium text-blue-600">
+                                {prospect.username.charAt(0).toUpperCase()}
+                              </span>
+                            </div>
+                          )}
                         </div>
                         <div className="ml-4">
                           <div className="text-sm font-medium text-gray-900">